@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+"""
+Simulador offline do ciclo de varredura (scan) de programas .smbp
+Interpreta o IL das <InstructionLines> (LD/LDN/ST/AND/OR/S/R, blocos
+[ %MWx := expr ] e temporizadores %TM) sobre memória %I, %Q, %M, %MW e %IW.
+
+Permite validar correções (ex.: bug SET sem RESET do mapeamento Modbus)
+sem CLP nem simulador, rodando milhares de ciclos por segundo.
+
+Uso:
+    python3 simulate_il.py correto.smbp cenario_mapeamento_modbus.json
+    python3 simulate_il.py correto_COM_RESETS.smbp cenario_mapeamento_modbus.json --fuzz 5000
+    python3 simulate_il.py correto.smbp cenario.json --trace trace.csv
+"""
+
+import argparse
+import csv
+import json
+import random
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+# Bases de tempo dos temporizadores (em ms). Padrão do M221 é 1 minuto.
+TIMER_BASES_MS = {
+    'OneMinute': 60000,
+    'OneSecond': 1000,
+    'OneHundredMs': 100,
+    'HundredMs': 100,
+    'TenMs': 10,
+    'OneMs': 1,
+}
+
+# Códigos de operação compilados
+OP_LD, OP_LDN, OP_AND, OP_ANDN, OP_OR, OP_ORN, OP_XOR, OP_XORN = range(8)
+OP_ST, OP_STN, OP_S, OP_R, OP_EXEC, OP_BLK, OP_IN, OP_NOP = range(8, 16)
+
+BOOL_OPS = {
+    'LD': OP_LD, 'LDN': OP_LDN,
+    'AND': OP_AND, 'ANDN': OP_ANDN,
+    'OR': OP_OR, 'ORN': OP_ORN,
+    'XOR': OP_XOR, 'XORN': OP_XORN,
+}
+STORE_OPS = {'ST': OP_ST, 'STN': OP_STN, 'S': OP_S, 'R': OP_R}
+
+TOKEN_RE = re.compile(
+    r'\s*(%[A-Z]+\d+(?:\.\d+)?(?:\.[A-Z]+)?|\d+|:=|<>|<=|>=|MOD\b|[-+*/()<>=])',
+    re.IGNORECASE,
+)
+COMPARATORS = {'=', '<>', '<', '>', '<=', '>='}
+
+
+class ILError(Exception):
+    """Erro de interpretação do IL (instrução ou expressão não suportada)"""
+
+
+def to_int16(value):
+    """Aplica o estouro de 16 bits com sinal de uma %MW"""
+    return ((int(value) + 0x8000) & 0xFFFF) - 0x8000
+
+
+def normalize(address):
+    """Normaliza um endereço (%mw500 -> %MW500)"""
+    return address.strip().upper()
+
+
+# ==================== Expressões ====================
+
+def tokenize(text):
+    """Quebra uma expressão em tokens"""
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        if not match:
+            raise ILError(f"Token inválido em '{text}' (posição {pos})")
+        tokens.append(match.group(1).upper())
+        pos = match.end()
+    return tokens
+
+
+class ExpressionCompiler:
+    """
+    Compila expressões de blocos de operação/comparação em closures
+    Gramática: cmp := sum [op sum]; sum := term {(+|-) term};
+               term := unary {(*|/|MOD) unary}; unary := [-] atom
+    """
+
+    def __init__(self, tokens, timer=None):
+        self.tokens = tokens
+        self.pos = 0
+        self.timer = timer
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def compile(self):
+        fn = self.comparison()
+        if self.peek() is not None:
+            raise ILError(f"Token inesperado: {self.peek()}")
+        return fn
+
+    def comparison(self):
+        left = self.sum()
+        if self.peek() in COMPARATORS:
+            op = self.take()
+            right = self.sum()
+            return {
+                '=': lambda m: int(left(m) == right(m)),
+                '<>': lambda m: int(left(m) != right(m)),
+                '<': lambda m: int(left(m) < right(m)),
+                '>': lambda m: int(left(m) > right(m)),
+                '<=': lambda m: int(left(m) <= right(m)),
+                '>=': lambda m: int(left(m) >= right(m)),
+            }[op]
+        return left
+
+    def sum(self):
+        fn = self.term()
+        while self.peek() in ('+', '-'):
+            op = self.take()
+            left, right = fn, self.term()
+            if op == '+':
+                fn = lambda m, a=left, b=right: a(m) + b(m)
+            else:
+                fn = lambda m, a=left, b=right: a(m) - b(m)
+        return fn
+
+    def term(self):
+        fn = self.unary()
+        while self.peek() in ('*', '/', 'MOD'):
+            op = self.take()
+            left, right = fn, self.unary()
+            if op == '*':
+                fn = lambda m, a=left, b=right: a(m) * b(m)
+            elif op == '/':
+                fn = lambda m, a=left, b=right: _divide(m, a(m), b(m))
+            else:
+                fn = lambda m, a=left, b=right: _modulo(m, a(m), b(m))
+        return fn
+
+    def unary(self):
+        if self.peek() == '-':
+            self.take()
+            inner = self.unary()
+            return lambda m: -inner(m)
+        return self.atom()
+
+    def atom(self):
+        token = self.take()
+        if token is None:
+            raise ILError("Expressão incompleta")
+        if token == '(':
+            fn = self.comparison()
+            if self.take() != ')':
+                raise ILError("Parêntese não fechado")
+            return fn
+        if token.isdigit():
+            value = int(token)
+            return lambda m: value
+        if token.startswith('%'):
+            return lambda m, key=token: m.get(key, 0)
+        raise ILError(f"Operando inválido: {token}")
+
+
+def _divide(memory, a, b):
+    """Divisão inteira truncada em zero; divisão por zero liga %S18"""
+    if b == 0:
+        memory['%S18'] = 1
+        return 0
+    return int(a / b)
+
+
+def _modulo(memory, a, b):
+    if b == 0:
+        memory['%S18'] = 1
+        return 0
+    return a - b * int(a / b)
+
+
+def compile_expression(text):
+    return ExpressionCompiler(tokenize(text)).compile()
+
+
+def compile_operand(text, timer=None):
+    """
+    Compila o operando de uma instrução booleana
+    Aceita constante, endereço, 'Q' de bloco de temporizador ou [ comparação ]
+    """
+    text = text.strip()
+    if text.startswith('[') and text.endswith(']'):
+        return compile_expression(text[1:-1])
+    text = normalize(text)
+    if text.isdigit():
+        value = 1 if int(text) else 0
+        return lambda m: value
+    if text == 'Q' and timer:
+        return lambda m, key=f'{timer}.Q': m.get(key, 0)
+    if text.startswith('%'):
+        return lambda m, key=text: m.get(key, 0)
+    raise ILError(f"Operando não suportado: {text}")
+
+
+def compile_operation(text):
+    """Compila um bloco de operação '[ %MWx := expr ]' em (destino, função)"""
+    body = text.strip()[1:-1]
+    if ':=' not in body:
+        return None, compile_expression(body)
+    dest, expr = body.split(':=', 1)
+    return normalize(dest), compile_expression(expr)
+
+
+# ==================== Programa ====================
+
+class Timer:
+    """Temporizador %TM (TON, TOF ou TP) com tempo simulado"""
+
+    __slots__ = ('address', 'kind', 'preset_ms', 'base_ms', 'elapsed_ms',
+                 'q', 'last_in', 'running')
+
+    def __init__(self, address, preset, base_ms, kind='TON'):
+        self.address = address
+        self.kind = kind
+        self.base_ms = base_ms
+        self.preset_ms = preset * base_ms
+        self.reset()
+
+    def reset(self):
+        self.elapsed_ms = 0
+        self.q = 0
+        self.last_in = 0
+        self.running = False
+
+    def update(self, enabled, dt_ms):
+        """Avalia o temporizador para a entrada IN atual"""
+        if self.kind == 'TON':
+            if enabled:
+                self.elapsed_ms = min(self.elapsed_ms + dt_ms, self.preset_ms)
+                self.q = int(self.elapsed_ms >= self.preset_ms)
+            else:
+                self.elapsed_ms = 0
+                self.q = 0
+        elif self.kind == 'TOF':
+            if enabled:
+                self.elapsed_ms = 0
+                self.q = 1
+            elif self.q:
+                self.elapsed_ms = min(self.elapsed_ms + dt_ms, self.preset_ms)
+                self.q = int(self.elapsed_ms < self.preset_ms)
+        else:  # TP
+            if enabled and not self.last_in and not self.running:
+                self.running = True
+                self.elapsed_ms = 0
+            if self.running:
+                self.elapsed_ms = min(self.elapsed_ms + dt_ms, self.preset_ms)
+                if self.elapsed_ms >= self.preset_ms:
+                    self.running = False
+            self.q = int(self.running)
+        self.last_in = enabled
+        return self.q
+
+
+class Rung:
+    """Rung compilado: nome, POU e lista de instruções (opcode, arg)"""
+
+    __slots__ = ('pou', 'name', 'source', 'code')
+
+    def __init__(self, pou, name, source, code):
+        self.pou = pou
+        self.name = name
+        self.source = source
+        self.code = code
+
+
+def compile_rung(pou, name, lines):
+    """Compila as linhas de IL de um rung"""
+    code = []
+    timer = None
+    for raw in lines:
+        line = raw.strip()
+        if not line:
+            continue
+        try:
+            if line.startswith('['):
+                dest, fn = compile_operation(line)
+                if dest is None:
+                    raise ILError(f"Bloco sem atribuição fora de LD/AND/OR: {line}")
+                code.append((OP_EXEC, (dest, fn)))
+                continue
+
+            parts = line.split(None, 1)
+            mnemonic = parts[0].upper()
+            operand = parts[1] if len(parts) > 1 else ''
+
+            if mnemonic in BOOL_OPS:
+                code.append((BOOL_OPS[mnemonic], compile_operand(operand, timer)))
+            elif mnemonic in STORE_OPS:
+                code.append((STORE_OPS[mnemonic], normalize(operand)))
+            elif mnemonic == 'BLK':
+                timer = normalize(operand)
+                if not timer.startswith('%TM'):
+                    raise ILError(f"Bloco não suportado: {operand}")
+                code.append((OP_BLK, timer))
+            elif mnemonic == 'IN' and timer:
+                code.append((OP_IN, timer))
+            elif mnemonic in ('OUT_BLK', 'END_BLK'):
+                code.append((OP_NOP, None))
+                if mnemonic == 'END_BLK':
+                    timer = None
+            else:
+                raise ILError(f"Instrução não suportada: {line}")
+        except ILError as e:
+            raise ILError(f"[{pou} / {name}] {e}") from None
+    return Rung(pou, name, list(lines), code)
+
+
+def load_program(smbp_file):
+    """
+    Lê um arquivo .smbp e retorna (rungs, timers)
+    timers é um dict endereço -> (preset, base_ms, tipo)
+    """
+    root = ET.parse(smbp_file).getroot()
+
+    rungs = []
+    for pou in root.iter('ProgramOrganizationUnits'):
+        pou_name = pou.findtext('Name') or ''
+        for rung in pou.iter('RungEntity'):
+            lines = [
+                entity.findtext('InstructionLine') or ''
+                for entity in rung.iter('InstructionLineEntity')
+            ]
+            rungs.append(compile_rung(pou_name, rung.findtext('Name') or '', lines))
+
+    timers = {}
+    for tm in root.iter('TimerTM'):
+        address = normalize(tm.findtext('Address') or '')
+        preset = int(tm.findtext('Preset') or 0)
+        base = TIMER_BASES_MS.get(tm.findtext('Base') or 'OneMinute', 60000)
+        kind = (tm.findtext('Type') or 'TON').upper()
+        timers[address] = (preset, base, kind)
+
+    return rungs, timers
+
+
+class PLCSimulator:
+    """
+    Executa um programa IL compilado ciclo a ciclo
+    Memória única (dict) endereçada por string normalizada ('%MW500')
+    """
+
+    def __init__(self, rungs, timers, scan_ms=10):
+        self.rungs = rungs
+        self.scan_ms = scan_ms
+        self.timer_config = timers
+        self.code = [instr for rung in rungs for instr in rung.code]
+        self.reset()
+
+    def reset(self):
+        """Volta ao estado de partida a frio"""
+        self.memory = {}
+        self.cycles = 0
+        self.time_ms = 0
+        self.timers = {
+            address: Timer(address, preset, base, kind)
+            for address, (preset, base, kind) in self.timer_config.items()
+        }
+        for address, timer in self.timers.items():
+            self.memory[f'{address}.P'] = timer.preset_ms // timer.base_ms
+
+    def _timer(self, address):
+        timer = self.timers.get(address)
+        if timer is None:
+            # Temporizador não configurado: preset 0, base padrão
+            timer = self.timers[address] = Timer(address, 0, 60000)
+        return timer
+
+    def set_inputs(self, values):
+        """Escreve valores na imagem de memória (entradas ou bits externos)"""
+        memory = self.memory
+        for address, value in values.items():
+            memory[normalize(address)] = int(value)
+
+    def scan(self):
+        """Executa um ciclo completo de varredura"""
+        memory = self.memory
+        dt = self.scan_ms
+        acc = 0
+        block_timer = None
+
+        self.time_ms += dt
+        for op, arg in self.code:
+            if op == OP_LD:
+                acc = 1 if arg(memory) else 0
+            elif op == OP_ST:
+                memory[arg] = acc
+            elif op == OP_EXEC:
+                if acc:
+                    dest, fn = arg
+                    memory[dest] = to_int16(fn(memory))
+            elif op == OP_LDN:
+                acc = 0 if arg(memory) else 1
+            elif op == OP_AND:
+                acc = 1 if acc and arg(memory) else 0
+            elif op == OP_ANDN:
+                acc = 1 if acc and not arg(memory) else 0
+            elif op == OP_OR:
+                acc = 1 if acc or arg(memory) else 0
+            elif op == OP_ORN:
+                acc = 1 if acc or not arg(memory) else 0
+            elif op == OP_XOR:
+                acc = 1 if bool(acc) != bool(arg(memory)) else 0
+            elif op == OP_XORN:
+                acc = 1 if bool(acc) == bool(arg(memory)) else 0
+            elif op == OP_STN:
+                memory[arg] = 0 if acc else 1
+            elif op == OP_S:
+                if acc:
+                    memory[arg] = 1
+            elif op == OP_R:
+                if acc:
+                    memory[arg] = 0
+            elif op == OP_BLK:
+                block_timer = self._timer(arg)
+            elif op == OP_IN:
+                q = block_timer.update(acc, dt)
+                memory[f'{arg}.Q'] = q
+                memory[f'{arg}.V'] = block_timer.elapsed_ms // block_timer.base_ms
+
+        self.cycles += 1
+
+    def run(self, cycles, trace=None, watch=()):
+        """Executa N ciclos, opcionalmente registrando o trace"""
+        memory = self.memory
+        for _ in range(cycles):
+            self.scan()
+            if trace is not None:
+                trace.append([self.cycles, self.time_ms] + [memory.get(a, 0) for a in watch])
+
+    def read(self, address):
+        return self.memory.get(normalize(address), 0)
+
+    def referenced(self, prefix):
+        """Endereços com o prefixo dado lidos pelo programa (ex.: '%I')"""
+        found = set()
+        for rung in self.rungs:
+            for line in rung.source:
+                for token in re.findall(r'%[A-Z]+\d+(?:\.\d+)?', line.upper()):
+                    if re.match(rf'{re.escape(prefix)}\d', token):
+                        found.add(token)
+        return sorted(found, key=_address_key)
+
+
+def _address_key(address):
+    numbers = [int(n) for n in re.findall(r'\d+', address)]
+    return (re.match(r'%[A-Z]+', address).group(0), numbers)
+
+
+# ==================== Cenários ====================
+
+def check_expectations(sim, expected):
+    """Retorna lista de falhas para um dict endereço -> valor esperado"""
+    failures = []
+    for address, value in expected.items():
+        actual = sim.read(address)
+        if actual != int(value):
+            failures.append(f"{normalize(address)} = {actual} (esperado {value})")
+    return failures
+
+
+def check_invariants(sim, invariants):
+    """Retorna as invariantes violadas no estado atual"""
+    return [text for text, fn in invariants if not fn(sim.memory)]
+
+
+def run_scenario(sim, scenario, trace=None, watch=()):
+    """
+    Executa os passos do cenário
+    Cada passo: {"inputs": {...}, "cycles": N, "expect": {...}}
+    As invariantes são verificadas ao fim de cada passo
+    """
+    invariants = [(text, compile_expression(text)) for text in scenario.get('invariants', [])]
+    failures = []
+
+    for index, step in enumerate(scenario.get('steps', []), start=1):
+        sim.set_inputs(step.get('inputs', {}))
+        sim.run(int(step.get('cycles', 1)), trace, watch)
+
+        label = step.get('name', f'passo {index}')
+        for failure in check_expectations(sim, step.get('expect', {})):
+            failures.append(f"{label} (ciclo {sim.cycles}): {failure}")
+        for violated in check_invariants(sim, invariants):
+            failures.append(f"{label} (ciclo {sim.cycles}): invariante violada: {violated}")
+
+    return failures
+
+
+def fuzz_scenario(sim, scenario, steps, seed):
+    """
+    Aplica sequências aleatórias nas entradas e verifica as invariantes
+    Entradas sorteadas: 'fuzz_inputs' do cenário ou todos os %I do programa
+    """
+    rng = random.Random(seed)
+    invariants = [(text, compile_expression(text)) for text in scenario.get('invariants', [])]
+    bits = [normalize(a) for a in scenario.get('fuzz_inputs', [])] or sim.referenced('%I')
+    words = [normalize(a) for a in scenario.get('fuzz_words', [])] or sim.referenced('%IW')
+    failures = []
+
+    for index in range(steps):
+        values = {address: rng.randint(0, 1) for address in bits}
+        values.update({address: rng.randint(0, 1000) for address in words})
+        sim.set_inputs(values)
+        sim.run(rng.randint(1, 5))
+
+        for violated in check_invariants(sim, invariants):
+            failures.append(
+                f"passo aleatório {index + 1} (ciclo {sim.cycles}, seed {seed}): "
+                f"invariante violada: {violated} | entradas: {values}"
+            )
+        if failures:
+            break
+
+    return failures
+
+
+def write_trace(trace, watch, output_file):
+    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['cycle', 'time_ms'] + list(watch))
+        writer.writerows(trace)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulador offline de IL (.smbp)')
+    parser.add_argument('smbp', help='Arquivo .smbp do SoMachine Basic')
+    parser.add_argument('scenario', help='Cenário JSON (passos, esperados e invariantes)')
+    parser.add_argument('--scan-ms', type=int, help='Tempo de ciclo simulado (padrão: do cenário ou 10ms)')
+    parser.add_argument('--trace', help='Grava o trace dos endereços observados em CSV')
+    parser.add_argument('--fuzz', type=int, default=0, help='Passos aleatórios após o cenário')
+    parser.add_argument('--seed', type=int, default=0, help='Semente do fuzz (reprodutível)')
+    args = parser.parse_args()
+
+    smbp_path = Path(args.smbp)
+    if not smbp_path.exists():
+        print(f"❌ Arquivo não encontrado: {args.smbp}")
+        return 2
+
+    with open(args.scenario, 'r', encoding='utf-8') as f:
+        scenario = json.load(f)
+
+    try:
+        rungs, timers = load_program(smbp_path)
+    except ILError as e:
+        print(f"❌ Erro de interpretação: {e}")
+        return 2
+
+    scan_ms = args.scan_ms or scenario.get('scan_ms', 10)
+    sim = PLCSimulator(rungs, timers, scan_ms=scan_ms)
+
+    print(f"📖 Programa: {smbp_path} ({len(rungs)} rungs, {len(sim.code)} instruções)")
+    print(f"🧪 Cenário: {scenario.get('description', args.scenario)}")
+
+    watch = [normalize(a) for a in scenario.get('trace', [])]
+    trace = [] if args.trace else None
+
+    started = time.perf_counter()
+    failures = run_scenario(sim, scenario, trace, watch)
+
+    if args.fuzz and not failures:
+        sim.reset()
+        failures = fuzz_scenario(sim, scenario, args.fuzz, args.seed)
+
+    elapsed = time.perf_counter() - started
+    rate = sim.cycles / elapsed if elapsed > 0 else 0.0
+
+    if trace is not None:
+        write_trace(trace, watch, args.trace)
+        print(f"💾 Trace gravado: {args.trace} ({len(trace)} ciclos)")
+
+    print(f"⏱️  {sim.cycles} ciclos em {elapsed:.3f}s ({rate:,.0f} ciclos/s)")
+
+    if failures:
+        print(f"\n❌ {len(failures)} falha(s):")
+        for failure in failures[:20]:
+            print(f"   - {failure}")
+        return 1
+
+    print("\n✅ Todas as verificações passaram")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,6 @@
 import pkg from 'pg';
+import { Readable } from 'stream';
+import { pipeline } from 'stream/promises';
 const { Pool } = pkg;
 
 // Database configuration
@@ -161,7 +163,8 @@ async function updateAlertPreferences(sensorName, preferences) {
       enable_ll = COALESCE($9, enable_ll),
       hysteresis = COALESCE($10, hysteresis),
       cooldown_seconds = COALESCE($11, cooldown_seconds),
-      is_active = COALESCE($12, is_active)
+      is_active = COALESCE($12, is_active),
+      debounce_seconds = COALESCE($13, debounce_seconds)
     WHERE sensor_name = $1
     RETURNING *
   `;
@@ -179,6 +182,7 @@ async function updateAlertPreferences(sensorName, preferences) {
     preferences.hysteresis,
     preferences.cooldown_seconds,
     preferences.is_active,
+    preferences.debounce_seconds,
   ];
 
   try {
@@ -283,6 +287,26 @@ async function resolveAlert(alertId) {
   }
 }
 
+/**
+ * Resolve the active alerts of a device sensor (edge threshold events)
+ */
+async function resolveSensorAlerts(deviceId, sensorName, resolvedAt) {
+  const query = `
+    UPDATE alert_history
+    SET is_active = false, resolved_at = $3
+    WHERE device_id = $1 AND sensor_name = $2 AND is_active = true
+    RETURNING id
+  `;
+
+  try {
+    const result = await pool.query(query, [deviceId, sensorName, resolvedAt || new Date()]);
+    return result.rows;
+  } catch (error) {
+    console.error('[DB] Error resolving sensor alerts:', error.message);
+    throw error;
+  }
+}
+
 // ============================================================================
 // USER PREFERENCES FUNCTIONS
 // ============================================================================
@@ -359,6 +383,21 @@ async function cleanupOldTelemetry() {
 // INVERTER FUNCTIONS
 // ============================================================================
 
+// Highest PV string stored in pv_strings_data (pv_01 .. pv_24)
+const PV_STRING_COUNT = 24;
+
+// Status and alarm registers arrive decoded (a status text, a list of alarm
+// names) or raw; only integer codes reach the INTEGER columns
+function integerOrNull(value) {
+  if (typeof value === 'number') {
+    return Number.isInteger(value) ? value : null;
+  }
+  if (typeof value === 'string' && /^-?[0-9]+$/.test(value)) {
+    return parseInt(value, 10);
+  }
+  return null;
+}
+
 /**
  * Insert inverter telemetry data
  */
@@ -378,11 +417,14 @@ async function insertInverterTelemetry(data) {
         daily_yield_energy, accumulated_yield_energy,
         internal_temperature, grid_frequency,
         device_status, alarm_1, alarm_2, alarm_3,
-        connection_type, data_quality, read_timestamp
+        connection_type, data_quality, read_timestamp,
+        boot_id, sequence
       ) VALUES (
         $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15,
-        $16, $17, $18, $19, $20, $21, $22, $23, $24, $25, $26
-      ) RETURNING id
+        $16, $17, $18, $19, $20, $21, $22, $23, $24, $25, $26, $27, $28
+      )
+      ON CONFLICT (device_id, boot_id, sequence) WHERE boot_id IS NOT NULL DO NOTHING
+      RETURNING id
     `;
 
     const telemetryValues = [
@@ -405,44 +447,51 @@ async function insertInverterTelemetry(data) {
       data.energy?.accumulated_yield_energy?.value || null,
       data.temperature?.internal_temperature?.value || null,
       data.grid?.grid_frequency?.value || null,
-      data.status?.device_status?.value || null,
-      data.status?.alarm_1?.value || null,
-      data.status?.alarm_2?.value || null,
-      data.status?.alarm_3?.value || null,
+      integerOrNull(data.status?.device_status?.value),
+      integerOrNull(data.status?.alarm_1?.value),
+      integerOrNull(data.status?.alarm_2?.value),
+      integerOrNull(data.status?.alarm_3?.value),
       data.metadata?.connection_type || null,
       data.metadata?.data_quality || null,
       data.metadata?.read_timestamp || null,
+      data.metadata?.boot_id || null,
+      data.metadata?.sequence ?? null,
     ];
 
     const telemetryResult = await client.query(telemetryQuery, telemetryValues);
+    if (telemetryResult.rows.length === 0) {
+      // Already stored (retried upload)
+      await client.query('COMMIT');
+      return null;
+    }
     const telemetryId = telemetryResult.rows[0].id;
 
-    // Insert PV strings data if available
+    // Insert PV strings data if available (only strings present in the payload)
     if (data.pv_strings) {
-      const pvQuery = `
-        INSERT INTO pv_strings_data (
-          inverter_telemetry_id, timestamp,
-          pv_01_voltage, pv_01_current,
-          pv_02_voltage, pv_02_current,
-          pv_03_voltage, pv_03_current,
-          pv_04_voltage, pv_04_current
-        ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
-      `;
-
-      const pvValues = [
-        telemetryId,
-        data.timestamp,
-        data.pv_strings?.PV_01_voltage?.value || null,
-        data.pv_strings?.PV_01_current?.value || null,
-        data.pv_strings?.PV_02_voltage?.value || null,
-        data.pv_strings?.PV_02_current?.value || null,
-        data.pv_strings?.PV_03_voltage?.value || null,
-        data.pv_strings?.PV_03_current?.value || null,
-        data.pv_strings?.PV_04_voltage?.value || null,
-        data.pv_strings?.PV_04_current?.value || null,
-      ];
-
-      await client.query(pvQuery, pvValues);
+      const pvColumns = [];
+      const pvValues = [telemetryId, data.timestamp];
+
+      for (let i = 1; i <= PV_STRING_COUNT; i++) {
+        const string = String(i).padStart(2, '0');
+        for (const field of ['voltage', 'current']) {
+          const reading = data.pv_strings[`pv_${string}_${field}`];
+          if (reading !== undefined) {
+            pvColumns.push(`pv_${string}_${field}`);
+            pvValues.push(reading?.value ?? null);
+          }
+        }
+      }
+
+      if (pvColumns.length > 0) {
+        const placeholders = pvValues.map((_, index) => `$${index + 1}`).join(', ');
+        const pvQuery = `
+          INSERT INTO pv_strings_data (
+            inverter_telemetry_id, timestamp, ${pvColumns.join(', ')}
+          ) VALUES (${placeholders})
+        `;
+
+        await client.query(pvQuery, pvValues);
+      }
     }
 
     await client.query('COMMIT');
@@ -456,6 +505,186 @@ async function insertInverterTelemetry(data) {
   }
 }
 
+/**
+ * Insert inverter alarm/status events (one transaction per batch)
+ */
+async function insertInverterEvents(events) {
+  const client = await pool.connect();
+  try {
+    await client.query('BEGIN');
+
+    const query = `
+      INSERT INTO inverter_events (
+        device_id, timestamp, event_type, register, code, name, level,
+        active_since, previous_status, current_status
+      ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+    `;
+
+    for (const event of events) {
+      await client.query(query, [
+        event.device_id || null,
+        event.timestamp,
+        event.event,
+        event.register || null,
+        event.code ?? null,
+        event.name || null,
+        event.level || null,
+        event.since || null,
+        event.previous || null,
+        event.current || null,
+      ]);
+    }
+
+    await client.query('COMMIT');
+  } catch (error) {
+    await client.query('ROLLBACK');
+    console.error('[DB] Error inserting inverter events:', error.message);
+    throw error;
+  } finally {
+    client.release();
+  }
+}
+
+// Bulk load staging table: [column, type]; every column is optional in a file
+const BACKFILL_NUMERIC_COLUMNS = [
+  'input_power', 'active_power', 'reactive_power', 'power_factor',
+  'line_voltage_ab', 'line_voltage_bc', 'line_voltage_ca',
+  'phase_a_voltage', 'phase_b_voltage', 'phase_c_voltage',
+  'phase_a_current', 'phase_b_current', 'phase_c_current',
+  'daily_yield_energy', 'accumulated_yield_energy',
+  'internal_temperature', 'grid_frequency',
+];
+const BACKFILL_INTEGER_COLUMNS = ['device_status', 'alarm_1', 'alarm_2', 'alarm_3'];
+const BACKFILL_PV_COLUMNS = [];
+for (let i = 1; i <= PV_STRING_COUNT; i++) {
+  const string = String(i).padStart(2, '0');
+  BACKFILL_PV_COLUMNS.push(`pv_${string}_voltage`, `pv_${string}_current`);
+}
+const BACKFILL_STAGING_COLUMNS = [
+  ['device_id', 'TEXT'],
+  ['timestamp', 'TIMESTAMPTZ'],
+  ...BACKFILL_NUMERIC_COLUMNS.map(column => [column, 'NUMERIC']),
+  // Raw register values: only integer codes reach the INTEGER columns
+  ...BACKFILL_INTEGER_COLUMNS.map(column => [column, 'TEXT']),
+  ['connection_type', 'TEXT'],
+  ['data_quality', 'TEXT'],
+  ['read_timestamp', 'TIMESTAMPTZ'],
+  ['boot_id', 'TEXT'],
+  ['sequence', 'BIGINT'],
+  ...BACKFILL_PV_COLUMNS.map(column => [column, 'NUMERIC']),
+];
+
+// Rows per chunk written to the COPY stream
+const COPY_CHUNK_ROWS = 1000;
+
+function csvValue(value) {
+  if (value === null || value === undefined) {
+    return '';
+  }
+  if (typeof value === 'number') {
+    return Number.isFinite(value) ? String(value) : '';
+  }
+  if (typeof value === 'bigint') {
+    return String(value);
+  }
+  return `"${String(value).replace(/"/g, '""')}"`;
+}
+
+function* csvChunks(columns, names, rowCount) {
+  const vectors = names.map(name => columns[name]);
+  for (let start = 0; start < rowCount; start += COPY_CHUNK_ROWS) {
+    const end = Math.min(start + COPY_CHUNK_ROWS, rowCount);
+    let chunk = '';
+    for (let row = start; row < end; row++) {
+      chunk += vectors.map(values => csvValue(values[row])).join(',') + '\n';
+    }
+    yield chunk;
+  }
+}
+
+/**
+ * Bulk load inverter telemetry (backfill after an outage)
+ * columns maps column names to arrays of rowCount values. Rows are streamed
+ * with COPY into a temporary table, then moved into inverter_telemetry and
+ * pv_strings_data with one INSERT ... SELECT each, in a single transaction.
+ * Samples already stored (same device_id, boot_id, sequence) are skipped
+ */
+async function copyInverterTelemetry(columns, rowCount) {
+  let copyFrom;
+  try {
+    ({ from: copyFrom } = await import('pg-copy-streams'));
+  } catch (error) {
+    throw new Error('Pacote "pg-copy-streams" não instalado (execute npm install no backend)');
+  }
+
+  const copyColumns = BACKFILL_STAGING_COLUMNS
+    .map(([column]) => column)
+    .filter(column => Array.isArray(columns[column]));
+  const pvColumns = BACKFILL_PV_COLUMNS.filter(column => copyColumns.includes(column));
+  const integer = column =>
+    `CASE WHEN ${column} ~ '^-?[0-9]+$' THEN ${column}::integer END`;
+
+  const client = await pool.connect();
+  try {
+    await client.query('BEGIN');
+
+    await client.query(`
+      CREATE TEMP TABLE backfill_staging (
+        id UUID DEFAULT uuid_generate_v4(),
+        ${BACKFILL_STAGING_COLUMNS.map(([column, type]) => `${column} ${type}`).join(',\n        ')}
+      ) ON COMMIT DROP
+    `);
+
+    const copyStream = client.query(copyFrom(
+      `COPY backfill_staging (${copyColumns.join(', ')}) FROM STDIN WITH (FORMAT csv)`
+    ));
+    await pipeline(Readable.from(csvChunks(columns, copyColumns, rowCount)), copyStream);
+
+    const telemetryResult = await client.query(`
+      INSERT INTO inverter_telemetry (
+        id, device_id, timestamp,
+        ${BACKFILL_NUMERIC_COLUMNS.join(', ')},
+        ${BACKFILL_INTEGER_COLUMNS.join(', ')},
+        connection_type, data_quality, read_timestamp,
+        boot_id, sequence
+      )
+      SELECT
+        id, device_id, timestamp,
+        ${BACKFILL_NUMERIC_COLUMNS.join(', ')},
+        ${BACKFILL_INTEGER_COLUMNS.map(integer).join(', ')},
+        connection_type, data_quality, read_timestamp,
+        boot_id, sequence
+      FROM backfill_staging
+      WHERE device_id IS NOT NULL AND timestamp IS NOT NULL
+      ON CONFLICT (device_id, boot_id, sequence) WHERE boot_id IS NOT NULL DO NOTHING
+    `);
+
+    if (pvColumns.length > 0) {
+      // PV rows only for the samples inserted above
+      await client.query(`
+        DELETE FROM backfill_staging s
+        WHERE NOT EXISTS (SELECT 1 FROM inverter_telemetry t WHERE t.id = s.id)
+      `);
+      await client.query(`
+        INSERT INTO pv_strings_data (inverter_telemetry_id, timestamp, ${pvColumns.join(', ')})
+        SELECT id, timestamp, ${pvColumns.join(', ')}
+        FROM backfill_staging
+        WHERE device_id IS NOT NULL AND timestamp IS NOT NULL
+          AND COALESCE(${pvColumns.join(', ')}) IS NOT NULL
+      `);
+    }
+
+    await client.query('COMMIT');
+    return telemetryResult.rowCount;
+  } catch (error) {
+    await client.query('ROLLBACK');
+    console.error('[DB] Error bulk loading inverter telemetry:', error.message);
+    throw error;
+  } finally {
+    client.release();
+  }
+}
+
 /**
  * Get latest inverter data
  */
@@ -622,6 +851,7 @@ export {
   getActiveAlerts,
   acknowledgeAlert,
   resolveAlert,
+  resolveSensorAlerts,
 
   // User preferences
   getUserPreference,
@@ -629,6 +859,8 @@ export {
 
   // Inverter
   insertInverterTelemetry,
+  insertInverterEvents,
+  copyInverterTelemetry,
   getLatestInverterData,
   getInverterHourlyStats,
   getInverterDailyStats,
@@ -0,0 +1,74 @@
+// ============================================================================
+// MQTT BRIDGE
+// Ingestão opcional dos dados publicados pelo inverter-service (--sink mqtt).
+// Ativada com MQTT_URL (ex.: mqtt://localhost:1883).
+// ============================================================================
+
+/**
+ * Subscribe to <prefix>/+/telemetry and <prefix>/+/events and hand each
+ * message to the same handlers used by the HTTP endpoints
+ */
+async function startMqttBridge({ url, topicPrefix, onTelemetry, onEvents }) {
+  let mqtt;
+  try {
+    mqtt = (await import('mqtt')).default;
+  } catch (error) {
+    console.error('[MQTT] Pacote "mqtt" não instalado (execute npm install no backend); ingestão MQTT desativada');
+    return null;
+  }
+
+  // Persistent session: QoS 1 messages published while the backend is down
+  // are delivered by the broker when it reconnects
+  const client = mqtt.connect(url, {
+    clientId: process.env.MQTT_CLIENT_ID || 'mtzview-backend',
+    clean: false,
+    reconnectPeriod: 5000,
+  });
+
+  const topics = [`${topicPrefix}/+/telemetry`, `${topicPrefix}/+/events`];
+
+  client.on('connect', () => {
+    client.subscribe(topics, { qos: 1 }, (err) => {
+      if (err) {
+        console.error('[MQTT] Erro ao assinar tópicos:', err.message);
+      } else {
+        console.log(`[MQTT] Conectado a ${url}, assinando ${topics.join(', ')}`);
+      }
+    });
+  });
+
+  client.on('message', (topic, payload, packet) => {
+    // Retained telemetry is the last value, already stored on first delivery
+    if (packet.retain) {
+      return;
+    }
+
+    let message;
+    try {
+      message = JSON.parse(payload.toString());
+    } catch (error) {
+      console.error(`[MQTT] Mensagem inválida em ${topic}:`, error.message);
+      return;
+    }
+
+    if (topic.endsWith('/telemetry')) {
+      if (message.device_id && message.timestamp) {
+        Promise.resolve(onTelemetry(message)).catch(error => {
+          console.error('[MQTT] Erro ao salvar telemetria do inversor:', error.message);
+        });
+      }
+    } else if (topic.endsWith('/events')) {
+      if (Array.isArray(message.events)) {
+        onEvents(message.events);
+      }
+    }
+  });
+
+  client.on('error', (error) => {
+    console.error('[MQTT] Erro:', error.message);
+  });
+
+  return client;
+}
+
+export { startMqttBridge };
@@ -6,6 +6,7 @@ import compression from 'compression';
 import { fileURLToPath } from 'url';
 import { dirname, join } from 'path';
 import * as db from './db.js';
+import { startMqttBridge } from './mqtt.js';
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = dirname(__filename);
@@ -292,6 +293,77 @@ app.post('/api/alerts/:id/resolve', async (req, res) => {
   }
 });
 
+// Threshold events evaluated at the edge (inverter service, Node-RED on the CLP)
+// 'threshold_raised' opens an alert in alert_history (closing the previous
+// level of the same sensor), 'threshold_cleared' resolves it
+const THRESHOLD_EVENTS = new Set(['threshold_raised', 'threshold_cleared']);
+const LEVEL_WORDS = { HH: 'muito alto', H: 'alto', L: 'baixo', LL: 'muito baixo' };
+
+function isThresholdEvent(event) {
+  return THRESHOLD_EVENTS.has(event.event);
+}
+
+function thresholdMessage(event) {
+  const direction = event.level.startsWith('H') ? 'acima' : 'abaixo';
+  return `${event.sensor_name}: ${event.value} ${direction} do limite ${event.level} `
+    + `(${event.threshold}) - nível ${LEVEL_WORDS[event.level]}`;
+}
+
+// Database writes run in order, so a clear never overtakes its raise
+let thresholdWrites = Promise.resolve();
+
+function handleThresholdEvents(events) {
+  broadcastToSSEClients({
+    type: 'threshold_events',
+    data: events
+  });
+
+  for (const event of events) {
+    thresholdWrites = thresholdWrites.then(async () => {
+      await db.resolveSensorAlerts(event.device_id, event.sensor_name, event.timestamp);
+      if (event.event === 'threshold_raised') {
+        await db.insertAlert({
+          device_id: event.device_id,
+          sensor_name: event.sensor_name,
+          alert_level: event.level,
+          severity: event.severity,
+          measured_value: event.value,
+          threshold_value: event.threshold,
+          message: thresholdMessage(event),
+          triggered_at: event.timestamp,
+        });
+      }
+    }).catch(err => {
+      console.error('[DB] Erro ao salvar evento de limite:', err.message);
+    });
+  }
+
+  console.log(`[${new Date().toISOString()}] Threshold events received: `
+    + events.map(e => `${e.sensor_name} ${e.event === 'threshold_raised' ? e.level : 'normal'}`).join(', '));
+}
+
+// Receive threshold events from the edge (priority path, sent as soon as detected)
+app.post('/api/alerts/events', (req, res) => {
+  const { events } = req.body;
+
+  // Validation
+  if (!Array.isArray(events) || events.some(e => !isThresholdEvent(e) || !e.device_id
+      || !e.sensor_name || !e.timestamp || (e.event === 'threshold_raised' && !LEVEL_WORDS[e.level]))) {
+    return res.status(400).json({
+      error: 'Dados inválidos',
+      message: 'events deve ser uma lista de threshold_raised/threshold_cleared com device_id, sensor_name e timestamp'
+    });
+  }
+
+  handleThresholdEvents(events);
+
+  res.status(201).json({
+    success: true,
+    received: events.length,
+    timestamp: new Date().toISOString()
+  });
+});
+
 // ============================================================================
 // DATABASE ENDPOINTS - Temperature Stats
 // ============================================================================
@@ -346,6 +418,84 @@ app.post('/api/preferences/:key', async (req, res) => {
 // INVERTER ENDPOINTS
 // ============================================================================
 
+// Recently stored samples ("device_id:boot_id:sequence"): a retried or
+// redelivered upload is acknowledged without a second insert or broadcast.
+// A key is recorded only once the sample is in the database; the unique
+// index on inverter_telemetry covers backend restarts and concurrent retries
+const recentSamples = new Set();
+const MAX_RECENT_SAMPLES = 10000;
+
+function sampleKey(data) {
+  const bootId = data.metadata?.boot_id;
+  const sequence = data.metadata?.sequence;
+  if (!bootId || sequence === undefined || sequence === null) {
+    return null;
+  }
+  return `${data.device_id}:${bootId}:${sequence}`;
+}
+
+function rememberSample(key) {
+  recentSamples.add(key);
+  if (recentSamples.size > MAX_RECENT_SAMPLES) {
+    // Sets iterate in insertion order: drop the oldest key
+    recentSamples.delete(recentSamples.values().next().value);
+  }
+}
+
+// Inverter telemetry handling, shared by the HTTP endpoint and the MQTT bridge
+// Resolves to false for a sample that was already received; rejects when
+// the sample could not be stored, so the sender retries it
+async function handleInverterTelemetry(data) {
+  const key = sampleKey(data);
+  if (key && recentSamples.has(key)) {
+    return false;
+  }
+
+  // Store before acknowledging: the sample is kept by the edge until then
+  const stored = await db.insertInverterTelemetry(data);
+  if (key) {
+    rememberSample(key);
+  }
+  if (stored === null) {
+    // Already in the database (retry after a restart, or a concurrent one)
+    return false;
+  }
+
+  // Broadcast via SSE
+  broadcastToSSEClients({
+    type: 'inverter',
+    data: data
+  });
+
+  console.log(`[${new Date().toISOString()}] Inverter data received: ${data.device_id}`);
+  return true;
+}
+
+// Inverter events handling, shared by the HTTP endpoint and the MQTT bridge
+function handleInverterEvents(events) {
+  // Threshold events share the inverter fast lane but are alerts
+  const thresholds = events.filter(isThresholdEvent);
+  if (thresholds.length > 0) {
+    handleThresholdEvents(thresholds);
+    events = events.filter(e => !isThresholdEvent(e));
+    if (events.length === 0) {
+      return;
+    }
+  }
+
+  // Broadcast first: the dashboard must not wait for the database
+  broadcastToSSEClients({
+    type: 'inverter_events',
+    data: events
+  });
+
+  db.insertInverterEvents(events).catch(err => {
+    console.error('[DB] Erro ao salvar eventos do inversor:', err.message);
+  });
+
+  console.log(`[${new Date().toISOString()}] Inverter events received: ${events.map(e => e.event).join(', ')}`);
+}
+
 // Receive inverter telemetry from Python service
 app.post('/api/inverter/telemetry', async (req, res) => {
   try {
@@ -359,27 +509,94 @@ app.post('/api/inverter/telemetry', async (req, res) => {
       });
     }
 
-    // Save to database (async)
-    db.insertInverterTelemetry(data).catch(err => {
-      console.error('[DB] Erro ao salvar telemetria do inversor:', err.message);
+    if (!(await handleInverterTelemetry(data))) {
+      // Retry of a sample already received: success, nothing stored
+      return res.status(200).json({
+        success: true,
+        duplicate: true,
+        message: 'Amostra já recebida',
+        timestamp: new Date().toISOString()
+      });
+    }
+
+    res.status(201).json({
+      success: true,
+      message: 'Dados do inversor recebidos com sucesso',
+      timestamp: new Date().toISOString()
+    });
+
+  } catch (error) {
+    console.error('Erro ao processar telemetria do inversor:', error);
+    res.status(500).json({
+      error: 'Erro interno do servidor',
+      message: error.message
+    });
+  }
+});
+
+// Receive a batch of inverter samples (metered uplink, --uplink): gzip body
+// ({"samples": [...]}, inflated by express.json), records may be rollups
+app.post('/api/inverter/telemetry/batch', async (req, res) => {
+  try {
+    const { samples } = req.body;
+
+    // Validation
+    if (!Array.isArray(samples) || samples.some(s => !s || !s.device_id || !s.timestamp)) {
+      return res.status(400).json({
+        error: 'Dados inválidos',
+        message: 'samples deve ser uma lista com device_id e timestamp'
+      });
+    }
+
+    // In order, one at a time: a failure answers 5xx and the edge resends
+    // the batch; the samples stored before it are then acknowledged as duplicates
+    let stored = 0;
+    for (const sample of samples) {
+      if (await handleInverterTelemetry(sample)) {
+        stored++;
+      }
+    }
+
+    res.status(201).json({
+      success: true,
+      received: samples.length,
+      stored: stored,
+      duplicates: samples.length - stored,
+      timestamp: new Date().toISOString()
     });
 
-    // Broadcast via SSE
-    broadcastToSSEClients({
-      type: 'inverter',
-      data: data
+  } catch (error) {
+    console.error('Erro ao processar lote de telemetria do inversor:', error);
+    res.status(500).json({
+      error: 'Erro interno do servidor',
+      message: error.message
     });
+  }
+});
+
+// Receive inverter alarm/status transitions (fast lane, sent as soon as detected)
+app.post('/api/inverter/events', async (req, res) => {
+  try {
+    const { events } = req.body;
+
+    // Validation
+    if (!Array.isArray(events) || events.some(e => !e.event || !e.timestamp)) {
+      return res.status(400).json({
+        error: 'Dados inválidos',
+        message: 'events deve ser uma lista com event e timestamp'
+      });
+    }
 
-    console.log(`[${new Date().toISOString()}] Inverter data received: ${data.device_id}`);
+    handleInverterEvents(events);
 
     res.status(201).json({
       success: true,
-      message: 'Dados do inversor recebidos com sucesso',
+      received: events.length,
       timestamp: new Date().toISOString()
     });
 
   } catch (error) {
-    console.error('Erro ao processar telemetria do inversor:', error);
+    console.error('Erro ao processar eventos do inversor:', error);
     res.status(500).json({
       error: 'Erro interno do servidor',
       message: error.message
@@ -387,6 +604,65 @@ app.post('/api/inverter/telemetry', async (req, res) => {
   }
 });
 
+// Bulk backfill from the inverter service (--backfill): one Arrow IPC stream
+// per device and day, gzip-compressed (Content-Encoding), loaded with COPY
+app.post('/api/inverter/backfill',
+  express.raw({ type: 'application/vnd.apache.arrow.stream', limit: '200mb' }),
+  async (req, res) => {
+    let arrow;
+    try {
+      arrow = await import('apache-arrow');
+    } catch (error) {
+      return res.status(501).json({
+        error: 'Backfill indisponível',
+        message: 'Pacote "apache-arrow" não instalado (execute npm install no backend)'
+      });
+    }
+
+    try {
+      if (!Buffer.isBuffer(req.body) || req.body.length === 0) {
+        return res.status(400).json({
+          error: 'Dados inválidos',
+          message: 'Corpo deve ser um stream Arrow IPC'
+        });
+      }
+
+      const table = arrow.tableFromIPC(req.body);
+      if (!table.getChild('device_id') || !table.getChild('timestamp')) {
+        return res.status(400).json({
+          error: 'Dados inválidos',
+          message: 'Colunas device_id e timestamp são obrigatórias'
+        });
+      }
+
+      // Plain arrays (nulls preserved) for the COPY stream
+      const columns = {};
+      for (const field of table.schema.fields) {
+        columns[field.name] = Array.from(table.getChild(field.name));
+      }
+
+      const started = Date.now();
+      const rows = await db.copyInverterTelemetry(columns, table.numRows);
+      const durationMs = Date.now() - started;
+
+      console.log(`[${new Date().toISOString()}] Inverter backfill loaded: ${rows} rows (${columns.device_id[0]}) in ${durationMs} ms`);
+
+      res.status(201).json({
+        success: true,
+        rows,
+        duration_ms: durationMs,
+        timestamp: new Date().toISOString()
+      });
+
+    } catch (error) {
+      console.error('Erro ao carregar backfill do inversor:', error);
+      res.status(500).json({
+        error: 'Erro interno do servidor',
+        message: error.message
+      });
+    }
+  });
+
 // Get latest inverter data
 app.get('/api/inverter/current', async (req, res) => {
   try {
@@ -488,6 +764,9 @@ app.use((err, req, res, next) => {
   });
 });
 
+// Cliente MQTT (ingestão opcional, ver backend/mqtt.js)
+let mqttBridge = null;
+
 // Iniciar servidor
 async function startServer() {
   // Test database connection
@@ -509,6 +788,16 @@ async function startServer() {
     }, 24 * 60 * 60 * 1000);
   }
 
+  // Optional MQTT ingestion (inverter service with --sink mqtt)
+  if (process.env.MQTT_URL) {
+    mqttBridge = await startMqttBridge({
+      url: process.env.MQTT_URL,
+      topicPrefix: process.env.MQTT_TOPIC_PREFIX || 'mtzview/inverter',
+      onTelemetry: handleInverterTelemetry,
+      onEvents: handleInverterEvents,
+    });
+  }
+
   app.listen(PORT, () => {
     console.log(`
 ╔════════════════════════════════════════════╗
@@ -530,18 +819,24 @@ async function startServer() {
 ║   - GET  /api/alerts/preferences          ║
 ║   - PUT  /api/alerts/preferences/:sensor  ║
 ║   - GET  /api/alerts/active               ║
+║   - POST /api/alerts/events               ║
 ║   - GET  /api/stats/temperature           ║
 ║   - GET  /api/preferences/:key            ║
 ║   - POST /api/preferences/:key            ║
 ║                                            ║
 ║   Inverter Endpoints:                      ║
 ║   - POST /api/inverter/telemetry          ║
+║   - POST /api/inverter/telemetry/batch    ║
+║   - POST /api/inverter/events             ║
+║   - POST /api/inverter/backfill           ║
 ║   - GET  /api/inverter/current            ║
 ║   - GET  /api/inverter/stats/hourly       ║
 ║   - GET  /api/inverter/stats/daily        ║
 ║   - GET  /api/inverter/devices            ║
 ║   - POST /api/inverter/device             ║
 ║                                            ║
+║   MQTT: ${mqttBridge ? 'SUBSCRIBED ✓' : 'DISABLED'}                         ║
+║                                            ║
 ║   ${IS_PRODUCTION ? 'Frontend: http://localhost:' + PORT : 'Dev: Frontend separado'}        ║
 ╚════════════════════════════════════════════╝
     `);
@@ -552,6 +847,10 @@ async function startServer() {
 async function shutdown() {
   console.log('\n[SHUTDOWN] Fechando servidor...');
 
+  if (mqttBridge) {
+    await mqttBridge.endAsync();
+  }
+
   // Close database connection
   await db.closePool();
 
@@ -88,6 +88,12 @@ CREATE TABLE alert_preferences (
     -- Alert cooldown (seconds) - minimum time between same alerts
     cooldown_seconds INTEGER DEFAULT 300,
 
+    -- Debounce (seconds) - a new level must hold this long before it is
+    -- raised or cleared (evaluated at the edge, see threshold_monitor.py)
+    -- Existing databases:
+    --   ALTER TABLE alert_preferences ADD COLUMN IF NOT EXISTS debounce_seconds DECIMAL(6,2) DEFAULT 0;
+    debounce_seconds DECIMAL(6,2) DEFAULT 0,
+
     -- Active/inactive
     is_active BOOLEAN DEFAULT true,
 
@@ -96,11 +102,12 @@ CREATE TABLE alert_preferences (
 );
 
 -- Insert default alert preferences for the 4 temperature sensors
-INSERT INTO alert_preferences (sensor_name, sensor_address, threshold_hh, threshold_h, threshold_l, threshold_ll) VALUES
-    ('ambiente', '%MW36', 40.0, 35.0, 10.0, 5.0),
-    ('quadro_eletrico', '%MW38', 60.0, 50.0, 15.0, 10.0),
-    ('modulo_fotovoltaico', '%MW40', 80.0, 70.0, 5.0, 0.0),
-    ('transformador', '%MW42', 85.0, 75.0, 20.0, 15.0);
+-- (the transformer has no debounce: over-temperature must alert within a second)
+INSERT INTO alert_preferences (sensor_name, sensor_address, threshold_hh, threshold_h, threshold_l, threshold_ll, debounce_seconds) VALUES
+    ('ambiente', '%MW36', 40.0, 35.0, 10.0, 5.0, 5.0),
+    ('quadro_eletrico', '%MW38', 60.0, 50.0, 15.0, 10.0, 3.0),
+    ('modulo_fotovoltaico', '%MW40', 80.0, 70.0, 5.0, 0.0, 5.0),
+    ('transformador', '%MW42', 85.0, 75.0, 20.0, 15.0, 0.0);
 
 -- ============================================================================
 -- ALERT HISTORY
@@ -61,6 +61,16 @@ CREATE INDEX IF NOT EXISTS idx_inverter_telemetry_timestamp ON inverter_telemetr
 CREATE INDEX IF NOT EXISTS idx_inverter_telemetry_device_timestamp ON inverter_telemetry(device_id, timestamp DESC);
 CREATE INDEX IF NOT EXISTS idx_inverter_telemetry_created ON inverter_telemetry(created_at DESC);
 
+-- Sample identity from the inverter service: a retried or redelivered upload
+-- of the same sample is dropped (older rows without boot_id are not checked)
+ALTER TABLE inverter_telemetry
+    ADD COLUMN IF NOT EXISTS boot_id VARCHAR(32),
+    ADD COLUMN IF NOT EXISTS sequence BIGINT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_inverter_telemetry_sample
+    ON inverter_telemetry(device_id, boot_id, sequence)
+    WHERE boot_id IS NOT NULL;
+
 -- ============================================================================
 -- PV STRINGS DATA
 -- ============================================================================
@@ -96,10 +106,77 @@ CREATE TABLE IF NOT EXISTS pv_strings_data (
     pv_07_current DECIMAL(8,2),
     pv_08_voltage DECIMAL(8,2),
     pv_08_current DECIMAL(8,2),
+    pv_09_voltage DECIMAL(8,2),
+    pv_09_current DECIMAL(8,2),
+    pv_10_voltage DECIMAL(8,2),
+    pv_10_current DECIMAL(8,2),
+    pv_11_voltage DECIMAL(8,2),
+    pv_11_current DECIMAL(8,2),
+    pv_12_voltage DECIMAL(8,2),
+    pv_12_current DECIMAL(8,2),
+    pv_13_voltage DECIMAL(8,2),
+    pv_13_current DECIMAL(8,2),
+    pv_14_voltage DECIMAL(8,2),
+    pv_14_current DECIMAL(8,2),
+    pv_15_voltage DECIMAL(8,2),
+    pv_15_current DECIMAL(8,2),
+    pv_16_voltage DECIMAL(8,2),
+    pv_16_current DECIMAL(8,2),
+    pv_17_voltage DECIMAL(8,2),
+    pv_17_current DECIMAL(8,2),
+    pv_18_voltage DECIMAL(8,2),
+    pv_18_current DECIMAL(8,2),
+    pv_19_voltage DECIMAL(8,2),
+    pv_19_current DECIMAL(8,2),
+    pv_20_voltage DECIMAL(8,2),
+    pv_20_current DECIMAL(8,2),
+    pv_21_voltage DECIMAL(8,2),
+    pv_21_current DECIMAL(8,2),
+    pv_22_voltage DECIMAL(8,2),
+    pv_22_current DECIMAL(8,2),
+    pv_23_voltage DECIMAL(8,2),
+    pv_23_current DECIMAL(8,2),
+    pv_24_voltage DECIMAL(8,2),
+    pv_24_current DECIMAL(8,2),
 
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Upgrade existing installations (strings 9-24 for SUN2000-100KTL and larger)
+ALTER TABLE pv_strings_data
+    ADD COLUMN IF NOT EXISTS pv_09_voltage DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_09_current DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_10_voltage DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_10_current DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_11_voltage DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_11_current DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_12_voltage DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_12_current DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_13_voltage DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_13_current DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_14_voltage DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_14_current DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_15_voltage DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_15_current DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_16_voltage DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_16_current DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_17_voltage DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_17_current DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_18_voltage DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_18_current DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_19_voltage DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_19_current DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_20_voltage DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_20_current DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_21_voltage DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_21_current DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_22_voltage DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_22_current DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_23_voltage DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_23_current DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_24_voltage DECIMAL(8,2),
+    ADD COLUMN IF NOT EXISTS pv_24_current DECIMAL(8,2);
+
 CREATE INDEX IF NOT EXISTS idx_pv_strings_telemetry ON pv_strings_data(inverter_telemetry_id);
 CREATE INDEX IF NOT EXISTS idx_pv_strings_timestamp ON pv_strings_data(timestamp DESC);
 
@@ -136,6 +213,36 @@ CREATE TABLE IF NOT EXISTS inverter_devices (
 CREATE INDEX IF NOT EXISTS idx_inverter_devices_device_id ON inverter_devices(device_id);
 CREATE INDEX IF NOT EXISTS idx_inverter_devices_active ON inverter_devices(is_active) WHERE is_active = true;
 
+-- ============================================================================
+-- INVERTER EVENTS (alarm/status transitions decoded on the edge)
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS inverter_events (
+    id BIGSERIAL PRIMARY KEY,
+    device_id VARCHAR(50),
+    timestamp TIMESTAMPTZ NOT NULL,     -- When the transition was detected
+
+    -- 'status', 'status_changed', 'alarm_raised' or 'alarm_cleared';
+    -- 'pv_finding_raised' or 'pv_finding_cleared' (edge string analytics:
+    -- register = pv_xx or 'efficiency', name = finding, current_status = value)
+    event_type VARCHAR(20) NOT NULL,
+
+    -- Alarm events
+    register VARCHAR(20),               -- alarm_1, alarm_2, alarm_3
+    code INTEGER,                       -- Huawei alarm ID
+    name VARCHAR(200),
+    level VARCHAR(20),                  -- Major, Minor, Warning
+    active_since TIMESTAMPTZ,           -- Raise time (alarm_cleared)
+
+    -- Status events
+    previous_status VARCHAR(100),
+    current_status VARCHAR(100),
+
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_inverter_events_device_timestamp ON inverter_events(device_id, timestamp DESC);
+
 -- ============================================================================
 -- INVERTER STATISTICS VIEWS
 -- ============================================================================
@@ -206,26 +313,38 @@ BEGIN
 
     DELETE FROM inverter_telemetry
     WHERE timestamp < NOW() - INTERVAL '90 days';
+
+    DELETE FROM inverter_events
+    WHERE timestamp < NOW() - INTERVAL '90 days';
 END;
 $$ LANGUAGE plpgsql;
 
 -- Function to update last_seen on inverter devices
+-- Statement-level: a bulk backfill updates each device once, and older
+-- backfilled samples never move last_seen back
 CREATE OR REPLACE FUNCTION update_inverter_last_seen()
 RETURNS TRIGGER AS $$
 BEGIN
-    UPDATE inverter_devices
-    SET last_seen = NEW.timestamp,
+    UPDATE inverter_devices d
+    SET last_seen = GREATEST(d.last_seen, n.last_seen),
         updated_at = NOW()
-    WHERE device_id = NEW.device_id;
-
-    RETURN NEW;
+    FROM (
+        SELECT device_id, MAX(timestamp) AS last_seen
+        FROM new_rows
+        GROUP BY device_id
+    ) n
+    WHERE d.device_id = n.device_id;
+
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
 -- Trigger to update last_seen
+DROP TRIGGER IF EXISTS trg_update_inverter_last_seen ON inverter_telemetry;
 CREATE TRIGGER trg_update_inverter_last_seen
     AFTER INSERT ON inverter_telemetry
-    FOR EACH ROW
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
     EXECUTE FUNCTION update_inverter_last_seen();
 
 -- ============================================================================
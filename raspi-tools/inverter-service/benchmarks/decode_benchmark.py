@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Decode benchmark
+Register decoding cost per cycle for the register profile, on the same raw
+blocks: the Result path (one huawei_solar decode() and Result per register,
+as batch_update returns them, then InverterClient._decode) against the
+block path (BlockDecoder, then InverterClient._decode_block)
+
+Usage: python3 benchmarks/decode_benchmark.py [--cycles N] [--register-profile PATH]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from collections import namedtuple
+from dataclasses import replace
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import config  # noqa: E402
+from modules.inverter_client import InverterClient  # noqa: E402
+from modules.register_decoder import BlockDecoder, _register_map  # noqa: E402
+from modules.register_profile import split_blocks  # noqa: E402
+
+# Same shape as huawei_solar's Result
+Result = namedtuple('Result', 'value unit')
+
+
+def raw_blocks(blocks, register_map, rng):
+    """Random register words per block, valid for every register in it"""
+    raw = []
+    for block in blocks:
+        decoder = BlockDecoder(block, register_map)
+        while True:
+            words = [rng.randrange(0, 3000) for _ in range(decoder.count)]
+            try:
+                decoder.decode_registers(words)
+                raw.append(words)
+                break
+            except Exception:
+                # Enum register without that value: draw again
+                continue
+    return raw
+
+
+def result_path(client, blocks, raw, register_map):
+    for block, words in zip(blocks, raw):
+        start = register_map[block[0]].register
+        results = {}
+        for name in block:
+            definition = register_map[name]
+            offset = definition.register - start
+            value = definition.decode(words[offset:offset + definition.length])
+            unit = getattr(definition, 'unit', None)
+            if callable(unit) or isinstance(unit, dict):
+                unit = None
+            results[name] = Result(value, unit)
+        client._decode(results)
+
+
+def block_path(client, decoders, raw):
+    for decoder, words in zip(decoders, raw):
+        decoder.decode_registers(words)
+        client._decode_block(decoder)
+
+
+def timed(function, cycles):
+    durations = []
+    for _ in range(cycles):
+        started = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+    return statistics.mean(durations), durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark register decoding per cycle')
+    parser.add_argument('--cycles', type=int, default=2000)
+    parser.add_argument('--register-profile', help='Register profile JSON (default: register_profiles/sun2000.json)')
+    parser.add_argument('--pv-strings', type=int, default=InverterClient.MAX_PV_STRINGS)
+    args = parser.parse_args()
+
+    settings = replace(config.inverter, register_profile=args.register_profile, discovery_cache=False)
+    client = InverterClient(settings=settings)
+    client.plan.set_pv_registers(client.build_pv_registers(args.pv_strings))
+    # No deadband, so both paths store every value
+    client.plan.decoder = {register: (field, None) for register, (field, _) in client.plan.decoder.items()}
+
+    register_map = _register_map()
+    registers = [r for group in client.plan.groups for r in group.registers]
+    blocks = split_blocks(registers)
+    raw = raw_blocks(blocks, register_map, random.Random(1))
+    decoders = [BlockDecoder(block, register_map) for block in blocks]
+
+    # Both paths must produce the same sample
+    result_path(client, blocks, raw, register_map)
+    expected = dict(client._units), {field: dict(values) for field, values in client._values.items()}
+    client._values.clear()
+    client._units.clear()
+    block_path(client, decoders, raw)
+    if (client._units, client._values) != expected:
+        units, values = expected
+        mismatched = [register for field in values for register in values[field]
+                      if values[field][register] != client._values.get(field, {}).get(register)]
+        print(f"Decoded values or units differ: {', '.join(mismatched[:10]) or 'units'}")
+        sys.exit(1)
+
+    fast = sum(decoder.fast_fields for decoder in decoders)
+    print(f"Profile '{client.plan.name}': {len(registers)} registers in {len(blocks)} blocks, "
+          f"{fast} decoded by struct formats, {len(registers) - fast} by huawei_solar")
+    print(f"  {'path':<8} {'mean us':>9} {'p95 us':>9} {'us/register':>12}")
+    for name, function in (('result', lambda: result_path(client, blocks, raw, register_map)),
+                           ('block', lambda: block_path(client, decoders, raw))):
+        mean, p95 = timed(function, args.cycles)
+        print(f"  {name:<8} {mean * 1e6:9.1f} {p95 * 1e6:9.1f} {mean * 1e6 / len(registers):12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,585 @@
+#!/usr/bin/env python3
+"""
+Ingest load benchmark
+A synthetic fleet against the backend ingestion endpoints: inverters post
+samples shaped by InverterClient.read_all_data (register profile, PV
+strings, boot_id/sequence) to /api/inverter/telemetry, CLPs post the
+Node-RED payload (PROJETOS/UBEC/payload_example_complete.json) to
+/api/clp/telemetry. Each device posts at its interval with a random phase;
+an outage holds every upload back, then all devices reconnect at once and
+the inverters replay their backlog as the service does (max_in_flight
+uploads each, failed ones retried). Reports latency percentiles, errors and
+throughput per endpoint and, with --database-url, the rows that reached
+Postgres (the backend answers before it writes)
+
+Usage: python3 benchmarks/ingest_load.py [--inverters N] [--clps N] [--duration S]
+                                          [--outage-at S --outage S] [--backend-url URL]
+                                          [--database-url postgresql://...]
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from dataclasses import replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import config  # noqa: E402
+from modules.inverter_client import InverterClient  # noqa: E402
+from modules.register_decoder import _register_map  # noqa: E402
+from modules.sample_queue import SampleSequencer  # noqa: E402
+
+CLP_EXAMPLE = Path(__file__).resolve().parents[3] / 'PROJETOS' / 'UBEC' / 'payload_example_complete.json'
+
+INVERTER_ENDPOINT = '/api/inverter/telemetry'
+CLP_ENDPOINT = '/api/clp/telemetry'
+
+
+# ==================== HTTP ====================
+
+class HttpPool:
+    """Keep-alive HTTP/1.1 connections over asyncio streams, at most size open at once"""
+
+    def __init__(self, base_url: str, size: int, timeout: float):
+        url = urlsplit(base_url)
+        if url.scheme != 'http':
+            raise ValueError(f"Only http:// backends are supported: {base_url}")
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.timeout = timeout
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def request(self, method: str, path: str, body: bytes = b'') -> Tuple[int, bytes, float]:
+        """(status, response body, seconds waiting for a free connection)"""
+        queued = time.perf_counter()
+        async with self._slots:
+            waited = time.perf_counter() - queued
+            # A reused connection may have been closed by the server's keep-alive timeout
+            while self._idle:
+                connection = self._idle.pop()
+                try:
+                    return (*await self._exchange(connection, method, path, body), waited)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    continue
+            connection = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+            return (*await self._exchange(connection, method, path, body), waited)
+
+    async def _exchange(self, connection, method: str, path: str, body: bytes) -> Tuple[int, bytes]:
+        reader, writer = connection
+        try:
+            status, headers, payload = await asyncio.wait_for(
+                self._roundtrip(reader, writer, method, path, body), self.timeout)
+        except BaseException:
+            writer.close()
+            raise
+        if headers.get('connection', '').lower() == 'close':
+            writer.close()
+        else:
+            self._idle.append(connection)
+        return status, payload
+
+    async def _roundtrip(self, reader, writer, method: str, path: str, body: bytes):
+        writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+            f"User-Agent: MTZ-Ingest-Load/1.0\r\n\r\n".encode() + body)
+        await writer.drain()
+
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the server")
+        status = int(line.split()[1])
+        headers = {}
+        while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while (size := int((await reader.readline()).split(b';')[0], 16)):
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            await reader.readline()
+            return status, headers, b''.join(chunks)
+        return status, headers, await reader.readexactly(int(headers.get('content-length', 0)))
+
+    def close(self):
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+
+# ==================== Statistics ====================
+
+class EndpointStats:
+    """Outcome of every request to one endpoint"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.requests = 0
+        self.latencies: List[float] = []
+        self.pool_waits: List[float] = []
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.duplicates = 0
+        self.dropped = 0
+        self.completed: Counter = Counter()  # successful responses per second of the run
+        self._window: List[float] = []
+        self._window_errors = 0
+
+    @property
+    def ok(self) -> int:
+        return sum(count for status, count in self.statuses.items() if 200 <= status < 300)
+
+    def record(self, second: int, status: int, latency: float, waited: float, duplicate: bool = False):
+        self.requests += 1
+        self.latencies.append(latency)
+        self.pool_waits.append(waited)
+        self.statuses[status] += 1
+        if 200 <= status < 300:
+            self.completed[second] += 1
+            self._window.append(latency)
+            self.duplicates += duplicate
+        else:
+            self.errors[f"HTTP {status}"] += 1
+            self._window_errors += 1
+
+    def record_error(self, kind: str):
+        self.requests += 1
+        self.errors[kind] += 1
+        self._window_errors += 1
+
+    def take_window(self) -> Tuple[List[float], int]:
+        """Latencies and errors since the previous call (progress lines)"""
+        window, errors = self._window, self._window_errors
+        self._window, self._window_errors = [], 0
+        return window, errors
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(len(ordered) * fraction)) - 1)]
+
+
+# ==================== Devices ====================
+
+class InverterPayloads:
+    """
+    Samples in the service's shape: one InverterClient plan (register
+    profile and PV strings), values stored and recorded the way a read
+    cycle does, serialized with Sample.to_dict
+    """
+
+    def __init__(self, register_profile: Optional[str], pv_strings: int):
+        settings = replace(config.inverter, register_profile=register_profile, discovery_cache=False)
+        self.client = InverterClient(settings=settings)
+        self.client.plan.set_pv_registers(self.client.build_pv_registers(pv_strings))
+        register_map = _register_map()
+        self.units = {}
+        for register in self.client.plan.decoder:
+            unit = getattr(register_map.get(register), 'unit', None)
+            self.units[register] = None if callable(unit) or isinstance(unit, dict) else unit
+
+    def build(self, device_id: str, values: Dict[str, object]) -> Dict[str, object]:
+        client = self.client
+        client.device_id = device_id
+        for register, (field, _) in client.plan.decoder.items():
+            client._store(register, field, None, values.get(register, 0), self.units[register])
+        quality = client._shared({field: 'good' for field in client.plan.fields})
+        return client._sample({
+            'connection_type': 'rtu',
+            'data_quality': 'good',
+            'field_quality': quality,
+            'register_profile': client.plan.name,
+            'groups_read': client._shared(tuple(group.name for group in client.plan.groups)),
+        })
+
+
+class SimulatedInverter:
+    """One inverter: power drifting like a plant under passing clouds, counters that keep rising"""
+
+    endpoint = INVERTER_ENDPOINT
+    replays = True
+
+    def __init__(self, index: int, payloads: InverterPayloads, rng: random.Random):
+        self.device_id = f"load-inv-{index:04d}"
+        self.payloads = payloads
+        self.rng = rng
+        self.rated = rng.choice((50.0, 75.0, 100.0))
+        self.power = self.rated * rng.uniform(0.3, 0.9)
+        self.daily = rng.uniform(0, 200)
+        self.total = rng.uniform(1e4, 5e5)
+        self.sequencer = SampleSequencer()
+        self._last = time.monotonic()
+
+    def values(self) -> Dict[str, object]:
+        rng = self.rng
+        now = time.monotonic()
+        hours, self._last = (now - self._last) / 3600, now
+        self.power = min(max(self.power + rng.gauss(0, self.rated * 0.03), 0.0), self.rated)
+        self.daily += self.power * hours
+        self.total += self.power * hours
+        power, load = self.power, self.power / self.rated
+
+        values = {
+            'input_power': round(power * 1.02, 3), 'active_power': round(power, 3),
+            'reactive_power': round(rng.gauss(0, 1.5), 3), 'power_factor': round(rng.uniform(0.98, 1.0), 3),
+            'daily_yield_energy': round(self.daily, 2), 'accumulated_yield_energy': round(self.total, 2),
+            'internal_temperature': round(35 + 20 * load + rng.gauss(0, 0.5), 1),
+            'grid_frequency': round(60 + rng.gauss(0, 0.02), 2),
+            'device_status': 'On-grid', 'alarm_1': [], 'alarm_2': [], 'alarm_3': [],
+        }
+        for register in self.payloads.client.plan.decoder:
+            if register in values:
+                continue
+            if register.startswith('line_voltage'):
+                values[register] = round(380 + rng.gauss(0, 3), 1)
+            elif register.endswith('_voltage') and register.startswith('phase'):
+                values[register] = round(220 + rng.gauss(0, 2), 1)
+            elif register.endswith('_current') and register.startswith('phase'):
+                values[register] = round(power * 1000 / 660 + rng.gauss(0, 0.3), 3)
+            elif register.startswith('pv_') and register.endswith('_voltage'):
+                values[register] = round(600 + rng.gauss(0, 10), 1)
+            elif register.startswith('pv_') and register.endswith('_current'):
+                values[register] = round(max(9 * load + rng.gauss(0, 0.2), 0.0), 2)
+            else:
+                values[register] = round(rng.uniform(0, 100), 2)
+        return values
+
+    def body(self) -> bytes:
+        sample = self.sequencer.stamp(self.payloads.build(self.device_id, self.values()))
+        return json.dumps(sample.to_dict(), default=str).encode()
+
+
+def clp_template() -> Dict[str, object]:
+    """The example payload without its documentation keys ('_comment', '_notes', ...)"""
+    def strip(value):
+        if isinstance(value, dict):
+            return {key: strip(item) for key, item in value.items() if not key.startswith('_')}
+        if isinstance(value, list):
+            return [strip(item) for item in value]
+        return value
+
+    with open(CLP_EXAMPLE, 'r', encoding='utf-8') as f:
+        return strip(json.load(f))
+
+
+class SimulatedCLP:
+    """
+    One CLP as the Node-RED flow posts it: temperatures drifting, alerts
+    only when a rule of the example matches. Node-RED does not replay
+    what it could not send, so a CLP skips the outage
+    """
+
+    endpoint = CLP_ENDPOINT
+    replays = False
+
+    def __init__(self, index: int, template: Dict[str, object], rng: random.Random):
+        self.device_id = f"load-clp-{index:04d}"
+        self.template = template
+        self.rng = rng
+        self.temperatures = {name: sensor['value'] for name, sensor in template['sensors']['temperaturas'].items()}
+
+    def body(self) -> bytes:
+        rng = self.rng
+        payload = json.loads(json.dumps(self.template))
+        payload['device_id'] = self.device_id
+        payload['timestamp'] = datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+        for name, sensor in payload['sensors']['temperaturas'].items():
+            self.temperatures[name] = round(self.temperatures[name] + rng.gauss(0, 0.3), 1)
+            sensor['value'] = self.temperatures[name]
+        alerts = []
+        if self.temperatures['transformador'] > 80:
+            alerts.append({'type': 'TEMP_HIGH', 'severity': 'high', 'sensor': 'transformador'})
+        if self.temperatures['modulo_fotovoltaico'] > 70:
+            alerts.append({'type': 'TEMP_HIGH', 'severity': 'medium', 'sensor': 'modulo_fotovoltaico'})
+        payload['alerts'] = alerts
+        return json.dumps(payload, ensure_ascii=False).encode()
+
+
+# ==================== Load ====================
+
+class LoadRun:
+    """Schedules every device, holds uploads during the outage and collects the results"""
+
+    def __init__(self, args, pool: HttpPool):
+        self.args = args
+        self.pool = pool
+        self.stats = {INVERTER_ENDPOINT: EndpointStats('inverter'), CLP_ENDPOINT: EndpointStats('clp')}
+        self.schedule_lag: List[float] = []
+        self.link_up = asyncio.Event()
+        self.link_up.set()
+        self.backlog = 0
+        self.started = 0.0
+        self.producing = True
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def in_outage(self, at: float) -> bool:
+        args = self.args
+        return args.outage > 0 and args.outage_at <= at < args.outage_at + args.outage
+
+    async def device(self, device, interval: float, rng: random.Random):
+        """Produce a sample every interval; an uploader sends them with up to --in-flight requests"""
+        queue: asyncio.Queue = asyncio.Queue()
+        uploader = asyncio.create_task(self.uploader(device, queue))
+        next_at = 0.0 if self.args.sync_start else rng.uniform(0, interval)
+        try:
+            while next_at < self.args.duration:
+                await asyncio.sleep(max(next_at - self.elapsed(), 0))
+                self.schedule_lag.append(max(self.elapsed() - next_at, 0))
+                next_at += interval
+                if self.in_outage(self.elapsed()) and not device.replays:
+                    continue
+                if queue.qsize() >= self.args.queue_size:
+                    # Service overflow policy drop_oldest
+                    queue.get_nowait()
+                    self.backlog -= 1
+                    self.stats[device.endpoint].dropped += 1
+                queue.put_nowait(device.body())
+                self.backlog += 1
+            await queue.join()
+        finally:
+            uploader.cancel()
+
+    async def uploader(self, device, queue: asyncio.Queue):
+        slots = asyncio.Semaphore(self.args.in_flight)
+
+        async def send(body: bytes):
+            try:
+                while not await self.post(device.endpoint, body):
+                    await asyncio.sleep(self.args.retry_delay)
+            finally:
+                slots.release()
+                self.backlog -= 1
+                queue.task_done()
+
+        tasks = set()
+        try:
+            while True:
+                body = await queue.get()
+                await slots.acquire()
+                task = asyncio.create_task(send(body))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def post(self, endpoint: str, body: bytes) -> bool:
+        """One upload attempt; True once the backend accepted the sample"""
+        await self.link_up.wait()
+        stats = self.stats[endpoint]
+        started = time.perf_counter()
+        try:
+            status, response, waited = await self.pool.request('POST', endpoint, body)
+        except asyncio.TimeoutError:
+            stats.record_error('timeout')
+            return False
+        except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+            stats.record_error(type(e).__name__)
+            return False
+        stats.record(int(self.elapsed()), status, time.perf_counter() - started - waited, waited,
+                     duplicate=status == 200 and b'"duplicate":true' in response)
+        return 200 <= status < 300
+
+    async def outage(self):
+        args = self.args
+        if args.outage <= 0:
+            return
+        await asyncio.sleep(args.outage_at)
+        self.link_up.clear()
+        print(f"[{self.elapsed():6.1f}s] outage: uploads held for {args.outage:g}s")
+        await asyncio.sleep(args.outage)
+        print(f"[{self.elapsed():6.1f}s] link back: {self.backlog} samples waiting")
+        self.link_up.set()
+
+    async def progress(self):
+        while True:
+            await asyncio.sleep(self.args.report_interval)
+            parts = []
+            for stats in self.stats.values():
+                window, errors = stats.take_window()
+                if window or errors:
+                    parts.append(f"{stats.name} {len(window) / self.args.report_interval:7.1f} req/s "
+                                 f"p95 {percentile(window, 0.95) * 1000:7.1f} ms {errors} err")
+            state = 'OUTAGE ' if not self.link_up.is_set() else ''
+            print(f"[{self.elapsed():6.1f}s] {state}{' | '.join(parts) or 'idle'} | backlog {self.backlog}")
+
+    async def run(self, devices):
+        rng = random.Random(self.args.seed)
+        self.started = time.perf_counter()
+        background = [asyncio.create_task(self.outage()), asyncio.create_task(self.progress())]
+        runs = [asyncio.create_task(self.device(device, interval, random.Random(rng.random())))
+                for device, interval in devices]
+        try:
+            done, pending = await asyncio.wait(runs, timeout=self.args.duration + self.args.drain_timeout)
+            if pending:
+                print(f"Drain timeout: {self.backlog} samples not delivered")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            for task in background:
+                task.cancel()
+        return time.perf_counter() - self.started
+
+
+# ==================== Postgres ====================
+
+def count_rows(database_url: str) -> Dict[str, int]:
+    """Rows of the synthetic devices per table"""
+    import psycopg2
+    with psycopg2.connect(database_url) as connection, connection.cursor() as cursor:
+        counts = {}
+        for table in ('inverter_telemetry', 'telemetry_history'):
+            cursor.execute(f"SELECT count(*) FROM {table} WHERE device_id LIKE 'load-%%'")
+            counts[table] = cursor.fetchone()[0]
+        return counts
+
+
+async def wait_for_rows(database_url: str, before: Dict[str, int], timeout: float) -> Tuple[Dict[str, int], float]:
+    """Row counts once they stop growing (the backend writes after answering), and how long that took"""
+    started = time.perf_counter()
+    last, stable_since = None, started
+    while True:
+        counts = await asyncio.to_thread(count_rows, database_url)
+        now = time.perf_counter()
+        if counts != last:
+            last, stable_since = counts, now
+        elif now - stable_since >= 3 or now - started >= timeout:
+            return {table: counts[table] - before[table] for table in counts}, stable_since - started
+        await asyncio.sleep(0.5)
+
+
+# ==================== Report ====================
+
+def print_report(run: LoadRun, elapsed: float, devices: int):
+    print(f"\n{devices} devices, {elapsed:.1f}s")
+    print(f"  {'endpoint':<9} {'requests':>8} {'ok':>7} {'dup':>5} {'errors':>6} {'err %':>6} {'dropped':>7} "
+          f"{'p50 ms':>8} {'p90':>8} {'p99':>8} {'max':>8} {'req/s':>7} {'peak/s':>7}")
+    for stats in run.stats.values():
+        if not stats.requests:
+            continue
+        errors = sum(stats.errors.values())
+        seconds = sorted(stats.completed)
+        span = seconds[-1] - seconds[0] + 1 if seconds else 1
+        latencies = stats.latencies
+        print(f"  {stats.name:<9} {stats.requests:8d} {stats.ok:7d} {stats.duplicates:5d} {errors:6d} "
+              f"{100 * errors / stats.requests:6.2f} {stats.dropped:7d} "
+              f"{percentile(latencies, 0.50) * 1000:8.1f} {percentile(latencies, 0.90) * 1000:8.1f} "
+              f"{percentile(latencies, 0.99) * 1000:8.1f} {max(latencies, default=0) * 1000:8.1f} "
+              f"{stats.ok / span:7.1f} {max(stats.completed.values(), default=0):7d}")
+        if stats.errors:
+            print(f"  {'':<9} errors: {', '.join(f'{kind} x{count}' for kind, count in stats.errors.most_common())}")
+        if percentile(stats.pool_waits, 0.95) > 0.001:
+            print(f"  {'':<9} waiting for a connection: p95 {percentile(stats.pool_waits, 0.95) * 1000:.1f} ms "
+                  f"(raise --connections)")
+    lag = run.schedule_lag
+    if lag:
+        print(f"  generator lag: median {statistics.median(lag) * 1000:.1f} ms, p99 {percentile(lag, 0.99) * 1000:.1f} ms"
+              + ("  (the generator itself is saturated)" if percentile(lag, 0.99) > 0.5 else ""))
+
+
+async def run_load(args):
+    pool = HttpPool(args.backend_url, args.connections, args.timeout)
+    try:
+        status, _, _ = await pool.request('GET', '/health')
+    except (OSError, asyncio.TimeoutError) as e:
+        print(f"Backend not reachable at {args.backend_url}: {e}")
+        return
+    if status != 200:
+        print(f"Backend health check answered {status}")
+        return
+
+    rng = random.Random(args.seed)
+    devices = []
+    if args.inverters:
+        payloads = InverterPayloads(args.register_profile, args.pv_strings)
+        devices += [(SimulatedInverter(index, payloads, random.Random(rng.random())), args.inverter_interval)
+                    for index in range(1, args.inverters + 1)]
+    if args.clps:
+        template = clp_template()
+        devices += [(SimulatedCLP(index, template, random.Random(rng.random())), args.clp_interval)
+                    for index in range(1, args.clps + 1)]
+
+    before = None
+    if args.database_url:
+        try:
+            before = await asyncio.to_thread(count_rows, args.database_url)
+        except ImportError:
+            print("--database-url needs psycopg2 (pip install psycopg2-binary); rows not checked")
+        except Exception as e:
+            print(f"Database not reachable, rows not checked: {e}")
+
+    rate = sum(1 / interval for _, interval in devices)
+    print(f"{args.inverters} inverters every {args.inverter_interval:g}s, {args.clps} CLPs every "
+          f"{args.clp_interval:g}s: {rate:.1f} samples/s for {args.duration:g}s against {args.backend_url}")
+
+    run = LoadRun(args, pool)
+    try:
+        elapsed = await run.run(devices)
+    finally:
+        pool.close()
+    print_report(run, elapsed, len(devices))
+
+    if before is not None:
+        stored, settle = await wait_for_rows(args.database_url, before, args.drain_timeout)
+        accepted = {'inverter_telemetry': run.stats[INVERTER_ENDPOINT].ok - run.stats[INVERTER_ENDPOINT].duplicates,
+                    'telemetry_history': run.stats[CLP_ENDPOINT].ok}
+        print("  Postgres (rows of load-* devices; delete them after the test):")
+        for table, rows in stored.items():
+            missing = accepted[table] - rows
+            print(f"    {table:<20} {rows:7d} stored of {accepted[table]} accepted"
+                  + (f", {missing} missing" if missing > 0 else "") + f" (settled {settle:.1f}s after the run)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Synthetic fleet load against the ingestion endpoints')
+    parser.add_argument('--backend-url', default='http://localhost:3001')
+    parser.add_argument('--inverters', type=int, default=10)
+    parser.add_argument('--clps', type=int, default=1)
+    parser.add_argument('--inverter-interval', type=float, default=30.0, help='Seconds between samples per inverter')
+    parser.add_argument('--clp-interval', type=float, default=30.0, help='Seconds between payloads per CLP')
+    parser.add_argument('--duration', type=float, default=120.0, help='Seconds of sample production')
+    parser.add_argument('--sync-start', action='store_true', help='Every device posts at t=0 (no random phase)')
+    parser.add_argument('--outage-at', type=float, default=0.0, help='Start of the simulated outage (seconds)')
+    parser.add_argument('--outage', type=float, default=0.0,
+                        help='Outage length; afterwards every device reconnects at once (0 = none)')
+    parser.add_argument('--in-flight', type=int, default=config.backend.max_in_flight,
+                        help='Uploads in flight per device (service backend.max_in_flight)')
+    parser.add_argument('--queue-size', type=int, default=config.queue.max_size,
+                        help='Samples buffered per device before the oldest is dropped')
+    parser.add_argument('--retry-delay', type=float, default=config.inverter.retry_delay)
+    parser.add_argument('--connections', type=int, default=200, help='Open connections to the backend at most')
+    parser.add_argument('--timeout', type=float, default=config.backend.timeout)
+    parser.add_argument('--drain-timeout', type=float, default=60.0,
+                        help='Seconds after the run to deliver the backlog (and for rows to settle)')
+    parser.add_argument('--report-interval', type=float, default=5.0)
+    parser.add_argument('--database-url', help='Postgres URL: count the rows that were stored (needs psycopg2)')
+    parser.add_argument('--register-profile', help='Register profile JSON (default: register_profiles/sun2000.json)')
+    parser.add_argument('--pv-strings', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run_load(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
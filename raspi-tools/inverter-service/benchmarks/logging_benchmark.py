@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Logging benchmark
+Time spent in the calling thread per log call: the previous synchronous
+colorlog handler vs the queue pipeline (utils.logger), with a fast output
+and with a slow one standing in for an SD card / busy journald
+
+Usage: python3 benchmarks/logging_benchmark.py [--calls N] [--write-delay MS]
+"""
+import argparse
+import io
+import logging
+import sys
+import time
+from pathlib import Path
+
+import colorlog
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import config  # noqa: E402
+from utils.logger import create_pipeline  # noqa: E402
+
+
+class SlowStream(io.StringIO):
+    """Output whose writes block, like a stalled SD card or journald"""
+
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+
+    def write(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        return len(text)
+
+
+def legacy_handler(stream) -> logging.Handler:
+    """The handler setup_logger attached before the queue pipeline"""
+    handler = colorlog.StreamHandler(stream)
+    handler.setFormatter(colorlog.ColoredFormatter(config.logging.format, datefmt=config.logging.date_format))
+    return handler
+
+
+def time_calls(logger: logging.Logger, calls: int, call) -> float:
+    """Mean seconds per call in the calling thread"""
+    started = time.perf_counter()
+    for i in range(calls):
+        call(logger, i)
+    return (time.perf_counter() - started) / calls
+
+
+def run(name: str, handler: logging.Handler, calls: int, listener=None):
+    logger = logging.getLogger(f'bench.{name}')
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    if listener:
+        listener.start()
+
+    sample = {'active_power': 51234.5, 'status': 'On-grid'}
+    results = {
+        'info': time_calls(logger, calls, lambda log, i: log.info("Telemetry sent. Status: %s", 201)),
+        'debug f-string (off)': time_calls(
+            logger, calls, lambda log, i: log.debug(f"Read {i} groups: {sample}")),
+        'debug lazy (off)': time_calls(
+            logger, calls, lambda log, i: log.debug("Read %d groups: %s", i, sample)),
+        'repeated error': time_calls(
+            logger, calls, lambda log, i: log.error("Connection error to backend: %s", 'refused')),
+    }
+
+    if listener:
+        flush_started = time.perf_counter()
+        listener.stop()
+        results['drain (listener thread)'] = (time.perf_counter() - flush_started) / calls
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the service logging pipeline')
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--write-delay', type=float, default=1.0,
+                        help='Milliseconds per write on the slow output (default: 1)')
+    args = parser.parse_args()
+
+    for label, delay in (('fast output', 0.0), (f'slow output ({args.write_delay:g} ms/write)', args.write_delay / 1000)):
+        legacy = run('legacy', legacy_handler(SlowStream(delay)), args.calls)
+        handler, listener = create_pipeline(SlowStream(delay))
+        queued = run('queued', handler, args.calls, listener)
+
+        print(f"\n{label}, {args.calls} calls, microseconds per call in the caller")
+        print(f"  {'case':<26} {'legacy':>10} {'queued':>10}")
+        for case in queued:
+            before = f"{legacy[case] * 1e6:10.1f}" if case in legacy else f"{'-':>10}"
+            print(f"  {case:<26} {before} {queued[case] * 1e6:10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Replay benchmark
+Bus latency recorded in a Modbus capture (--record-traffic), then the
+acquisition pipeline run against the capture: read and decode
+(InverterClient), JSON encoding and, with --backend-url, the HTTP upload
+
+Usage: python3 benchmarks/replay_benchmark.py CAPTURE [--cycles N] [--realtime]
+                                               [--backend-url URL]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import config  # noqa: E402
+from modules.modbus_capture import latency_summary, read_capture  # noqa: E402
+
+
+def print_latency(path: str):
+    metadata, exchanges = read_capture(path)
+    span = exchanges[-1].started - exchanges[0].started if exchanges else 0.0
+    print(f"{path}: {len(exchanges)} exchanges over {span:.0f}s "
+          f"({', '.join(f'{k}={v}' for k, v in metadata.items() if k != 'created')})")
+    print(f"  {'dev':>3} {'fc':>3} {'address':>7} {'count':>6} {'errors':>6} "
+          f"{'min ms':>8} {'median':>8} {'p95':>8} {'max':>8}")
+    for row in latency_summary(exchanges):
+        print(f"  {row['device_id']:>3} {row['function']:>3} {row['address'] if row['address'] is not None else '-':>7} "
+              f"{row['count']:>6} {row['errors']:>6} {row['min'] * 1000:8.1f} {row['median'] * 1000:8.1f} "
+              f"{row['p95'] * 1000:8.1f} {row['max'] * 1000:8.1f}")
+
+
+async def run_pipeline(path: str, cycles: int, realtime: bool, backend_url: str):
+    from modules.inverter_client import InverterClient
+
+    settings = replace(config.inverter, connection_type='replay', replay_file=path,
+                       replay_realtime=realtime, capture_file=None, discovery_cache=False)
+    inverter = InverterClient(settings=settings)
+    if not await inverter.connect():
+        print(f"Replay failed: {inverter.last_error}")
+        return
+
+    backend = None
+    if backend_url:
+        from modules.backend_client import BackendClient
+        config.backend.base_url = backend_url
+        backend = BackendClient()
+
+    timings = {'read + decode': [], 'json encode': [], 'upload': []}
+    errors = 0
+    body = ''
+    for _ in range(cycles):
+        started = time.perf_counter()
+        try:
+            data = await inverter.read_all_data()
+        except Exception:
+            errors += 1
+            continue
+        timings['read + decode'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        body = json.dumps(data.to_dict(), default=str)
+        timings['json encode'].append(time.perf_counter() - started)
+
+        if backend:
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(backend.send_telemetry, data)
+                timings['upload'].append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+    await inverter.disconnect()
+
+    print(f"\n{cycles} cycles ({'recorded speed' if realtime else 'as fast as possible'}), "
+          f"{errors} errors, last sample {len(body)} bytes of JSON")
+    print(f"  {'stage':<14} {'mean ms':>9} {'p95 ms':>9}")
+    for stage, values in timings.items():
+        if values:
+            values.sort()
+            print(f"  {stage:<14} {statistics.mean(values) * 1000:9.2f} "
+                  f"{values[min(len(values) - 1, int(len(values) * 0.95))] * 1000:9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the acquisition pipeline on a Modbus capture')
+    parser.add_argument('capture', help='Capture file written with --record-traffic')
+    parser.add_argument('--cycles', type=int, default=200)
+    parser.add_argument('--realtime', action='store_true',
+                        help='Answer with the recorded latency (default: as fast as possible)')
+    parser.add_argument('--backend-url', help='Also upload each sample to this backend')
+    args = parser.parse_args()
+
+    print_latency(args.capture)
+    asyncio.run(run_pipeline(args.capture, args.cycles, args.realtime, args.backend_url))
+
+
+if __name__ == '__main__':
+    main()
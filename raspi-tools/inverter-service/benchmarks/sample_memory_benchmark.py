@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Sample memory benchmark
+Memory held by N buffered samples of the register profile: compact Sample
+records (what the queue holds) against the nested dicts they serialize to
+(what it held before). Samples are built the way a read cycle builds them,
+with fresh values every cycle
+
+Usage: python3 benchmarks/sample_memory_benchmark.py [--samples N] [--register-profile PATH]
+"""
+import argparse
+import gc
+import random
+import sys
+import tracemalloc
+from dataclasses import replace
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import config  # noqa: E402
+from modules.inverter_client import InverterClient  # noqa: E402
+from modules.sample_queue import SampleSequencer  # noqa: E402
+
+
+def build_samples(client, count, rng):
+    sequencer = SampleSequencer()
+    registers = list(client.plan.decoder.items())
+    samples = []
+    for _ in range(count):
+        for register, (field, _) in registers:
+            value = 'On-grid' if field == 'status' else round(rng.uniform(0, 1000), 2)
+            client._store(register, field, None, value, None if field == 'status' else 'kW')
+        quality = client._shared({field: 'good' for field in client.plan.fields})
+        sample = client._sample({
+            'connection_type': 'rtu',
+            'data_quality': 'good',
+            'field_quality': quality,
+            'register_profile': client.plan.name,
+            'groups_read': client._shared(tuple(group.name for group in client.plan.groups)),
+        })
+        samples.append(sequencer.stamp(sample))
+    return samples
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    held = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory per buffered sample: records vs dicts')
+    parser.add_argument('--samples', type=int, default=2000)
+    parser.add_argument('--register-profile', help='Register profile JSON (default: register_profiles/sun2000.json)')
+    parser.add_argument('--pv-strings', type=int, default=InverterClient.MAX_PV_STRINGS)
+    args = parser.parse_args()
+
+    settings = replace(config.inverter, register_profile=args.register_profile, discovery_cache=False)
+    client = InverterClient(settings=settings)
+    client.plan.set_pv_registers(client.build_pv_registers(args.pv_strings))
+
+    records = measure(lambda: build_samples(client, args.samples, random.Random(1)))
+    dicts = measure(lambda: [sample.to_dict() for sample in build_samples(client, args.samples, random.Random(1))])
+
+    print(f"Profile '{client.plan.name}': {len(client.plan.decoder)} registers, {args.samples} samples")
+    print(f"  {'form':<8} {'bytes/sample':>13} {'samples per 100 MB':>19}")
+    for name, size in (('record', records), ('dict', dicts)):
+        per_sample = size / args.samples
+        print(f"  {name:<8} {per_sample:13.0f} {100 * 2 ** 20 / per_sample:19.0f}")
+    print(f"  records take {dicts / records:.1f}x less memory")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+String analytics benchmark
+Cost of one StringAnalytics.update (a bulk sample of one inverter) per PV
+string count, with full windows, and what a fleet of that size spends per
+poll cycle. A pure-Python pass over the same window (statistics.median per
+sample and per string) is timed alongside for reference
+
+Usage: python3 benchmarks/string_analytics_benchmark.py [--devices N] [--window N] [--cycles N]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import StringAnalyticsConfig  # noqa: E402
+from modules.inverter_client import InverterClient  # noqa: E402
+from modules.string_analytics import StringAnalytics  # noqa: E402
+
+
+def samples(strings, count, rng):
+    """Bulk samples (register values) of one inverter at ~9 A per string"""
+    result = []
+    for _ in range(count):
+        values = {}
+        for index in range(1, strings + 1):
+            values[f'pv_{index:02d}_voltage'] = round(rng.uniform(590, 610), 1)
+            values[f'pv_{index:02d}_current'] = round(rng.uniform(8.8, 9.2), 2)
+        dc = sum(values[f'pv_{i:02d}_voltage'] * values[f'pv_{i:02d}_current'] for i in range(1, strings + 1))
+        values['input_power'] = round(dc, 1)
+        values['active_power'] = round(dc * 0.98, 1)
+        result.append(values)
+    return result
+
+
+def python_window(window, strings, settings):
+    """Reference: the string and efficiency ratios of one window, without NumPy"""
+    names = [f'pv_{i:02d}' for i in range(1, strings + 1)]
+    ratios = [[] for _ in names]
+    efficiency = []
+    for values in window:
+        power = [values[f'{n}_voltage'] * values[f'{n}_current'] for n in names]
+        median = statistics.median(power)
+        if median >= settings.min_string_power:
+            for column, p in zip(ratios, power):
+                column.append(p / median)
+        if values['input_power'] >= settings.min_input_power:
+            efficiency.append(values['active_power'] / values['input_power'])
+    return [statistics.median(column) for column in ratios], statistics.median(efficiency)
+
+
+def timed(function, cycles):
+    durations = []
+    for _ in range(cycles):
+        started = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+    return statistics.mean(durations), durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark PV string analytics per sample')
+    parser.add_argument('--devices', type=int, default=100, help='Fleet size for the per-cycle total')
+    parser.add_argument('--window', type=int, default=StringAnalyticsConfig.window)
+    parser.add_argument('--cycles', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    settings = StringAnalyticsConfig(window=args.window, trend_cache_path='')
+    print(f"Window of {args.window} samples; fleet total for {args.devices} inverters per poll cycle")
+    print(f"  {'strings':>7} {'mean us':>9} {'p95 us':>9} {'python us':>10} {'fleet ms':>9}")
+    for strings in (4, 8, 12, 16, 20, InverterClient.MAX_PV_STRINGS):
+        analytics = StringAnalytics(settings)
+        window = samples(strings, args.window, rng)
+        # Fill the window first: every update judges a full one
+        for values in window:
+            analytics.update('bench', values)
+        feed = iter(window * (args.cycles // len(window) + 1))
+        mean, p95 = timed(lambda: analytics.update('bench', next(feed)), args.cycles)
+        reference, _ = timed(lambda: python_window(window, strings, settings), max(args.cycles // 20, 10))
+        print(f"  {strings:>7} {mean * 1e6:9.1f} {p95 * 1e6:9.1f} {reference * 1e6:10.1f} "
+              f"{mean * args.devices * 1e3:9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,12 @@
 """Configuration package"""
-from .config import config, ServiceConfig, InverterConfig, BackendConfig, LoggingConfig
+from .config import (
+    config, load_config, ServiceConfig, InverterConfig, AdaptivePollingConfig, BackendConfig,
+    MqttConfig, AlarmConfig, FleetConfig, QueueConfig, BackfillConfig, UplinkConfig, SinksConfig,
+    StringAnalyticsConfig, MetricsConfig, ProfilingConfig, LoggingConfig, GatewayConfig,
+)
 
-__all__ = ['config', 'ServiceConfig', 'InverterConfig', 'BackendConfig', 'LoggingConfig']
+__all__ = [
+    'config', 'load_config', 'ServiceConfig', 'InverterConfig', 'AdaptivePollingConfig', 'BackendConfig',
+    'MqttConfig', 'AlarmConfig', 'FleetConfig', 'QueueConfig', 'BackfillConfig', 'UplinkConfig', 'SinksConfig',
+    'StringAnalyticsConfig', 'MetricsConfig', 'ProfilingConfig', 'LoggingConfig', 'GatewayConfig',
+]
@@ -1,16 +1,18 @@
 """
 Configuration module for Huawei Inverter Service
-Centralized configuration management with CLI argument support
+Centralized configuration management with CLI argument and file support
 """
 import argparse
-from dataclasses import dataclass
-from typing import Optional
+import json
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Dict, List, Optional, Set, Union, get_args, get_origin
 
 
 @dataclass
 class InverterConfig:
     """Inverter connection configuration"""
-    # Connection type: 'rtu' for USB/RS485, 'tcp' for network
+    # Connection type: 'rtu' for USB/RS485, 'tcp' for network, 'replay' for
+    # a Modbus capture file (replay_file)
     connection_type: str = 'rtu'
 
     # RTU (USB/RS485) Configuration
@@ -25,22 +27,244 @@ class InverterConfig:
     # Polling interval (seconds)
     poll_interval: int = 30
 
-    # Retry configuration
+    # Retry configuration (max_retries: extra reads of a failed register
+    # block within one cycle)
     max_retries: int = 3
     retry_delay: int = 5
 
+    # Discovery cache (device identity reused across restarts)
+    discovery_cache: bool = True
+    discovery_cache_path: str = 'cache/device_profiles.json'
+
+    # Register profile (None = register_profiles/sun2000.json) and compiled plan cache
+    register_profile: Optional[str] = None
+    read_plan_cache: str = 'cache/read_plans'
+
+    # Read each register block raw and decode it with a compiled struct
+    # format (numeric registers), instead of one huawei_solar Result each
+    fast_decode: bool = True
+
+    # Modbus traffic capture: record every exchange to capture_file; replays
+    # answer with the recorded latency unless replay_realtime is off
+    capture_file: Optional[str] = None
+    replay_file: Optional[str] = None
+    replay_realtime: bool = True
+
 
 @dataclass
 class BackendConfig:
     """Backend API configuration"""
     base_url: str = 'http://localhost:3001'
     telemetry_endpoint: str = '/api/inverter/telemetry'
+    telemetry_batch_endpoint: str = '/api/inverter/telemetry/batch'
+    events_endpoint: str = '/api/inverter/events'
+    backfill_endpoint: str = '/api/inverter/backfill'
+    alert_preferences_endpoint: str = '/api/alerts/preferences'
     timeout: int = 10
 
+    # Telemetry uploads kept in flight (samples are deduplicated by sequence number)
+    max_in_flight: int = 4
+
+    # Sink for telemetry and events: 'http' (BackendClient) or 'mqtt' (MqttClient)
+    sink: str = 'http'
+
     @property
     def telemetry_url(self) -> str:
         return f"{self.base_url}{self.telemetry_endpoint}"
 
+    @property
+    def telemetry_batch_url(self) -> str:
+        return f"{self.base_url}{self.telemetry_batch_endpoint}"
+
+    @property
+    def events_url(self) -> str:
+        return f"{self.base_url}{self.events_endpoint}"
+
+    @property
+    def backfill_url(self) -> str:
+        return f"{self.base_url}{self.backfill_endpoint}"
+
+    @property
+    def alert_preferences_url(self) -> str:
+        return f"{self.base_url}{self.alert_preferences_endpoint}"
+
+
+@dataclass
+class MqttConfig:
+    """MQTT sink configuration"""
+    host: str = 'localhost'
+    port: int = 1883
+    username: Optional[str] = None
+    password: Optional[str] = None
+
+    # Topics: <topic_prefix>/<device_id>/telemetry and .../events
+    topic_prefix: str = 'mtzview/inverter'
+
+    # Stable client id keeps the broker session (default: mtz-inverter-<hostname>)
+    client_id: Optional[str] = None
+    keepalive: int = 60
+    qos: int = 1
+
+
+@dataclass
+class AdaptivePollingConfig:
+    """Adaptive polling configuration (interval follows the plant)"""
+    enabled: bool = False
+
+    # Bounds for any interval the policy picks (seconds)
+    min_interval: float = 5.0
+    max_interval: float = 300.0
+
+    # DEVICE_STATUS prefixes polled at max_interval
+    slow_states: List[str] = field(default_factory=lambda: ['Standby', 'Shutdown'])
+
+    # ACTIVE_POWER/INPUT_POWER change (W/s) that switches to min_interval,
+    # and how long to stay fast after the last such change (seconds)
+    power_rate_threshold: float = 500.0
+    hold: float = 120.0
+
+
+@dataclass
+class AlarmConfig:
+    """Alarm fast lane configuration"""
+    # Status/alarm polling interval in seconds (0 = read with bulk data only)
+    status_interval: float = 1.0
+
+    # HH/H/L/LL thresholds (backend alert_preferences) evaluated on the edge;
+    # watched registers are read with the status block
+    thresholds: bool = True
+    threshold_sync_interval: float = 300.0
+    threshold_cache_path: str = 'cache/alert_thresholds.json'
+
+
+@dataclass
+class FleetConfig:
+    """Multi-process fleet configuration (supervisor mode)"""
+    # Device list JSON (None = single inverter from the inverter section)
+    devices_file: Optional[str] = None
+
+    # TCP devices per worker process (RTU devices get one worker per bus)
+    devices_per_worker: int = 4
+
+    # Backoff between restarts of a crashed worker (seconds)
+    restart_delay: float = 2.0
+    max_restart_delay: float = 60.0
+
+
+@dataclass
+class QueueConfig:
+    """Sample queue configuration (acquisition -> upload)"""
+    max_size: int = 1000
+
+    # Overflow policy: 'drop_oldest', 'coalesce' or 'spill'
+    overflow_policy: str = 'drop_oldest'
+    spill_dir: str = 'spool'
+
+
+@dataclass
+class BackfillConfig:
+    """Columnar backfill of the spilled backlog (HTTP sink, spill policy)"""
+    enabled: bool = False
+
+    # Spilled samples that trigger a bulk export instead of one POST per sample
+    min_samples: int = 500
+
+    # Exported Arrow files waiting for upload (kept across restarts)
+    directory: str = 'backfill'
+
+    # Seconds between backlog checks, and per file upload
+    check_interval: float = 60.0
+    upload_timeout: float = 120.0
+
+
+@dataclass
+class UplinkConfig:
+    """Metered uplink (HTTP sink): batched, compressed uploads within a daily budget"""
+    enabled: bool = False
+
+    # Bytes per day for the whole service, request overhead included (0 = no limit)
+    daily_budget_mb: float = 0.0
+
+    # Records per request, and longest wait for a batch to fill (seconds)
+    min_batch: int = 1
+    max_batch: int = 60
+    max_batch_delay: float = 30.0
+
+    # Most raw samples merged into one record when the budget runs short
+    max_rollup: int = 10
+
+    # Bytes per day and device, kept across restarts
+    usage_file: str = 'cache/uplink_usage.json'
+
+
+@dataclass
+class SinksConfig:
+    """Extra telemetry sinks, fed the same samples as the backend upload"""
+    # {"name", "type": "file", "path", "retention_days"} (local historian) or
+    # {"name", "type": "http", "url", "endpoint", "timeout"} (another collector);
+    # queue_size, overflow_policy and max_batch override the defaults below
+    targets: List[Dict[str, Any]] = field(default_factory=list)
+
+    # Per-sink queue (spill policy: <spill_dir>/<name>) and batch size
+    queue_size: int = 1000
+    overflow_policy: str = 'drop_oldest'
+    spill_dir: str = 'spool/sinks'
+    max_batch: int = 50
+
+    # Retry after a failed delivery, doubling up to max_retry_delay (seconds)
+    retry_delay: float = 1.0
+    max_retry_delay: float = 60.0
+
+
+@dataclass
+class StringAnalyticsConfig:
+    """PV string analytics on the edge (NumPy); findings go out as events"""
+    enabled: bool = False
+
+    # Rolling window per inverter (bulk samples), and the judged samples
+    # needed before a finding (samples with the median string under
+    # min_string_power W are not judged)
+    window: int = 60
+    min_samples: int = 10
+    min_string_power: float = 200.0
+
+    # String power over the median string: below 1 - mismatch is
+    # underperforming, below open_ratio an open string; cleared hysteresis back
+    mismatch: float = 0.15
+    open_ratio: float = 0.05
+    hysteresis: float = 0.05
+
+    # DC/AC efficiency (ACTIVE_POWER / INPUT_POWER, both in W), judged with
+    # INPUT_POWER of min_input_power W or more
+    min_efficiency: float = 0.95
+    efficiency_hysteresis: float = 0.01
+    min_input_power: float = 1000.0
+
+    # Daily ratio to the median kept per string; a loss of more than
+    # degradation_per_day per day (over min_trend_days at least) is a finding
+    trend_days: int = 30
+    min_trend_days: int = 7
+    degradation_per_day: float = 0.002
+    trend_cache_path: str = 'cache/string_trends.json'
+
+
+@dataclass
+class MetricsConfig:
+    """Metrics export configuration"""
+    # Prometheus textfile path (disabled if None)
+    textfile: Optional[str] = None
+    interval: int = 15
+
+
+@dataclass
+class ProfilingConfig:
+    """Sampling profiler configuration"""
+    # Profile window in seconds (0 = until toggled off by SIGUSR1)
+    window: int = 0
+    interval: float = 0.01
+    output_dir: str = 'profiles'
+    enabled_at_start: bool = False
+
 
 @dataclass
 class LoggingConfig:
@@ -49,19 +273,220 @@ class LoggingConfig:
     format: str = '%(log_color)s%(levelname)-8s%(reset)s %(blue)s%(name)s%(reset)s - %(message)s'
     date_format: str = '%Y-%m-%d %H:%M:%S'
 
+    # Output: 'text' (colored, uses format) or 'json' (one object per line)
+    output: str = 'text'
+
+    # Identical warnings/errors are logged once per window (seconds, 0 = off)
+    rate_limit_window: float = 60.0
+
+
+@dataclass
+class GatewayConfig:
+    """Modbus TCP-to-RTU gateway configuration (gateway.py)"""
+    # Serial bus owned by the gateway
+    serial_port: str = '/dev/ttyUSB0'
+    baudrate: int = 9600
+    parity: str = 'N'
+    stopbits: int = 1
+
+    # Modbus TCP listener (unit id selects the RTU slave)
+    host: str = '127.0.0.1'
+    port: int = 5020
+
+    # Seconds to wait for a slave response (the ceiling when adaptive)
+    response_timeout: float = 1.0
+
+    # Per-slave timeouts from measured latency, never below min_response_timeout
+    adaptive_timeout: bool = True
+    min_response_timeout: float = 0.1
+
+    # Timeouts in a row before a slave is skipped (0 = never), and seconds
+    # between probes of a skipped slave
+    unreachable_after: int = 3
+    probe_interval: float = 30.0
+
+    # Register reads younger than this are answered from cache (0 = off)
+    cache_ttl: float = 1.0
+
+    # Widest read produced by merging overlapping requests
+    max_read: int = 125
+
+    # Prometheus textfile path (disabled if None)
+    metrics_file: Optional[str] = None
+    metrics_interval: int = 15
+
+
+def _matches(value: Any, annotation: Any) -> bool:
+    """True if a JSON value fits an option's annotated type"""
+    origin = get_origin(annotation)
+    if origin is Union:
+        return any(_matches(value, arg) for arg in get_args(annotation))
+    if origin is list:
+        (item,) = get_args(annotation)
+        return isinstance(value, list) and all(_matches(v, item) for v in value)
+    if origin is dict:
+        return isinstance(value, dict)
+    if annotation is Any:
+        return True
+    if annotation is type(None):
+        return value is None
+    # bool is an int subclass; ints are fine for float options
+    if isinstance(value, bool):
+        return annotation is bool
+    if annotation is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, annotation)
+
 
 @dataclass
 class ServiceConfig:
     """Main service configuration"""
     inverter: InverterConfig
+    adaptive: AdaptivePollingConfig
     backend: BackendConfig
+    mqtt: MqttConfig
+    alarms: AlarmConfig
+    fleet: FleetConfig
+    queue: QueueConfig
+    backfill: BackfillConfig
+    uplink: UplinkConfig
+    sinks: SinksConfig
+    strings: StringAnalyticsConfig
+    metrics: MetricsConfig
+    profiling: ProfilingConfig
     logging: LoggingConfig
 
+    # Sections that can be set from a config file
+    SECTIONS = ('inverter', 'adaptive', 'backend', 'mqtt', 'alarms', 'fleet', 'queue', 'backfill',
+                'uplink', 'sinks', 'strings', 'metrics', 'profiling', 'logging')
+
     def __init__(self):
         self.inverter = InverterConfig()
+        self.adaptive = AdaptivePollingConfig()
         self.backend = BackendConfig()
+        self.mqtt = MqttConfig()
+        self.alarms = AlarmConfig()
+        self.fleet = FleetConfig()
+        self.queue = QueueConfig()
+        self.backfill = BackfillConfig()
+        self.uplink = UplinkConfig()
+        self.sinks = SinksConfig()
+        self.strings = StringAnalyticsConfig()
+        self.metrics = MetricsConfig()
+        self.profiling = ProfilingConfig()
         self.logging = LoggingConfig()
 
+    def update_from_file(self, path: str):
+        """
+        Update configuration from a JSON file
+        Format: {"inverter": {"poll_interval": 10}, "logging": {"level": "DEBUG"}}
+        """
+        with open(path, 'r') as f:
+            data = json.load(f)
+
+        if not isinstance(data, dict):
+            raise ValueError(f"{path}: expected an object of sections")
+
+        for section, values in data.items():
+            if section not in self.SECTIONS or not isinstance(values, dict):
+                raise ValueError(f"{path}: unknown config section '{section}'")
+            target = getattr(self, section)
+            types = {f.name: f.type for f in fields(target)}
+            for key, value in values.items():
+                if key not in types:
+                    raise ValueError(f"{path}: unknown config option '{section}.{key}'")
+                # A wrong type would only fail later (validate, poll loop)
+                if not _matches(value, types[key]):
+                    raise ValueError(f"{path}: config option '{section}.{key}' has the wrong type "
+                                     f"({type(value).__name__}: {value!r})")
+                if types[key] is float:
+                    value = float(value)
+                setattr(target, key, value)
+
+    def validate(self):
+        """Raise ValueError for values the service cannot run with"""
+        if self.inverter.connection_type not in ('rtu', 'tcp', 'replay'):
+            raise ValueError(f"Invalid connection type: {self.inverter.connection_type}")
+        if self.inverter.connection_type == 'replay' and not self.inverter.replay_file:
+            raise ValueError("Replay connection needs a capture file (replay_file)")
+        if self.backend.sink not in ('http', 'mqtt'):
+            raise ValueError(f"Invalid sink: {self.backend.sink}")
+        if self.logging.level not in ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'):
+            raise ValueError(f"Invalid log level: {self.logging.level}")
+        if self.logging.output not in ('text', 'json'):
+            raise ValueError(f"Invalid log output: {self.logging.output}")
+        if self.inverter.poll_interval <= 0:
+            raise ValueError("Polling interval must be positive")
+        if self.inverter.max_retries < 0:
+            raise ValueError("Max retries cannot be negative")
+        if self.adaptive.min_interval <= 0 or self.adaptive.max_interval < self.adaptive.min_interval:
+            raise ValueError("Adaptive polling needs 0 < min interval <= max interval")
+        if self.alarms.status_interval < 0:
+            raise ValueError("Status interval cannot be negative")
+        if self.alarms.threshold_sync_interval <= 0:
+            raise ValueError("Threshold sync interval must be positive")
+        if self.fleet.devices_per_worker < 1:
+            raise ValueError("Devices per worker must be at least 1")
+        if self.backend.max_in_flight < 1:
+            raise ValueError("Uploads in flight must be at least 1")
+        if self.queue.max_size < 1:
+            raise ValueError("Queue size must be at least 1")
+        if self.backfill.enabled and self.queue.overflow_policy != 'spill':
+            raise ValueError("Backfill exports the spill backlog: use the 'spill' queue policy")
+        if self.backfill.min_samples < 1 or self.backfill.check_interval <= 0:
+            raise ValueError("Backfill needs min samples >= 1 and a positive check interval")
+        if self.uplink.enabled and self.backend.sink != 'http':
+            raise ValueError("The metered uplink batches HTTP uploads: use the 'http' sink")
+        if not 1 <= self.uplink.min_batch <= self.uplink.max_batch or self.uplink.max_rollup < 1:
+            raise ValueError("Uplink needs 1 <= min batch <= max batch and max rollup >= 1")
+        if self.uplink.daily_budget_mb < 0 or self.uplink.max_batch_delay < 0:
+            raise ValueError("Uplink budget and batch delay cannot be negative")
+        self._validate_sinks()
+        if not 1 <= self.strings.min_samples <= self.strings.window:
+            raise ValueError("String analytics needs 1 <= min samples <= window")
+        if not 0 <= self.strings.open_ratio < 1 - self.strings.mismatch < 1:
+            raise ValueError("String analytics needs 0 <= open ratio < 1 - mismatch < 1")
+        if not 2 <= self.strings.min_trend_days <= self.strings.trend_days:
+            raise ValueError("String analytics needs 2 <= min trend days <= trend days")
+
+    def _validate_sinks(self):
+        names = set()
+        for target in self.sinks.targets:
+            if not isinstance(target, dict) or not target.get('name'):
+                raise ValueError(f"Sink without a name: {target}")
+            name = target['name']
+            if name in names or name == 'telemetry':
+                raise ValueError(f"Duplicate or reserved sink name: {name}")
+            names.add(name)
+            if target.get('type') not in ('file', 'http'):
+                raise ValueError(f"Invalid type for sink {name}: {target.get('type')}")
+            if target.get('type') == 'file' and not target.get('path'):
+                raise ValueError(f"File sink {name} needs a path")
+            if target.get('type') == 'http' and not target.get('url'):
+                raise ValueError(f"HTTP sink {name} needs a url")
+            if target.get('overflow_policy', self.sinks.overflow_policy) not in ('drop_oldest', 'coalesce', 'spill'):
+                raise ValueError(f"Invalid overflow policy for sink {name}")
+            if int(target.get('queue_size', self.sinks.queue_size)) < 1 or \
+                    int(target.get('max_batch', self.sinks.max_batch)) < 1:
+                raise ValueError(f"Sink {name} needs queue size and max batch >= 1")
+        if self.sinks.retry_delay <= 0 or self.sinks.max_retry_delay < self.sinks.retry_delay:
+            raise ValueError("Sinks need 0 < retry delay <= max retry delay")
+
+    def diff(self, other: 'ServiceConfig') -> Set[str]:
+        """Names ('section.field') of the values that differ from other"""
+        changed = set()
+        for section in self.SECTIONS:
+            current = asdict(getattr(self, section))
+            new = asdict(getattr(other, section))
+            changed |= {f"{section}.{key}" for key in current if current[key] != new[key]}
+        return changed
+
+    def apply(self, other: 'ServiceConfig'):
+        """Copy all values from other in place, so existing references stay valid"""
+        for section in self.SECTIONS:
+            for key, value in asdict(getattr(other, section)).items():
+                setattr(getattr(self, section), key, value)
+
     def update_from_args(self, args: argparse.Namespace):
         """Update configuration from CLI arguments"""
         # Inverter configuration
@@ -80,16 +505,149 @@ class ServiceConfig:
             self.inverter.tcp_port = args.tcp_port
         if args.poll_interval:
             self.inverter.poll_interval = args.poll_interval
+        if args.discovery_cache:
+            self.inverter.discovery_cache_path = args.discovery_cache
+        if args.no_discovery_cache:
+            self.inverter.discovery_cache = False
+        if args.register_profile:
+            self.inverter.register_profile = args.register_profile
+        if args.no_fast_decode:
+            self.inverter.fast_decode = False
+        if args.record_traffic:
+            self.inverter.capture_file = args.record_traffic
+        if args.replay:
+            self.inverter.replay_file = args.replay
+            self.inverter.connection_type = 'replay'
+        if args.replay_fast:
+            self.inverter.replay_realtime = False
+
+        # Adaptive polling configuration
+        if args.adaptive_polling:
+            self.adaptive.enabled = True
+        if args.min_poll_interval:
+            self.adaptive.min_interval = args.min_poll_interval
+        if args.max_poll_interval:
+            self.adaptive.max_interval = args.max_poll_interval
+        if args.power_rate_threshold:
+            self.adaptive.power_rate_threshold = args.power_rate_threshold
 
         # Backend configuration
         if args.backend_url:
             self.backend.base_url = args.backend_url
         if args.backend_timeout:
             self.backend.timeout = args.backend_timeout
+        if args.sink:
+            self.backend.sink = args.sink
+        if args.max_in_flight:
+            self.backend.max_in_flight = args.max_in_flight
+
+        # MQTT configuration
+        if args.mqtt_host:
+            self.mqtt.host = args.mqtt_host
+            if not args.sink:
+                self.backend.sink = 'mqtt'  # Auto-switch to MQTT
+        if args.mqtt_port:
+            self.mqtt.port = args.mqtt_port
+        if args.mqtt_username:
+            self.mqtt.username = args.mqtt_username
+        if args.mqtt_password:
+            self.mqtt.password = args.mqtt_password
+        if args.mqtt_topic_prefix:
+            self.mqtt.topic_prefix = args.mqtt_topic_prefix.rstrip('/')
+        if args.mqtt_client_id:
+            self.mqtt.client_id = args.mqtt_client_id
+
+        # Alarm configuration
+        if args.status_interval is not None:
+            self.alarms.status_interval = args.status_interval
+        if args.no_thresholds:
+            self.alarms.thresholds = False
+        if args.threshold_sync_interval:
+            self.alarms.threshold_sync_interval = args.threshold_sync_interval
+
+        # String analytics configuration
+        if args.string_analytics:
+            self.strings.enabled = True
+        if args.string_window:
+            self.strings.window = args.string_window
+
+        # Fleet configuration
+        if args.fleet:
+            self.fleet.devices_file = args.fleet
+        if args.devices_per_worker:
+            self.fleet.devices_per_worker = args.devices_per_worker
+
+        # Queue configuration
+        if args.queue_size:
+            self.queue.max_size = args.queue_size
+        if args.queue_policy:
+            self.queue.overflow_policy = args.queue_policy
+        if args.spill_dir:
+            self.queue.spill_dir = args.spill_dir
+
+        # Backfill configuration
+        if args.backfill:
+            self.backfill.enabled = True
+        if args.backfill_dir:
+            self.backfill.directory = args.backfill_dir
+        if args.backfill_min_samples:
+            self.backfill.min_samples = args.backfill_min_samples
+
+        # Uplink configuration
+        if args.uplink:
+            self.uplink.enabled = True
+        if args.uplink_budget is not None:
+            self.uplink.daily_budget_mb = args.uplink_budget
+            self.uplink.enabled = True  # Auto-enable the metered uplink
+        if args.uplink_max_batch:
+            self.uplink.max_batch = args.uplink_max_batch
+
+        # Sinks configuration (targets from the CLI replace file targets of the same name)
+        cli_targets = []
+        if args.historian:
+            cli_targets.append({'name': 'historian', 'type': 'file', 'path': args.historian})
+        for index, url in enumerate(args.collector or [], start=1):
+            cli_targets.append({'name': f'collector{index}', 'type': 'http', 'url': url})
+        if cli_targets:
+            names = {target['name'] for target in cli_targets}
+            self.sinks.targets = [target for target in self.sinks.targets
+                                  if target.get('name') not in names] + cli_targets
+
+        # Metrics configuration
+        if args.metrics_file:
+            self.metrics.textfile = args.metrics_file
+        if args.metrics_interval:
+            self.metrics.interval = args.metrics_interval
+
+        # Profiling configuration
+        if args.profile is not None:
+            self.profiling.enabled_at_start = True
+            self.profiling.window = args.profile
+        if args.profile_dir:
+            self.profiling.output_dir = args.profile_dir
+        if args.profile_interval:
+            self.profiling.interval = args.profile_interval
 
         # Logging configuration
         if args.log_level:
             self.logging.level = args.log_level.upper()
+        if args.log_output:
+            self.logging.output = args.log_output
+        if args.log_rate_limit is not None:
+            self.logging.rate_limit_window = args.log_rate_limit
+
+
+def load_config(args: argparse.Namespace) -> ServiceConfig:
+    """
+    Build a configuration from defaults, the config file and CLI arguments
+    CLI arguments take precedence over the file
+    """
+    new_config = ServiceConfig()
+    if args.config:
+        new_config.update_from_file(args.config)
+    new_config.update_from_args(args)
+    new_config.validate()
+    return new_config
 
 
 # Global config instance
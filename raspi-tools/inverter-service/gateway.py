@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+MTZ View - Modbus Gateway
+Owns the RS485 serial port and shares it with any number of Modbus TCP
+clients (inverter service, PROJETOS/UBEC scripts, Node-RED)
+"""
+import asyncio
+import argparse
+import signal
+import sys
+
+from config import config, GatewayConfig
+from modules.modbus_gateway import ModbusGateway, RtuBus
+from utils import setup_logger, metrics
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command-line arguments"""
+    defaults = GatewayConfig()
+    parser = argparse.ArgumentParser(
+        description='MTZ View - Modbus TCP to RTU gateway',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+Examples:
+  # Share /dev/ttyUSB0 on 127.0.0.1:5020
+  %(prog)s --serial-port /dev/ttyUSB0 --baudrate 9600
+
+  # Then point every client at the gateway
+  python3 main.py --tcp-host 127.0.0.1 --tcp-port 5020
+        '''
+    )
+
+    serial_group = parser.add_argument_group('RTU/Serial Bus')
+    serial_group.add_argument('-p', '--serial-port', default=defaults.serial_port,
+                              help=f'Serial port device (default: {defaults.serial_port})')
+    serial_group.add_argument('-b', '--baudrate', type=int, default=defaults.baudrate,
+                              help=f'Serial baudrate (default: {defaults.baudrate})')
+    serial_group.add_argument('--parity', choices=['N', 'E', 'O'], default=defaults.parity,
+                              help=f'Serial parity (default: {defaults.parity})')
+    serial_group.add_argument('--stopbits', type=int, choices=[1, 2], default=defaults.stopbits,
+                              help=f'Serial stop bits (default: {defaults.stopbits})')
+    serial_group.add_argument('--response-timeout', type=float, metavar='SECONDS',
+                              default=defaults.response_timeout,
+                              help=f'Slave response timeout; the ceiling of adaptive timeouts '
+                                   f'(default: {defaults.response_timeout})')
+    serial_group.add_argument('--min-response-timeout', type=float, metavar='SECONDS',
+                              default=defaults.min_response_timeout,
+                              help=f'Floor of adaptive timeouts (default: {defaults.min_response_timeout})')
+    serial_group.add_argument('--fixed-timeout', action='store_true',
+                              help='Always wait --response-timeout instead of a per-slave timeout '
+                                   'from measured latency')
+    serial_group.add_argument('--unreachable-after', type=int, metavar='TIMEOUTS',
+                              default=defaults.unreachable_after,
+                              help=f'Skip a slave after this many timeouts in a row '
+                                   f'(default: {defaults.unreachable_after}, 0 = never)')
+    serial_group.add_argument('--probe-interval', type=float, metavar='SECONDS',
+                              default=defaults.probe_interval,
+                              help=f'Probe a skipped slave this often (default: {defaults.probe_interval})')
+
+    tcp_group = parser.add_argument_group('Modbus TCP Listener')
+    tcp_group.add_argument('--host', default=defaults.host,
+                           help=f'Listen address (default: {defaults.host})')
+    tcp_group.add_argument('--port', type=int, default=defaults.port,
+                           help=f'Listen port (default: {defaults.port})')
+
+    cache_group = parser.add_argument_group('Read Sharing')
+    cache_group.add_argument('--cache-ttl', type=float, metavar='SECONDS', default=defaults.cache_ttl,
+                             help=f'Answer repeated reads from cache for this long '
+                                  f'(default: {defaults.cache_ttl}, 0 = off)')
+    cache_group.add_argument('--max-read', type=int, metavar='REGISTERS', default=defaults.max_read,
+                             help=f'Widest read built by merging requests (default: {defaults.max_read})')
+
+    misc_group = parser.add_argument_group('Miscellaneous')
+    misc_group.add_argument('--metrics-file', metavar='PATH',
+                            help='Write Prometheus textfile metrics to this path')
+    misc_group.add_argument('--metrics-interval', type=int, default=defaults.metrics_interval,
+                            help=f'Metrics textfile interval in seconds (default: {defaults.metrics_interval})')
+    misc_group.add_argument('-l', '--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+                            type=str.upper, help='Logging level (default: INFO)')
+    misc_group.add_argument('--log-output', choices=['text', 'json'],
+                            help='Log line format (default: text)')
+
+    return parser.parse_args()
+
+
+def gateway_config(args: argparse.Namespace) -> GatewayConfig:
+    """Gateway configuration from CLI arguments"""
+    return GatewayConfig(
+        serial_port=args.serial_port,
+        baudrate=args.baudrate,
+        parity=args.parity,
+        stopbits=args.stopbits,
+        host=args.host,
+        port=args.port,
+        response_timeout=args.response_timeout,
+        adaptive_timeout=not args.fixed_timeout,
+        min_response_timeout=args.min_response_timeout,
+        unreachable_after=args.unreachable_after,
+        probe_interval=args.probe_interval,
+        cache_ttl=args.cache_ttl,
+        max_read=args.max_read,
+        metrics_file=args.metrics_file,
+        metrics_interval=args.metrics_interval,
+    )
+
+
+async def metrics_loop(gateway_cfg: GatewayConfig):
+    """Periodically write the metrics textfile"""
+    while True:
+        await asyncio.sleep(gateway_cfg.metrics_interval)
+        metrics.write_textfile(gateway_cfg.metrics_file)
+
+
+async def main():
+    """Main entry point"""
+    args = parse_arguments()
+    if args.log_level:
+        config.logging.level = args.log_level
+    if args.log_output:
+        config.logging.output = args.log_output
+    gateway_cfg = gateway_config(args)
+
+    logger = setup_logger(__name__)
+    metrics.prefix = 'modbus_gateway'
+
+    bus = RtuBus(
+        gateway_cfg.serial_port,
+        gateway_cfg.baudrate,
+        parity=gateway_cfg.parity,
+        stopbits=gateway_cfg.stopbits,
+        timeout=gateway_cfg.response_timeout,
+    )
+    gateway = ModbusGateway(
+        bus,
+        cache_ttl=gateway_cfg.cache_ttl,
+        max_read=gateway_cfg.max_read,
+        adaptive_timeout=gateway_cfg.adaptive_timeout,
+        min_timeout=gateway_cfg.min_response_timeout,
+        unreachable_after=gateway_cfg.unreachable_after,
+        probe_interval=gateway_cfg.probe_interval,
+    )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await gateway.start(gateway_cfg.host, gateway_cfg.port)
+    except OSError as e:
+        logger.critical(f"Cannot listen on {gateway_cfg.host}:{gateway_cfg.port}: {e}")
+        return 1
+
+    metrics_task = None
+    if gateway_cfg.metrics_file:
+        metrics_task = asyncio.create_task(metrics_loop(gateway_cfg))
+
+    await stop.wait()
+    logger.info("Stopping gateway...")
+
+    if metrics_task:
+        metrics_task.cancel()
+    await gateway.stop()
+    if gateway_cfg.metrics_file:
+        metrics.write_textfile(gateway_cfg.metrics_file)
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(main()))
+    except Exception as e:
+        print(f"CRITICAL: Failed to start gateway: {e}", file=sys.stderr)
+        sys.exit(1)
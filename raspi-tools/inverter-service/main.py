@@ -6,13 +6,27 @@ Fully configurable via command-line arguments
 """
 import asyncio
 import argparse
+import os
 import signal
 import sys
-from typing import Optional
+import time
+from pathlib import Path
+from typing import List, Optional, Set
 
-from config import config
-from modules import InverterClient, BackendClient
-from utils import setup_logger
+import requests
+
+from config import config, load_config
+from modules import (
+    InverterClient, BackendClient, SampleQueue, SampleSequencer, DeviceCache, AlarmMonitor,
+    ThresholdMonitor, AdaptivePollPolicy,
+)
+from modules.threshold_monitor import sample_values
+from modules.sample_queue import OVERFLOW_POLICIES
+from modules.fleet import FleetSupervisor, load_fleet, shard_devices
+from modules.register_profile import ProfileError
+from modules.sinks import SinkFanout
+from modules.uplink import UplinkController
+from utils import setup_logger, set_log_level, metrics, SamplingProfiler
 
 
 def parse_arguments() -> argparse.Namespace:
@@ -28,12 +42,40 @@ Examples:
   # TCP connection
   %(prog)s --tcp-host 192.168.1.100 --tcp-port 502
 
+  # Publish over MQTT instead of HTTP POSTs
+  %(prog)s --mqtt-host 192.168.1.50 --queue-policy spill
+
+  # After long outages, ship the spilled backlog as Arrow files per device/day
+  %(prog)s --queue-policy spill --backfill
+
+  # Same samples to a local historian and a second collector
+  %(prog)s --historian /var/lib/mtzview/historian --collector http://192.168.1.60:3001
+
+  # PV string mismatch, efficiency and degradation findings on the edge
+  %(prog)s --string-analytics
+
+  # Slow down in standby/at night, speed up on power transients
+  %(prog)s --adaptive-polling --min-poll-interval 5 --max-poll-interval 300
+
   # Custom polling interval and backend URL
   %(prog)s --poll-interval 60 --backend-url http://192.168.1.50:3001
 
   # Debug mode
   %(prog)s --log-level DEBUG
 
+  # Many inverters: worker processes per serial bus / per 4 TCP devices
+  %(prog)s --fleet /etc/mtzview/fleet.json --devices-per-worker 4
+
+  # Settings from a file, reloaded on SIGHUP or when the file changes
+  %(prog)s --config /etc/mtzview/inverter.json --watch-config
+
+  # Record the Modbus traffic, then replay it at the desk without an inverter
+  %(prog)s --record-traffic captures/site.mbcap
+  %(prog)s --replay captures/site.mbcap --replay-fast
+
+  # Profile the first 2 minutes (or toggle any time with: kill -USR1 <pid>)
+  %(prog)s --profile 120 --profile-dir /tmp/profiles
+
   # Full example for Raspberry Pi
   %(prog)s \\
     --serial-port /dev/ttyUSB0 \\
@@ -45,6 +87,19 @@ Examples:
         '''
     )
 
+    # Configuration file
+    file_group = parser.add_argument_group('Configuration File')
+    file_group.add_argument(
+        '-c', '--config',
+        metavar='PATH',
+        help='JSON config file, reloaded on SIGHUP (command-line options take precedence)'
+    )
+    file_group.add_argument(
+        '--watch-config',
+        action='store_true',
+        help='Also reload the config file when it changes on disk'
+    )
+
     # Connection group
     conn_group = parser.add_argument_group('Inverter Connection')
     conn_group.add_argument(
@@ -89,6 +144,111 @@ Examples:
         type=int,
         help='Polling interval in seconds (default: 30)'
     )
+    poll_group.add_argument(
+        '--adaptive-polling',
+        action='store_true',
+        help='Adapt the polling interval to device status and power changes'
+    )
+    poll_group.add_argument(
+        '--min-poll-interval',
+        type=float,
+        metavar='SECONDS',
+        help='Adaptive polling: fastest interval, used on power transients (default: 5)'
+    )
+    poll_group.add_argument(
+        '--max-poll-interval',
+        type=float,
+        metavar='SECONDS',
+        help='Adaptive polling: slowest interval, used in standby/shutdown (default: 300)'
+    )
+    poll_group.add_argument(
+        '--power-rate-threshold',
+        type=float,
+        metavar='W_PER_S',
+        help='Adaptive polling: power change rate that triggers fast polling (default: 500)'
+    )
+    poll_group.add_argument(
+        '--discovery-cache',
+        metavar='PATH',
+        help='Device profile cache file (default: cache/device_profiles.json)'
+    )
+    poll_group.add_argument(
+        '--no-discovery-cache',
+        action='store_true',
+        help='Always read the device identity at startup'
+    )
+
+    poll_group.add_argument(
+        '--register-profile',
+        metavar='PATH',
+        help='Register profile JSON (default: register_profiles/sun2000.json)'
+    )
+    poll_group.add_argument(
+        '--no-fast-decode',
+        action='store_true',
+        help='Decode registers one by one through huawei_solar instead of per block'
+    )
+    poll_group.add_argument(
+        '--status-interval',
+        type=float,
+        metavar='SECONDS',
+        help='Device status/alarm polling interval for the alarm fast lane '
+             '(default: 1, 0 = read status with bulk data only)'
+    )
+    poll_group.add_argument(
+        '--no-thresholds',
+        action='store_true',
+        help='Do not evaluate the backend alert thresholds (HH/H/L/LL) on the edge'
+    )
+    poll_group.add_argument(
+        '--threshold-sync-interval',
+        type=float,
+        metavar='SECONDS',
+        help='Interval between alert threshold syncs from the backend (default: 300)'
+    )
+    poll_group.add_argument(
+        '--string-analytics',
+        action='store_true',
+        help='Evaluate PV string mismatch, DC/AC efficiency and degradation on the edge (needs numpy)'
+    )
+    poll_group.add_argument(
+        '--string-window',
+        type=int,
+        metavar='SAMPLES',
+        help='Bulk samples in the string analytics window (default: 60)'
+    )
+
+    # Traffic capture arguments
+    capture_group = parser.add_argument_group('Traffic Capture')
+    capture_group.add_argument(
+        '--record-traffic',
+        metavar='PATH',
+        help='Append every Modbus request/response, with timing, to a capture file'
+    )
+    capture_group.add_argument(
+        '--replay',
+        metavar='PATH',
+        help='Read from a capture file instead of the inverter (auto-enables replay mode)'
+    )
+    capture_group.add_argument(
+        '--replay-fast',
+        action='store_true',
+        help='Replay: answer immediately instead of with the recorded latency'
+    )
+
+    # Fleet arguments
+    fleet_group = parser.add_argument_group('Fleet (Multi-Process)')
+    fleet_group.add_argument(
+        '--fleet',
+        metavar='PATH',
+        help='Device list JSON; polls every device from worker processes (supervisor mode)'
+    )
+    fleet_group.add_argument(
+        '--devices-per-worker',
+        type=int,
+        metavar='N',
+        help='TCP devices per worker process (default: 4; RTU devices get one worker per bus)'
+    )
 
     # Backend arguments
     backend_group = parser.add_argument_group('Backend Configuration')
@@ -101,6 +261,148 @@ Examples:
         type=int,
         help='Backend request timeout in seconds (default: 10)'
     )
+    backend_group.add_argument(
+        '--sink',
+        choices=['http', 'mqtt'],
+        help='Transport for telemetry and events (default: http)'
+    )
+    backend_group.add_argument(
+        '--max-in-flight',
+        type=int,
+        metavar='N',
+        help='Telemetry uploads kept in flight on slow links (default: 4)'
+    )
+
+    # MQTT arguments
+    mqtt_group = parser.add_argument_group('MQTT Sink')
+    mqtt_group.add_argument(
+        '--mqtt-host',
+        help='MQTT broker host (auto-enables --sink mqtt)'
+    )
+    mqtt_group.add_argument(
+        '--mqtt-port',
+        type=int,
+        help='MQTT broker port (default: 1883)'
+    )
+    mqtt_group.add_argument(
+        '--mqtt-username',
+        help='MQTT username'
+    )
+    mqtt_group.add_argument(
+        '--mqtt-password',
+        help='MQTT password'
+    )
+    mqtt_group.add_argument(
+        '--mqtt-topic-prefix',
+        help='Topic prefix (default: mtzview/inverter)'
+    )
+    mqtt_group.add_argument(
+        '--mqtt-client-id',
+        help='Client id of the persistent session (default: mtz-inverter-<hostname>)'
+    )
+
+    # Queue arguments
+    queue_group = parser.add_argument_group('Upload Queue')
+    queue_group.add_argument(
+        '--queue-size',
+        type=int,
+        help='Max samples buffered in memory between read and upload (default: 1000)'
+    )
+    queue_group.add_argument(
+        '--queue-policy',
+        choices=OVERFLOW_POLICIES,
+        help='Overflow policy when the queue is full (default: drop_oldest)'
+    )
+    queue_group.add_argument(
+        '--spill-dir',
+        help='Directory for spilled samples with --queue-policy spill (default: spool)'
+    )
+
+    backfill_group = parser.add_argument_group('Backfill (Bulk Upload)')
+    backfill_group.add_argument(
+        '--backfill',
+        action='store_true',
+        help='Upload a large spilled backlog as Arrow files (requires --queue-policy spill and pyarrow)'
+    )
+    backfill_group.add_argument(
+        '--backfill-dir',
+        help='Directory for exported files waiting for upload (default: backfill)'
+    )
+    backfill_group.add_argument(
+        '--backfill-min-samples',
+        type=int,
+        metavar='N',
+        help='Spilled samples that trigger a bulk export (default: 500)'
+    )
+
+    uplink_group = parser.add_argument_group('Metered Uplink (3G)')
+    uplink_group.add_argument(
+        '--uplink',
+        action='store_true',
+        help='Batch and compress uploads from the measured link (HTTP sink)'
+    )
+    uplink_group.add_argument(
+        '--uplink-budget',
+        type=float,
+        metavar='MB',
+        help='Daily uplink budget in MB; samples are rolled up to stay within it (auto-enables --uplink)'
+    )
+    uplink_group.add_argument(
+        '--uplink-max-batch',
+        type=int,
+        metavar='N',
+        help='Most records per upload request (default: 60)'
+    )
+    uplink_group.add_argument(
+        '--uplink-usage',
+        action='store_true',
+        help='Show uplink bytes per day and device (last 7 days) and exit'
+    )
+
+    # Extra sinks
+    sinks_group = parser.add_argument_group('Extra Sinks (Fan-out)')
+    sinks_group.add_argument(
+        '--historian',
+        metavar='DIR',
+        help='Also write every sample to a local historian (one JSONL file per day in DIR)'
+    )
+    sinks_group.add_argument(
+        '--collector',
+        metavar='URL',
+        action='append',
+        help='Also send samples to another collector (backend API base URL; repeatable)'
+    )
+
+    # Metrics arguments
+    metrics_group = parser.add_argument_group('Metrics')
+    metrics_group.add_argument(
+        '--metrics-file',
+        help='Write Prometheus textfile metrics to this path'
+    )
+    metrics_group.add_argument(
+        '--metrics-interval',
+        type=int,
+        help='Metrics file update interval in seconds (default: 15)'
+    )
+
+    # Profiling arguments
+    profile_group = parser.add_argument_group('Profiling')
+    profile_group.add_argument(
+        '--profile',
+        type=int,
+        metavar='SECONDS',
+        help='Run the sampling profiler for SECONDS after start (0 = until SIGUSR1). '
+             'SIGUSR1 toggles profiling on a running service'
+    )
+    profile_group.add_argument(
+        '--profile-dir',
+        help='Directory for collapsed stacks and summaries (default: profiles)'
+    )
+    profile_group.add_argument(
+        '--profile-interval',
+        type=float,
+        help='Sampling interval in seconds (default: 0.01)'
+    )
 
     # Logging arguments
     log_group = parser.add_argument_group('Logging')
@@ -109,6 +411,17 @@ Examples:
         choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
         help='Logging level (default: INFO)'
     )
+    log_group.add_argument(
+        '--log-output',
+        choices=['text', 'json'],
+        help='Log line format: colored text or one JSON object per line (default: text)'
+    )
+    log_group.add_argument(
+        '--log-rate-limit',
+        type=float,
+        metavar='SECONDS',
+        help='Log identical warnings/errors once per window (default: 60, 0 = off)'
+    )
 
     # Utility arguments
     parser.add_argument(
@@ -128,18 +441,121 @@ Examples:
 
 logger = None  # Will be initialized after parsing args
 
+# Process start reference for the time-to-first-sample metric
+STARTED_AT = time.monotonic()
+
+
+def rejected_status(error: Exception) -> Optional[int]:
+    """
+    HTTP status of a permanent rejection (4xx other than 408/429), or None
+    The backend will not accept the same request on a retry
+    """
+    if not isinstance(error, requests.HTTPError) or error.response is None:
+        return None
+    status = error.response.status_code
+    if 400 <= status < 500 and status not in (408, 429):
+        return status
+    return None
+
 
 class InverterService:
     """
     Main service class
     Orchestrates inverter reading and backend communication
+    Acquisition and upload run as independent tasks joined by a bounded queue
     """
 
-    def __init__(self):
-        self.inverter = InverterClient()
+    # Settings that need a new inverter connection
+    TRANSPORT_SETTINGS = {
+        'inverter.connection_type', 'inverter.serial_port', 'inverter.baudrate',
+        'inverter.slave_id', 'inverter.tcp_host', 'inverter.tcp_port',
+        'inverter.capture_file', 'inverter.replay_file', 'inverter.replay_realtime',
+    }
+
+    # Settings only read at startup
+    RESTART_SETTINGS = {
+        'inverter.discovery_cache', 'inverter.discovery_cache_path',
+        'fleet.devices_file', 'fleet.devices_per_worker',
+        'queue.overflow_policy', 'queue.spill_dir',
+        'uplink.enabled', 'uplink.usage_file',
+        'strings.enabled', 'strings.trend_cache_path',
+        'logging.format', 'logging.date_format', 'logging.output', 'logging.rate_limit_window',
+    }
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.inverter = self._create_inverter()
         self.backend = BackendClient()
+        # Alarm fast lane: own session and queue, never behind bulk uploads
+        self.alarm_monitor = AlarmMonitor()
+        self.thresholds = ThresholdMonitor(config.alarms.threshold_cache_path)
+        self.string_analytics = self._create_string_analytics()
+        self.event_backend = BackendClient()
+        self.mqtt = self._create_mqtt_client()
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.poll_policy = AdaptivePollPolicy(config.adaptive)
+        self.queue = SampleQueue(
+            max_size=config.queue.max_size,
+            overflow_policy=config.queue.overflow_policy,
+            spill_dir=config.queue.spill_dir,
+        )
+        # (boot_id, sequence) per sample: the backend drops retried duplicates
+        self.sequencer = SampleSequencer()
+        # Metered link: batches, compression and rollups within a daily budget
+        self.uplink = UplinkController(config.uplink) if config.uplink.enabled else None
+        # Extra sinks (historian, other collectors), each with its own queue
+        self.sinks = SinkFanout()
+        self.profiler = SamplingProfiler(interval=config.profiling.interval)
+        self._profile_timer: Optional[asyncio.TimerHandle] = None
         self.running = False
-        self.task: Optional[asyncio.Task] = None
+        self.tasks: List[asyncio.Task] = []
+        self.first_sample_at: Optional[float] = None
+        # Last upload succeeded (backfill waits for the backend to be back)
+        self._backend_up = False
+        # The backend refused a backfill file for good (4xx, 501): bulk upload
+        # stays off until restart and the backlog goes through the queue
+        self._backfill_rejected = False
+
+        # Hot reload: set to make a loop rebuild its schedule
+        self._poll_wakeup = asyncio.Event()
+        # Set with _poll_wakeup to read right away (adaptive polling)
+        self._poll_now = False
+        self._status_wakeup = asyncio.Event()
+        # Set when uploads recover, so a backlog is exported before it is replayed
+        self._backfill_wakeup = asyncio.Event()
+        self._reload_lock = asyncio.Lock()
+        self._status_task: Optional[asyncio.Task] = None
+        self._metrics_task: Optional[asyncio.Task] = None
+        self._backfill_task: Optional[asyncio.Task] = None
+        self._threshold_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _create_inverter() -> Optional[InverterClient]:
+        cache = None
+        if config.inverter.discovery_cache:
+            cache = DeviceCache(config.inverter.discovery_cache_path)
+        return InverterClient(cache=cache)
+
+    @staticmethod
+    def _create_string_analytics():
+        if not config.strings.enabled:
+            return None
+        # numpy is only needed for the string analytics
+        try:
+            from modules.string_analytics import StringAnalytics
+        except ImportError as e:
+            logger.error(f"String analytics disabled: {e} (pip install numpy)")
+            return None
+        logger.info(f"String analytics: window of {config.strings.window} samples, findings on the event lane")
+        return StringAnalytics(config.strings)
+
+    @staticmethod
+    def _create_mqtt_client():
+        if config.backend.sink != 'mqtt':
+            return None
+        # asyncio-mqtt is only needed for the MQTT sink
+        from modules.mqtt_client import MqttClient
+        return MqttClient()
 
     async def start(self):
         """Start the service"""
@@ -148,61 +564,181 @@ class InverterService:
         logger.info("SUN2000-100KTL-M1 Integration")
         logger.info("=" * 60)
 
-        # Check backend connectivity
-        if self.backend.ping():
-            logger.info(f"Backend is reachable at {config.backend.base_url}")
-        else:
-            logger.warning(f"Backend not reachable at {config.backend.base_url}")
-            logger.warning("Service will continue but data may not be sent")
+        if config.profiling.enabled_at_start:
+            self.start_profiling(config.profiling.window)
+
+        # Check backend connectivity concurrently with the inverter connection
+        background = [asyncio.create_task(self._check_backend())]
+        self._load_thresholds()
 
         # Connect to inverter
-        connected = await self.inverter.connect()
-        if not connected:
+        while not await self.inverter.connect():
             logger.error("Failed to connect to inverter. Retrying in 30 seconds...")
             await asyncio.sleep(30)
-            return await self.start()
 
-        # Get and log device info
-        try:
-            device_info = await self.inverter.get_device_info()
-            logger.info("Device Information:")
-            for key, value in device_info.items():
-                logger.info(f"  {key}: {value['value']} {value['unit'] or ''}")
-        except Exception as e:
-            logger.warning(f"Could not read device info: {e}")
+        if self.inverter.profile_from_cache:
+            # Start polling right away; confirm the cached identity in the background
+            background.append(asyncio.create_task(self._verify_device_profile()))
+        else:
+            self._log_device_info()
 
-        # Start polling loop
+        # Start acquisition and upload stages
         self.running = True
-        self.task = asyncio.create_task(self._polling_loop())
+        await self.sinks.configure(config.sinks)
+        self.tasks = background + [
+            asyncio.create_task(self._polling_loop()),
+            asyncio.create_task(self._upload_loop()),
+            asyncio.create_task(self._event_loop()),
+        ]
+        self._ensure_optional_tasks()
+        if self.args.config and self.args.watch_config:
+            self.tasks.append(asyncio.create_task(self._config_watch_loop()))
 
         logger.info(f"Service started. Polling every {config.inverter.poll_interval}s")
+        if config.adaptive.enabled:
+            logger.info(f"Adaptive polling: {config.adaptive.min_interval:g}s to "
+                        f"{config.adaptive.max_interval:g}s")
+        if config.alarms.status_interval > 0:
+            logger.info(f"Alarm fast lane: status every {config.alarms.status_interval}s")
+        if config.alarms.thresholds:
+            logger.info(f"Edge thresholds: synced every {config.alarms.threshold_sync_interval:g}s")
+        logger.info(f"Upload queue: {config.queue.max_size} samples, "
+                    f"overflow policy '{config.queue.overflow_policy}'")
+        if config.backfill.enabled:
+            logger.info(f"Backfill: spilled backlog of {config.backfill.min_samples}+ samples "
+                        f"is bulk-uploaded from {config.backfill.directory}")
+        self._log_uplink()
         logger.info("Press Ctrl+C to stop")
 
+    def _log_uplink(self):
+        if not self.uplink:
+            return
+        budget = f"{config.uplink.daily_budget_mb:g} MB/day" if config.uplink.daily_budget_mb > 0 else "no budget"
+        logger.info(f"Metered uplink: batches of up to {config.uplink.max_batch} records, {budget} "
+                    f"({self.uplink.used_today() / 1e6:.2f} MB used today)")
+
+    def _ensure_optional_tasks(self):
+        """Start the status, metrics and backfill loops if enabled and not running"""
+        if config.alarms.status_interval > 0 and (self._status_task is None or self._status_task.done()):
+            self._status_task = asyncio.create_task(self._status_loop())
+            self.tasks.append(self._status_task)
+        if config.metrics.textfile and (self._metrics_task is None or self._metrics_task.done()):
+            self._metrics_task = asyncio.create_task(self._metrics_loop())
+            self.tasks.append(self._metrics_task)
+        self._ensure_backfill_task()
+        self._ensure_threshold_task()
+
+    def _ensure_threshold_task(self):
+        if config.alarms.thresholds and (self._threshold_task is None or self._threshold_task.done()):
+            self._threshold_task = asyncio.create_task(self._threshold_sync_loop())
+            self.tasks.append(self._threshold_task)
+
+    def _ensure_backfill_task(self):
+        if config.backfill.enabled and not self._backfill_rejected and \
+                (self._backfill_task is None or self._backfill_task.done()):
+            self._backfill_task = asyncio.create_task(self._backfill_loop())
+            self.tasks.append(self._backfill_task)
+
+    @staticmethod
+    async def _wait_or_wakeup(delay: float, wakeup: asyncio.Event) -> bool:
+        """Sleep for delay seconds; True if woken early by a schedule change"""
+        try:
+            await asyncio.wait_for(wakeup.wait(), timeout=max(delay, 0))
+        except asyncio.TimeoutError:
+            return False
+        wakeup.clear()
+        return True
+
+    async def _check_backend(self):
+        """Log backend reachability (runs off the startup critical path)"""
+        if self.mqtt:
+            try:
+                await self.mqtt.connect()
+            except Exception as e:
+                logger.warning(f"MQTT broker not reachable at {config.mqtt.host}:{config.mqtt.port}: {e}")
+                logger.warning("Samples will be buffered until it is")
+            return
+
+        if await asyncio.to_thread(self.backend.ping):
+            logger.info(f"Backend is reachable at {config.backend.base_url}")
+        else:
+            logger.warning(f"Backend not reachable at {config.backend.base_url}")
+            logger.warning("Service will continue but data may not be sent")
+
+    async def _verify_device_profile(self):
+        """Check the cached device profile against the live device"""
+        try:
+            if await self.inverter.refresh_device_profile():
+                logger.warning("Cached device profile was outdated; cache updated")
+            else:
+                logger.debug("Cached device profile matches the device")
+            self._log_device_info()
+        except Exception as e:
+            logger.warning(f"Could not verify cached device profile: {e}")
+
+    def _log_device_info(self):
+        logger.info("Device Information:")
+        for key, value in self.inverter.device_info.items():
+            logger.info(f"  {key}: {value['value']} {value['unit'] or ''}")
+
+    def _record_first_sample(self):
+        """Report time from process start to the first queued sample"""
+        self.first_sample_at = time.monotonic()
+        elapsed = self.first_sample_at - STARTED_AT
+        metrics.set('time_to_first_sample_seconds', elapsed)
+        logger.info(f"First sample acquired {elapsed:.2f}s after start")
+
     async def _polling_loop(self):
-        """Main polling loop"""
+        """
+        Acquisition loop
+        Reads the inverter on a fixed-rate schedule and hands samples to the
+        upload queue; backend and network conditions never delay a read
+        """
         consecutive_errors = 0
         max_consecutive_errors = 5
+        loop = asyncio.get_running_loop()
+        next_poll = loop.time()
 
         while self.running:
             try:
                 # Read data from inverter
                 logger.debug("Reading data from inverter...")
+                started = loop.time()
                 data = await self.inverter.read_all_data()
+                metrics.set('read_duration_seconds', loop.time() - started)
+                metrics.inc('samples_acquired_total')
+                consecutive_errors = 0  # Reset error counter on success
 
-                # Send to backend
-                try:
-                    self.backend.send_telemetry(data)
-                    consecutive_errors = 0  # Reset error counter on success
-                except Exception as e:
-                    logger.error(f"Failed to send data to backend: {e}")
-                    # Continue even if backend is down
+                # Hand off to the uploader (never blocks)
+                self._enqueue(data)
 
-                # Wait for next poll
-                await asyncio.sleep(config.inverter.poll_interval)
+                # Without the fast lane, transitions are detected per sample
+                if config.alarms.status_interval <= 0:
+                    self._publish_events(data['status'])
+                    self._check_thresholds(self.inverter.device_id, sample_values(data))
+                self._analyze_strings(self.inverter.device_id, data)
+
+                # Wait for next poll, keeping a fixed cadence
+                next_poll += self._poll_interval(data)
+                delay = next_poll - loop.time()
+                if delay < 0:
+                    logger.warning("Polling fell behind schedule by %.1fs", -delay)
+                    next_poll = loop.time()
+                    delay = 0
+                while await self._wait_or_wakeup(delay, self._poll_wakeup):
+                    if self._poll_now:
+                        # Device state changed: read now
+                        self._poll_now = False
+                        next_poll = loop.time()
+                    else:
+                        # Interval changed: reschedule relative to the last read
+                        next_poll = max(started + self._poll_interval(), loop.time())
+                    delay = next_poll - loop.time()
 
             except Exception as e:
+                metrics.inc('read_errors_total')
                 consecutive_errors += 1
-                logger.error(f"Error in polling loop (attempt {consecutive_errors}): {e}")
+                logger.error("Error in polling loop (attempt %d): %s", consecutive_errors, e)
 
                 if consecutive_errors >= max_consecutive_errors:
                     logger.critical(f"Too many consecutive errors ({consecutive_errors}). Reconnecting...")
@@ -221,24 +757,655 @@ class InverterService:
                     # Wait before retry
                     await asyncio.sleep(config.inverter.retry_delay)
 
+                next_poll = loop.time()
+
+    def _enqueue(self, sample):
+        """Stamp a sample and hand it to the upload queue and the extra sinks"""
+        self.queue.put(self.sequencer.stamp(sample))
+        self.sinks.put(sample)
+        if self.uplink:
+            self.uplink.sample_acquired()
+        if self.first_sample_at is None:
+            self._record_first_sample()
+
+    def _poll_interval(self, data=None) -> float:
+        """Seconds until the next poll (fixed, or from the adaptive policy)"""
+        if config.adaptive.enabled:
+            interval = self.poll_policy.next_interval(config.inverter.poll_interval, data)
+        else:
+            interval = config.inverter.poll_interval
+        metrics.set('poll_interval_seconds', interval)
+        return interval
+
+    async def _upload_loop(self):
+        """
+        Upload loop
+        Keeps up to backend.max_in_flight uploads running, so a high-latency
+        link is not idle while waiting for each response. Samples carry a
+        sequence number and the backend drops duplicates, so the order of
+        completion and retries do not matter. A failing sample is retried by
+        its own task while new samples keep accumulating under the queue
+        overflow policy
+        """
+        if self.uplink:
+            await self._uplink_loop()
+            return
+
+        in_flight: Set[asyncio.Task] = set()
+
+        def done(task: asyncio.Task):
+            in_flight.discard(task)
+            metrics.set('uploads_in_flight', len(in_flight))
+
+        try:
+            while self.running:
+                while len(in_flight) >= config.backend.max_in_flight:
+                    await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+
+                sample = await self.queue.get()
+                task = asyncio.create_task(self._upload_sample(sample))
+                in_flight.add(task)
+                task.add_done_callback(done)
+                metrics.set('uploads_in_flight', len(in_flight))
+        finally:
+            pending = list(in_flight)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _upload_sample(self, sample):
+        """Upload one sample, retrying until it is accepted or rejected"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    started = loop.time()
+                    await self._send_telemetry(sample)
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    status = rejected_status(e)
+                    if status is not None:
+                        # Retrying would hold an in-flight slot forever
+                        metrics.inc('samples_rejected_total')
+                        logger.error("Sample rejected by the backend (HTTP %d), dropped: %s", status, e)
+                        return
+                    self._backend_up = False
+                    metrics.inc('upload_errors_total')
+                    logger.error("Failed to upload sample: %s (%d samples queued)", e, len(self.queue))
+                    await asyncio.sleep(config.inverter.retry_delay)
+        except asyncio.CancelledError:
+            # Stopping: keep the sample for queue.persist(); a copy the backend
+            # already received is dropped as a duplicate on the next upload
+            self.queue.put_back(sample)
+            raise
+
+        metrics.set('upload_duration_seconds', loop.time() - started)
+        metrics.inc('samples_uploaded_total')
+        if not self._backend_up:
+            self._backend_up = True
+            self._backfill_wakeup.set()
+
+    async def _uplink_loop(self):
+        """
+        Metered upload loop (--uplink)
+        One batch request at a time: the uplink controller sizes the batch,
+        picks the gzip level and, when the daily budget runs short, merges
+        raw samples into rollup records. A failed batch is retried as is; one
+        the backend rejects (4xx) is dropped
+        """
+        loop = asyncio.get_running_loop()
+        while self.running:
+            plan = self.uplink.plan(len(self.queue))
+            samples = [await self.queue.get()]
+            wanted = plan.batch_size * plan.rollup
+            deadline = loop.time() + plan.max_delay
+            while len(samples) < wanted:
+                sample = self.queue.get_nowait()
+                if sample is not None:
+                    samples.append(sample)
+                    continue
+                if loop.time() >= deadline:
+                    break
+                await asyncio.sleep(min(1.0, deadline - loop.time()))
+
+            records = self.uplink.records(samples, plan.rollup)
+            body = await asyncio.to_thread(self.uplink.encode, records, plan.level)
+            rejected = False
+            try:
+                while True:
+                    started = loop.time()
+                    try:
+                        await asyncio.to_thread(self.backend.send_telemetry_batch, body)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        status = rejected_status(e)
+                        if status is not None:
+                            metrics.inc('samples_rejected_total', len(samples))
+                            logger.error("Batch of %d records rejected by the backend (HTTP %d), dropped: %s",
+                                         len(records), status, e)
+                            rejected = True
+                            break
+                        self._backend_up = False
+                        self.uplink.record(records, len(body), loop.time() - started, ok=False)
+                        metrics.inc('upload_errors_total')
+                        logger.error("Failed to upload batch of %d records: %s (%d samples queued)",
+                                     len(records), e, len(self.queue))
+                        await asyncio.sleep(config.inverter.retry_delay)
+                        continue
+                    break
+            except asyncio.CancelledError:
+                # Stopping: keep the raw samples for queue.persist()
+                for sample in reversed(samples):
+                    self.queue.put_back(sample)
+                raise
+            if rejected:
+                continue
+
+            duration = loop.time() - started
+            self.uplink.record(records, len(body), duration, ok=True)
+            metrics.set('upload_duration_seconds', duration)
+            metrics.inc('samples_uploaded_total', len(samples))
+            logger.debug("Uploaded %d samples as %d records (%d bytes, level %d) in %.2fs",
+                         len(samples), len(records), len(body), plan.level, duration)
+            if not self._backend_up:
+                self._backend_up = True
+                self._backfill_wakeup.set()
+
+    async def _backfill_loop(self):
+        """
+        Bulk upload of a large spilled backlog (--backfill)
+        Once uploads succeed again, the spool is exported as Arrow files, one
+        per device and day, and the backend loads each file with COPY instead
+        of taking the samples one POST at a time. Exported files stay on disk
+        until uploaded, across restarts
+        """
+        try:
+            from modules import backfill
+        except ImportError as e:
+            logger.error(f"Backfill disabled: {e} (pip install pyarrow)")
+            return
+
+        while self.running and config.backfill.enabled and not self._backfill_rejected:
+            await self._wait_or_wakeup(config.backfill.check_interval, self._backfill_wakeup)
+            if self.mqtt:
+                logger.warning("Backfill needs the HTTP sink; the MQTT backlog is replayed sample by sample")
+                continue
+            if not self._backend_up:
+                continue
+
+            directory = Path(config.backfill.directory)
+            try:
+                if self.queue.spilled >= config.backfill.min_samples:
+                    directory.mkdir(parents=True, exist_ok=True)
+                    self.queue.take_spilled(directory / f"spool-{int(time.time() * 1000)}.jsonl")
+
+                # Includes spool files a previous run moved but did not export
+                for spool in sorted(directory.glob('spool-*.jsonl')):
+                    await asyncio.to_thread(backfill.export_spool, spool, directory)
+                    spool.with_suffix('.offset').unlink(missing_ok=True)
+                    spool.unlink()
+            except (OSError, ValueError) as e:
+                logger.error("Backfill export failed, retrying later: %s", e)
+                continue
+
+            await self._upload_backfill(backfill, directory)
+
+    async def _upload_backfill(self, backfill, directory: Path):
+        """Upload exported files oldest day first; stop at the first failure"""
+        files = backfill.pending_files(directory)
+        if not files:
+            return
+
+        # Own session: the upload loop keeps using self.backend meanwhile
+        client = BackendClient()
+        loop = asyncio.get_running_loop()
+        try:
+            for index, path in enumerate(files):
+                metrics.set('backfill_pending_files', len(files) - index)
+                started = loop.time()
+                try:
+                    rows = await asyncio.to_thread(client.send_backfill, str(path), backfill.MEDIA_TYPE)
+                except requests.HTTPError as e:
+                    metrics.inc('backfill_errors_total')
+                    status = e.response.status_code if e.response is not None else None
+                    if rejected_status(e) is not None or status == 501:
+                        await self._requeue_backfill(backfill, files[index:], f"HTTP {status} for {path.name}")
+                    else:
+                        logger.error("Backfill upload of %s failed, retrying later: %s", path.name, e)
+                    return
+                except Exception as e:
+                    metrics.inc('backfill_errors_total')
+                    logger.error("Backfill upload of %s failed, retrying later: %s", path.name, e)
+                    return
+                path.unlink(missing_ok=True)
+                metrics.inc('backfill_files_total')
+                metrics.inc('backfill_rows_total', rows)
+                logger.info("Backfill: %s loaded (%d rows in %.1fs)", path.name, rows, loop.time() - started)
+            metrics.set('backfill_pending_files', 0)
+        finally:
+            client.close()
+
+    async def _requeue_backfill(self, backfill, files: List[Path], reason: str):
+        """
+        The backend will not take backfill files (rejected, or no Arrow
+        support): their samples go back through the upload queue one by one
+        and bulk upload is off until restart, so they are not exported again
+        """
+        self._backfill_rejected = True
+        requeued = 0
+        for path in files:
+            try:
+                samples = await asyncio.to_thread(backfill.read_samples, path)
+            except (OSError, ValueError) as e:
+                logger.error(f"Backfill file {path} could not be read back, kept on disk: {e}")
+                continue
+            for sample in samples:
+                self.queue.put(sample)
+            path.unlink(missing_ok=True)
+            requeued += len(samples)
+        metrics.set('backfill_pending_files', 0)
+        logger.error(f"Backfill rejected by the backend ({reason}); {requeued} samples re-queued for "
+                     f"the per-sample upload, bulk upload off until restart")
+
+    async def _status_loop(self):
+        """
+        Alarm fast lane
+        Polls DEVICE_STATUS and ALARM_1..3 at status_interval; transitions
+        are queued for immediate upload. The bulk read reuses these results,
+        so the status block is not read twice
+        """
+        loop = asyncio.get_running_loop()
+        next_poll = loop.time()
+
+        while self.running and config.alarms.status_interval > 0:
+            if self.inverter.connected:
+                try:
+                    status_data = await self.inverter.read_status()
+                    self._publish_events(status_data)
+                    self._check_thresholds(self.inverter.device_id,
+                                           {register: result.value for register, result in status_data.items()})
+                except Exception as e:
+                    # Connection errors are handled by the polling loop
+                    metrics.inc('status_read_errors_total')
+                    logger.debug("Status read failed: %s", e)
+
+            next_poll = max(next_poll + config.alarms.status_interval, loop.time())
+            if await self._wait_or_wakeup(next_poll - loop.time(), self._status_wakeup):
+                next_poll = loop.time()
+
+        if self.running:
+            logger.info("Alarm fast lane stopped; status is read with bulk data")
+
+    def _publish_events(self, status_data):
+        """Decode status registers and queue any transitions"""
+        self.alarm_monitor.device_id = self.inverter.device_id
+        events = self.alarm_monitor.update(status_data)
+        for event in events:
+            if (event['event'] == 'status_changed' and config.adaptive.enabled
+                    and self.poll_policy.status_changed(event['current'])):
+                # e.g. standby -> on-grid: do not wait out the slow interval
+                self._poll_now = True
+                self._poll_wakeup.set()
+        self._queue_events(events)
+        metrics.set('active_alarms', len(self.alarm_monitor.active_alarms))
+
+    def _queue_events(self, events):
+        """Hand events to the fast lane"""
+        for event in events:
+            event['detected_monotonic'] = time.monotonic()
+            self.events.put_nowait(event)
+            metrics.inc('events_detected_total', event=event['event'])
+
+    def _check_thresholds(self, device_id, values):
+        """
+        Evaluate the edge thresholds on one reading and queue any transitions
+        A failure is logged and counted; it never costs the reading itself
+        """
+        if config.alarms.thresholds and self.thresholds.rules:
+            try:
+                self._queue_events(self.thresholds.update(device_id, values))
+            except Exception:
+                metrics.inc('analytics_errors_total', stage='thresholds')
+                logger.exception("Threshold evaluation failed for %s", device_id)
+                return
+            metrics.set('active_thresholds', len(self.thresholds.active()))
+
+    def _analyze_strings(self, device_id, sample):
+        """
+        PV string analytics on one bulk sample; findings go to the fast lane
+        A failure is logged and counted; it never costs the reading itself
+        """
+        if self.string_analytics:
+            try:
+                self._queue_events(self.string_analytics.update(device_id, sample_values(sample)))
+            except Exception:
+                metrics.inc('analytics_errors_total', stage='strings')
+                logger.exception("String analytics failed for %s", device_id)
+
+    def _load_thresholds(self):
+        """Cached rules, so thresholds are evaluated before the first sync"""
+        if config.alarms.thresholds and self.thresholds.load_cache():
+            self._thresholds_changed()
+
+    def _thresholds_changed(self):
+        # Watched registers are read with the status block every status_interval
+        # (in fleet mode thresholds are evaluated on the worker samples)
+        if self.inverter:
+            self.inverter.set_watch_registers(self.thresholds.addresses)
+
+    async def _threshold_sync_loop(self):
+        """
+        Threshold sync loop
+        Fetches alert_preferences from the backend every sync interval; the
+        last rules (cached on disk) stay in use while it is unreachable
+        """
+        while self.running and config.alarms.thresholds:
+            self.thresholds.cache_path = Path(config.alarms.threshold_cache_path)
+            try:
+                rows = await asyncio.to_thread(self.event_backend.get_alert_preferences)
+                self._queue_events(self.thresholds.sync(rows))
+                self._thresholds_changed()
+                metrics.set('threshold_rules', len(self.thresholds.rules))
+            except Exception as e:
+                metrics.inc('threshold_sync_errors_total')
+                logger.warning(f"Threshold sync failed, keeping {len(self.thresholds.rules)} rules: {e}")
+            await asyncio.sleep(config.alarms.threshold_sync_interval)
+
+    async def _event_loop(self):
+        """
+        Event upload loop
+        Sends transitions as soon as they are detected; events that arrive
+        while a send is in flight or failing go out together on the next try
+        """
+        pending = []
+
+        while self.running:
+            if not pending:
+                pending.append(await self.events.get())
+            while not self.events.empty():
+                pending.append(self.events.get_nowait())
+
+            payload = [{k: v for k, v in event.items() if k != 'detected_monotonic'}
+                       for event in pending]
+            try:
+                await self._send_events(payload)
+                metrics.set('event_latency_seconds', time.monotonic() - pending[0]['detected_monotonic'])
+                metrics.inc('events_sent_total', len(pending))
+                pending = []
+            except Exception as e:
+                metrics.inc('event_upload_errors_total')
+                logger.error("Failed to send %d events: %s", len(pending), e)
+                # Short retry: events are small and latency matters
+                await asyncio.sleep(1)
+
+    async def _send_telemetry(self, sample):
+        if self.mqtt:
+            await self.mqtt.send_telemetry(sample)
+        else:
+            # requests is blocking: run it off the event loop
+            await asyncio.to_thread(self.backend.send_telemetry, sample)
+
+    async def _send_events(self, events):
+        if self.mqtt:
+            await self.mqtt.send_events(events)
+        else:
+            await asyncio.to_thread(self.event_backend.send_events, events)
+
+    async def _metrics_loop(self):
+        """Periodically export metrics to the configured textfile"""
+        while self.running and config.metrics.textfile:
+            metrics.write_textfile(config.metrics.textfile)
+            await asyncio.sleep(config.metrics.interval)
+
+    async def _config_watch_loop(self):
+        """Reload the config file when its modification time changes"""
+        def mtime():
+            try:
+                return os.stat(self.args.config).st_mtime_ns
+            except OSError:
+                return None
+
+        last = mtime()
+        while self.running:
+            await asyncio.sleep(2)
+            current = mtime()
+            if current != last and current is not None:
+                last = current
+                await self.reload_config()
+
+    async def reload_config(self):
+        """
+        Re-read the config file and apply each change at the narrowest scope:
+        log level and intervals in place, a new uploader for backend/MQTT
+        changes, and a reconnect only when the inverter transport changed
+        """
+        async with self._reload_lock:
+            try:
+                new_config = load_config(self.args)
+            except (OSError, ValueError) as e:
+                metrics.inc('config_reload_errors_total')
+                logger.error(f"Config reload failed, keeping current settings: {e}")
+                return
+
+            changed = config.diff(new_config)
+            previous_profile = config.inverter.register_profile
+            deferred = changed & self.RESTART_SETTINGS
+            for name in deferred:
+                section, key = name.split('.')
+                setattr(getattr(new_config, section), key, getattr(getattr(config, section), key))
+            if deferred:
+                logger.warning(f"Config changes applied on next restart: {', '.join(sorted(deferred))}")
+            changed -= deferred
+
+            # The profile file may have changed even if the settings did not
+            config.inverter.register_profile = new_config.inverter.register_profile
+            try:
+                if self.inverter.reload_plan():
+                    logger.info(f"Register profile reloaded: '{self.inverter.plan.name}'")
+            except (OSError, ProfileError) as e:
+                config.inverter.register_profile = previous_profile
+                new_config.inverter.register_profile = previous_profile
+                changed.discard('inverter.register_profile')
+                logger.error(f"Register profile not reloaded, keeping current plan: {e}")
+
+            if not changed:
+                logger.info("Config reloaded: no changes to apply")
+                return
+
+            previous_base_url = config.backend.base_url
+            config.apply(new_config)
+            metrics.inc('config_reloads_total')
+            logger.info(f"Config reloaded: {', '.join(sorted(changed))}")
+
+            if 'logging.level' in changed:
+                set_log_level(config.logging.level)
+
+            if 'queue.max_size' in changed:
+                self.queue.max_size = config.queue.max_size
+
+            if 'profiling.interval' in changed and not self.profiler.running:
+                self.profiler.interval = config.profiling.interval
+
+            # Uploader: HTTP settings are read per request; a new session only
+            # drops keep-alive connections to a previous host
+            if config.backend.base_url != previous_base_url:
+                self._swap_backend_clients()
+            if 'backend.sink' in changed or any(name.startswith('mqtt.') for name in changed):
+                await self._swap_mqtt_client()
+            if any(name.startswith('sinks.') for name in changed):
+                await self.sinks.configure(config.sinks)
+
+            # Schedulers pick up new intervals without waiting out the old one
+            if 'inverter.poll_interval' in changed or any(name.startswith('adaptive.') for name in changed):
+                self._poll_wakeup.set()
+            if 'alarms.status_interval' in changed:
+                self._status_wakeup.set()
+            self._ensure_optional_tasks()
+
+            if changed & self.TRANSPORT_SETTINGS:
+                logger.warning("Inverter transport settings changed, reconnecting...")
+                if await self.inverter.reconnect():
+                    logger.info("Reconnected with the new transport settings")
+                else:
+                    logger.error("Reconnect failed; the polling loop will keep retrying")
+
+    def _swap_backend_clients(self):
+        old_clients = (self.backend, self.event_backend)
+        self.backend = BackendClient()
+        self.event_backend = BackendClient()
+        for client in old_clients:
+            client.close()
+        logger.info(f"Uploading to {config.backend.base_url}")
+
+    async def _swap_mqtt_client(self):
+        old_client, self.mqtt = self.mqtt, self._create_mqtt_client()
+        if old_client:
+            await old_client.close()
+        logger.info(f"Sink: {config.backend.sink}")
+
+    def start_profiling(self, window: int = 0):
+        """Start the sampling profiler, optionally for a fixed window"""
+        if self.profiler.running:
+            return
+        self.profiler.start(asyncio.get_running_loop())
+        if window > 0:
+            logger.info(f"Profiling for {window}s")
+            self._profile_timer = asyncio.get_running_loop().call_later(window, self.stop_profiling)
+
+    def stop_profiling(self):
+        """Stop the sampling profiler and write its output"""
+        if self._profile_timer:
+            self._profile_timer.cancel()
+            self._profile_timer = None
+        if not self.profiler.running:
+            return
+        self.profiler.stop()
+        try:
+            self.profiler.write(config.profiling.output_dir)
+        except OSError as e:
+            logger.error(f"Could not write profile: {e}")
+
+    def toggle_profiling(self):
+        """Switch profiling on or off (SIGUSR1)"""
+        if self.profiler.running:
+            self.stop_profiling()
+        else:
+            self.start_profiling(config.profiling.window)
+
     async def stop(self):
         """Stop the service gracefully"""
         logger.info("Stopping service...")
         self.running = False
+        self.stop_profiling()
 
-        if self.task:
-            self.task.cancel()
-            try:
-                await self.task
-            except asyncio.CancelledError:
-                pass
+        for task in self.tasks:
+            task.cancel()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        await self.sinks.close()
+
+        if config.queue.overflow_policy == 'spill':
+            self.queue.persist()
+        elif len(self.queue):
+            logger.warning(f"{len(self.queue)} samples were not uploaded")
+        if self.string_analytics:
+            self.string_analytics.save()
+        if not self.events.empty():
+            logger.warning(f"{self.events.qsize()} inverter events were not uploaded")
+        if self.uplink:
+            self.uplink.save_usage()
+            for device, size in sorted(self.uplink.usage_today().items()):
+                logger.info(f"Uplink today: {device} {size / 1e6:.2f} MB")
 
-        await self.inverter.disconnect()
+        if self.inverter:
+            await self.inverter.disconnect()
         self.backend.close()
+        self.event_backend.close()
+        if self.mqtt:
+            await self.mqtt.close()
 
         logger.info("Service stopped")
 
 
+class FleetService(InverterService):
+    """
+    Supervisor mode (--fleet)
+    Worker processes poll the inverters, one per serial bus or per group of
+    TCP devices; this process only uploads, through the same queue, sinks
+    and event lane as the single-inverter service
+    """
+
+    def __init__(self, args: argparse.Namespace, devices):
+        super().__init__(args)
+        self.supervisor = FleetSupervisor(devices, self._on_sample, self._on_events)
+
+    @staticmethod
+    def _create_inverter() -> Optional[InverterClient]:
+        # Inverters are owned by the workers
+        return None
+
+    async def start(self):
+        """Start the workers and the upload stages"""
+        logger.info("=" * 60)
+        logger.info("MTZ View - Huawei Inverter Service (fleet supervisor)")
+        logger.info("=" * 60)
+
+        if config.profiling.enabled_at_start:
+            self.start_profiling(config.profiling.window)
+
+        self.running = True
+        self._load_thresholds()
+        await self.sinks.configure(config.sinks)
+        self.tasks = [
+            asyncio.create_task(self._check_backend()),
+            asyncio.create_task(self._upload_loop()),
+            asyncio.create_task(self._event_loop()),
+        ]
+        self._ensure_optional_tasks()
+        await self.supervisor.start()
+
+        logger.info(f"Fleet started: {len(self.supervisor.workers)} worker processes")
+        logger.info(f"Upload queue: {config.queue.max_size} samples, "
+                    f"overflow policy '{config.queue.overflow_policy}'")
+        if config.backfill.enabled:
+            logger.info(f"Backfill: spilled backlog of {config.backfill.min_samples}+ samples "
+                        f"is bulk-uploaded from {config.backfill.directory}")
+        self._log_uplink()
+        logger.info("Press Ctrl+C to stop")
+
+    def _ensure_optional_tasks(self):
+        """Start the metrics, backfill and threshold loops if enabled (workers read status with bulk data)"""
+        if config.metrics.textfile and (self._metrics_task is None or self._metrics_task.done()):
+            self._metrics_task = asyncio.create_task(self._metrics_loop())
+            self.tasks.append(self._metrics_task)
+        self._ensure_backfill_task()
+        self._ensure_threshold_task()
+
+    def _on_sample(self, device: str, data):
+        # Per-device state is keyed by the fleet device name (the sample's device_id)
+        metrics.inc('samples_acquired_total')
+        self._enqueue(data)
+        self._check_thresholds(device, sample_values(data))
+        self._analyze_strings(device, data)
+
+    def _on_events(self, events):
+        self._queue_events(events)
+
+    async def reload_config(self):
+        """Workers own a copy of the configuration: restart to apply changes"""
+        logger.warning("Config reload is not supported in fleet mode; restart the service to apply changes")
+
+    async def stop(self):
+        """Stop the workers first, so their last samples reach the queue"""
+        logger.info("Stopping workers...")
+        await self.supervisor.stop()
+        await super().stop()
+
+
 # Global service instance
 service: Optional[InverterService] = None
 
@@ -250,33 +1417,153 @@ def signal_handler(sig, frame):
         asyncio.create_task(service.stop())
 
 
-def show_configuration():
+def reload_signal_handler(sig, frame):
+    """Reload the config file (SIGHUP)"""
+    if not service:
+        return
+    if not service.args.config:
+        logger.warning("SIGHUP received but no --config file is set; nothing to reload")
+        return
+    logger.info("Received SIGHUP, reloading configuration...")
+    asyncio.create_task(service.reload_config())
+
+
+def profile_signal_handler(sig, frame):
+    """Toggle profiling (SIGUSR1)"""
+    if service:
+        service.toggle_profiling()
+
+
+def show_configuration(args: argparse.Namespace):
     """Display current configuration"""
     print("=" * 70)
     print("MTZ View - Huawei Inverter Service - Configuration")
     print("=" * 70)
     print()
+    if args.config:
+        print("Config File:")
+        print(f"  Path:           {args.config}")
+        print(f"  Reload:         SIGHUP{' + file watch' if args.watch_config else ''}")
+        print()
     print("Inverter Connection:")
     print(f"  Type:           {config.inverter.connection_type.upper()}")
     if config.inverter.connection_type == 'rtu':
         print(f"  Serial Port:    {config.inverter.serial_port}")
         print(f"  Baudrate:       {config.inverter.baudrate}")
         print(f"  Slave ID:       {config.inverter.slave_id}")
+    elif config.inverter.connection_type == 'replay':
+        print(f"  Capture:        {config.inverter.replay_file}")
+        print(f"  Speed:          {'recorded' if config.inverter.replay_realtime else 'as fast as possible'}")
     else:
         print(f"  TCP Host:       {config.inverter.tcp_host}")
         print(f"  TCP Port:       {config.inverter.tcp_port}")
+    if config.inverter.capture_file:
+        print(f"  Recording To:   {config.inverter.capture_file}")
     print(f"  Poll Interval:  {config.inverter.poll_interval}s")
+    if config.adaptive.enabled:
+        print(f"  Adaptive:       {config.adaptive.min_interval:g}s to {config.adaptive.max_interval:g}s "
+              f"(fast above {config.adaptive.power_rate_threshold:g} W/s)")
+    print(f"  Registers:      {config.inverter.register_profile or 'register_profiles/sun2000.json'}")
+    print(f"  Block decoding: {'Enabled' if config.inverter.fast_decode else 'Disabled'}")
+    if config.inverter.discovery_cache:
+        print(f"  Device Cache:   {config.inverter.discovery_cache_path}")
+    else:
+        print("  Device Cache:   disabled")
     print()
-    print("Backend:")
-    print(f"  URL:            {config.backend.base_url}")
-    print(f"  Endpoint:       {config.backend.telemetry_endpoint}")
+    if config.backend.sink == 'mqtt':
+        print("MQTT Sink:")
+        print(f"  Broker:         {config.mqtt.host}:{config.mqtt.port}")
+        print(f"  Topic Prefix:   {config.mqtt.topic_prefix}")
+        print(f"  Client ID:      {config.mqtt.client_id or 'mtz-inverter-<hostname>'}")
+        print(f"  QoS:            {config.mqtt.qos}")
+    else:
+        print("Backend:")
+        print(f"  URL:            {config.backend.base_url}")
+        print(f"  Endpoint:       {config.backend.telemetry_endpoint}")
     print(f"  Timeout:        {config.backend.timeout}s")
+    print(f"  In Flight:      {config.backend.max_in_flight}")
+    print()
+    if config.fleet.devices_file:
+        print("Fleet:")
+        print(f"  Devices File:   {config.fleet.devices_file}")
+        print(f"  TCP per Worker: {config.fleet.devices_per_worker}")
+        print()
+    print("Alarm Fast Lane:")
+    if config.alarms.status_interval > 0:
+        print(f"  Status Every:   {config.alarms.status_interval}s")
+        if config.backend.sink == 'mqtt':
+            print(f"  Events:         {config.mqtt.topic_prefix}/<device_id>/events")
+        else:
+            print(f"  Events:         {config.backend.events_endpoint}")
+    else:
+        print("  Status Every:   with bulk data (fast lane off)")
+    if config.alarms.thresholds:
+        print(f"  Thresholds:     {config.backend.alert_preferences_endpoint} every "
+              f"{config.alarms.threshold_sync_interval:g}s (cache {config.alarms.threshold_cache_path})")
+    else:
+        print("  Thresholds:     disabled")
+    if config.strings.enabled:
+        print(f"  PV Strings:     window of {config.strings.window} samples, mismatch "
+              f"{config.strings.mismatch:.0%}, efficiency < {config.strings.min_efficiency:.0%}, "
+              f"trends {config.strings.trend_days} days")
+    print()
+    print("Upload Queue:")
+    print(f"  Size:           {config.queue.max_size}")
+    print(f"  Policy:         {config.queue.overflow_policy}")
+    if config.queue.overflow_policy == 'spill':
+        print(f"  Spill Dir:      {config.queue.spill_dir}")
+    if config.backfill.enabled:
+        print(f"  Backfill:       {config.backfill.min_samples}+ spilled samples -> "
+              f"{config.backend.backfill_endpoint} (via {config.backfill.directory})")
+    if config.uplink.enabled:
+        budget = f"{config.uplink.daily_budget_mb:g} MB/day" if config.uplink.daily_budget_mb > 0 else "no limit"
+        print(f"  Uplink:         {config.backend.telemetry_batch_endpoint}, {budget}, "
+              f"{config.uplink.min_batch}-{config.uplink.max_batch} records per request, "
+              f"rollup up to {config.uplink.max_rollup}")
+    if config.metrics.textfile:
+        print(f"  Metrics File:   {config.metrics.textfile}")
+    print()
+    if config.sinks.targets:
+        print("Extra Sinks:")
+        for target in config.sinks.targets:
+            where = target.get('path') if target.get('type') == 'file' else target.get('url')
+            policy = target.get('overflow_policy', config.sinks.overflow_policy)
+            size = target.get('queue_size', config.sinks.queue_size)
+            print(f"  {target['name'] + ':':<15} {target.get('type')} {where} (queue {size}, {policy})")
+        print()
+    print("Profiling:")
+    if config.profiling.enabled_at_start:
+        window = f"{config.profiling.window}s" if config.profiling.window else "until SIGUSR1"
+        print(f"  At Start:       {window}")
+    else:
+        print("  At Start:       off (toggle with SIGUSR1)")
+    print(f"  Output Dir:     {config.profiling.output_dir}")
     print()
     print("Logging:")
     print(f"  Level:          {config.logging.level}")
+    print(f"  Output:         {config.logging.output}")
+    if config.logging.rate_limit_window > 0:
+        print(f"  Rate Limit:     repeats once per {config.logging.rate_limit_window:g}s")
     print("=" * 70)
 
 
+def show_uplink_usage():
+    """Display uplink bytes per day and device"""
+    rows = UplinkController(config.uplink).report()
+    if not rows:
+        print(f"No uplink usage recorded in {config.uplink.usage_file}")
+        return
+    budget = config.uplink.daily_budget_mb
+    print(f"  {'day':<10} {'device':<28} {'MB':>8}")
+    totals = {}
+    for day, device, size in rows:
+        totals[day] = totals.get(day, 0) + size
+        print(f"  {day:<10} {device:<28} {size / 1e6:8.2f}")
+    for day, size in totals.items():
+        share = f" ({size / 1e6 / budget:.0%} of {budget:g} MB)" if budget > 0 else ""
+        print(f"  {day:<10} {'total':<28} {size / 1e6:8.2f}{share}")
+
+
 async def main():
     """Main entry point"""
     global service, logger
@@ -284,23 +1571,45 @@ async def main():
     # Parse command-line arguments
     args = parse_arguments()
 
-    # Update configuration from arguments
-    config.update_from_args(args)
+    # Build configuration from the config file and arguments
+    try:
+        config.apply(load_config(args))
+    except (OSError, ValueError) as e:
+        print(f"Invalid configuration: {e}", file=sys.stderr)
+        return 1
 
     # Initialize logger after config is updated
     logger = setup_logger(__name__)
 
     # Show configuration if requested
     if args.show_config:
-        show_configuration()
+        show_configuration(args)
+        return 0
+
+    if args.uplink_usage:
+        show_uplink_usage()
         return 0
 
+    devices = None
+    if config.fleet.devices_file:
+        try:
+            devices = load_fleet(config.fleet.devices_file, config.inverter)
+            shard_devices(devices, config.fleet.devices_per_worker)
+        except (OSError, ValueError) as e:
+            print(f"Invalid fleet file: {e}", file=sys.stderr)
+            return 1
+
     # Setup signal handlers
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
+    signal.signal(signal.SIGUSR1, profile_signal_handler)
+    signal.signal(signal.SIGHUP, reload_signal_handler)
 
     try:
-        service = InverterService()
+        if devices:
+            service = FleetService(args, devices)
+        else:
+            service = InverterService(args)
         await service.start()
 
         # Keep running until stopped
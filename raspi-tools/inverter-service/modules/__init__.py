@@ -1,5 +1,11 @@
 """Modules package"""
 from .inverter_client import InverterClient
 from .backend_client import BackendClient
+from .sample_queue import SampleQueue, SampleSequencer
+from .device_cache import DeviceCache
+from .alarm_monitor import AlarmMonitor
+from .threshold_monitor import ThresholdMonitor
+from .poll_policy import AdaptivePollPolicy
 
-__all__ = ['InverterClient', 'BackendClient']
+__all__ = ['InverterClient', 'BackendClient', 'SampleQueue', 'SampleSequencer', 'DeviceCache', 'AlarmMonitor',
+           'ThresholdMonitor', 'AdaptivePollPolicy']
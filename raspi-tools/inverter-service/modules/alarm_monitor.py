@@ -0,0 +1,130 @@
+"""
+Alarm Monitor Module
+Decodes device status and alarm bitfields into named events on the edge
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from huawei_solar import register_names as rn
+
+logger = logging.getLogger(__name__)
+
+ALARM_REGISTERS = (rn.ALARM_1, rn.ALARM_2, rn.ALARM_3)
+
+# (register, code, name, level)
+AlarmKey = Tuple[str, int, str, str]
+
+
+class AlarmMonitor:
+    """
+    Tracks DEVICE_STATUS and ALARM_1..3 and reports transitions
+    huawei_solar decodes the alarm bitfields into Alarm(name, id, level)
+    tuples; raw integers (undecoded registers) are split per bit instead.
+    Only changes produce events, so a steady state costs no uplink traffic.
+    """
+
+    def __init__(self, device_id: Optional[str] = None):
+        self.device_id = device_id
+        self.device_status: Optional[str] = None
+        self.active_alarms: Dict[AlarmKey, datetime] = {}
+        self.initialized = False
+
+    @staticmethod
+    def decode_alarms(register: str, value: Any) -> List[AlarmKey]:
+        """Decode one alarm register value into (register, code, name, level) tuples"""
+        if value is None:
+            return []
+
+        if isinstance(value, int):
+            # Undecoded bitfield: one entry per set bit
+            return [
+                (register, bit, f"{register} bit {bit}", 'Unknown')
+                for bit in range(16) if value & (1 << bit)
+            ]
+
+        alarms = []
+        for alarm in value:
+            name = getattr(alarm, 'name', str(alarm))
+            code = getattr(alarm, 'id', 0)
+            level = getattr(alarm, 'level', 'Unknown')
+            alarms.append((register, code, name, level))
+        return alarms
+
+    @staticmethod
+    def decode_status(value: Any) -> Optional[str]:
+        """Device status as text (huawei_solar maps status codes to names)"""
+        if value is None:
+            return None
+        return str(value)
+
+    def update(self, status_results: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Feed the status registers (raw batch_update results or the
+        formatted 'status' block of a bulk sample)
+        Returns the list of transition events since the previous update
+        """
+        now = datetime.now()
+        timestamp = now.isoformat()
+        events = []
+
+        status = self.decode_status(self._value(status_results, rn.DEVICE_STATUS))
+        current: Dict[AlarmKey, datetime] = {}
+        for register in ALARM_REGISTERS:
+            if register in status_results:
+                for key in self.decode_alarms(register, self._value(status_results, register)):
+                    current[key] = self.active_alarms.get(key, now)
+            else:
+                # Register not read this time: keep its known alarms
+                for key, since in self.active_alarms.items():
+                    if key[0] == register:
+                        current[key] = since
+
+        if not self.initialized:
+            # First reading: report what is already active as raised
+            self.initialized = True
+            if status is not None:
+                events.append(self._event('status', timestamp, current=status))
+            for key in current:
+                events.append(self._alarm_event('alarm_raised', key, timestamp))
+        else:
+            if status is not None and status != self.device_status:
+                events.append(self._event('status_changed', timestamp,
+                                          previous=self.device_status, current=status))
+            for key in current.keys() - self.active_alarms.keys():
+                events.append(self._alarm_event('alarm_raised', key, timestamp))
+            for key in self.active_alarms.keys() - current.keys():
+                events.append(self._alarm_event('alarm_cleared', key, timestamp,
+                                                since=self.active_alarms[key].isoformat()))
+
+        if status is not None:
+            self.device_status = status
+        self.active_alarms = current
+
+        for event in events:
+            log = logger.warning if event['event'] == 'alarm_raised' else logger.info
+            log(f"Inverter event: {event['event']} {event.get('name') or event.get('current')}")
+
+        return events
+
+    @staticmethod
+    def _value(results: Dict[str, Any], register: str) -> Any:
+        """Value from a Result object or a formatted {'value', 'unit'} dict"""
+        result = results.get(register)
+        if isinstance(result, dict):
+            return result.get('value')
+        return getattr(result, 'value', result)
+
+    def _event(self, kind: str, timestamp: str, **fields) -> Dict[str, Any]:
+        event = {
+            'device_id': self.device_id,
+            'event': kind,
+            'timestamp': timestamp,
+        }
+        event.update(fields)
+        return event
+
+    def _alarm_event(self, kind: str, key: AlarmKey, timestamp: str, **fields) -> Dict[str, Any]:
+        register, code, name, level = key
+        return self._event(kind, timestamp, register=register, code=code,
+                           name=name, level=level, **fields)
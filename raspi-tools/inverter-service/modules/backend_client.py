@@ -4,10 +4,11 @@ Handles communication with MTZ View backend
 """
 import logging
 import requests
-from typing import Dict, Any
+from typing import Dict, Any, List
 from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
 
 from config import config
+from .sample_record import as_dict
 
 logger = logging.getLogger(__name__)
 
@@ -37,35 +38,109 @@ class BackendClient:
         Includes automatic retry on failure
         """
         try:
-            logger.debug(f"Sending telemetry to {config.backend.telemetry_url}")
+            logger.debug("Sending telemetry to %s", config.backend.telemetry_url)
 
             response = self.session.post(
                 config.backend.telemetry_url,
-                json=data,
+                json=as_dict(data),
                 timeout=config.backend.timeout
             )
 
             response.raise_for_status()
 
-            logger.info(f"Telemetry sent successfully. Status: {response.status_code}")
+            logger.debug("Telemetry sent successfully. Status: %s", response.status_code)
             return True
 
         except requests.exceptions.Timeout:
-            logger.error(f"Timeout sending telemetry to backend")
+            logger.error("Timeout sending telemetry to backend")
             raise
 
         except requests.exceptions.ConnectionError as e:
-            logger.error(f"Connection error to backend: {e}")
+            logger.error("Connection error to backend: %s", e)
             raise
 
         except requests.exceptions.HTTPError as e:
-            logger.error(f"HTTP error from backend: {e.response.status_code} - {e.response.text}")
+            logger.error("HTTP error from backend: %s - %s", e.response.status_code, e.response.text)
             raise
 
         except Exception as e:
-            logger.error(f"Unexpected error sending telemetry: {e}")
+            logger.error("Unexpected error sending telemetry: %s", e)
             raise
 
+    def send_telemetry_batch(self, body: bytes) -> bool:
+        """
+        Send a gzip-compressed batch of samples ({"samples": [...]}, --uplink)
+        Single attempt: the caller retries and accounts the bytes sent
+        """
+        logger.debug("Sending %d-byte batch to %s", len(body), config.backend.telemetry_batch_url)
+        response = self.session.post(
+            config.backend.telemetry_batch_url,
+            data=body,
+            headers={'Content-Encoding': 'gzip'},
+            timeout=config.backend.timeout
+        )
+        response.raise_for_status()
+        return True
+
+    def send_events(self, events: List[Dict[str, Any]]) -> bool:
+        """
+        Send alarm/status transition events to backend
+        Single attempt: the caller retries so newer events are never held
+        behind tenacity's fixed waits
+        """
+        try:
+            logger.debug("Sending %d events to %s", len(events), config.backend.events_url)
+
+            response = self.session.post(
+                config.backend.events_url,
+                json={'events': events},
+                timeout=config.backend.timeout
+            )
+
+            response.raise_for_status()
+
+            logger.info("%d events sent. Status: %s", len(events), response.status_code)
+            return True
+
+        except requests.exceptions.HTTPError as e:
+            logger.error("HTTP error from backend: %s - %s", e.response.status_code, e.response.text)
+            raise
+
+        except requests.RequestException as e:
+            logger.error("Error sending events to backend: %s", e)
+            raise
+
+    def send_backfill(self, path: str, media_type: str) -> int:
+        """
+        Upload one exported backfill file (gzip-compressed body)
+        Single attempt: the file stays on disk until a later try succeeds
+        Returns the number of rows the backend loaded
+        """
+        with open(path, 'rb') as f:
+            body = f.read()
+
+        logger.debug("Sending backfill %s (%d bytes) to %s", path, len(body), config.backend.backfill_url)
+        response = self.session.post(
+            config.backend.backfill_url,
+            data=body,
+            headers={'Content-Type': media_type, 'Content-Encoding': 'gzip'},
+            timeout=config.backfill.upload_timeout
+        )
+        response.raise_for_status()
+        return int(response.json().get('rows', 0))
+
+    def get_alert_preferences(self) -> List[Dict[str, Any]]:
+        """
+        Active alert thresholds (alert_preferences rows), for edge evaluation
+        Single attempt: the caller keeps its cached rules until the next sync
+        """
+        response = self.session.get(config.backend.alert_preferences_url, timeout=config.backend.timeout)
+        response.raise_for_status()
+        preferences = response.json()
+        if not isinstance(preferences, list):
+            raise ValueError(f"Unexpected alert preferences response: {type(preferences).__name__}")
+        return preferences
+
     def ping(self) -> bool:
         """
         Check if backend is reachable
@@ -77,7 +152,7 @@ class BackendClient:
             )
             return response.status_code == 200
         except Exception as e:
-            logger.debug(f"Backend ping failed: {e}")
+            logger.debug("Backend ping failed: %s", e)
             return False
 
     def close(self):
@@ -0,0 +1,203 @@
+"""
+Backfill Module
+Exports the spilled backlog as compressed columnar files for bulk loading
+"""
+import json
+import logging
+import re
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+# Arrow IPC stream, gzip-compressed as a whole (sent with Content-Encoding: gzip)
+MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+FILE_SUFFIX = '.arrows.gz'
+
+# inverter_telemetry column -> (sample field, register); same mapping as the
+# backend's per-sample insert
+TELEMETRY_COLUMNS = {
+    'input_power': ('power', 'input_power'),
+    'active_power': ('power', 'active_power'),
+    'reactive_power': ('power', 'reactive_power'),
+    'power_factor': ('power', 'power_factor'),
+    'line_voltage_ab': ('voltage_current', 'line_voltage_A_B'),
+    'line_voltage_bc': ('voltage_current', 'line_voltage_B_C'),
+    'line_voltage_ca': ('voltage_current', 'line_voltage_C_A'),
+    'phase_a_voltage': ('voltage_current', 'phase_A_voltage'),
+    'phase_b_voltage': ('voltage_current', 'phase_B_voltage'),
+    'phase_c_voltage': ('voltage_current', 'phase_C_voltage'),
+    'phase_a_current': ('voltage_current', 'phase_A_current'),
+    'phase_b_current': ('voltage_current', 'phase_B_current'),
+    'phase_c_current': ('voltage_current', 'phase_C_current'),
+    'daily_yield_energy': ('energy', 'daily_yield_energy'),
+    'accumulated_yield_energy': ('energy', 'accumulated_yield_energy'),
+    'internal_temperature': ('temperature', 'internal_temperature'),
+    'grid_frequency': ('grid', 'grid_frequency'),
+    'device_status': ('status', 'device_status'),
+    'alarm_1': ('status', 'alarm_1'),
+    'alarm_2': ('status', 'alarm_2'),
+    'alarm_3': ('status', 'alarm_3'),
+}
+
+# Columns stored as text or int64; the others are float64
+TEXT_COLUMNS = ('device_id', 'timestamp', 'device_status', 'alarm_1', 'alarm_2', 'alarm_3',
+                'connection_type', 'data_quality', 'read_timestamp', 'boot_id')
+INTEGER_COLUMNS = ('sequence',)
+METADATA_COLUMNS = ('connection_type', 'data_quality', 'read_timestamp', 'boot_id', 'sequence')
+
+# pv_strings_data columns (pv_01_voltage .. pv_24_current)
+PV_STRING_COUNT = 24
+PV_COLUMNS = tuple(f"pv_{i:02d}_{kind}" for i in range(1, PV_STRING_COUNT + 1)
+                   for kind in ('voltage', 'current'))
+
+COLUMNS = ('device_id', 'timestamp') + tuple(TELEMETRY_COLUMNS) + METADATA_COLUMNS + PV_COLUMNS
+
+_DAY = re.compile(r'^\d{4}-\d{2}-\d{2}')
+_UNSAFE = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def _value(sample: Dict[str, Any], field: str, register: str) -> Any:
+    entry = (sample.get(field) or {}).get(register)
+    return entry.get('value') if isinstance(entry, dict) else None
+
+
+def flatten(sample: Dict[str, Any]) -> Dict[str, Any]:
+    """One table row from a telemetry sample (missing registers are None)"""
+    row = {'device_id': _text(sample.get('device_id')), 'timestamp': _text(sample.get('timestamp'))}
+    for column, (field, register) in TELEMETRY_COLUMNS.items():
+        value = _value(sample, field, register)
+        row[column] = _text(value) if column in TEXT_COLUMNS else _number(value)
+    metadata = sample.get('metadata') or {}
+    for column in METADATA_COLUMNS:
+        value = metadata.get(column)
+        if column in INTEGER_COLUMNS:
+            row[column] = int(value) if _number(value) is not None else None
+        else:
+            row[column] = _text(value)
+    pv_strings = sample.get('pv_strings') or {}
+    for column in PV_COLUMNS:
+        if column in pv_strings:
+            row[column] = _number(_value(sample, 'pv_strings', column))
+    return row
+
+
+def _read_spool(spool_path: Path):
+    """Samples of a spool file, starting at its .offset (if any)"""
+    offset_path = spool_path.with_suffix('.offset')
+    try:
+        offset = int(offset_path.read_text().strip() or 0)
+    except (OSError, ValueError):
+        offset = 0
+
+    corrupt = 0
+    with open(spool_path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                corrupt += 1
+    if corrupt:
+        logger.warning(f"Skipped {corrupt} corrupt lines in {spool_path}")
+
+
+def _write_table(path: Path, columns: Dict[str, List[Any]]):
+    """Write one Arrow IPC stream file, gzip-compressed, atomically"""
+    def column_type(name):
+        if name in TEXT_COLUMNS:
+            return pa.string()
+        return pa.int64() if name in INTEGER_COLUMNS else pa.float64()
+
+    schema = pa.schema([(name, column_type(name)) for name in COLUMNS if name in columns])
+    table = pa.table({name: columns[name] for name in schema.names}, schema=schema)
+
+    tmp_path = path.with_name(path.name + '.tmp')
+    with pa.CompressedOutputStream(str(tmp_path), 'gzip') as sink:
+        with pa.ipc.new_stream(sink, schema) as writer:
+            writer.write_table(table)
+    tmp_path.replace(path)
+
+
+def export_spool(spool_path: Path, out_dir: Path) -> List[Tuple[Path, int]]:
+    """
+    Split a spool file into one columnar file per device and day
+    Returns (file, rows) for each file written; the spool file is left in place
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    groups: Dict[Tuple[str, str], Dict[str, List[Any]]] = {}
+    counts: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    for sample in _read_spool(spool_path):
+        if not isinstance(sample, dict) or not sample.get('device_id') or not sample.get('timestamp'):
+            continue
+        row = flatten(sample)
+        match = _DAY.match(row['timestamp'])
+        key = (row['device_id'], match.group(0) if match else 'unknown')
+
+        columns = groups.setdefault(key, {})
+        rows = counts[key]
+        # PV columns appear with the first sample that has them
+        for name in row.keys() - columns.keys():
+            columns[name] = [None] * rows
+        for name, values in columns.items():
+            values.append(row.get(name))
+        counts[key] = rows + 1
+
+    written = []
+    stamp = int(time.time() * 1000)
+    for (device_id, day), columns in sorted(groups.items()):
+        path = out_dir / f"{_UNSAFE.sub('_', device_id)}_{day}_{stamp}{FILE_SUFFIX}"
+        _write_table(path, columns)
+        written.append((path, counts[(device_id, day)]))
+        logger.info(f"Exported {counts[(device_id, day)]} samples of {device_id} ({day}) to {path.name}")
+    return written
+
+
+def read_samples(path: Path) -> List[Dict[str, Any]]:
+    """
+    Samples of an exported file in the upload form, for the per-sample path
+    when the backend rejects the file (units are not kept in the export)
+    """
+    with pa.CompressedInputStream(str(path), 'gzip') as source:
+        table = pa.ipc.open_stream(source).read_all()
+
+    samples = []
+    for row in table.to_pylist():
+        sample: Dict[str, Any] = {'device_id': row.get('device_id'), 'timestamp': row.get('timestamp')}
+        for column, (field, register) in TELEMETRY_COLUMNS.items():
+            if row.get(column) is not None:
+                sample.setdefault(field, {})[register] = {'value': row[column], 'unit': None}
+        for column in PV_COLUMNS:
+            if row.get(column) is not None:
+                sample.setdefault('pv_strings', {})[column] = {'value': row[column], 'unit': None}
+        sample['metadata'] = {column: row[column] for column in METADATA_COLUMNS if row.get(column) is not None}
+        samples.append(sample)
+    return samples
+
+
+def pending_files(out_dir: Path) -> List[Path]:
+    """Exported files not uploaded yet, oldest day first"""
+    if not out_dir.exists():
+        return []
+    return sorted(out_dir.glob(f"*{FILE_SUFFIX}"), key=lambda path: (path.name.rsplit('_', 2)[-2], path.name))
@@ -0,0 +1,58 @@
+"""
+Device Cache Module
+Persists discovered device profiles so restarts can start polling at once
+"""
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from utils.files import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceCache:
+    """
+    JSON file of device profiles keyed by connection
+    ('rtu:/dev/ttyUSB0:1' or 'tcp:192.168.1.100:502:1')
+    A profile holds the identity read at discovery: model, serial number
+    and the static info returned by get_device_info()
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    @staticmethod
+    def key_for(connection_type: str, serial_port: str, slave_id: int,
+                tcp_host: Optional[str], tcp_port: int) -> str:
+        """Cache key for a connection"""
+        if connection_type == 'tcp':
+            return f"tcp:{tcp_host}:{tcp_port}:{slave_id}"
+        return f"rtu:{serial_port}:{slave_id}"
+
+    def _read_all(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable device cache {self.path}: {e}")
+            return {}
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached profile for a connection, or None"""
+        return self._read_all().get(key)
+
+    def save(self, key: str, profile: Dict[str, Any]):
+        """Store a profile (atomic write)"""
+        profiles = self._read_all()
+        profiles[key] = dict(profile, cached_at=datetime.now().isoformat())
+
+        try:
+            write_json_atomic(self.path, profiles, indent=2, default=str)
+            logger.debug(f"Device profile cached for {key}")
+        except OSError as e:
+            logger.warning(f"Could not write device cache {self.path}: {e}")
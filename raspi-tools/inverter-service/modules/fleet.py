@@ -0,0 +1,370 @@
+"""
+Fleet Module
+Splits many inverters across worker processes and supervises them
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import queue
+import signal
+import time
+from dataclasses import dataclass, fields, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from config import config, InverterConfig, ServiceConfig
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Spawned workers start from a clean interpreter (no inherited event loop,
+# threads or sockets from the supervisor)
+_mp = multiprocessing.get_context('spawn')
+
+
+@dataclass
+class FleetDevice:
+    """One inverter of the fleet"""
+    name: str
+    settings: InverterConfig
+
+    @property
+    def bus(self) -> str:
+        """Serial port for RTU devices, host:port for TCP devices"""
+        if self.settings.connection_type == 'rtu':
+            return self.settings.serial_port
+        if self.settings.connection_type == 'replay':
+            return f"replay:{self.settings.replay_file}"
+        return f"{self.settings.tcp_host}:{self.settings.tcp_port}"
+
+
+def load_fleet(path: str, defaults: InverterConfig) -> List[FleetDevice]:
+    """
+    Read the device list
+    Format: {"devices": [{"name": "inv1", "serial_port": "/dev/ttyUSB0"},
+                         {"name": "inv2", "tcp_host": "192.168.1.10", "slave_id": 2}]}
+    Each entry overrides the inverter section; tcp_host switches to TCP
+    """
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    entries = data.get('devices') if isinstance(data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path}: expected an object with a non-empty 'devices' list")
+
+    names = {f.name for f in fields(InverterConfig)}
+    devices = []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError(f"{path}: device #{index + 1} must be an object")
+        entry = dict(entry)
+        name = str(entry.pop('name', f"inverter{index + 1}"))
+        unknown = set(entry) - names
+        if unknown:
+            raise ValueError(f"{path}: device '{name}': unknown option(s) {', '.join(sorted(unknown))}")
+        if entry.get('tcp_host') and 'connection_type' not in entry:
+            entry['connection_type'] = 'tcp'
+        settings = replace(defaults, **entry)
+        if settings.capture_file and 'capture_file' not in entry:
+            # One capture per device: workers cannot share a file
+            capture = Path(settings.capture_file)
+            settings.capture_file = str(capture.with_name(f"{capture.stem}-{name}{capture.suffix}"))
+        if settings.connection_type not in ('rtu', 'tcp', 'replay'):
+            raise ValueError(f"{path}: device '{name}': invalid connection type {settings.connection_type}")
+        if settings.connection_type == 'tcp' and not settings.tcp_host:
+            raise ValueError(f"{path}: device '{name}': tcp_host is required for TCP devices")
+        if settings.connection_type == 'replay' and not settings.replay_file:
+            raise ValueError(f"{path}: device '{name}': replay_file is required for replay devices")
+        if any(device.name == name for device in devices):
+            raise ValueError(f"{path}: duplicate device name '{name}'")
+        devices.append(FleetDevice(name, settings))
+    return devices
+
+
+def shard_devices(devices: List[FleetDevice], devices_per_worker: int) -> List[List[FleetDevice]]:
+    """
+    Group devices into worker shards
+    RTU devices get one worker per serial port (a port can only be opened
+    once); TCP and replay devices are packed devices_per_worker to a worker
+    """
+    by_port: Dict[str, FleetDevice] = {}
+    tcp_devices = []
+    for device in devices:
+        if device.settings.connection_type != 'rtu':
+            tcp_devices.append(device)
+            continue
+        other = by_port.get(device.bus)
+        if other is not None:
+            raise ValueError(
+                f"Devices '{other.name}' and '{device.name}' share {device.bus}: run gateway.py on "
+                f"that port and list them as TCP devices on the gateway, with their slave_id"
+            )
+        by_port[device.bus] = device
+
+    shards = [[device] for device in by_port.values()]
+    for start in range(0, len(tcp_devices), devices_per_worker):
+        shards.append(tcp_devices[start:start + devices_per_worker])
+    return shards
+
+
+# ----------------------------------------------------------------------
+# Worker process
+# ----------------------------------------------------------------------
+
+def run_worker(index: int, devices: List[FleetDevice], service_config: ServiceConfig,
+               channel, stop_event):
+    """Worker process entry point: acquire a shard and send samples to the supervisor"""
+    # Shutdown is coordinated by the supervisor through stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda sig, frame: stop_event.set())
+
+    config.apply(service_config)
+
+    from utils import setup_logger
+    setup_logger(__name__)
+
+    try:
+        asyncio.run(_worker_main(index, devices, channel, stop_event))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker_main(index: int, devices: List[FleetDevice], channel, stop_event):
+    tasks = [asyncio.create_task(_device_loop(index, device, channel)) for device in devices]
+    logger.info(f"Worker {index} (pid {multiprocessing.current_process().pid}) acquiring "
+                f"{', '.join(device.name for device in devices)}")
+
+    while not stop_event.is_set():
+        await asyncio.sleep(0.5)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _device_loop(index: int, device: FleetDevice, channel):
+    """
+    Acquisition loop of one device
+    Same fixed-rate schedule and reconnect policy as the single-inverter
+    polling loop; status and alarms are read with the bulk data
+    """
+    # Imported in the worker only: the supervisor never talks Modbus
+    from .alarm_monitor import AlarmMonitor
+    from .device_cache import DeviceCache
+    from .inverter_client import InverterClient
+    from .poll_policy import AdaptivePollPolicy
+
+    settings = device.settings
+    cache = DeviceCache(settings.discovery_cache_path) if settings.discovery_cache else None
+    # The name is unique in the fleet; the model name is not
+    inverter = InverterClient(cache=cache, settings=settings, device_id=device.name)
+    alarm_monitor = AlarmMonitor()
+    poll_policy = AdaptivePollPolicy(config.adaptive)
+    loop = asyncio.get_running_loop()
+
+    try:
+        while not await inverter.connect():
+            logger.error("[%s] Failed to connect. Retrying in 30 seconds...", device.name)
+            await asyncio.sleep(30)
+
+        consecutive_errors = 0
+        next_poll = loop.time()
+        while True:
+            try:
+                started = loop.time()
+                data = await inverter.read_all_data()
+                consecutive_errors = 0
+
+                alarm_monitor.device_id = inverter.device_id
+                events = alarm_monitor.update(data['status'])
+
+                channel.put(('sample', device.name, index, loop.time() - started, data))
+                if events:
+                    channel.put(('events', device.name, index, 0.0, events))
+
+                if config.adaptive.enabled:
+                    next_poll += poll_policy.next_interval(settings.poll_interval, data)
+                else:
+                    next_poll += settings.poll_interval
+                delay = next_poll - loop.time()
+                if delay < 0:
+                    logger.warning("[%s] Polling fell behind schedule by %.1fs", device.name, -delay)
+                    next_poll = loop.time()
+                    delay = 0
+                await asyncio.sleep(delay)
+
+            except asyncio.CancelledError:
+                raise
+
+            except Exception as e:
+                consecutive_errors += 1
+                channel.put(('error', device.name, index, 0.0, str(e)))
+                logger.error("[%s] Read error (attempt %d): %s", device.name, consecutive_errors, e)
+
+                if consecutive_errors >= 5:
+                    logger.critical(f"[{device.name}] Too many consecutive errors. Reconnecting...")
+                    await asyncio.sleep(10)
+                    if await inverter.reconnect():
+                        consecutive_errors = 0
+                    else:
+                        await asyncio.sleep(60)
+                else:
+                    await asyncio.sleep(settings.retry_delay)
+                next_poll = loop.time()
+    finally:
+        await inverter.disconnect()
+
+
+# ----------------------------------------------------------------------
+# Supervisor
+# ----------------------------------------------------------------------
+
+class _Worker:
+    """Supervisor-side state of one worker process"""
+
+    def __init__(self, index: int, devices: List[FleetDevice]):
+        self.index = index
+        self.devices = devices
+        self.process: Optional[multiprocessing.Process] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.restart_at: Optional[float] = None
+
+
+class FleetSupervisor:
+    """
+    Runs one worker process per shard and restarts crashed workers
+    Workers do all Modbus I/O and decoding; samples and events come back
+    over a multiprocessing queue (a pipe) and are handed to on_sample (with
+    the device name) and on_events in the supervisor's event loop, which
+    does the uploading
+    """
+
+    # A worker that ran this long before dying gets its backoff reset
+    STABLE_AFTER = 300.0
+
+    def __init__(self, devices: List[FleetDevice],
+                 on_sample: Callable[[str, Any], None],
+                 on_events: Callable[[List[Dict[str, Any]]], None]):
+        self.workers = [
+            _Worker(index, shard)
+            for index, shard in enumerate(shard_devices(devices, config.fleet.devices_per_worker))
+        ]
+        self.on_sample = on_sample
+        self.on_events = on_events
+        self.channel = _mp.Queue(maxsize=10000)
+        self.stop_event = _mp.Event()
+        self.running = False
+        self._tasks: List[asyncio.Task] = []
+
+        metrics.describe('fleet_workers_alive', 'Worker processes currently running')
+        metrics.describe('fleet_worker_restarts_total', 'Worker processes restarted after exiting')
+        metrics.describe('fleet_samples_total', 'Samples received from workers')
+
+    def _spawn(self, worker: _Worker):
+        worker.process = _mp.Process(
+            target=run_worker,
+            args=(worker.index, worker.devices, config, self.channel, self.stop_event),
+            name=f"inverter-worker-{worker.index}",
+            daemon=True,
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        worker.restart_at = None
+
+    async def start(self):
+        self.running = True
+        for worker in self.workers:
+            self._spawn(worker)
+            logger.info(f"Worker {worker.index} started (pid {worker.process.pid}): "
+                        f"{', '.join(device.name for device in worker.devices)}")
+        self._tasks = [
+            asyncio.create_task(self._receive_loop()),
+            asyncio.create_task(self._watch_loop()),
+        ]
+
+    async def _receive_loop(self):
+        """Move worker messages into the supervisor's event loop"""
+        while self.running:
+            try:
+                # Blocking get off the event loop; the timeout lets stop() end it
+                kind, device, index, duration, payload = await asyncio.to_thread(
+                    self.channel.get, True, 0.5
+                )
+            except queue.Empty:
+                continue
+
+            if kind == 'sample':
+                metrics.inc('fleet_samples_total', worker=index)
+                metrics.set('read_duration_seconds', duration, device=device)
+                self.on_sample(device, payload)
+            elif kind == 'events':
+                self.on_events(payload)
+            elif kind == 'error':
+                metrics.inc('read_errors_total', device=device)
+
+    async def _watch_loop(self):
+        """Restart workers that exited, with exponential backoff"""
+        while self.running:
+            now = time.monotonic()
+            alive = 0
+            for worker in self.workers:
+                process = worker.process
+                if process is not None and process.is_alive():
+                    alive += 1
+                    continue
+
+                if worker.restart_at is None:
+                    uptime = now - worker.started_at
+                    if uptime >= self.STABLE_AFTER:
+                        worker.restarts = 0
+                    delay = min(config.fleet.restart_delay * 2 ** worker.restarts,
+                                config.fleet.max_restart_delay)
+                    worker.restart_at = now + delay
+                    logger.error(f"Worker {worker.index} exited with code {process.exitcode} "
+                                 f"after {uptime:.0f}s; restarting in {delay:.0f}s")
+                elif now >= worker.restart_at:
+                    worker.restarts += 1
+                    metrics.inc('fleet_worker_restarts_total', worker=worker.index)
+                    self._spawn(worker)
+                    alive += 1
+                    logger.info(f"Worker {worker.index} restarted (pid {worker.process.pid})")
+
+            metrics.set('fleet_workers_alive', alive)
+            await asyncio.sleep(1)
+
+    async def stop(self, timeout: float = 10.0):
+        """Ask workers to finish, then terminate any that do not"""
+        if not self._tasks:
+            return
+        self.stop_event.set()
+        receiver, watcher = self._tasks
+        watcher.cancel()
+
+        # Keep receiving while workers exit: a worker flushes its queue
+        # buffer before it terminates
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            if worker.process is not None:
+                await asyncio.to_thread(worker.process.join, max(deadline - time.monotonic(), 0))
+                if worker.process.is_alive():
+                    logger.warning(f"Worker {worker.index} did not stop, terminating")
+                    worker.process.terminate()
+                    await asyncio.to_thread(worker.process.join, 2)
+
+        self.running = False
+        await asyncio.gather(receiver, watcher, return_exceptions=True)
+        self._tasks = []
+
+        # Samples sent just before the workers stopped
+        while True:
+            try:
+                kind, device, index, duration, payload = self.channel.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'sample':
+                self.on_sample(device, payload)
+            elif kind == 'events':
+                self.on_events(payload)
+        self.channel.close()
@@ -5,8 +5,8 @@ Supports all SUN2000 models via Modbus RTU and TCP
 """
 import asyncio
 import logging
-from typing import Dict, Any, Optional
-from datetime import datetime
+import time
+from typing import Dict, Any, List, Optional, Set, Tuple
 
 # Add parent directory to path for huawei_solar import
 import sys
@@ -22,10 +22,19 @@ from huawei_solar import (
 from huawei_solar import register_names as rn
 from huawei_solar.exceptions import HuaweiSolarException
 
-from config import config
+from config import config, InverterConfig
+from utils.metrics import metrics
+from .device_cache import DeviceCache
+from .register_decoder import BlockDecoder, _register_map
+from .register_profile import ReadPlan, load_read_plan, split_blocks
+from .sample_record import MISSING, Sample
 
 logger = logging.getLogger(__name__)
 
+# Per-field data quality, best first: read this cycle (or within its group's
+# period), last known value after a failed read, no value at all
+QUALITY_LEVELS = ('good', 'stale', 'bad')
+
 
 class InverterClient:
     """
@@ -34,93 +43,142 @@ class InverterClient:
     Handles connection, data reading, and error recovery
     """
 
-    # Register groups for organized data collection
-    POWER_REGISTERS = [
-        rn.INPUT_POWER,              # DC Input Power
-        rn.ACTIVE_POWER,             # AC Active Power
-        rn.REACTIVE_POWER,           # Reactive Power
-        rn.POWER_FACTOR,             # Power Factor
-    ]
-
-    VOLTAGE_CURRENT_REGISTERS = [
-        rn.LINE_VOLTAGE_A_B,         # Phase AB Voltage
-        rn.LINE_VOLTAGE_B_C,         # Phase BC Voltage
-        rn.LINE_VOLTAGE_C_A,         # Phase CA Voltage
-        rn.PHASE_A_VOLTAGE,          # Phase A Voltage
-        rn.PHASE_B_VOLTAGE,          # Phase B Voltage
-        rn.PHASE_C_VOLTAGE,          # Phase C Voltage
-        rn.PHASE_A_CURRENT,          # Phase A Current
-        rn.PHASE_B_CURRENT,          # Phase B Current
-        rn.PHASE_C_CURRENT,          # Phase C Current
-    ]
-
-    ENERGY_REGISTERS = [
-        rn.DAILY_YIELD_ENERGY,       # Daily Energy Yield
-        rn.ACCUMULATED_YIELD_ENERGY, # Total Energy Yield
-    ]
-
-    TEMPERATURE_REGISTERS = [
-        rn.INTERNAL_TEMPERATURE,     # Internal Temperature
-    ]
-
-    GRID_REGISTERS = [
-        rn.GRID_FREQUENCY,           # Grid Frequency
-    ]
-
-    STATUS_REGISTERS = [
-        rn.DEVICE_STATUS,            # Device Status
-        rn.ALARM_1,                  # Alarm Status 1
-        rn.ALARM_2,                  # Alarm Status 2
-        rn.ALARM_3,                  # Alarm Status 3
-    ]
-
-    PV_REGISTERS = [
-        rn.PV_01_VOLTAGE,            # String 1 Voltage
-        rn.PV_01_CURRENT,            # String 1 Current
-        rn.PV_02_VOLTAGE,            # String 2 Voltage
-        rn.PV_02_CURRENT,            # String 2 Current
-        rn.PV_03_VOLTAGE,            # String 3 Voltage
-        rn.PV_03_CURRENT,            # String 3 Current
-        rn.PV_04_VOLTAGE,            # String 4 Voltage
-        rn.PV_04_CURRENT,            # String 4 Current
-    ]
-
-    def __init__(self):
+    # Registers come from the register profile (register_profiles/*.json)
+
+    # PV strings read until the device reports NB_PV_STRINGS
+    DEFAULT_PV_STRINGS = 4
+
+    # Highest PV string exposed by huawei_solar register names
+    MAX_PV_STRINGS = 24
+
+    def __init__(self, cache: Optional[DeviceCache] = None,
+                 settings: Optional[InverterConfig] = None,
+                 device_id: Optional[str] = None):
+        # Connection settings (fleet workers pass one per device)
+        self.settings = settings or config.inverter
+
         self.client = None
+        self.recorder = None
         self.device: Optional[SUN2000Device] = None
         self.connected = False
         self.last_error: Optional[str] = None
 
+        # Device identity, from the discovery cache or read at connect;
+        # a fixed device_id (fleet device name) replaces the model name,
+        # which is the same for every inverter of a model
+        self.cache = cache
+        self.fixed_device_id = device_id
+        self.device_id: Optional[str] = device_id
+        self.device_info: Dict[str, Any] = {}
+        self.profile_from_cache = False
+        self.nb_pv_strings = self.DEFAULT_PV_STRINGS
+
+        # Read plan compiled from the register profile, and its runtime state:
+        # last read time per group, last reported value per field and register,
+        # and the unit of each register
+        self.plan: ReadPlan = self._load_plan()
+        self._group_read_at: Dict[str, float] = {}
+        self._values: Dict[str, Dict[str, Any]] = {}
+        self._units: Dict[str, Optional[str]] = {}
+        # Last field_quality dict and groups_read tuple (see _shared)
+        self._metadata_values: Dict[type, Any] = {}
+
+        # Registers read with the status block (edge thresholds), and the
+        # latest status block read (monotonic time, raw results)
+        self.watch_registers: List[str] = []
+        self._status_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+
+        # Compiled decoders of the blocks read raw (fast_decode), by block
+        self._block_decoders: Dict[Tuple[str, ...], BlockDecoder] = {}
+
+        # Serializes reads with reconnects requested from other tasks
+        self._io_lock = asyncio.Lock()
+
+        metrics.describe('block_retries_total', 'Register blocks read again after failing in the same cycle')
+        metrics.describe('block_failures_total', 'Register blocks still failing at the end of a cycle')
+        metrics.describe('samples_partial_total', 'Samples with stale or missing fields after failed blocks')
+
+    def _load_plan(self) -> ReadPlan:
+        plan = load_read_plan(self.settings.register_profile, self.settings.read_plan_cache)
+        plan.set_pv_registers(self.build_pv_registers(self.nb_pv_strings))
+        logger.info(f"Register profile '{plan.name}': {len(plan.groups)} groups, "
+                    f"{len(plan.decoder)} registers, ~{plan.requests_per_cycle} Modbus requests per full read")
+        if not plan.status_registers:
+            logger.warning("Register profile has no 'status' group; alarms are not monitored")
+        return plan
+
+    def reload_plan(self) -> bool:
+        """Recompile the register profile; True if the plan changed"""
+        plan = load_read_plan(self.settings.register_profile, self.settings.read_plan_cache)
+        if plan.profile_hash == self.plan.profile_hash:
+            return False
+        self.plan = self._load_plan()
+        self._group_read_at.clear()
+        self._values.clear()
+        self._units.clear()
+        self._status_cache = None
+        self._block_decoders.clear()
+        return True
+
+    @property
+    def cache_key(self) -> str:
+        return DeviceCache.key_for(
+            self.settings.connection_type,
+            self.settings.serial_port,
+            self.settings.slave_id,
+            self.settings.tcp_host,
+            self.settings.tcp_port,
+        )
+
     async def connect(self) -> bool:
         """
         Establish connection to inverter
         Supports both RTU (USB/RS485) and TCP connections
         """
         try:
-            logger.info(f"Connecting to inverter via {config.inverter.connection_type.upper()}...")
+            logger.info(f"Connecting to inverter via {self.settings.connection_type.upper()}...")
 
-            if config.inverter.connection_type == 'rtu':
+            if self.settings.connection_type == 'rtu':
                 # USB/RS485 Connection
                 self.client = create_rtu_client(
-                    port=config.inverter.serial_port,
-                    baudrate=config.inverter.baudrate,
-                    slave_id=config.inverter.slave_id
+                    port=self.settings.serial_port,
+                    baudrate=self.settings.baudrate,
+                    slave_id=self.settings.slave_id
                 )
-                logger.info(f"RTU Client created: {config.inverter.serial_port} @ {config.inverter.baudrate}bps")
+                logger.info(f"RTU Client created: {self.settings.serial_port} @ {self.settings.baudrate}bps")
 
-            elif config.inverter.connection_type == 'tcp':
+            elif self.settings.connection_type == 'tcp':
                 # TCP Connection
-                if not config.inverter.tcp_host:
+                if not self.settings.tcp_host:
                     raise ValueError("TCP host not configured")
 
+                # Unit id as for RTU: behind a gateway it selects the slave, and
+                # the block reads (_read_raw) address the same one
                 self.client = create_tcp_client(
-                    host=config.inverter.tcp_host,
-                    port=config.inverter.tcp_port
+                    host=self.settings.tcp_host,
+                    port=self.settings.tcp_port,
+                    slave_id=self.settings.slave_id
                 )
-                logger.info(f"TCP Client created: {config.inverter.tcp_host}:{config.inverter.tcp_port}")
+                logger.info(f"TCP Client created: {self.settings.tcp_host}:{self.settings.tcp_port} "
+                            f"(unit {self.settings.slave_id})")
+
+            elif self.settings.connection_type == 'replay':
+                # Recorded traffic instead of a bus (pymodbus loaded on demand)
+                from .modbus_capture import ReplayClient
+                self.client = ReplayClient(self.settings.replay_file, realtime=self.settings.replay_realtime)
 
             else:
-                raise ValueError(f"Invalid connection type: {config.inverter.connection_type}")
+                raise ValueError(f"Invalid connection type: {self.settings.connection_type}")
+
+            if self.settings.capture_file and self.settings.connection_type != 'replay':
+                from .modbus_capture import TrafficRecorder
+                if self.recorder is None:
+                    self.recorder = TrafficRecorder(self.settings.capture_file, metadata={
+                        'connection_type': self.settings.connection_type,
+                        'slave_id': self.settings.slave_id,
+                        'register_profile': self.plan.name,
+                    })
+                self.recorder.attach(self.client)
 
             # Create device instance
             self.device = await create_device_instance(self.client)
@@ -132,11 +190,20 @@ class InverterClient:
             self.last_error = None
             logger.info("Successfully connected to Huawei SUN2000 inverter")
 
-            # Log device info
-            model = await self.device.get(rn.MODEL_NAME)
-            serial = await self.device.get(rn.SERIAL_NUMBER)
-            logger.info(f"Inverter Model: {model.value}")
-            logger.info(f"Serial Number: {serial.value}")
+            # Identity: cached profile if available, otherwise read it now.
+            # Captures always include the identity reads, so replays need no cache
+            capturing = self.settings.capture_file or self.settings.connection_type == 'replay'
+            profile = self.cache.load(self.cache_key) if self.cache and not capturing else None
+            if profile:
+                self._apply_profile(profile)
+                self.profile_from_cache = True
+                logger.info(f"Using cached device profile (from {profile.get('cached_at')})")
+            else:
+                await self.refresh_device_profile()
+                self.profile_from_cache = False
+
+            logger.info(f"Inverter Model: {self.device_info.get(rn.MODEL_NAME, {}).get('value')}")
+            logger.info(f"Serial Number: {self.device_info.get(rn.SERIAL_NUMBER, {}).get('value')}")
 
             return True
 
@@ -158,55 +225,232 @@ class InverterClient:
                 self.connected = False
                 self.device = None
                 self.client = None
+                self._status_cache = None
+                if self.recorder is not None:
+                    self.recorder.close()
+                    self.recorder = None
 
-    async def read_all_data(self) -> Dict[str, Any]:
+    async def reconnect(self) -> bool:
+        """
+        Close and reopen the connection with the current transport settings
+        Waits for any read in progress to finish first
+        """
+        async with self._io_lock:
+            await self.disconnect()
+            return await self.connect()
+
+    async def read_all_data(self) -> Sample:
         """
         Read all important data from inverter
-        Returns organized dictionary with all metrics
+        Returns a Sample (to_dict() gives the organized dictionary)
         """
+        async with self._io_lock:
+            return await self._read_all_data()
+
+    async def _read_all_data(self) -> Sample:
         if not self.connected or not self.device:
             raise HuaweiSolarException("Not connected to inverter")
 
         try:
-            # Read all register groups
-            power_data = await self.device.batch_update(self.POWER_REGISTERS)
-            voltage_current_data = await self.device.batch_update(self.VOLTAGE_CURRENT_REGISTERS)
-            energy_data = await self.device.batch_update(self.ENERGY_REGISTERS)
-            temperature_data = await self.device.batch_update(self.TEMPERATURE_REGISTERS)
-            grid_data = await self.device.batch_update(self.GRID_REGISTERS)
-            status_data = await self.device.batch_update(self.STATUS_REGISTERS)
-            pv_data = await self.device.batch_update(self.PV_REGISTERS)
-
-            # Get device ID dynamically
-            device_model = await self.device.get(rn.MODEL_NAME)
-            device_id = f"{device_model.value}"
-
-            # Organize data
-            data = {
-                'device_id': device_id,
-                'timestamp': datetime.now().isoformat(),
-                'power': self._format_results(power_data),
-                'voltage_current': self._format_results(voltage_current_data),
-                'energy': self._format_results(energy_data),
-                'temperature': self._format_results(temperature_data),
-                'grid': self._format_results(grid_data),
-                'status': self._format_results(status_data),
-                'pv_strings': self._format_results(pv_data),
-                'metadata': {
-                    'connection_type': config.inverter.connection_type,
-                    'data_quality': 'good',
-                    'read_timestamp': datetime.now().isoformat(),
-                }
-            }
-
-            logger.debug(f"Successfully read all data from inverter")
+            # Every group that is due, one Modbus block at a time: a failed
+            # block is retried on its own and only its fields lose quality.
+            # Status comes from the fast lane when fresh
+            now = time.monotonic()
+            deadline = now + self.settings.poll_interval / 2
+            due = self.plan.due_groups(now, self._group_read_at)
+            registers = [r for group in due if group.field != 'status' for r in group.registers]
+            decoded: List[BlockDecoder] = []
+            results, failed = await self._read_blocks(
+                registers, deadline, decoded if self.settings.fast_decode else None
+            )
+            answered = bool(results) or bool(decoded)
+            if any(group.field == 'status' for group in due):
+                status_data = self._fresh_status()
+                if status_data is None:
+                    status_data, status_failed = await self._read_blocks(self.plan.status_registers, deadline)
+                    if not status_failed:
+                        self._status_cache = (time.monotonic(), status_data)
+                    answered = answered or bool(status_data)
+                    failed |= status_failed
+                results.update(status_data)
+
+            if failed and not answered:
+                # Nothing answered: a failed cycle, not a partial sample
+                raise HuaweiSolarException(f"No register block could be read ({self.last_error})")
+
+            self._decode(results)
+            for decoder in decoded:
+                self._decode_block(decoder)
+            for group in due:
+                if failed.isdisjoint(group.registers):
+                    self._group_read_at[group.name] = now
+
+            # One compact record (groups not due keep their last values)
+            quality = self._shared(self._field_quality(due, failed))
+            data = self._sample({
+                'connection_type': self.settings.connection_type,
+                'data_quality': max(quality.values(), key=QUALITY_LEVELS.index, default='good'),
+                'field_quality': quality,
+                'register_profile': self.plan.name,
+                'groups_read': self._shared(tuple(group.name for group in due if failed.isdisjoint(group.registers))),
+            })
+
+            if failed:
+                metrics.inc('samples_partial_total')
+                logger.warning("Partial read: %d registers not read (%s)", len(failed), self.last_error)
+            else:
+                logger.debug("Successfully read %d register groups from inverter", len(due))
             return data
 
         except Exception as e:
-            logger.error(f"Error reading inverter data: {e}")
+            logger.error("Error reading inverter data: %s", e)
             self.last_error = str(e)
             raise
 
+    async def _read_blocks(self, registers: List[str], deadline: float,
+                           decoded: Optional[List[BlockDecoder]] = None) -> Tuple[Dict[str, Any], Set[str]]:
+        """
+        Read registers one Modbus block at a time (the same requests a single
+        batch_update makes). Failed blocks are retried, up to max_retries
+        times and while the deadline allows, without repeating the others
+        With a decoded list, blocks are read raw and their decoders appended
+        to it instead of producing Results
+        Returns the results and the registers that could not be read
+        """
+        results: Dict[str, Any] = {}
+        pending = split_blocks(registers)
+        for attempt in range(self.settings.max_retries + 1):
+            if attempt:
+                metrics.inc('block_retries_total', len(pending))
+            failed = []
+            for block in pending:
+                try:
+                    if decoded is not None:
+                        decoded.append(await self._read_raw(block))
+                    else:
+                        results.update(await self.device.batch_update(block))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    failed.append(block)
+                    self.last_error = str(e) or type(e).__name__
+                    logger.debug("Block %s..%s failed (attempt %d): %s",
+                                 block[0], block[-1], attempt + 1, self.last_error)
+            pending = failed
+            if not pending or time.monotonic() >= deadline:
+                break
+        if pending:
+            metrics.inc('block_failures_total', len(pending))
+        return results, {register for block in pending for register in block}
+
+    async def _read_raw(self, block: List[str]) -> BlockDecoder:
+        """Read a block with one holding-register request and decode it in place"""
+        decoder = self._block_decoders.get(tuple(block))
+        if decoder is None:
+            decoder = self._block_decoders[tuple(block)] = BlockDecoder(block)
+        response = await self.client.read_holding_registers(
+            decoder.start, count=decoder.count, device_id=self.settings.slave_id
+        )
+        if response.isError():
+            raise HuaweiSolarException(f"Modbus error reading {decoder.count} registers at {decoder.start}: {response}")
+        decoder.decode_registers(response.registers)
+        return decoder
+
+    def _field_quality(self, due, failed: Set[str]) -> Dict[str, str]:
+        """Worst quality of each field's registers after a read"""
+        quality = {field: 'good' for field in self.plan.fields}
+        for group in due:
+            missing = failed.intersection(group.registers)
+            if not missing:
+                continue
+            values = self._values.get(group.field, {})
+            level = 'bad' if any(register not in values for register in missing) else 'stale'
+            if QUALITY_LEVELS.index(level) > QUALITY_LEVELS.index(quality[group.field]):
+                quality[group.field] = level
+        return quality
+
+    def _decode(self, results: Dict[str, Any]):
+        """
+        Route results to their fields through the decoder table
+        Numeric changes within the register's deadband keep the last value
+        """
+        for register, (field, deadband) in self.plan.decoder.items():
+            result = results.get(register)
+            if result is None:
+                continue
+            self._store(register, field, deadband, result.value,
+                        result.unit if hasattr(result, 'unit') else None)
+
+    def _decode_block(self, decoder: BlockDecoder):
+        """Route the values of a raw-decoded block, as _decode() does for Results"""
+        routes = self.plan.decoder
+        for register, value, unit in zip(decoder.names, decoder.values, decoder.units):
+            route = routes.get(register)
+            if route is not None:
+                self._store(register, route[0], route[1], value, unit)
+
+    def _store(self, register: str, field: str, deadband: Optional[float], value: Any, unit: Optional[str]):
+        values = self._values.setdefault(field, {})
+        previous = values.get(register, MISSING)
+        if (deadband and previous is not MISSING
+                and isinstance(value, (int, float)) and not isinstance(value, bool)
+                and isinstance(previous, (int, float))
+                and abs(value - previous) <= deadband):
+            return
+        values[register] = value
+        self._units[register] = unit
+
+    def _sample(self, metadata: Dict[str, Any]) -> Sample:
+        """Record of the current values, one slot per register of the plan"""
+        slots = tuple((field, register) for register, (field, _) in self.plan.decoder.items())
+        return Sample.build(
+            self.plan.fields, slots, tuple(self._units.get(register) for _, register in slots),
+            [self._values.get(field, {}).get(register, MISSING) for field, register in slots],
+            self.device_id, time.time(), metadata,
+        )
+
+    def _shared(self, value):
+        """The previous sample's equal metadata value, so buffered samples share one copy"""
+        previous = self._metadata_values.setdefault(type(value), value)
+        if previous == value:
+            return previous
+        self._metadata_values[type(value)] = value
+        return value
+
+    async def read_status(self) -> Dict[str, Any]:
+        """
+        Read the profile's status group, DEVICE_STATUS and ALARM_1..3 (fast lane),
+        plus the watched registers. Returns the raw batch_update results; they are also kept so the next
+        bulk read can reuse them instead of reading the same block again
+        """
+        async with self._io_lock:
+            return await self._read_status()
+
+    async def _read_status(self) -> Dict[str, Any]:
+        if not self.connected or not self.device:
+            raise HuaweiSolarException("Not connected to inverter")
+
+        status_registers = self.plan.status_registers
+        watched = [r for r in self.watch_registers if r not in status_registers]
+        registers = status_registers + watched
+        status_data = await self.device.batch_update(registers) if registers else {}
+        self._status_cache = (time.monotonic(), status_data)
+        return status_data
+
+    def set_watch_registers(self, names: List[str]):
+        """Read these registers with the status block too (unknown names are ignored)"""
+        known = _register_map()
+        self.watch_registers = [name for name in names if name in known]
+
+    def _fresh_status(self) -> Optional[Dict[str, Any]]:
+        """Fast-lane status block recent enough to reuse for a bulk sample"""
+        max_age = config.alarms.status_interval * 2
+        if self._status_cache and max_age > 0:
+            read_at, status_data = self._status_cache
+            if time.monotonic() - read_at <= max_age:
+                return status_data
+        return None
+
     def _format_results(self, results: Dict) -> Dict[str, Any]:
         """
         Format register results into clean dictionary
@@ -231,13 +475,59 @@ class InverterClient:
         try:
             # Try to read device status
             status = await self.device.get(rn.DEVICE_STATUS)
-            logger.debug(f"Health check passed. Device status: {status.value}")
+            logger.debug("Health check passed. Device status: %s", status.value)
             return True
         except Exception as e:
             logger.warning(f"Health check failed: {e}")
             self.connected = False
             return False
 
+    def _apply_profile(self, profile: Dict[str, Any]):
+        """Adopt a device profile (cached or freshly read)"""
+        self.device_info = profile.get('device_info', {})
+        self.device_id = self.fixed_device_id or profile.get('device_id')
+
+        nb_strings = self.device_info.get(rn.NB_PV_STRINGS, {}).get('value')
+        if nb_strings:
+            self.nb_pv_strings = nb_strings
+            registers = self.build_pv_registers(nb_strings)
+            self.plan.set_pv_registers(registers)
+            logger.info(f"Reading {len(registers) // 2} PV strings")
+
+    @classmethod
+    def build_pv_registers(cls, nb_strings: int) -> List[str]:
+        """
+        PV voltage/current registers for strings 1..nb_strings
+        PV_xx registers are contiguous, so batch_update reads them as one block
+        """
+        count = min(int(nb_strings), cls.MAX_PV_STRINGS)
+        if nb_strings > cls.MAX_PV_STRINGS:
+            logger.warning(f"Device reports {nb_strings} PV strings; reading the first {count}")
+
+        registers = []
+        for index in range(1, count + 1):
+            registers.append(getattr(rn, f'PV_{index:02d}_VOLTAGE'))
+            registers.append(getattr(rn, f'PV_{index:02d}_CURRENT'))
+        return registers
+
+    async def refresh_device_profile(self) -> bool:
+        """
+        Read the device identity and update the discovery cache
+        Returns True if it differs from the profile in use
+        """
+        info = await self.get_device_info()
+        profile = {
+            'device_id': f"{info[rn.MODEL_NAME]['value']}",
+            'device_info': info,
+        }
+
+        changed = profile['device_id'] != self.device_id or info != self.device_info
+        self._apply_profile(profile)
+        self.profile_from_cache = False
+        if self.cache:
+            self.cache.save(self.cache_key, profile)
+        return changed
+
     async def get_device_info(self) -> Dict[str, Any]:
         """Get static device information"""
         if not self.connected or not self.device:
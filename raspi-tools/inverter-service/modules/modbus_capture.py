@@ -0,0 +1,248 @@
+"""
+Modbus Capture Module
+Records the Modbus traffic of a client to a binary capture file and
+replays a capture as a client, for desk reproduction and benchmarks
+"""
+import asyncio
+import json
+import logging
+import struct
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+import pymodbus.exceptions
+from pymodbus.client.mixin import ModbusClientMixin
+from pymodbus.pdu import DecodePDU, ModbusPDU
+
+logger = logging.getLogger(__name__)
+
+# File layout: header (magic, format version, metadata length), JSON
+# metadata, then one record per exchange followed by its request and
+# response PDUs (function code + data, as on the wire without address/CRC)
+MAGIC = b'MTZCAP'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<6sHI')
+# Start (epoch seconds), duration (seconds), device id, status, PDU lengths
+RECORD = struct.Struct('<dfBBHH')
+
+STATUS_OK = 0
+# The client raised instead of returning a response; the response bytes
+# hold "<exception class>: <message>"
+STATUS_ERROR = 1
+
+
+@dataclass
+class Exchange:
+    """One request and its outcome"""
+    started: float
+    duration: float
+    device_id: int
+    status: int
+    request: bytes
+    response: bytes
+
+    @property
+    def function(self) -> int:
+        return self.request[0]
+
+    @property
+    def failed(self) -> bool:
+        """No response, or a Modbus exception response"""
+        return self.status != STATUS_OK or (bool(self.response) and bool(self.response[0] & 0x80))
+
+    @property
+    def address(self) -> Optional[int]:
+        """Starting address for register/coil requests"""
+        return struct.unpack('>H', self.request[1:3])[0] if len(self.request) >= 3 else None
+
+
+def _device_id(pdu: ModbusPDU) -> int:
+    # pymodbus renamed slave_id to dev_id in 3.9
+    return getattr(pdu, 'dev_id', getattr(pdu, 'slave_id', 0)) or 0
+
+
+def _pdu_bytes(pdu: ModbusPDU) -> bytes:
+    return bytes((pdu.function_code,)) + pdu.encode()
+
+
+class TrafficRecorder:
+    """
+    Appends every request/response of the attached clients to a capture file
+    Wraps the client's execute(), which every pymodbus request goes through;
+    the file is flushed after each exchange so a crash loses nothing
+    """
+
+    def __init__(self, path: str, metadata: Optional[Dict[str, Any]] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        new_file = not self.path.exists() or self.path.stat().st_size == 0
+        self._file = open(self.path, 'ab')
+        if new_file:
+            meta = json.dumps({'created': time.time(), **(metadata or {})}, default=str).encode()
+            self._file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(meta)) + meta)
+            self._file.flush()
+        self.exchanges = 0
+        logger.info(f"Recording Modbus traffic to {self.path}")
+
+    def attach(self, client):
+        """Record the traffic of a pymodbus client (returns the same client)"""
+        execute = client.execute
+
+        async def recorded(no_response_expected: bool, request: ModbusPDU):
+            started = time.time()
+            clock = time.perf_counter()
+            try:
+                response = await execute(no_response_expected, request)
+            except Exception as e:
+                self._write(started, time.perf_counter() - clock, request, STATUS_ERROR,
+                            f"{type(e).__name__}: {e}".encode())
+                raise
+            self._write(started, time.perf_counter() - clock, request, STATUS_OK,
+                        _pdu_bytes(response) if response is not None else b'')
+            return response
+
+        client.execute = recorded
+        return client
+
+    def _write(self, started: float, duration: float, request: ModbusPDU, status: int, response: bytes):
+        if self._file is None:
+            return
+        payload = _pdu_bytes(request)
+        self._file.write(RECORD.pack(started, duration, _device_id(request) & 0xFF, status,
+                                     len(payload), len(response)) + payload + response)
+        self._file.flush()
+        self.exchanges += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info(f"Recorded {self.exchanges} Modbus exchanges to {self.path}")
+
+
+def read_capture(path: str) -> Tuple[Dict[str, Any], List[Exchange]]:
+    """Metadata and exchanges of a capture file"""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path}: not a capture file")
+    magic, version, meta_length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not a capture file")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported capture format {version}")
+    offset = HEADER.size + meta_length
+    metadata = json.loads(data[HEADER.size:offset])
+
+    exchanges = []
+    while offset + RECORD.size <= len(data):
+        started, duration, device_id, status, request_length, response_length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        end = offset + request_length + response_length
+        if end > len(data):
+            # Truncated last record (recorder killed mid-write)
+            break
+        exchanges.append(Exchange(started, duration, device_id, status,
+                                  data[offset:offset + request_length],
+                                  data[offset + request_length:end]))
+        offset = end
+    return metadata, exchanges
+
+
+def latency_summary(exchanges: List[Exchange]) -> Iterator[Dict[str, Any]]:
+    """Latency statistics per (device, function, address), for offline inspection"""
+    groups: Dict[Tuple[int, int, Optional[int]], List[Exchange]] = defaultdict(list)
+    for exchange in exchanges:
+        groups[(exchange.device_id, exchange.function, exchange.address)].append(exchange)
+
+    for (device_id, function, address), group in sorted(groups.items(), key=lambda item: (item[0][:2], item[0][2] or 0)):
+        durations = sorted(exchange.duration for exchange in group)
+        yield {
+            'device_id': device_id,
+            'function': function,
+            'address': address,
+            'count': len(durations),
+            'errors': sum(1 for exchange in group if exchange.failed),
+            'min': durations[0],
+            'median': durations[len(durations) // 2],
+            'p95': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            'max': durations[-1],
+        }
+
+
+class ReplayClient(ModbusClientMixin):
+    """
+    Client that answers from a capture file instead of a bus
+    Each request gets the next recorded response to the same request (same
+    device id and PDU), so a replay is deterministic even if the reader
+    skips or reorders blocks. With realtime each answer takes its recorded
+    duration; otherwise answers are immediate. A request the capture does
+    not have raises ModbusIOException; with loop, the responses start over
+    once a request's recordings are used up
+    """
+
+    def __init__(self, path: str, realtime: bool = True, loop: bool = True):
+        super().__init__()
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.metadata, exchanges = read_capture(path)
+        self._recorded: Dict[Tuple[int, bytes], List[Exchange]] = defaultdict(list)
+        for exchange in exchanges:
+            self._recorded[(exchange.device_id, exchange.request)].append(exchange)
+        self._pending: Dict[Tuple[int, bytes], Deque[Exchange]] = {}
+        self._decoder = DecodePDU(False)
+        self.connected = False
+        self.replayed = 0
+        logger.info(f"Replaying {len(exchanges)} Modbus exchanges from {path} "
+                    f"({'recorded speed' if realtime else 'as fast as possible'})")
+
+    async def connect(self) -> bool:
+        self.connected = True
+        return True
+
+    async def close(self):
+        self.connected = False
+
+    def execute(self, no_response_expected: bool, request: ModbusPDU):
+        return self._replay(no_response_expected, request)
+
+    async def _replay(self, no_response_expected: bool, request: ModbusPDU) -> Optional[ModbusPDU]:
+        key = (_device_id(request) & 0xFF, _pdu_bytes(request))
+        pending = self._pending.get(key)
+        if not pending:
+            recorded = self._recorded.get(key)
+            if not recorded or (key in self._pending and not self.loop):
+                raise pymodbus.exceptions.ModbusIOException(
+                    f"Request not in capture: device {key[0]}, PDU {key[1].hex()}"
+                )
+            pending = self._pending[key] = deque(recorded)
+        exchange = pending.popleft()
+        self.replayed += 1
+
+        if self.realtime:
+            await asyncio.sleep(exchange.duration)
+        else:
+            # Still yield, as a real transport would
+            await asyncio.sleep(0)
+
+        if exchange.status != STATUS_OK:
+            name, _, message = exchange.response.decode(errors='replace').partition(': ')
+            error = getattr(pymodbus.exceptions, name, None)
+            if not (isinstance(error, type) and issubclass(error, Exception)):
+                error = pymodbus.exceptions.ModbusIOException
+            raise error(message)
+        if no_response_expected or not exchange.response:
+            return None
+
+        response = self._decoder.decode(exchange.response)
+        if response is None:
+            raise pymodbus.exceptions.ModbusIOException(f"Undecodable recorded response {exchange.response.hex()}")
+        for attribute in ('dev_id', 'slave_id', 'transaction_id'):
+            if hasattr(request, attribute) and hasattr(response, attribute):
+                setattr(response, attribute, getattr(request, attribute))
+        return response
@@ -0,0 +1,692 @@
+"""
+Modbus Gateway Module
+Modbus TCP server that multiplexes one RS485 (RTU) bus for many clients
+"""
+import asyncio
+import logging
+import struct
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Tuple
+
+import serial
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Function codes
+READ_HOLDING_REGISTERS = 0x03
+READ_INPUT_REGISTERS = 0x04
+WRITE_SINGLE_COIL = 0x05
+WRITE_SINGLE_REGISTER = 0x06
+WRITE_MULTIPLE_COILS = 0x0F
+WRITE_MULTIPLE_REGISTERS = 0x10
+
+REGISTER_READS = (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS)
+
+# Exception codes
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_DATA_VALUE = 0x03
+GATEWAY_PATH_UNAVAILABLE = 0x0A
+GATEWAY_TARGET_FAILED = 0x0B
+
+# Protocol limit for one FC3/FC4 request
+MAX_READ_COUNT = 125
+
+
+class BusError(Exception):
+    """No valid response from the RTU bus"""
+
+    def __init__(self, message: str, exception_code: int = GATEWAY_TARGET_FAILED):
+        super().__init__(message)
+        self.exception_code = exception_code
+
+
+class BusTimeout(BusError):
+    """The slave sent nothing before the response timeout"""
+
+
+def crc16(frame: bytes) -> int:
+    """Modbus RTU CRC (polynomial 0xA001, initial 0xFFFF)"""
+    crc = 0xFFFF
+    for byte in frame:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return crc
+
+
+def exception_pdu(function: int, code: int) -> bytes:
+    return bytes((function | 0x80, code))
+
+
+class ResponseTimer:
+    """
+    Response timeout of one slave, estimated like TCP's retransmission
+    timer (RFC 6298): smoothed latency plus four times its mean deviation,
+    kept within [min_timeout, max_timeout]
+    Latency is measured from the end of the request to the first response
+    byte, so it does not depend on the frame length. Each expiry doubles
+    the timeout; after unreachable_after expiries in a row the slave is
+    skipped for probe_interval seconds, then one request probes it again
+    """
+
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    K = 4
+
+    def __init__(self, min_timeout: float, max_timeout: float,
+                 unreachable_after: int = 3, probe_interval: float = 30.0):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.unreachable_after = unreachable_after
+        self.probe_interval = probe_interval
+
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        # No measurement yet: the configured timeout
+        self.timeout = max_timeout
+        self.expiries = 0
+        self.unreachable_until = 0.0
+
+    @property
+    def unreachable(self) -> bool:
+        return bool(self.unreachable_after) and self.expiries >= self.unreachable_after
+
+    def available(self, now: float) -> bool:
+        """False while the slave is isolated (requests fail without using the bus)"""
+        return not self.unreachable or now >= self.unreachable_until
+
+    def sample(self, latency: float):
+        """Record a response latency"""
+        if self.srtt is None:
+            self.srtt = latency
+            self.rttvar = latency / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - latency)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * latency
+        self.timeout = min(max(self.srtt + self.K * self.rttvar, self.min_timeout), self.max_timeout)
+        self.expiries = 0
+        self.unreachable_until = 0.0
+
+    def expired(self, now: float):
+        """Record a request that timed out"""
+        self.expiries += 1
+        self.timeout = min(self.timeout * 2, self.max_timeout)
+        if self.unreachable:
+            self.unreachable_until = now + self.probe_interval
+
+
+class RtuBus:
+    """
+    Blocking pyserial transport, driven from a worker thread
+    One transaction at a time; frames are separated by at least 3.5
+    character times of silence as the RTU framing requires
+    """
+
+    def __init__(self, port: str, baudrate: int, parity: str = 'N', stopbits: int = 1,
+                 timeout: float = 1.0):
+        self.port = port
+        self.baudrate = baudrate
+        self.parity = parity
+        self.stopbits = stopbits
+        self.timeout = timeout
+        self._serial: Optional[serial.Serial] = None
+        self._last_frame = 0.0
+
+        # Seconds from the end of the last request to its first response byte
+        self.last_latency: Optional[float] = None
+
+        # 11 bits per character (start + 8 data + parity/stop + stop)
+        self.char_time = 11 / baudrate
+        # Spec fixes the silent interval at 1.75 ms above 19200 baud
+        self.frame_gap = 3.5 * self.char_time if baudrate <= 19200 else 0.00175
+
+    def open(self):
+        if self._serial is not None:
+            return
+        self._serial = serial.Serial(
+            self.port,
+            self.baudrate,
+            bytesize=serial.EIGHTBITS,
+            parity=self.parity,
+            stopbits=self.stopbits,
+            timeout=self.timeout,
+        )
+        logger.info(f"Opened {self.port} at {self.baudrate} baud")
+
+    def close(self):
+        port, self._serial = self._serial, None
+        if port is not None:
+            try:
+                port.close()
+            except serial.SerialException:
+                pass
+
+    def _read(self, size: int) -> bytes:
+        data = self._serial.read(size)
+        if len(data) < size:
+            raise BusError(f"Timeout ({len(data)}/{size} bytes)")
+        return data
+
+    def _read_until_silence(self) -> bytes:
+        # Unknown function: the frame ends at the first inter-frame gap
+        self._serial.timeout = max(self.frame_gap, 0.01)
+        try:
+            data = b''
+            while True:
+                chunk = self._serial.read(256)
+                if not chunk:
+                    return data
+                data += chunk
+        finally:
+            self._serial.timeout = self.timeout
+
+    def _read_first(self, timeout: float) -> bytes:
+        self._serial.timeout = timeout
+        try:
+            first = self._serial.read(1)
+        finally:
+            self._serial.timeout = self.timeout
+        if not first:
+            raise BusTimeout(f"No response within {timeout * 1000:.0f} ms")
+        return first
+
+    def transact(self, unit: int, pdu: bytes, timeout: Optional[float] = None) -> bytes:
+        """
+        Send one request PDU to a slave and return its response PDU
+        timeout bounds the wait for the first response byte (default: the
+        bus timeout); the rest of the frame uses the bus timeout
+        """
+        try:
+            self.open()
+        except (serial.SerialException, OSError) as e:
+            raise BusError(f"Cannot open {self.port}: {e}", GATEWAY_PATH_UNAVAILABLE) from None
+
+        frame = bytes((unit,)) + pdu
+        frame += struct.pack('<H', crc16(frame))
+
+        try:
+            idle = time.monotonic() - self._last_frame
+            if idle < self.frame_gap:
+                time.sleep(self.frame_gap - idle)
+
+            # Discard late answers to a previous, timed-out request
+            self._serial.reset_input_buffer()
+            self._serial.write(frame)
+            self._serial.flush()
+            sent = time.monotonic()
+
+            if unit == 0:
+                # Broadcast: slaves never answer
+                return b''
+
+            response = self._read_first(self.timeout if timeout is None else timeout)
+            self.last_latency = time.monotonic() - sent
+            response += self._read(1)
+            function = response[1]
+            if function & 0x80:
+                response += self._read(3)
+            elif function in (0x01, 0x02) + REGISTER_READS:
+                response += self._read(1)
+                response += self._read(response[2] + 2)
+            elif function in (WRITE_SINGLE_COIL, WRITE_SINGLE_REGISTER,
+                              WRITE_MULTIPLE_COILS, WRITE_MULTIPLE_REGISTERS):
+                response += self._read(6)
+            else:
+                response += self._read_until_silence()
+        except serial.SerialException as e:
+            # Adapter unplugged: reopen on the next request
+            self.close()
+            raise BusError(f"Serial error: {e}", GATEWAY_PATH_UNAVAILABLE) from None
+        finally:
+            self._last_frame = time.monotonic()
+
+        if len(response) < 4 or crc16(response[:-2]) != struct.unpack('<H', response[-2:])[0]:
+            raise BusError("Bad CRC")
+        if response[0] != unit:
+            raise BusError(f"Response from slave {response[0]}, expected {unit}")
+        if response[1] & 0x7F != pdu[0]:
+            raise BusError(f"Response to function {response[1] & 0x7F}, expected {pdu[0]}")
+        return response[1:-2]
+
+
+@dataclass
+class _Waiter:
+    """A client request attached to a bus job"""
+    future: asyncio.Future
+    address: int = 0
+    count: int = 0
+
+
+@dataclass
+class _Job:
+    """One bus transaction, possibly answering several client requests"""
+    unit: int
+    function: int
+    # Register span for FC3/FC4 jobs; raw PDU for everything else
+    address: int = 0
+    count: int = 0
+    pdu: bytes = b''
+    waiters: List[_Waiter] = field(default_factory=list)
+
+    @property
+    def end(self) -> int:
+        return self.address + self.count
+
+    def covers(self, address: int, count: int) -> bool:
+        return self.address <= address and address + count <= self.end
+
+
+class RegisterCache:
+    """Short-lived copy of register values read from the bus"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        # (unit, function) -> address -> (read at, value)
+        self._values: Dict[Tuple[int, int], Dict[int, Tuple[float, int]]] = {}
+
+    def get(self, unit: int, function: int, address: int, count: int) -> Optional[List[int]]:
+        if self.ttl <= 0:
+            return None
+        values = self._values.get((unit, function))
+        if not values:
+            return None
+        oldest = time.monotonic() - self.ttl
+        result = []
+        for register in range(address, address + count):
+            entry = values.get(register)
+            if entry is None or entry[0] < oldest:
+                return None
+            result.append(entry[1])
+        return result
+
+    def put(self, unit: int, function: int, address: int, registers: List[int]):
+        if self.ttl <= 0:
+            return
+        now = time.monotonic()
+        values = self._values.setdefault((unit, function), {})
+        for offset, value in enumerate(registers):
+            values[address + offset] = (now, value)
+
+    def invalidate(self, unit: int, address: int, count: int):
+        """Forget holding registers changed by a write"""
+        for (cached_unit, function), values in self._values.items():
+            # A broadcast write (unit 0) reached every slave
+            if function == READ_HOLDING_REGISTERS and unit in (0, cached_unit):
+                for register in range(address, address + count):
+                    values.pop(register, None)
+
+
+class ModbusGateway:
+    """
+    Modbus TCP to RTU gateway
+    - the unit id of each TCP request selects the RTU slave
+    - fair queueing: one queue per TCP connection, served round-robin, so a
+      client polling in a tight loop cannot starve the others
+    - read coalescing: an FC3/FC4 read covered by a read already on the bus
+      or queued waits for that transaction; an overlapping queued read is
+      widened (up to 125 registers) to answer both
+    - register cache: reads fully covered by values younger than cache_ttl
+      are answered without touching the bus; writes invalidate their range
+    - per-slave timeouts: each unit gets a response timeout from its measured
+      latency (ResponseTimer); a slave that stops answering is skipped, its
+      requests failing at once, so the others keep their cadence
+    """
+
+    def __init__(self, bus: RtuBus, cache_ttl: float = 1.0, max_read: int = MAX_READ_COUNT,
+                 adaptive_timeout: bool = True, min_timeout: float = 0.1,
+                 unreachable_after: int = 3, probe_interval: float = 30.0):
+        self.bus = bus
+        self.cache = RegisterCache(cache_ttl)
+        self.max_read = min(max_read, MAX_READ_COUNT)
+
+        self.adaptive_timeout = adaptive_timeout
+        self.min_timeout = min(min_timeout, bus.timeout)
+        self.unreachable_after = unreachable_after
+        self.probe_interval = probe_interval
+        self._timers: Dict[int, ResponseTimer] = {}
+
+        self._queues: Dict[str, Deque[_Job]] = {}
+        self._turns: Deque[str] = deque()
+        self._wakeup = asyncio.Event()
+        self._active: Optional[_Job] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._clients = 0
+
+        metrics.describe('requests_total', 'Client requests by function code')
+        metrics.describe('cache_hits_total', 'Reads answered from the register cache')
+        metrics.describe('coalesced_total', 'Reads answered by another client\'s bus transaction')
+        metrics.describe('bus_transactions_total', 'Transactions sent on the RTU bus')
+        metrics.describe('bus_errors_total', 'Bus transactions without a valid response')
+        metrics.describe('bus_busy_seconds_total', 'Time the RTU bus spent in transactions')
+        metrics.describe('clients', 'Connected TCP clients')
+        metrics.describe('slave_latency_seconds', 'Smoothed response latency per slave')
+        metrics.describe('slave_timeout_seconds', 'Current response timeout per slave')
+        metrics.describe('slave_timeouts_total', 'Requests the slave did not answer in time')
+        metrics.describe('slave_unreachable', '1 while the slave is skipped after repeated timeouts')
+        metrics.describe('fast_failures_total', 'Requests failed without the bus because the slave is unreachable')
+
+    async def start(self, host: str, port: int):
+        self._worker = asyncio.create_task(self._bus_loop())
+        self._server = await asyncio.start_server(self._handle_client, host, port)
+        logger.info(f"Modbus gateway listening on {host}:{port} -> {self.bus.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for queue in self._queues.values():
+            for job in queue:
+                for waiter in job.waiters:
+                    if not waiter.future.done():
+                        waiter.future.cancel()
+        self._queues.clear()
+        self._turns.clear()
+        await asyncio.to_thread(self.bus.close)
+
+    # ------------------------------------------------------------------
+    # TCP side
+    # ------------------------------------------------------------------
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info('peername')
+        client = f"{peer[0]}:{peer[1]}" if peer else f"client-{id(writer)}"
+        write_lock = asyncio.Lock()
+        pending = set()
+
+        self._clients += 1
+        metrics.set('clients', self._clients)
+        logger.debug(f"Client connected: {client}")
+
+        try:
+            while True:
+                header = await reader.readexactly(7)
+                transaction_id, protocol_id, length, unit = struct.unpack('>HHHB', header)
+                if protocol_id != 0 or not 2 <= length <= 254:
+                    logger.warning(f"{client}: invalid MBAP header, closing")
+                    break
+                pdu = await reader.readexactly(length - 1)
+
+                # Clients may pipeline requests; answer each as soon as it is ready
+                task = asyncio.create_task(
+                    self._answer(client, writer, write_lock, transaction_id, unit, pdu)
+                )
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in pending:
+                task.cancel()
+            self._drop_client(client)
+            writer.close()
+            self._clients -= 1
+            metrics.set('clients', self._clients)
+            logger.debug(f"Client disconnected: {client}")
+
+    async def _answer(self, client: str, writer: asyncio.StreamWriter, write_lock: asyncio.Lock,
+                      transaction_id: int, unit: int, pdu: bytes):
+        response = await self.request(client, unit, pdu)
+        if not response:
+            # No answer to broadcasts
+            return
+        frame = struct.pack('>HHHB', transaction_id, 0, len(response) + 1, unit) + response
+        async with write_lock:
+            try:
+                writer.write(frame)
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    async def request(self, client: str, unit: int, pdu: bytes) -> bytes:
+        """Response PDU for a request PDU from one client"""
+        function = pdu[0]
+        metrics.inc('requests_total', function=function)
+
+        if function in REGISTER_READS:
+            if unit == 0:
+                return exception_pdu(function, ILLEGAL_FUNCTION)
+            if len(pdu) != 5:
+                return exception_pdu(function, ILLEGAL_DATA_VALUE)
+            address, count = struct.unpack('>HH', pdu[1:5])
+            if not 1 <= count <= MAX_READ_COUNT or address + count > 0x10000:
+                return exception_pdu(function, ILLEGAL_DATA_VALUE)
+            return await self._read(client, unit, function, address, count)
+
+        job = _Job(unit=unit, function=function, pdu=pdu)
+        return await self._submit(client, job)
+
+    async def _read(self, client: str, unit: int, function: int, address: int, count: int) -> bytes:
+        registers = self.cache.get(unit, function, address, count)
+        if registers is not None:
+            metrics.inc('cache_hits_total')
+            return self._read_response(function, registers)
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(loop.create_future(), address, count)
+
+        job = self._find_read(unit, function, address, count)
+        if job is not None:
+            metrics.inc('coalesced_total')
+            job.waiters.append(waiter)
+            return await waiter.future
+
+        job = _Job(unit=unit, function=function, address=address, count=count, waiters=[waiter])
+        self._enqueue(client, job)
+        return await waiter.future
+
+    def _find_read(self, unit: int, function: int, address: int, count: int) -> Optional[_Job]:
+        """A bus read that can answer this request, widening a queued one if needed"""
+        active = self._active
+        if (active is not None and active.function == function and active.unit == unit
+                and active.covers(address, count)):
+            return active
+
+        end = address + count
+        for queue in self._queues.values():
+            for job in queue:
+                if job.function != function or job.unit != unit:
+                    continue
+                if job.covers(address, count):
+                    return job
+                start = min(job.address, address)
+                stop = max(job.end, end)
+                # Only overlapping or adjacent spans: no unrequested gaps on the bus
+                if address <= job.end and job.address <= end and stop - start <= self.max_read:
+                    job.address = start
+                    job.count = stop - start
+                    return job
+        return None
+
+    async def _submit(self, client: str, job: _Job) -> bytes:
+        waiter = _Waiter(asyncio.get_running_loop().create_future())
+        job.waiters.append(waiter)
+        self._enqueue(client, job)
+        return await waiter.future
+
+    def _enqueue(self, client: str, job: _Job):
+        queue = self._queues.get(client)
+        if queue is None:
+            queue = self._queues[client] = deque()
+        if not queue:
+            self._turns.append(client)
+        queue.append(job)
+        self._wakeup.set()
+
+    def _drop_client(self, client: str):
+        """Forget queued jobs only this client was waiting for"""
+        queue = self._queues.pop(client, None)
+        if client in self._turns:
+            self._turns.remove(client)
+        if not queue:
+            return
+        for job in queue:
+            waiting = [w for w in job.waiters if not w.future.done()]
+            if waiting:
+                # Coalesced requests of other clients still need this read
+                self._enqueue(f"{client}#orphan", job)
+
+    def _next_job(self) -> Optional[_Job]:
+        # Round-robin: one job per client per turn
+        while self._turns:
+            client = self._turns.popleft()
+            queue = self._queues.get(client)
+            if not queue:
+                continue
+            job = queue.popleft()
+            if queue:
+                self._turns.append(client)
+            else:
+                del self._queues[client]
+            return job
+        return None
+
+    async def _bus_loop(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            if all(w.future.done() for w in job.waiters):
+                # Every requester disconnected
+                continue
+
+            self._active = job
+            try:
+                await self._run(job)
+            except Exception as e:
+                logger.error(f"Unexpected gateway error: {e}", exc_info=True)
+                self._resolve(job, exception_pdu(job.function, GATEWAY_TARGET_FAILED))
+            finally:
+                self._active = None
+
+    def _timer(self, unit: int) -> ResponseTimer:
+        timer = self._timers.get(unit)
+        if timer is None:
+            timer = self._timers[unit] = ResponseTimer(
+                self.min_timeout, self.bus.timeout, self.unreachable_after, self.probe_interval
+            )
+        return timer
+
+    async def _transact(self, unit: int, pdu: bytes) -> bytes:
+        # Broadcasts get no answer, so there is nothing to time
+        timer = self._timer(unit) if unit else None
+        if timer is not None and not timer.available(time.monotonic()):
+            metrics.inc('fast_failures_total', unit=unit)
+            return exception_pdu(pdu[0], GATEWAY_TARGET_FAILED)
+        timeout = timer.timeout if timer is not None and self.adaptive_timeout else None
+
+        started = time.monotonic()
+        metrics.inc('bus_transactions_total')
+        try:
+            response = await asyncio.to_thread(self.bus.transact, unit, pdu, timeout)
+        except BusError as e:
+            metrics.inc('bus_errors_total')
+            logger.warning("Slave %d function %d: %s", unit, pdu[0], e)
+            if timer is not None and isinstance(e, BusTimeout):
+                self._expired(unit, timer)
+            return exception_pdu(pdu[0], e.exception_code)
+        finally:
+            metrics.inc('bus_busy_seconds_total', time.monotonic() - started)
+
+        if timer is not None:
+            if timer.unreachable:
+                logger.info(f"Slave {unit} is responding again")
+            timer.sample(self.bus.last_latency)
+            self._update_timer_gauges(unit, timer)
+        return response
+
+    def _expired(self, unit: int, timer: ResponseTimer):
+        was_unreachable = timer.unreachable
+        timer.expired(time.monotonic())
+        metrics.inc('slave_timeouts_total', unit=unit)
+        if timer.unreachable and not was_unreachable:
+            logger.warning(f"Slave {unit} unreachable after {timer.expiries} timeouts; "
+                           f"failing its requests for {timer.probe_interval:.0f}s between probes")
+        self._update_timer_gauges(unit, timer)
+
+    @staticmethod
+    def _update_timer_gauges(unit: int, timer: ResponseTimer):
+        if timer.srtt is not None:
+            metrics.set('slave_latency_seconds', timer.srtt, unit=unit)
+        metrics.set('slave_timeout_seconds', timer.timeout, unit=unit)
+        metrics.set('slave_unreachable', int(timer.unreachable), unit=unit)
+
+    async def _run(self, job: _Job):
+        if job.function not in REGISTER_READS:
+            response = await self._transact(job.unit, job.pdu)
+            if job.function in (WRITE_SINGLE_REGISTER, WRITE_MULTIPLE_REGISTERS):
+                address = struct.unpack('>H', job.pdu[1:3])[0]
+                count = 1 if job.function == WRITE_SINGLE_REGISTER else struct.unpack('>H', job.pdu[3:5])[0]
+                # Invalidate even on errors: the slave may have applied the write
+                self.cache.invalidate(job.unit, address, count)
+            self._resolve(job, response)
+            return
+
+        response = await self._transact(job.unit, struct.pack('>BHH', job.function, job.address, job.count))
+        if response[0] & 0x80:
+            widened = any((w.address, w.count) != (job.address, job.count) for w in job.waiters)
+            if widened and response[1] not in (GATEWAY_PATH_UNAVAILABLE, GATEWAY_TARGET_FAILED):
+                # The widened span may include addresses the slave rejects:
+                # retry each original request on its own
+                await self._run_separately(job)
+            else:
+                self._resolve(job, response)
+            return
+
+        registers = list(struct.unpack(f'>{job.count}H', response[2:2 + 2 * job.count]))
+        self.cache.put(job.unit, job.function, job.address, registers)
+        for waiter in job.waiters:
+            offset = waiter.address - job.address
+            if not waiter.future.done():
+                waiter.future.set_result(
+                    self._read_response(job.function, registers[offset:offset + waiter.count])
+                )
+
+    async def _run_separately(self, job: _Job):
+        spans: Dict[Tuple[int, int], List[_Waiter]] = {}
+        for waiter in job.waiters:
+            spans.setdefault((waiter.address, waiter.count), []).append(waiter)
+
+        for (address, count), waiters in spans.items():
+            if all(w.future.done() for w in waiters):
+                continue
+            single = _Job(unit=job.unit, function=job.function, address=address,
+                          count=count, waiters=waiters)
+            self._active = single
+            response = await self._transact(job.unit, struct.pack('>BHH', job.function, address, count))
+            if not response[0] & 0x80:
+                self.cache.put(job.unit, job.function, address,
+                               list(struct.unpack(f'>{count}H', response[2:2 + 2 * count])))
+            self._resolve(single, response)
+
+    @staticmethod
+    def _resolve(job: _Job, response: bytes):
+        for waiter in job.waiters:
+            if not waiter.future.done():
+                waiter.future.set_result(response)
+
+    @staticmethod
+    def _read_response(function: int, registers: List[int]) -> bytes:
+        return struct.pack(f'>BB{len(registers)}H', function, 2 * len(registers), *registers)
@@ -0,0 +1,140 @@
+"""
+MQTT Client Module
+Publishes telemetry and events to an MQTT broker over one long-lived connection
+"""
+import asyncio
+import json
+import logging
+import socket
+from typing import Any, Dict, List, Optional
+
+from asyncio_mqtt import Client, MqttError, Will
+
+from config import config
+from utils.metrics import metrics
+from .sample_record import as_dict
+
+logger = logging.getLogger(__name__)
+
+
+class MqttClient:
+    """
+    MQTT sink, selectable instead of BackendClient (--sink mqtt)
+    - persistent session: stable client id and clean_session=False, so the
+      broker keeps QoS 1 state across reconnects
+    - QoS 1: send_* returns only after the broker's PUBACK, so the upload
+      loop dequeues a sample only once it is delivered
+    - per-device topics: <prefix>/<device_id>/telemetry and .../events;
+      telemetry is retained, so a new subscriber gets the last value at once
+    - offline buffer: while the broker is unreachable send_* raises and the
+      samples wait in the SampleQueue (use --queue-policy spill to keep them
+      on disk)
+    """
+
+    def __init__(self):
+        self.client_id = config.mqtt.client_id or f"mtz-inverter-{socket.gethostname()}"
+        self._client: Optional[Client] = None
+        self._connect_lock = asyncio.Lock()
+
+        metrics.describe('mqtt_bytes_sent_total', 'Payload bytes published to the MQTT broker')
+
+    @property
+    def connected(self) -> bool:
+        return self._client is not None
+
+    @property
+    def availability_topic(self) -> str:
+        return f"{config.mqtt.topic_prefix}/service/{self.client_id}/availability"
+
+    def topic(self, device_id: Optional[str], kind: str) -> str:
+        """Per-device topic, e.g. mtzview/inverter/SUN2000-100KTL-M1/telemetry"""
+        return f"{config.mqtt.topic_prefix}/{device_id or 'unknown'}/{kind}"
+
+    async def connect(self):
+        """Open the connection (no-op if already connected)"""
+        async with self._connect_lock:
+            if self._client is not None:
+                return
+
+            client = Client(
+                config.mqtt.host,
+                config.mqtt.port,
+                username=config.mqtt.username,
+                password=config.mqtt.password,
+                client_id=self.client_id,
+                clean_session=False,
+                keepalive=config.mqtt.keepalive,
+                # Broker marks the service offline if the link drops
+                will=Will(self.availability_topic, 'offline', qos=1, retain=True),
+            )
+            await client.connect(timeout=config.backend.timeout)
+            self._client = client
+            await self._publish(self.availability_topic, 'online', retain=True)
+
+            logger.info(f"Connected to MQTT broker {config.mqtt.host}:{config.mqtt.port} "
+                        f"as {self.client_id}")
+
+    async def _publish(self, topic: str, payload: str, retain: bool = False):
+        client = self._client
+        if client is None:
+            raise MqttError("Not connected to MQTT broker")
+        try:
+            await client.publish(
+                topic, payload, qos=config.mqtt.qos, retain=retain,
+                timeout=config.backend.timeout,
+            )
+        except MqttError:
+            # Drop the connection; the next send reconnects with the same session
+            await self._discard()
+            raise
+        metrics.inc('mqtt_bytes_sent_total', len(payload))
+
+    async def _discard(self):
+        client, self._client = self._client, None
+        if client is not None:
+            try:
+                await client.disconnect(timeout=1)
+            except Exception:
+                pass
+
+    @staticmethod
+    def _encode(data: Any) -> str:
+        return json.dumps(data, separators=(',', ':'), default=str)
+
+    async def send_telemetry(self, data: Dict[str, Any]) -> bool:
+        """Publish one sample (retained last value)"""
+        try:
+            await self.connect()
+            await self._publish(self.topic(data.get('device_id'), 'telemetry'),
+                                self._encode(as_dict(data)), retain=True)
+            logger.debug("Telemetry published for %s", data.get('device_id'))
+            return True
+        except MqttError as e:
+            logger.error("MQTT error publishing telemetry: %s", e)
+            raise
+
+    async def send_events(self, events: List[Dict[str, Any]]) -> bool:
+        """Publish alarm/status transitions (not retained)"""
+        try:
+            await self.connect()
+            by_device: Dict[Optional[str], List[Dict[str, Any]]] = {}
+            for event in events:
+                by_device.setdefault(event.get('device_id'), []).append(event)
+            for device_id, device_events in by_device.items():
+                await self._publish(self.topic(device_id, 'events'),
+                                    self._encode({'events': device_events}))
+            logger.info("%d events published", len(events))
+            return True
+        except MqttError as e:
+            logger.error("MQTT error publishing events: %s", e)
+            raise
+
+    async def close(self):
+        """Announce a clean shutdown and disconnect"""
+        if self._client is None:
+            return
+        try:
+            await self._publish(self.availability_topic, 'offline', retain=True)
+        except MqttError:
+            pass
+        await self._discard()
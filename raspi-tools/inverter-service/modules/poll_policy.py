@@ -0,0 +1,114 @@
+"""
+Poll Policy Module
+Adapts the polling interval to the inverter state and power dynamics
+"""
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from huawei_solar import register_names as rn
+
+logger = logging.getLogger(__name__)
+
+# Registers whose rate of change drives fast polling
+POWER_REGISTERS = (rn.ACTIVE_POWER, rn.INPUT_POWER)
+
+MODE_SLOW = 'slow'
+MODE_FAST = 'fast'
+MODE_NORMAL = 'normal'
+
+
+class AdaptivePollPolicy:
+    """
+    Interval until the next poll, decided from each sample
+    - slow: DEVICE_STATUS starts with one of slow_states (standby, shutdown):
+      poll every max_interval
+    - fast: ACTIVE_POWER or INPUT_POWER changed faster than
+      power_rate_threshold (W/s): poll every min_interval, and keep doing so
+      for `hold` seconds after the last fast change
+    - normal: the configured poll_interval; coming out of fast mode the
+      interval doubles per calm sample instead of jumping back
+    The result is always within [min_interval, max_interval]
+    """
+
+    def __init__(self, settings):
+        # AdaptivePollingConfig; read on every call so reloads apply at once
+        self.settings = settings
+        self.mode = MODE_NORMAL
+        self.interval: Optional[float] = None
+        self.reason = ''
+        self._last_power: Dict[str, Tuple[float, float]] = {}
+        self._fast_until = 0.0
+        self._status: Optional[str] = None
+
+    @staticmethod
+    def _value(data: Dict[str, Any], field: str, register: str) -> Any:
+        entry = data.get(field, {}).get(register)
+        return entry.get('value') if isinstance(entry, dict) else None
+
+    def _power_rate(self, data: Dict[str, Any], now: float) -> Tuple[float, str]:
+        """Fastest |dP/dt| (W/s) among the power registers since the previous sample"""
+        fastest, fastest_register = 0.0, ''
+        for register in POWER_REGISTERS:
+            entry = data.get('power', {}).get(register)
+            value = entry.get('value') if isinstance(entry, dict) else None
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                continue
+            if entry.get('unit') == 'kW':
+                value *= 1000
+            previous = self._last_power.get(register)
+            self._last_power[register] = (now, value)
+            if previous is None or now <= previous[0]:
+                continue
+            rate = abs(value - previous[1]) / (now - previous[0])
+            if rate > fastest:
+                fastest, fastest_register = rate, register
+        return fastest, fastest_register
+
+    def next_interval(self, base: float, data: Optional[Dict[str, Any]] = None,
+                      now: Optional[float] = None) -> float:
+        """
+        Seconds until the next poll
+        base is the configured poll_interval; without data the decision is
+        recomputed from the last sample (e.g. after a config reload)
+        """
+        settings = self.settings
+        now = time.monotonic() if now is None else now
+        previous_mode = self.mode
+
+        if data is not None:
+            self._status = str(self._value(data, 'status', rn.DEVICE_STATUS) or '')
+            rate, register = self._power_rate(data, now)
+            if rate >= settings.power_rate_threshold:
+                self._fast_until = now + settings.hold
+                self.reason = f"{register} changing {rate:.0f} W/s"
+
+        if self._status and self._status.startswith(tuple(settings.slow_states)):
+            self.mode = MODE_SLOW
+            self.reason = f"status '{self._status}'"
+            interval = settings.max_interval
+        elif now < self._fast_until:
+            self.mode = MODE_FAST
+            interval = settings.min_interval
+        else:
+            self.mode = MODE_NORMAL
+            self.reason = 'steady'
+            interval = base
+            if self.interval is not None and self.interval < base:
+                # Relaxing after a transient
+                interval = min(self.interval * 2, base)
+
+        interval = max(settings.min_interval, min(interval, settings.max_interval))
+        if self.mode != previous_mode:
+            logger.info(f"Adaptive polling: {self.mode} ({self.reason}), every {interval:g}s")
+        self.interval = interval
+        return interval
+
+    def status_changed(self, status: Optional[str]) -> bool:
+        """
+        Device status from the alarm fast lane
+        Returns True if the current slow/normal decision no longer holds
+        and the next poll should not wait out the current interval
+        """
+        slow = bool(status) and status.startswith(tuple(self.settings.slow_states))
+        return slow != (self.mode == MODE_SLOW)
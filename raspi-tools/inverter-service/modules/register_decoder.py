@@ -0,0 +1,104 @@
+"""
+Register Decoder Module
+Decodes a whole register block in one pass with a precompiled struct format,
+instead of one huawei_solar Result per register
+"""
+import struct
+from typing import Any, Dict, List, Optional, Sequence
+
+# huawei_solar register classes whose decode() is an integer conversion, an
+# invalid-value check and a gain. Anything else (enums, bitfields, strings,
+# timestamps, absolute-value registers) keeps its own decode()
+STRUCT_CODES = {
+    'U16Register': 'H',
+    'I16Register': 'h',
+    'U32Register': 'I',
+    'I32Register': 'i',
+    'U64Register': 'Q',
+    'I64Register': 'q',
+}
+
+
+def _register_map() -> Dict[str, Any]:
+    from huawei_solar.registers import REGISTERS
+    return REGISTERS
+
+
+def _plain_unit(definition) -> bool:
+    unit = getattr(definition, 'unit', None)
+    return not callable(unit) and not isinstance(unit, dict)
+
+
+class BlockDecoder:
+    """
+    Decoder for one register block (as split_blocks() returns it)
+    The numeric registers are unpacked by a single struct.unpack_from() over
+    the raw block (big-endian words, unread gaps as pad bytes) and scaled
+    into the preallocated values list; after decode(), values[i] and
+    units[i] belong to names[i]. Values match huawei_solar's decode()
+    """
+
+    def __init__(self, names: Sequence[str], register_map: Optional[Dict[str, Any]] = None):
+        register_map = register_map if register_map is not None else _register_map()
+        definitions = [register_map[name] for name in names]
+        self.names = list(names)
+        self.start = min(definition.register for definition in definitions)
+        self.count = max(definition.register + definition.length for definition in definitions) - self.start
+        self.values: List[Any] = [None] * len(self.names)
+        # Same unit rule as huawei_solar's Result: None for mapped values
+        self.units: List[Optional[str]] = [
+            getattr(definition, 'unit', None) if _plain_unit(definition) else None
+            for definition in definitions
+        ]
+
+        # Raw block buffer, reused on every read
+        self._words = struct.Struct(f'>{self.count}H')
+        self._buffer = bytearray(self._words.size)
+        self._view = memoryview(self._buffer)
+
+        fmt = ['>']
+        position = 0
+        slots, gains, invalid = [], [], []
+        self._fallback = []
+        for slot, definition in sorted(enumerate(definitions), key=lambda item: item[1].register):
+            offset = definition.register - self.start
+            code = STRUCT_CODES.get(type(definition).__name__)
+            if (code is None or not _plain_unit(definition) or offset < position
+                    or struct.calcsize('>' + code) != definition.length * 2):
+                # Not a plain number, or overlapping one already in the format
+                self._fallback.append((slot, definition, offset))
+                continue
+            if offset > position:
+                fmt.append(f'{(offset - position) * 2}x')
+            fmt.append(code)
+            position = offset + definition.length
+            slots.append(slot)
+            gains.append(getattr(definition, 'gain', 1))
+            invalid.append(getattr(definition, '_invalid_value', None))
+        self._struct = struct.Struct(''.join(fmt))
+        self._fields = tuple(zip(slots, gains, invalid))
+
+    def decode(self, block) -> List[Any]:
+        """Decode a raw block (bytes-like, big-endian words from self.start)"""
+        values = self.values
+        for (slot, gain, invalid), raw in zip(self._fields, self._struct.unpack_from(block)):
+            if raw == invalid:
+                values[slot] = None
+            elif gain != 1:
+                values[slot] = raw / gain
+            else:
+                values[slot] = raw
+        for slot, definition, offset in self._fallback:
+            words = struct.unpack_from(f'>{definition.length}H', block, offset * 2)
+            values[slot] = definition.decode(list(words))
+        return values
+
+    def decode_registers(self, registers: Sequence[int]) -> List[Any]:
+        """Decode a block read as register values (pymodbus response.registers)"""
+        self._words.pack_into(self._buffer, 0, *registers)
+        return self.decode(self._view)
+
+    @property
+    def fast_fields(self) -> int:
+        """Registers decoded by the struct format"""
+        return len(self._fields)
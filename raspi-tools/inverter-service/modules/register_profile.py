@@ -0,0 +1,281 @@
+"""
+Register Profile Module
+Compiles declarative register profiles (JSON) into cached read plans
+"""
+import hashlib
+import json
+import logging
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.files import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# Profile shipped with the service
+DEFAULT_PROFILE = Path(__file__).resolve().parent.parent / 'register_profiles' / 'sun2000.json'
+
+# Bumped when the compiled plan format changes (invalidates cached plans)
+PLAN_FORMAT = 1
+
+# Same batching limits huawei_solar applies inside batch_update()
+MAX_BATCHED_REGISTERS_COUNT = 64
+MAX_BATCHED_REGISTERS_GAP = 16
+
+
+class ProfileError(ValueError):
+    """Invalid register profile"""
+
+
+@dataclass
+class RegisterGroup:
+    """One group of a register profile"""
+    name: str
+    field: str
+    registers: List[str]
+    # Seconds between reads (None = every poll)
+    period: Optional[float] = None
+    # Absolute deadband per register (changes within it are not reported)
+    deadband: Dict[str, float] = field(default_factory=dict)
+    # Registers come from the device's NB_PV_STRINGS instead of the profile
+    pv_strings: bool = False
+
+
+@dataclass
+class ReadPlan:
+    """
+    Compiled register profile
+    The plan reads every group that is due in the blocks batch_update would
+    build, so adjacent groups share Modbus requests, and routes the results
+    to their destination fields through the decoder table
+    """
+    name: str
+    profile_hash: str
+    groups: List[RegisterGroup]
+    # register -> (destination field, deadband)
+    decoder: Dict[str, Tuple[str, Optional[float]]] = field(default_factory=dict)
+    # Estimated Modbus requests for a full read (all groups due)
+    requests_per_cycle: int = 0
+
+    @property
+    def fields(self) -> List[str]:
+        """Destination fields in profile order"""
+        return list(dict.fromkeys(group.field for group in self.groups))
+
+    @property
+    def status_registers(self) -> List[str]:
+        """Registers of the 'status' field, read by the alarm fast lane"""
+        return [r for group in self.groups if group.field == 'status' for r in group.registers]
+
+    def group(self, name: str) -> Optional[RegisterGroup]:
+        for group in self.groups:
+            if group.name == name:
+                return group
+        return None
+
+    def set_pv_registers(self, registers: List[str]):
+        """Fill the pv_strings groups with the registers for the device's strings"""
+        for group in self.groups:
+            if group.pv_strings:
+                for register in group.registers:
+                    self.decoder.pop(register, None)
+                group.registers = list(registers)
+                self._index_group(group)
+        self.requests_per_cycle = estimate_requests(
+            [r for group in self.groups if group.field != 'status' for r in group.registers]
+        )
+
+    def due_groups(self, now: float, last_read: Dict[str, float]) -> List[RegisterGroup]:
+        """Groups never read or whose period has elapsed"""
+        due = []
+        for group in self.groups:
+            previous = last_read.get(group.name)
+            if previous is None or group.period is None or now - previous >= group.period:
+                due.append(group)
+        return due
+
+    def _index_group(self, group: RegisterGroup):
+        default = group.deadband.get('*')
+        for register in group.registers:
+            self.decoder[register] = (group.field, group.deadband.get(register, default))
+
+    def build_decoder(self):
+        self.decoder = {}
+        for group in self.groups:
+            self._index_group(group)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'format': PLAN_FORMAT,
+            'name': self.name,
+            'profile_hash': self.profile_hash,
+            'requests_per_cycle': self.requests_per_cycle,
+            'groups': [asdict(group) for group in self.groups],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ReadPlan':
+        plan = cls(
+            name=data['name'],
+            profile_hash=data['profile_hash'],
+            groups=[RegisterGroup(**group) for group in data['groups']],
+            requests_per_cycle=data['requests_per_cycle'],
+        )
+        plan.build_decoder()
+        return plan
+
+
+def _register_map() -> Dict[str, Any]:
+    # Imported here so loading a cached plan does not need the register table
+    from huawei_solar.registers import REGISTERS
+    return REGISTERS
+
+
+def split_blocks(registers: List[str]) -> List[List[str]]:
+    """
+    Registers grouped into the Modbus requests batch_update() would make,
+    in address order; reading each block on its own costs no extra requests
+    """
+    register_map = _register_map()
+    known = sorted((name for name in registers if name in register_map),
+                   key=lambda name: register_map[name].register)
+
+    blocks: List[List[str]] = []
+    first_start = last_end = 0
+    for name in known:
+        start = register_map[name].register
+        end = start + register_map[name].length - 1
+        if blocks and end - first_start <= MAX_BATCHED_REGISTERS_COUNT and start - last_end < MAX_BATCHED_REGISTERS_GAP:
+            blocks[-1].append(name)
+            last_end = end
+        else:
+            blocks.append([name])
+            first_start, last_end = start, end
+    return blocks
+
+
+def estimate_requests(registers: List[str]) -> int:
+    """Modbus requests batch_update() needs for these registers"""
+    return len(split_blocks(registers))
+
+
+def compile_profile(profile: Dict[str, Any], profile_hash: str = '') -> ReadPlan:
+    """Validate a parsed profile and compile it into a read plan"""
+    if not isinstance(profile, dict) or not isinstance(profile.get('groups'), list):
+        raise ProfileError("Profile must be an object with a 'groups' list")
+
+    register_map = _register_map()
+    groups: List[RegisterGroup] = []
+    seen_registers: Dict[str, str] = {}
+
+    for index, raw in enumerate(profile['groups']):
+        if not isinstance(raw, dict):
+            raise ProfileError(f"Group #{index + 1} must be an object")
+        name = raw.get('name')
+        if not name or not isinstance(name, str):
+            raise ProfileError(f"Group #{index + 1} has no name")
+        if any(group.name == name for group in groups):
+            raise ProfileError(f"Duplicate group '{name}'")
+
+        unknown = set(raw) - {'name', 'field', 'registers', 'period', 'deadband', 'pv_strings'}
+        if unknown:
+            raise ProfileError(f"Group '{name}': unknown option(s) {', '.join(sorted(unknown))}")
+
+        pv_strings = bool(raw.get('pv_strings', False))
+        registers = raw.get('registers', [])
+        if not isinstance(registers, list) or not all(isinstance(r, str) for r in registers):
+            raise ProfileError(f"Group '{name}': registers must be a list of register names")
+        if not registers and not pv_strings:
+            raise ProfileError(f"Group '{name}' has no registers")
+        if pv_strings and registers:
+            raise ProfileError(f"Group '{name}': pv_strings groups take their registers from the device")
+
+        for register in registers:
+            if register not in register_map:
+                raise ProfileError(f"Group '{name}': unknown register '{register}'")
+            if register in seen_registers:
+                raise ProfileError(
+                    f"Register '{register}' is in groups '{seen_registers[register]}' and '{name}'"
+                )
+            seen_registers[register] = name
+
+        period = raw.get('period')
+        if period is not None and (not isinstance(period, (int, float)) or period <= 0):
+            raise ProfileError(f"Group '{name}': period must be a positive number of seconds")
+
+        deadband = raw.get('deadband', {})
+        if isinstance(deadband, (int, float)):
+            deadband = {'*': deadband}
+        if not isinstance(deadband, dict):
+            raise ProfileError(f"Group '{name}': deadband must be a number or an object")
+        for register, value in deadband.items():
+            if register != '*' and register not in registers and not pv_strings:
+                raise ProfileError(f"Group '{name}': deadband for '{register}', which is not in the group")
+            if not isinstance(value, (int, float)) or value < 0:
+                raise ProfileError(f"Group '{name}': deadband for '{register}' must be >= 0")
+
+        groups.append(RegisterGroup(
+            name=name,
+            field=raw.get('field', name),
+            registers=list(registers),
+            period=period,
+            deadband=dict(deadband),
+            pv_strings=pv_strings,
+        ))
+
+    if not groups:
+        raise ProfileError("Profile has no groups")
+
+    plan = ReadPlan(name=profile.get('name', 'unnamed'), profile_hash=profile_hash, groups=groups)
+    plan.build_decoder()
+    plan.requests_per_cycle = estimate_requests(
+        [r for group in groups if group.field != 'status' for r in group.registers]
+    )
+    return plan
+
+
+def profile_hash(content: bytes) -> str:
+    """Hash of the profile file plus the plan format"""
+    digest = hashlib.sha256(content)
+    digest.update(f"format={PLAN_FORMAT}".encode())
+    return digest.hexdigest()[:16]
+
+
+def load_read_plan(path: Optional[str] = None, cache_dir: Optional[str] = None) -> ReadPlan:
+    """
+    Read plan for a profile file
+    The compiled plan is cached as <cache_dir>/read_plan-<hash>.json, so an
+    unchanged profile is never validated or compiled again
+    """
+    profile_path = Path(path) if path else DEFAULT_PROFILE
+    content = profile_path.read_bytes()
+    digest = profile_hash(content)
+
+    cache_path = Path(cache_dir) / f"read_plan-{digest}.json" if cache_dir else None
+    if cache_path and cache_path.exists():
+        try:
+            with open(cache_path, 'r') as f:
+                plan = ReadPlan.from_dict(json.load(f))
+            logger.debug(f"Using cached read plan {cache_path}")
+            return plan
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable read plan cache {cache_path}: {e}")
+
+    try:
+        profile = json.loads(content)
+    except ValueError as e:
+        raise ProfileError(f"{profile_path}: {e}") from None
+
+    try:
+        plan = compile_profile(profile, digest)
+    except ProfileError as e:
+        raise ProfileError(f"{profile_path}: {e}") from None
+
+    if cache_path:
+        try:
+            write_json_atomic(cache_path, plan.to_dict(), indent=2)
+        except OSError as e:
+            logger.warning(f"Could not write read plan cache {cache_path}: {e}")
+
+    return plan
@@ -0,0 +1,283 @@
+"""
+Sample Queue Module
+Bounded in-memory queue between the acquisition and upload stages
+"""
+import asyncio
+import json
+import logging
+import shutil
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Optional
+
+from utils.metrics import metrics
+from .sample_record import Sample, as_dict
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ('drop_oldest', 'coalesce', 'spill')
+
+
+class SampleSequencer:
+    """
+    Tags samples with the service boot ID and a per-device sequence number
+    (device_id, boot_id, sequence) identifies a sample: the backend drops
+    the duplicates left by retries, so uploads can overlap and be retried
+    freely. The boot ID is new on every start, so counters need no storage
+    """
+
+    def __init__(self, boot_id: Optional[str] = None):
+        self.boot_id = boot_id or uuid.uuid4().hex
+        self._last: Dict[str, int] = {}
+
+    def stamp(self, sample: Dict[str, Any]) -> Dict[str, Any]:
+        """Add boot_id and the next sequence number to the sample metadata"""
+        device_id = str(sample.get('device_id'))
+        sequence = self._last.get(device_id, 0) + 1
+        self._last[device_id] = sequence
+
+        metadata = sample.metadata if isinstance(sample, Sample) else sample.setdefault('metadata', {})
+        metadata['boot_id'] = self.boot_id
+        metadata['sequence'] = sequence
+        return sample
+
+
+class SampleQueue:
+    """
+    Bounded FIFO of telemetry samples with a configurable overflow policy
+    Samples are Sample records, or dicts when read back from the spool
+    put() never blocks the acquisition stage; when the queue is full:
+      - drop_oldest: the oldest queued sample is discarded
+      - coalesce:    the newest queued sample is replaced by the incoming one
+      - spill:       samples are appended to a spool file on disk and fed
+                     back in FIFO order as the uploader catches up
+    """
+
+    SPILL_FILE = 'queue.jsonl'
+    OFFSET_FILE = 'queue.offset'
+
+    def __init__(self, max_size: int, overflow_policy: str = 'drop_oldest',
+                 spill_dir: Optional[str] = None, name: str = 'telemetry'):
+        if max_size < 1:
+            raise ValueError("Queue size must be at least 1")
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid overflow policy: {overflow_policy}")
+        if overflow_policy == 'spill' and not spill_dir:
+            raise ValueError("Spill policy requires a spill directory")
+
+        self.name = name
+        self.max_size = max_size
+        self.overflow_policy = overflow_policy
+        self._items: Deque[Dict[str, Any]] = deque()
+        self._not_empty = asyncio.Event()
+
+        self._spill_path: Optional[Path] = None
+        self._offset_path: Optional[Path] = None
+        self._spilled = 0
+        if overflow_policy == 'spill':
+            spool = Path(spill_dir)
+            spool.mkdir(parents=True, exist_ok=True)
+            self._spill_path = spool / self.SPILL_FILE
+            self._offset_path = spool / self.OFFSET_FILE
+            self._spilled = self._count_spilled()
+            if self._spilled:
+                logger.info(f"Recovered {self._spilled} spilled samples from {self._spill_path}")
+                self._refill()
+
+        metrics.describe('queue_depth', 'Samples waiting in memory for upload')
+        metrics.describe('queue_spilled', 'Samples waiting on disk for upload')
+        metrics.describe('queue_dropped_total', 'Samples discarded by the overflow policy')
+        metrics.describe('queue_coalesced_total', 'Samples merged by the overflow policy')
+        self._update_gauges()
+
+    def __len__(self) -> int:
+        return len(self._items) + self._spilled
+
+    @property
+    def depth(self) -> int:
+        """Samples held in memory"""
+        return len(self._items)
+
+    @property
+    def spilled(self) -> int:
+        """Samples held on disk"""
+        return self._spilled
+
+    def put(self, sample: Dict[str, Any]):
+        """Enqueue a sample, applying the overflow policy if full"""
+        metrics.inc('queue_enqueued_total', queue=self.name)
+
+        if self._spilled or len(self._items) >= self.max_size:
+            self._overflow(sample)
+        else:
+            self._items.append(sample)
+
+        self._not_empty.set()
+        self._update_gauges()
+
+    def _overflow(self, sample: Dict[str, Any]):
+        if self.overflow_policy == 'spill':
+            self._spill(sample)
+        elif self.overflow_policy == 'coalesce':
+            self._items[-1] = sample
+            metrics.inc('queue_coalesced_total', queue=self.name)
+            logger.debug("Queue full, coalesced newest sample")
+        else:
+            self._items.popleft()
+            self._items.append(sample)
+            metrics.inc('queue_dropped_total', queue=self.name)
+            logger.warning("Queue full (%d), dropped oldest sample", self.max_size)
+
+    def put_back(self, sample: Dict[str, Any]):
+        """Return a dequeued sample to the head of the queue (upload cancelled)"""
+        self._items.appendleft(sample)
+        self._not_empty.set()
+        self._update_gauges()
+
+    async def get(self) -> Dict[str, Any]:
+        """Wait for and return the oldest sample"""
+        while not self._items:
+            if self._spilled:
+                self._refill()
+                continue
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        sample = self._items.popleft()
+        if self._spilled:
+            self._refill()
+        metrics.inc('queue_dequeued_total', queue=self.name)
+        self._update_gauges()
+        return sample
+
+    def get_nowait(self) -> Optional[Dict[str, Any]]:
+        """Return the oldest sample or None if the queue is empty"""
+        if not self._items:
+            return None
+        sample = self._items.popleft()
+        if self._spilled:
+            self._refill()
+        metrics.inc('queue_dequeued_total', queue=self.name)
+        self._update_gauges()
+        return sample
+
+    def _update_gauges(self):
+        metrics.set('queue_depth', len(self._items), queue=self.name)
+        metrics.set('queue_spilled', self._spilled, queue=self.name)
+
+    # ==================== Disk spill ====================
+
+    def _read_offset(self) -> int:
+        try:
+            return int(self._offset_path.read_text().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _count_spilled(self) -> int:
+        if not self._spill_path.exists():
+            return 0
+        with open(self._spill_path, 'rb') as f:
+            f.seek(self._read_offset())
+            return sum(1 for _ in f)
+
+    def _spill(self, sample: Dict[str, Any]):
+        try:
+            with open(self._spill_path, 'a') as f:
+                f.write(json.dumps(as_dict(sample), default=str) + '\n')
+            self._spilled += 1
+            metrics.inc('queue_spilled_total', queue=self.name)
+        except OSError as e:
+            # Disk full or unavailable: fall back to dropping the oldest sample
+            logger.error("Could not spill sample to %s: %s", self._spill_path, e)
+            if self._items:
+                self._items.popleft()
+            self._items.append(sample)
+            metrics.inc('queue_dropped_total', queue=self.name)
+
+    def persist(self):
+        """
+        Write in-memory samples back to the spool (spill policy only)
+        Called on shutdown so a restart resumes with nothing lost
+        """
+        if self.overflow_policy != 'spill' or not self._items:
+            return
+
+        backlog = b''
+        if self._spilled and self._spill_path.exists():
+            with open(self._spill_path, 'rb') as f:
+                f.seek(self._read_offset())
+                backlog = f.read()
+
+        tmp_path = self._spill_path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            for sample in self._items:
+                f.write((json.dumps(as_dict(sample), default=str) + '\n').encode())
+            f.write(backlog)
+        tmp_path.replace(self._spill_path)
+        self._offset_path.unlink(missing_ok=True)
+
+        logger.info(f"Persisted {len(self._items)} queued samples to {self._spill_path}")
+        self._spilled += len(self._items)
+        self._items.clear()
+        self._update_gauges()
+
+    def take_spilled(self, target: Path) -> int:
+        """
+        Hand the on-disk backlog over for bulk export
+        The spool file is moved to target as is; if part of it was already
+        loaded back into memory, target.offset holds where the rest starts.
+        In-memory samples stay queued. Returns the number of samples moved
+        """
+        if not self._spilled:
+            return 0
+
+        offset = self._read_offset()
+        if offset:
+            target.with_suffix('.offset').write_text(str(offset))
+        shutil.move(str(self._spill_path), str(target))
+        self._offset_path.unlink(missing_ok=True)
+
+        moved, self._spilled = self._spilled, 0
+        self._update_gauges()
+        logger.info(f"Moved {moved} spilled samples to {target}")
+        return moved
+
+    def _refill(self):
+        """Move spilled samples back into memory while there is room"""
+        room = self.max_size - len(self._items)
+        if room <= 0:
+            return
+
+        offset = self._read_offset()
+        loaded = consumed = 0
+        try:
+            with open(self._spill_path, 'rb') as f:
+                f.seek(offset)
+                while loaded < room:
+                    line = f.readline()
+                    if not line:
+                        break
+                    offset += len(line)
+                    consumed += 1
+                    try:
+                        self._items.append(json.loads(line))
+                        loaded += 1
+                    except ValueError:
+                        logger.warning("Skipping corrupt line in spill file")
+        except OSError as e:
+            logger.error(f"Could not read spill file {self._spill_path}, discarding backlog: {e}")
+            metrics.inc('queue_dropped_total', self._spilled, queue=self.name)
+            self._spilled = 0
+            return
+
+        self._spilled = 0 if not consumed else max(0, self._spilled - consumed)
+        if self._spilled == 0:
+            # Backlog fully drained: start a fresh spool file
+            self._spill_path.unlink(missing_ok=True)
+            self._offset_path.unlink(missing_ok=True)
+        else:
+            self._offset_path.write_text(str(offset))
+
+        if loaded:
+            logger.debug(f"Loaded {loaded} spilled samples back into memory")
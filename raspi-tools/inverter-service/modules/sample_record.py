@@ -0,0 +1,195 @@
+"""
+Sample Record Module
+Compact in-memory telemetry samples. Fields, registers, units and value
+types live once in a shared schema; each sample holds its numbers packed in
+one bytes string plus a short tuple of the other values. The nested
+{'field': {'register': {'value', 'unit'}}} dict is only built to serialize
+"""
+import struct
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+INT_RANGE = (-2 ** 63, 2 ** 63)
+
+
+class _Missing:
+    """Register with no value yet (absent from the field, unlike a None value)"""
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'MISSING'
+
+    def __reduce__(self):
+        return 'MISSING'
+
+
+MISSING = _Missing()
+
+
+def kind_of(value: Any) -> str:
+    """Storage of a value: 'd' packed float, 'q' packed int, 'o' kept as object"""
+    if type(value) is float:
+        return 'd'
+    if type(value) is int and INT_RANGE[0] <= value < INT_RANGE[1]:
+        return 'q'
+    return 'o'
+
+
+class SampleSchema:
+    """
+    Layout shared by the samples of a register plan: the sample fields, in
+    order, and the (field, register) slot, unit and storage kind of each
+    value. Packed numbers and kept objects are both in slot order
+    """
+    __slots__ = ('fields', 'slots', 'units', 'kinds', '_struct', '_field_slots', '_index', '_positions')
+
+    def __init__(self, fields: Tuple[str, ...], slots: Tuple[Tuple[str, str], ...],
+                 units: Tuple[Optional[str], ...], kinds: str):
+        self.fields = fields
+        self.slots = slots
+        self.units = units
+        self.kinds = kinds
+        self._struct = struct.Struct('<' + ''.join(kind for kind in kinds if kind != 'o'))
+
+        by_field: Dict[str, list] = {field: [] for field in fields}
+        for index, (field, _) in enumerate(slots):
+            by_field.setdefault(field, []).append(index)
+        self._field_slots = {field: tuple(indexes) for field, indexes in by_field.items()}
+        self._index = {slot: index for index, slot in enumerate(slots)}
+
+        # Slot -> (packed?, position among the packed numbers or the objects)
+        numbers = objects = 0
+        positions = []
+        for kind in kinds:
+            if kind == 'o':
+                positions.append((False, objects))
+                objects += 1
+            else:
+                positions.append((True, numbers))
+                numbers += 1
+        self._positions = tuple(positions)
+
+    def pack(self, values: Sequence[Any]) -> Tuple[bytes, Tuple[Any, ...]]:
+        """Packed numbers and kept objects of a values sequence in slot order"""
+        kinds = self.kinds
+        numbers = [value for value, kind in zip(values, kinds) if kind != 'o']
+        objects = tuple(value for value, kind in zip(values, kinds) if kind == 'o')
+        return self._struct.pack(*numbers), objects
+
+    def unpack(self, packed: bytes, objects: Tuple[Any, ...]) -> Tuple[Any, ...]:
+        """Values in slot order"""
+        numbers = self._struct.unpack(packed)
+        return tuple(numbers[position] if is_packed else objects[position]
+                     for is_packed, position in self._positions)
+
+    def field_slots(self, field: str) -> Tuple[int, ...]:
+        return self._field_slots.get(field, ())
+
+    def index(self, field: str, register: str) -> Optional[int]:
+        return self._index.get((field, register))
+
+
+@lru_cache(maxsize=64)
+def schema_for(fields: Tuple[str, ...], slots: Tuple[Tuple[str, str], ...],
+               units: Tuple[Optional[str], ...], kinds: str) -> SampleSchema:
+    """The shared schema for a layout (one instance per distinct layout)"""
+    return SampleSchema(fields, slots, units, kinds)
+
+
+class Sample:
+    """
+    One telemetry sample
+    Reads like the sample dict (sample['power'], sample.get('status'),
+    sample['metadata']) so consumers need no changes; to_dict() gives the
+    serialized form
+    """
+    __slots__ = ('schema', 'device_id', 'read_at', 'packed', 'objects', 'metadata')
+
+    def __init__(self, schema: SampleSchema, device_id: Optional[str], read_at: float,
+                 packed: bytes, objects: Tuple[Any, ...], metadata: Dict[str, Any]):
+        self.schema = schema
+        self.device_id = device_id
+        # Epoch seconds; serialized as the ISO 'timestamp' and 'read_timestamp'
+        self.read_at = read_at
+        self.packed = packed
+        self.objects = objects
+        self.metadata = metadata
+
+    @classmethod
+    def build(cls, fields: Sequence[str], slots: Tuple[Tuple[str, str], ...], units: Tuple[Optional[str], ...],
+              values: List[Any], device_id: Optional[str], read_at: float, metadata: Dict[str, Any]) -> 'Sample':
+        """Sample from values in slot order, with the shared schema for their layout"""
+        schema = schema_for(tuple(fields), slots, units, ''.join(map(kind_of, values)))
+        packed, objects = schema.pack(values)
+        return cls(schema, device_id, read_at, packed, objects, metadata)
+
+    @property
+    def values(self) -> Tuple[Any, ...]:
+        return self.schema.unpack(self.packed, self.objects)
+
+    @property
+    def timestamp(self) -> str:
+        return datetime.fromtimestamp(self.read_at).isoformat()
+
+    def value(self, field: str, register: str, default: Any = None) -> Any:
+        index = self.schema.index(field, register)
+        if index is None:
+            return default
+        value = self.values[index]
+        return default if value is MISSING else value
+
+    def field(self, field: str, values: Optional[Tuple[Any, ...]] = None) -> Dict[str, Dict[str, Any]]:
+        """One field as in the sample dict: {register: {'value', 'unit'}}"""
+        schema = self.schema
+        values = values if values is not None else self.values
+        return {
+            schema.slots[index][1]: {'value': values[index], 'unit': schema.units[index]}
+            for index in schema.field_slots(field)
+            if values[index] is not MISSING
+        }
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'device_id':
+            return self.device_id
+        if key == 'timestamp':
+            return self.timestamp
+        if key == 'metadata':
+            return self.metadata
+        if key in self.schema.fields:
+            return self.field(key)
+        raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in ('device_id', 'timestamp', 'metadata') or key in self.schema.fields
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in self else default
+
+    def to_dict(self) -> Dict[str, Any]:
+        timestamp = self.timestamp
+        values = self.values
+        data: Dict[str, Any] = {'device_id': self.device_id, 'timestamp': timestamp}
+        for field in self.schema.fields:
+            data[field] = self.field(field, values)
+        data['metadata'] = {**self.metadata, 'read_timestamp': timestamp}
+        return data
+
+    def __reduce__(self):
+        # Pickled (fleet workers -> supervisor) with its layout, which the
+        # receiving process interns again
+        schema = self.schema
+        return _restore, (schema.fields, schema.slots, schema.units, schema.kinds,
+                          self.device_id, self.read_at, self.packed, self.objects, self.metadata)
+
+    def __repr__(self):
+        return f"Sample({self.device_id!r}, {self.timestamp}, {len(self.schema.slots)} values)"
+
+
+def _restore(fields, slots, units, kinds, device_id, read_at, packed, objects, metadata) -> Sample:
+    return Sample(schema_for(fields, slots, units, kinds), device_id, read_at, packed, objects, metadata)
+
+
+def as_dict(sample: Any) -> Dict[str, Any]:
+    """Serializable form of a queued sample (a Sample, or a dict read back from the spool)"""
+    return sample.to_dict() if isinstance(sample, Sample) else sample
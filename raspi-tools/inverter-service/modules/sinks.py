@@ -0,0 +1,311 @@
+"""
+Sinks Module
+Fan-out of telemetry to destinations besides the backend upload: a local
+historian file and other collectors. Every sink has its own bounded queue,
+retry state and task, so a slow or failing sink falls behind (and drops
+under its own overflow policy) without holding back the others or polling
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from config import SinksConfig
+from utils.metrics import metrics
+from .sample_queue import SampleQueue
+from .sample_record import Sample, as_dict
+
+logger = logging.getLogger(__name__)
+
+# Target keys that override the section defaults for one sink
+LANE_SETTINGS = ('queue_size', 'overflow_policy', 'max_batch')
+
+
+class Sink:
+    """A destination for batches of samples; send() raises to have the batch retried"""
+
+    def __init__(self, name: str, target: Dict[str, Any]):
+        self.name = name
+        self.target = target
+
+    def send(self, samples: List[Any]):
+        """Deliver a batch (blocking; runs in a worker thread)"""
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class HistorianSink(Sink):
+    """
+    Local historian: one JSON line per sample (the uploaded form), in one
+    file per day (<path>/telemetry-<YYYY-MM-DD>.jsonl). A batch is stored
+    whole or not at all. Files older than retention_days are deleted (0 = kept)
+    """
+
+    def __init__(self, name: str, target: Dict[str, Any]):
+        super().__init__(name, target)
+        self.directory = Path(target['path'])
+        self.retention_days = int(target.get('retention_days', 30))
+        self._pruned: Optional[str] = None
+
+    def send(self, samples: List[Any]):
+        by_day: Dict[str, List[str]] = {}
+        for sample in samples:
+            record = as_dict(sample)
+            day = str(record.get('timestamp') or date.today().isoformat())[:10]
+            by_day.setdefault(day, []).append(json.dumps(record, separators=(',', ':'), default=str))
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # All or nothing: a failed batch is sent again, so whatever part of
+        # it was appended is cut off again first
+        written: List[Tuple[Path, int]] = []
+        try:
+            for day, lines in by_day.items():
+                path = self.directory / f"telemetry-{day}.jsonl"
+                with open(path, 'a') as f:
+                    written.append((path, f.tell()))
+                    f.write('\n'.join(lines) + '\n')
+        except OSError:
+            for path, size in written:
+                try:
+                    os.truncate(path, size)
+                except OSError as e:
+                    logger.error(f"Historian {self.name}: could not roll back {path.name}: {e}")
+            raise
+        self._prune()
+
+    def _prune(self):
+        today = date.today().isoformat()
+        if self.retention_days <= 0 or self._pruned == today:
+            return
+        self._pruned = today
+        oldest = (date.today() - timedelta(days=self.retention_days - 1)).isoformat()
+        for path in self.directory.glob('telemetry-*.jsonl'):
+            if path.stem[len('telemetry-'):] < oldest:
+                path.unlink(missing_ok=True)
+                logger.info(f"Historian {self.name}: removed {path.name} (older than {self.retention_days} days)")
+
+    def describe(self) -> str:
+        retention = f"{self.retention_days} days" if self.retention_days > 0 else "kept"
+        return f"file {self.directory}/telemetry-<day>.jsonl ({retention})"
+
+
+class CollectorSink(Sink):
+    """
+    Another collector speaking the backend API: each batch is one
+    gzip-compressed POST of {"samples": [...]} to its telemetry batch
+    endpoint. Samples keep their sequence numbers, so retried batches are
+    deduplicated there as on the backend
+    """
+
+    def __init__(self, name: str, target: Dict[str, Any]):
+        super().__init__(name, target)
+        self.url = target['url'].rstrip('/') + target.get('endpoint', '/api/inverter/telemetry/batch')
+        self.timeout = float(target.get('timeout', 10))
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'User-Agent': 'MTZ-Inverter-Service/1.0'
+        })
+
+    def send(self, samples: List[Any]):
+        body = json.dumps({'samples': [as_dict(sample) for sample in samples]},
+                          separators=(',', ':'), default=str).encode()
+        response = self.session.post(
+            self.url,
+            data=gzip.compress(body, compresslevel=6),
+            headers={'Content-Encoding': 'gzip'},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+
+    def describe(self) -> str:
+        return f"http {self.url}"
+
+    def close(self):
+        self.session.close()
+
+
+SINK_CLASSES = {'file': HistorianSink, 'http': CollectorSink}
+
+
+def lane_key(target: Dict[str, Any], settings: SinksConfig) -> Dict[str, Any]:
+    """Settings a sink lane is built from"""
+    return {'target': dict(target), 'spill_dir': settings.spill_dir,
+            **{key: getattr(settings, key) for key in LANE_SETTINGS}}
+
+
+def _read_at(sample: Any) -> Optional[float]:
+    """Acquisition time of a sample (epoch seconds)"""
+    if isinstance(sample, Sample):
+        return sample.read_at
+    try:
+        return datetime.fromisoformat(sample['timestamp']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class SinkLane:
+    """
+    One sink with its queue and retry state
+    A task takes up to max_batch queued samples and sends them until the
+    sink accepts them, waiting retry_delay after a failure and doubling it
+    up to max_retry_delay. Meanwhile new samples queue under the sink's
+    overflow policy
+    """
+
+    def __init__(self, target: Dict[str, Any], settings: SinksConfig):
+        self.name = target['name']
+        self.settings = settings
+        self.max_batch = int(target.get('max_batch', settings.max_batch))
+        overflow_policy = target.get('overflow_policy', settings.overflow_policy)
+        self.queue = SampleQueue(
+            max_size=int(target.get('queue_size', settings.queue_size)),
+            overflow_policy=overflow_policy,
+            spill_dir=str(Path(settings.spill_dir) / self.name) if overflow_policy == 'spill' else None,
+            name=self.name,
+        )
+        self.sink = SINK_CLASSES[target['type']](self.name, target)
+        # What the lane was built from (a change needs a new lane); retry
+        # delays are read live
+        self.key = lane_key(target, settings)
+        self.failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def put(self, sample: Any):
+        self.queue.put(sample)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.max_batch:
+                sample = self.queue.get_nowait()
+                if sample is None:
+                    break
+                batch.append(sample)
+
+            try:
+                while True:
+                    started = loop.time()
+                    try:
+                        await asyncio.to_thread(self.sink.send, batch)
+                        break
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        delay = min(self.settings.retry_delay * 2 ** self.failures, self.settings.max_retry_delay)
+                        self.failures += 1
+                        metrics.inc('sink_errors_total', sink=self.name)
+                        metrics.set('sink_up', 0, sink=self.name)
+                        logger.error("Sink %s: failed to send %d samples: %s (%d queued, retry in %.0fs)",
+                                     self.name, len(batch), e, len(self.queue), delay)
+                        await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                # Stopping: the batch goes back to the head of the queue
+                for sample in reversed(batch):
+                    self.queue.put_back(sample)
+                raise
+
+            if self.failures:
+                logger.info(f"Sink {self.name}: delivering again after {self.failures} failed attempts")
+                self.failures = 0
+            metrics.set('sink_up', 1, sink=self.name)
+            metrics.set('sink_send_seconds', loop.time() - started, sink=self.name)
+            metrics.inc('sink_samples_total', len(batch), sink=self.name)
+            read_at = _read_at(batch[-1])
+            if read_at is not None:
+                metrics.set('sink_lag_seconds', max(time.time() - read_at, 0.0), sink=self.name)
+
+    async def stop(self) -> List[Any]:
+        """
+        Stop the task and close the sink; returns the samples still queued in
+        memory (a spill queue keeps them on disk instead)
+        """
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.sink.close()
+
+        if self.queue.overflow_policy == 'spill':
+            self.queue.persist()
+            return []
+        backlog = []
+        while (sample := self.queue.get_nowait()) is not None:
+            backlog.append(sample)
+        return backlog
+
+
+class SinkFanout:
+    """
+    The extra sinks, all fed the samples the upload queue gets
+    put() only appends to each sink's queue, so acquisition never waits on
+    a sink. configure() applies a new target list at runtime: unchanged
+    sinks keep running, changed ones are rebuilt keeping their backlog
+    """
+
+    def __init__(self):
+        self.lanes: Dict[str, SinkLane] = {}
+
+        metrics.describe('sink_samples_total', 'Samples delivered per extra sink')
+        metrics.describe('sink_errors_total', 'Failed deliveries per extra sink')
+        metrics.describe('sink_send_seconds', 'Duration of the last delivery per extra sink')
+        metrics.describe('sink_lag_seconds', 'Age of the newest delivered sample per extra sink')
+        metrics.describe('sink_up', 'Last delivery per extra sink succeeded (1) or failed (0)')
+
+    def put(self, sample: Any):
+        for lane in self.lanes.values():
+            lane.put(sample)
+
+    async def configure(self, settings: SinksConfig):
+        """Start, rebuild or stop sinks to match the configured targets"""
+        targets = {target['name']: target for target in settings.targets}
+
+        for name in [name for name in self.lanes if name not in targets]:
+            lane = self.lanes.pop(name)
+            dropped = len(await lane.stop())
+            logger.info(f"Sink {name} removed" + (f" ({dropped} queued samples discarded)" if dropped else ""))
+            if dropped:
+                metrics.inc('queue_dropped_total', dropped, queue=name)
+
+        for name, target in targets.items():
+            current = self.lanes.get(name)
+            if current and current.key == lane_key(target, settings):
+                continue
+            # A rebuilt sink keeps its backlog (a spill queue through its spool)
+            backlog = await self.lanes.pop(name).stop() if current else []
+            try:
+                lane = SinkLane(target, settings)
+            except (KeyError, TypeError, ValueError, OSError) as e:
+                logger.error(f"Sink {name} not started: {e}")
+                if backlog:
+                    metrics.inc('queue_dropped_total', len(backlog), queue=name)
+                continue
+            for sample in backlog:
+                lane.put(sample)
+            logger.info(f"Sink {name}{' reconfigured' if current else ''}: {lane.sink.describe()}")
+            self.lanes[name] = lane
+            lane.start()
+
+    async def close(self):
+        """Stop every sink (spill queues persist their backlog)"""
+        for name, lane in list(self.lanes.items()):
+            backlog = await lane.stop()
+            if backlog:
+                logger.warning(f"Sink {name}: {len(backlog)} samples were not delivered")
+        self.lanes.clear()
@@ -0,0 +1,331 @@
+"""
+String Analytics Module
+PV string performance on the edge: a rolling window of PV_xx voltage and
+current per inverter, evaluated with NumPy on every bulk sample. Only
+findings leave the device (raised/cleared events), never the arrays
+"""
+import json
+import logging
+import math
+import re
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import StringAnalyticsConfig
+from utils.files import write_json_atomic
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SEVERITY = {'underperforming': 'warning', 'open_string': 'critical', 'low_efficiency': 'warning',
+            'degradation': 'warning'}
+
+_STRING_VOLTAGE = re.compile(r'^(pv_\d{2})_voltage$')
+
+
+def _as_float(value: Any) -> float:
+    """Register value as a float, NaN if unread or not numeric"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return math.nan
+
+
+def _read(values: Dict[str, Any], registers: Tuple[str, ...]) -> np.ndarray:
+    """Values of registers as floats (NaN where unread)"""
+    try:
+        return np.fromiter(map(values.get, registers), float, len(registers))
+    except (TypeError, ValueError):
+        return np.fromiter(map(_as_float, map(values.get, registers)), float, len(registers))
+
+
+def _upper_median(array: np.ndarray, axis: int) -> np.ndarray:
+    """
+    Median as an order statistic (upper middle element for an even count):
+    a string that just changed state is judged on the majority of the
+    window, never on the mean of both states
+    """
+    middle = array.shape[axis] // 2
+    return np.partition(array, middle, axis=axis).take(middle, axis=axis)
+
+
+class _DeviceWindow:
+    """
+    Ring buffers of one inverter (rows are samples, columns strings), the
+    strings seen producing, today's accumulated ratios and active findings
+    """
+    __slots__ = ('strings', 'voltage_registers', 'current_registers', 'voltage', 'current',
+                 'input_power', 'active_power', 'row', 'seen', 'day', 'day_sum', 'day_count', 'active',
+                 'flagged')
+
+    def __init__(self, strings: Tuple[str, ...], size: int, day: str):
+        count = len(strings)
+        self.strings = strings
+        self.voltage_registers = tuple(f'{string}_voltage' for string in strings)
+        self.current_registers = tuple(f'{string}_current' for string in strings)
+        self.voltage = np.full((size, count), np.nan)
+        self.current = np.full((size, count), np.nan)
+        self.input_power = np.full(size, np.nan)
+        self.active_power = np.full(size, np.nan)
+        self.row = 0
+        # Strings that have produced (an input that never did has no panels)
+        self.seen = np.zeros(count, dtype=bool)
+        self.day = day
+        self.day_sum = np.zeros(count)
+        self.day_count = np.zeros(count, dtype=np.int64)
+        # (finding, subject) -> value when raised; strings with one of them
+        self.active: Dict[Tuple[str, str], float] = {}
+        self.flagged = np.zeros(count, dtype=bool)
+
+    @property
+    def size(self) -> int:
+        return len(self.input_power)
+
+    def resize(self, size: int):
+        """New window length (settings reloaded); the buffered samples are dropped"""
+        count = len(self.strings)
+        self.voltage = np.full((size, count), np.nan)
+        self.current = np.full((size, count), np.nan)
+        self.input_power = np.full(size, np.nan)
+        self.active_power = np.full(size, np.nan)
+        self.row = 0
+
+
+class StringAnalytics:
+    """
+    Per-string findings from the rolling window of each inverter
+    - underperforming / open_string: a string's power over the median of
+      the producing strings, median over the window (a passing cloud shades
+      them all; a fault or fixed shading only some)
+    - low_efficiency: ACTIVE_POWER / INPUT_POWER over the window
+    - degradation: each string's daily mean ratio to the median, its slope
+      over the last trend_days days (loss relative to its neighbours, so
+      weather and plant-wide ageing cancel out); judged once per day
+    Samples with the median string under min_string_power (night, dawn)
+    are not judged. A finding is raised once and cleared hysteresis back
+    """
+
+    def __init__(self, settings: StringAnalyticsConfig):
+        self.settings = settings
+        self.trend_path = Path(settings.trend_cache_path) if settings.trend_cache_path else None
+        self._windows: Dict[Optional[str], _DeviceWindow] = {}
+        self._active = 0
+        # {device_id: {'strings': [...], 'days': [[day, [ratio or None, ...]], ...]}}
+        self.trends: Dict[str, Dict[str, Any]] = self._load_trends()
+
+        metrics.describe('pv_findings_active', 'PV string and efficiency findings currently raised')
+        metrics.describe('pv_analytics_seconds', 'Duration of the last string analytics update')
+
+    # ==================== Update ====================
+
+    def update(self, device_id: Optional[str], values: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Add one bulk sample ({register: value}) and judge the window
+        Returns the pv_finding_raised/pv_finding_cleared events of this sample
+        """
+        started = time.perf_counter()
+        window = self._window(device_id, values)
+        if window is None:
+            return []
+        settings = self.settings
+        events: List[Dict[str, Any]] = []
+
+        row = window.row
+        window.voltage[row] = _read(values, window.voltage_registers)
+        window.current[row] = _read(values, window.current_registers)
+        window.input_power[row] = _as_float(values.get('input_power'))
+        window.active_power[row] = _as_float(values.get('active_power'))
+        window.row = (row + 1) % window.size
+
+        today = date.today().isoformat()
+        if today != window.day:
+            events += self._close_day(device_id, window, today)
+
+        # Per-string power (W) and its ratio to the median producing string;
+        # samples missing a string or under min_string_power are not judged
+        power = window.voltage * window.current
+        with np.errstate(invalid='ignore'):
+            window.seen |= power[row] >= settings.min_string_power
+        strings = np.flatnonzero(window.seen)
+        if len(strings) >= 2:
+            power = power[:, strings]
+            median = _upper_median(power, axis=1)
+            with np.errstate(invalid='ignore'):
+                judged = np.isfinite(power).all(axis=1) & (median >= settings.min_string_power)
+            ratios = power[judged] / median[judged, None]
+
+            # Today's mean ratios (trend), from this sample only
+            if judged[row]:
+                window.day_sum[strings] += power[row] / median[row]
+                window.day_count[strings] += 1
+
+            if len(ratios) >= settings.min_samples:
+                self._judge_strings(device_id, window, strings, _upper_median(ratios, axis=0), events)
+
+        self._judge_efficiency(device_id, window, events)
+
+        for event in events:
+            log = logger.warning if event['event'] == 'pv_finding_raised' else logger.info
+            log(f"PV finding: {event['name']} {event['register']} {event['current']}"
+                f"{'' if event['event'] == 'pv_finding_raised' else ' (cleared)'}")
+        metrics.set('pv_findings_active', self._active)
+        metrics.set('pv_analytics_seconds', time.perf_counter() - started)
+        return events
+
+    def _window(self, device_id: Optional[str], values: Dict[str, Any]) -> Optional[_DeviceWindow]:
+        window = self._windows.get(device_id)
+        size = self.settings.window
+        if window is not None and all(r in values for r in window.voltage_registers):
+            if window.size != size:
+                window.resize(size)
+            return window
+
+        # First sample of the device, or its strings changed (PV string count, profile)
+        strings = tuple(sorted(match.group(1) for match in map(_STRING_VOLTAGE.match, values)
+                               if match and f'{match.group(1)}_current' in values))
+        if not strings:
+            return None
+        if window is not None and window.strings == strings:
+            return window
+        if window is not None:
+            # The previous layout's findings are dropped with it
+            self._active -= len(window.active)
+        window = self._windows[device_id] = _DeviceWindow(strings, size, date.today().isoformat())
+        logger.debug("String analytics for %s: %d strings, window of %d samples", device_id, len(strings), size)
+        return window
+
+    # ==================== Findings ====================
+
+    def _judge_strings(self, device_id, window: _DeviceWindow, strings: np.ndarray, ratios: np.ndarray,
+                       events: List[Dict[str, Any]]):
+        settings = self.settings
+        low = 1 - settings.mismatch
+        # Only strings under the threshold or with a finding raised can change
+        candidates = (ratios < low) | window.flagged[strings]
+        if not candidates.any():
+            return
+        for index, ratio in zip(strings[candidates].tolist(), ratios[candidates].tolist()):
+            string = window.strings[index]
+            self._judge(events, device_id, window, 'open_string', string, ratio, settings.open_ratio,
+                        raise_when=ratio < settings.open_ratio,
+                        clear_when=ratio >= settings.open_ratio + settings.hysteresis)
+            self._judge(events, device_id, window, 'underperforming', string, ratio, low,
+                        raise_when=settings.open_ratio <= ratio < low,
+                        clear_when=ratio >= low + settings.hysteresis or ratio < settings.open_ratio)
+            window.flagged[index] = ('open_string', string) in window.active or \
+                ('underperforming', string) in window.active
+
+    def _judge_efficiency(self, device_id, window: _DeviceWindow, events: List[Dict[str, Any]]):
+        settings = self.settings
+        with np.errstate(invalid='ignore', divide='ignore'):
+            loaded = window.input_power >= settings.min_input_power
+            efficiency = window.active_power[loaded] / window.input_power[loaded]
+        efficiency = efficiency[np.isfinite(efficiency)]
+        if len(efficiency) < settings.min_samples:
+            return
+        value = float(_upper_median(efficiency, axis=0))
+        self._judge(events, device_id, window, 'low_efficiency', 'efficiency', value, settings.min_efficiency,
+                    raise_when=value < settings.min_efficiency,
+                    clear_when=value >= settings.min_efficiency + settings.efficiency_hysteresis)
+
+    def _judge(self, events: List[Dict[str, Any]], device_id, window: _DeviceWindow, finding: str,
+               subject: str, value: float, threshold: float, raise_when: bool, clear_when: bool):
+        key = (finding, subject)
+        if key not in window.active and raise_when:
+            window.active[key] = value
+            self._active += 1
+            events.append(self._event('pv_finding_raised', device_id, finding, subject, value, threshold))
+        elif key in window.active and clear_when:
+            del window.active[key]
+            self._active -= 1
+            events.append(self._event('pv_finding_cleared', device_id, finding, subject, value, threshold))
+
+    @staticmethod
+    def _event(kind: str, device_id: Optional[str], finding: str, subject: str, value: float,
+               threshold: float) -> Dict[str, Any]:
+        if finding == 'degradation':
+            description = f"{value * 100:+.2f}%/day against the other strings"
+        elif finding == 'low_efficiency':
+            description = f"DC/AC efficiency {value:.1%}"
+        else:
+            description = f"{value:.0%} of the median string"
+        return {
+            'device_id': device_id,
+            'event': kind,
+            'timestamp': datetime.now().isoformat(),
+            'name': finding,
+            'register': subject,
+            'level': SEVERITY[finding],
+            'current': description,
+            'value': round(value, 4),
+            'threshold': threshold,
+        }
+
+    # ==================== Trends ====================
+
+    def _close_day(self, device_id: Optional[str], window: _DeviceWindow, today: str) -> List[Dict[str, Any]]:
+        """Store the finished day's mean ratios and judge the degradation slope"""
+        settings = self.settings
+        key = str(device_id)
+        enough = window.day_count >= settings.min_samples
+        if enough.any():
+            means = np.where(enough, window.day_sum / np.maximum(window.day_count, 1), np.nan)
+            trend = self.trends.get(key)
+            if trend is None or trend['strings'] != list(window.strings):
+                trend = self.trends[key] = {'strings': list(window.strings), 'days': []}
+            trend['days'].append([window.day, [None if math.isnan(v) else round(v, 4) for v in means.tolist()]])
+            del trend['days'][:-settings.trend_days]
+            self.save()
+        window.day, window.day_sum[:], window.day_count[:] = today, 0.0, 0
+
+        events: List[Dict[str, Any]] = []
+        for index, slope in self.slopes(key).items():
+            self._judge(events, device_id, window, 'degradation', window.strings[index], slope,
+                        -settings.degradation_per_day,
+                        raise_when=slope < -settings.degradation_per_day,
+                        clear_when=slope >= -settings.degradation_per_day / 2)
+        return events
+
+    def slopes(self, device_id: str) -> Dict[int, float]:
+        """Least-squares slope of each string's daily ratio (per day), strings with every day recorded"""
+        trend = self.trends.get(device_id)
+        if not trend or len(trend['days']) < self.settings.min_trend_days:
+            return {}
+        days = np.array([date.fromisoformat(day).toordinal() for day, _ in trend['days']], dtype=float)
+        ratios = np.array([[np.nan if v is None else v for v in row] for _, row in trend['days']])
+        complete = np.flatnonzero(np.isfinite(ratios).all(axis=0))
+        if not len(complete):
+            return {}
+        slopes = np.polyfit(days - days[0], ratios[:, complete], 1)[0]
+        return dict(zip(complete.tolist(), slopes.tolist()))
+
+    def _load_trends(self) -> Dict[str, Dict[str, Any]]:
+        if not self.trend_path:
+            return {}
+        try:
+            with open(self.trend_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable string trend cache {self.trend_path}: {e}")
+            return {}
+
+    def save(self):
+        """Write the daily ratios (atomic write)"""
+        if not self.trend_path:
+            return
+        try:
+            write_json_atomic(self.trend_path, self.trends)
+        except OSError as e:
+            logger.warning(f"Could not save string trends: {e}")
+
+    def active(self) -> Dict[str, str]:
+        """Active findings ('device_id/subject' in fleet mode -> finding)"""
+        return {
+            (f"{device_id}/{subject}" if device_id else subject): finding
+            for device_id, window in self._windows.items() for finding, subject in window.active
+        }
@@ -0,0 +1,245 @@
+"""
+Threshold Monitor Module
+Evaluates the backend's HH/H/L/LL alert thresholds (alert_preferences) on
+the edge, so limit violations go out on the event fast lane instead of
+waiting for the telemetry they are found in
+"""
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.files import write_json_atomic
+from .sample_record import MISSING, Sample
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ('HH', 'H', 'L', 'LL')
+SEVERITY = {'HH': 'critical', 'H': 'warning', 'L': 'warning', 'LL': 'critical'}
+
+# Levels that keep a level active while within hysteresis of its threshold
+# (the level itself and the more severe one on the same side)
+HOLDS = {'HH': ('HH',), 'H': ('HH', 'H'), 'L': ('LL', 'L'), 'LL': ('LL',)}
+
+
+@dataclass
+class ThresholdRule:
+    """One alert_preferences row: a sensor, its enabled thresholds and timing"""
+    sensor_name: str
+    sensor_address: str
+    thresholds: Dict[str, float] = field(default_factory=dict)
+    hysteresis: float = 1.0
+    debounce: float = 0.0
+    cooldown: float = 300.0
+
+    @classmethod
+    def from_preferences(cls, row: Dict[str, Any]) -> 'ThresholdRule':
+        # DECIMAL columns arrive as strings from the backend
+        thresholds = {}
+        for level in LEVELS:
+            value = row.get(f'threshold_{level.lower()}')
+            if value is not None and row.get(f'enable_{level.lower()}', True):
+                thresholds[level] = float(value)
+        return cls(
+            sensor_name=row['sensor_name'],
+            sensor_address=row['sensor_address'],
+            thresholds=thresholds,
+            hysteresis=float(row.get('hysteresis') or 0),
+            debounce=float(row.get('debounce_seconds') or 0),
+            cooldown=float(row.get('cooldown_seconds') or 0),
+        )
+
+    def level_for(self, value: float, current: Optional[str]) -> Optional[str]:
+        """
+        Level of a value (None = normal), most severe first
+        A level is entered at its threshold and, once active, kept until the
+        value is hysteresis back past it
+        """
+        for level in ('HH', 'H'):
+            threshold = self.thresholds.get(level)
+            if threshold is not None and (
+                    value >= threshold or (current in HOLDS[level] and value > threshold - self.hysteresis)):
+                return level
+        for level in ('LL', 'L'):
+            threshold = self.thresholds.get(level)
+            if threshold is not None and (
+                    value <= threshold or (current in HOLDS[level] and value < threshold + self.hysteresis)):
+                return level
+        return None
+
+
+class _SensorState:
+    """Active level of one sensor of one device, and the level waiting out the debounce"""
+    __slots__ = ('level', 'pending', 'pending_since', 'raised_at', 'suppressed')
+
+    def __init__(self):
+        self.level: Optional[str] = None
+        self.pending: Optional[str] = None
+        self.pending_since: Optional[float] = None
+        self.raised_at: Dict[str, float] = {}
+        # Raise held back by the cooldown (its clear is not sent either)
+        self.suppressed = False
+
+
+def sample_values(sample: Sample) -> Dict[str, Any]:
+    """Register values of a sample"""
+    return {register: value for (_, register), value in zip(sample.schema.slots, sample.values)}
+
+
+class ThresholdMonitor:
+    """
+    Tracks the alert level of each (device, sensor) and reports transitions
+    A rule applies to the value named by its sensor_address (a register name
+    on the inverter); rules for other addresses (the CLP's %MW words) are
+    ignored. A new level must hold for the rule's debounce before it is
+    reported, and the same level is not raised again within its cooldown
+    Rules are cached on disk so a restart without the backend keeps them
+    """
+
+    def __init__(self, cache_path: Optional[str] = None):
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.rules: Dict[str, ThresholdRule] = {}
+        self._states: Dict[Tuple[Optional[str], str], _SensorState] = {}
+
+    @property
+    def addresses(self) -> List[str]:
+        """Value names the rules watch"""
+        return sorted({rule.sensor_address for rule in self.rules.values()})
+
+    def load_cache(self) -> bool:
+        """Rules from the cache file; False if there is none"""
+        if not self.cache_path:
+            return False
+        try:
+            with open(self.cache_path, 'r') as f:
+                rows = json.load(f)['preferences']
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable threshold cache {self.cache_path}: {e}")
+            return False
+        self.set_rules(rows)
+        return True
+
+    def sync(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """New rules from the backend, cached to disk; returns clear events for dropped rules"""
+        events = self.set_rules(rows)
+        if self.cache_path:
+            try:
+                cache = {'synced_at': datetime.now().isoformat(), 'preferences': rows}
+                write_json_atomic(self.cache_path, cache, indent=2, default=str)
+            except OSError as e:
+                logger.warning(f"Could not cache thresholds: {e}")
+        return events
+
+    def set_rules(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Replace the rules (alert_preferences rows); the state of kept sensors
+        is preserved. Active levels of removed sensors are cleared
+        """
+        rules = {}
+        for row in rows:
+            try:
+                rule = ThresholdRule.from_preferences(row)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Ignoring invalid threshold rule {row.get('sensor_name')}: {e}")
+                continue
+            rules[rule.sensor_name] = rule
+
+        events = []
+        timestamp = datetime.now().isoformat()
+        for key in [key for key in self._states if key[1] not in rules]:
+            state = self._states.pop(key)
+            if state.level is not None and not state.suppressed:
+                rule = self.rules[key[1]]
+                events.append(self._event('threshold_cleared', key[0], rule, timestamp, None, state.level, None))
+        if rules != self.rules:
+            logger.info(f"Thresholds: {len(rules)} rules ({', '.join(sorted(rules)) or 'none'})")
+        self.rules = rules
+        return events
+
+    def update(self, device_id: Optional[str], values: Dict[str, Any],
+               now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Evaluate the rules on one reading ({value name: value})
+        Returns the threshold_raised/threshold_cleared events of this reading
+        """
+        now = time.monotonic() if now is None else now
+        events = []
+        for rule in self.rules.values():
+            value = values.get(rule.sensor_address)
+            if value is None or value is MISSING or isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+
+            state = self._states.get((device_id, rule.sensor_name))
+            if state is None:
+                state = self._states[(device_id, rule.sensor_name)] = _SensorState()
+
+            target = rule.level_for(value, state.level)
+            if target == state.level:
+                state.pending_since = None
+                continue
+            if state.pending_since is None or state.pending != target:
+                state.pending, state.pending_since = target, now
+            if now - state.pending_since < rule.debounce:
+                continue
+
+            previous, state.level, state.pending_since = state.level, target, None
+            event = self._transition(device_id, rule, state, previous, value, now)
+            if event:
+                events.append(event)
+
+        for event in events:
+            log = logger.warning if event['event'] == 'threshold_raised' else logger.info
+            log(f"Threshold event: {event['sensor_name']} {event['value']:g} "
+                f"{event['level'] or 'normal'} (was {event['previous'] or 'normal'})")
+        return events
+
+    def _transition(self, device_id: Optional[str], rule: ThresholdRule, state: _SensorState,
+                    previous: Optional[str], value: float, now: float) -> Optional[Dict[str, Any]]:
+        timestamp = datetime.now().isoformat()
+        level = state.level
+        if level is None:
+            if state.suppressed:
+                state.suppressed = False
+                return None
+            return self._event('threshold_cleared', device_id, rule, timestamp, value, previous, None)
+
+        last = state.raised_at.get(level)
+        if previous is None and last is not None and now - last < rule.cooldown:
+            # Same alert again within the cooldown: held back with its clear.
+            # Escalations and de-escalations always go out
+            state.suppressed = True
+            logger.debug("Threshold %s %s within cooldown, not raised", rule.sensor_name, level)
+            return None
+        state.suppressed = False
+        state.raised_at[level] = now
+        return self._event('threshold_raised', device_id, rule, timestamp, value, previous, level)
+
+    @staticmethod
+    def _event(kind: str, device_id: Optional[str], rule: ThresholdRule, timestamp: str,
+               value: Optional[float], previous: Optional[str], level: Optional[str]) -> Dict[str, Any]:
+        # Threshold of the level raised, or of the level cleared
+        crossed = level or previous
+        return {
+            'device_id': device_id,
+            'event': kind,
+            'timestamp': timestamp,
+            'sensor_name': rule.sensor_name,
+            'register': rule.sensor_address,
+            'level': level,
+            'previous': previous,
+            'severity': SEVERITY[crossed],
+            'value': value,
+            'threshold': rule.thresholds.get(crossed),
+        }
+
+    def active(self) -> Dict[str, str]:
+        """Active level per sensor ('device_id/sensor_name' in fleet mode)"""
+        return {
+            (f"{device_id}/{sensor}" if device_id else sensor): state.level
+            for (device_id, sensor), state in self._states.items() if state.level is not None
+        }
@@ -0,0 +1,307 @@
+"""
+Uplink Module
+Metered-link upload control: measures the link from recent uploads and
+spends a daily byte budget, choosing per request the batch size, gzip level
+and how many raw samples are merged into one rollup record
+"""
+import gzip
+import json
+import logging
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config import UplinkConfig
+from utils.files import write_json_atomic
+from utils.metrics import metrics
+from .sample_record import as_dict
+
+logger = logging.getLogger(__name__)
+
+# Bytes a request costs besides its body (HTTP request and response headers,
+# TCP/IP framing); counted against the budget like the body
+REQUEST_OVERHEAD = 600
+
+# Fields whose value is kept from the last sample of a rollup (counters,
+# states and bitfields) instead of averaged
+LAST_VALUE_FIELDS = ('energy', 'status')
+
+# Time constant of the sample arrival rate estimate (seconds)
+RATE_WINDOW = 600.0
+
+# Compressed bytes per record until uploads have measured it
+DEFAULT_RECORD_SIZE = 1000
+
+
+@dataclass
+class UplinkPlan:
+    """What the next upload request looks like"""
+    batch_size: int     # Records per request
+    rollup: int         # Raw samples merged into each record (1 = raw)
+    level: int          # gzip compression level
+    max_delay: float    # Longest wait for a batch to fill (seconds)
+
+
+class LinkEstimator:
+    """
+    Round-trip time and throughput from recent uploads
+    A request takes about rtt + bytes / throughput: the RTT is the fastest
+    recent request, the throughput an average over the rest of each request
+    """
+
+    def __init__(self, window: int = 20, alpha: float = 0.3):
+        self.alpha = alpha
+        self._durations: Deque[float] = deque(maxlen=window)
+        self.throughput: Optional[float] = None
+        self.failures = 0
+
+    @property
+    def rtt(self) -> Optional[float]:
+        return min(self._durations) if self._durations else None
+
+    def record(self, size: int, duration: float, ok: bool):
+        if not ok:
+            self.failures += 1
+            return
+        self.failures = 0
+        self._durations.append(duration)
+        transfer = max(duration - self.rtt, 0.05)
+        sample = size / transfer
+        self.throughput = sample if self.throughput is None else (
+            self.alpha * sample + (1 - self.alpha) * self.throughput)
+
+
+class UplinkController:
+    """
+    Decides each upload from the link estimate and the daily budget
+    - rollup: the backlog plus the samples still to come today must fit in
+      what is left of the budget; each record merges enough raw samples to
+      make that true (up to max_rollup)
+    - batch size: large enough that request overhead stays a small part of
+      the bytes, and that a slow link spends its time sending, not waiting
+      for round trips
+    - gzip level: highest when the budget is tight or the link slow
+    Bytes are counted per device and day (local date) and kept on disk, so
+    a restart does not reset the day's usage
+    """
+
+    def __init__(self, settings: UplinkConfig):
+        self.settings = settings
+        self.link = LinkEstimator()
+        self.usage_path = Path(settings.usage_file) if settings.usage_file else None
+        # {date: {device_id: bytes}}
+        self.usage: Dict[str, Dict[str, int]] = self._load_usage()
+        self._bytes_per_record: Optional[float] = None
+        self._rate = 0.0
+        self._arrivals = 0
+        self._started = time.monotonic()
+        self._last_arrival = self._started
+        self._saved_at = 0.0
+        self._exhausted_logged: Optional[str] = None
+
+        metrics.describe('uplink_bytes_total', 'Bytes sent over the uplink, body and request overhead')
+        metrics.describe('uplink_bytes_today', 'Uplink bytes used today per device')
+        metrics.describe('uplink_rollup', 'Raw samples merged into each uploaded record')
+
+    # ==================== Measurements ====================
+
+    def sample_acquired(self):
+        """Count a sample entering the upload queue (arrival rate estimate)"""
+        now = time.monotonic()
+        self._arrivals += 1
+        self._rate = self._rate * math.exp(-(now - self._last_arrival) / RATE_WINDOW) + 1 / RATE_WINDOW
+        self._last_arrival = now
+
+    @property
+    def sample_rate(self) -> float:
+        """Samples per second entering the queue"""
+        elapsed = time.monotonic() - self._started
+        if elapsed < RATE_WINDOW:
+            # Warming up: the decayed rate still underestimates
+            return self._arrivals / max(elapsed, 1.0)
+        return self._rate
+
+    def record(self, records: List[Dict[str, Any]], body_size: int, duration: float, ok: bool):
+        """
+        Account one request (failed ones too: a metered link bills what was
+        sent) and update the link estimate
+        """
+        size = body_size + REQUEST_OVERHEAD
+        self.link.record(size, duration, ok)
+        if ok and records:
+            per_record = body_size / len(records)
+            self._bytes_per_record = per_record if self._bytes_per_record is None else (
+                0.3 * per_record + 0.7 * self._bytes_per_record)
+
+        today = self._today()
+        day = self.usage.setdefault(today, {})
+        devices: Dict[str, int] = {}
+        for record in records:
+            device = str(record.get('device_id'))
+            devices[device] = devices.get(device, 0) + 1
+        for device, count in devices.items():
+            share = size * count // max(len(records), 1)
+            day[device] = day.get(device, 0) + share
+            metrics.inc('uplink_bytes_total', share, device=device)
+            metrics.set('uplink_bytes_today', day[device], device=device)
+
+        if self.link.rtt is not None:
+            metrics.set('uplink_rtt_seconds', self.link.rtt)
+        if self.link.throughput is not None:
+            metrics.set('uplink_throughput_bytes_per_second', self.link.throughput)
+        if self.settings.daily_budget_mb > 0:
+            metrics.set('uplink_budget_used_ratio', self.used_today() / self.budget)
+
+        if time.monotonic() - self._saved_at >= 60:
+            self.save_usage()
+
+    # ==================== Decisions ====================
+
+    @property
+    def budget(self) -> float:
+        return self.settings.daily_budget_mb * 1e6
+
+    def usage_today(self) -> Dict[str, int]:
+        """Bytes sent today per device"""
+        return self.usage.get(self._today(), {})
+
+    def used_today(self) -> int:
+        return sum(self.usage_today().values())
+
+    def plan(self, backlog: int) -> UplinkPlan:
+        """The next request, for backlog samples waiting in the queue"""
+        settings = self.settings
+        per_record = self._bytes_per_record or DEFAULT_RECORD_SIZE
+
+        # Overhead at most ~10% of the request, and on a slow link a request
+        # lasting at least ~9 round trips
+        batch = math.ceil(REQUEST_OVERHEAD / (0.1 * per_record))
+        rtt, throughput = self.link.rtt, self.link.throughput
+        if rtt is not None and throughput is not None:
+            batch = max(batch, math.ceil(9 * rtt * throughput / per_record))
+        batch = min(max(batch, settings.min_batch), settings.max_batch)
+        rollup = self._rollup(backlog, per_record + REQUEST_OVERHEAD / batch)
+
+        slow = rtt is not None and rtt > 1.0 or throughput is not None and throughput < 8000
+        level = 9 if rollup > 1 or slow or self.link.failures else 6
+
+        metrics.set('uplink_rollup', rollup)
+        metrics.set('uplink_batch_size', batch)
+        metrics.set('uplink_compression_level', level)
+        return UplinkPlan(batch_size=batch, rollup=rollup, level=level, max_delay=settings.max_batch_delay)
+
+    def _rollup(self, backlog: int, per_record: float) -> int:
+        """Raw samples per record for the rest of today to fit the budget"""
+        if self.settings.daily_budget_mb <= 0:
+            return 1
+        today = self._today()
+        remaining = self.budget - self.used_today()
+        seconds_left = self._seconds_to_midnight()
+        # Bytes the backlog and the rest of today's samples would take raw
+        projected = per_record * (backlog + self.sample_rate * seconds_left)
+        if remaining <= 0:
+            if self._exhausted_logged != today:
+                self._exhausted_logged = today
+                logger.warning("Uplink budget of %.1f MB used up for today; sending at the lowest rate "
+                               "(1 record per %d samples)", self.settings.daily_budget_mb, self.settings.max_rollup)
+            return self.settings.max_rollup
+        return min(max(math.ceil(projected / remaining), 1), self.settings.max_rollup)
+
+    # ==================== Payload ====================
+
+    @staticmethod
+    def records(samples: List[Any], rollup: int) -> List[Dict[str, Any]]:
+        """Sample dicts for a request, each device's samples merged rollup at a time"""
+        dicts = [as_dict(sample) for sample in samples]
+        if rollup <= 1:
+            return dicts
+        by_device: Dict[Any, List[Dict[str, Any]]] = {}
+        for sample in dicts:
+            by_device.setdefault(sample.get('device_id'), []).append(sample)
+        records = []
+        for device_samples in by_device.values():
+            for start in range(0, len(device_samples), rollup):
+                records.append(rollup_samples(device_samples[start:start + rollup]))
+        return records
+
+    @staticmethod
+    def encode(records: List[Dict[str, Any]], level: int) -> bytes:
+        """Request body: gzip-compressed {"samples": [...]}"""
+        body = json.dumps({'samples': records}, separators=(',', ':'), default=str).encode()
+        return gzip.compress(body, compresslevel=level)
+
+    # ==================== Usage file ====================
+
+    @staticmethod
+    def _today() -> str:
+        return date.today().isoformat()
+
+    @staticmethod
+    def _seconds_to_midnight() -> float:
+        now = time.localtime()
+        return 86400 - (now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec)
+
+    def _load_usage(self) -> Dict[str, Dict[str, int]]:
+        if not self.usage_path:
+            return {}
+        try:
+            with open(self.usage_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable uplink usage file {self.usage_path}: {e}")
+            return {}
+
+    def save_usage(self):
+        """Write the usage counters (last 7 days, atomic write)"""
+        self._saved_at = time.monotonic()
+        oldest = (date.today() - timedelta(days=6)).isoformat()
+        self.usage = {day: devices for day, devices in self.usage.items() if day >= oldest}
+        if not self.usage_path:
+            return
+        try:
+            write_json_atomic(self.usage_path, self.usage, indent=2, sort_keys=True)
+        except OSError as e:
+            logger.warning(f"Could not save uplink usage: {e}")
+
+    def report(self) -> List[Tuple[str, str, int]]:
+        """(day, device_id, bytes) rows, oldest day first"""
+        return [(day, device, size) for day in sorted(self.usage)
+                for device, size in sorted(self.usage[day].items())]
+
+
+def rollup_samples(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    One record for consecutive samples of a device: numeric values averaged,
+    counters, states and non-numeric values from the last sample. The
+    metadata (sequence included) is the last sample's, plus the rollup size
+    and first timestamp
+    """
+    last = samples[-1]
+    if len(samples) == 1:
+        return last
+    merged: Dict[str, Any] = {'device_id': last.get('device_id'), 'timestamp': last.get('timestamp')}
+    for field, registers in last.items():
+        if field in merged or field == 'metadata' or not isinstance(registers, dict):
+            continue
+        merged[field] = {}
+        for register, entry in registers.items():
+            value = entry.get('value')
+            if field not in LAST_VALUE_FIELDS and _numeric(value):
+                values = [sample[field][register]['value'] for sample in samples
+                          if register in sample.get(field, {})]
+                values = [v for v in values if _numeric(v)]
+                value = round(sum(values) / len(values), 4)
+            merged[field][register] = {'value': value, 'unit': entry.get('unit')}
+    merged['metadata'] = dict(last.get('metadata', {}), rollup=len(samples),
+                              rollup_from=samples[0].get('timestamp'))
+    return merged
+
+
+def _numeric(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
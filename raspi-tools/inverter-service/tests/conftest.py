@@ -0,0 +1,9 @@
+"""
+Test setup
+The service modules are imported as main.py imports them, from the
+service directory (config, modules, utils)
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
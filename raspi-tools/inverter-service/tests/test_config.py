@@ -0,0 +1,51 @@
+"""Config files: options are checked by name and type before anything is applied"""
+import json
+
+import pytest
+
+from config.config import ServiceConfig
+
+
+def load(tmp_path, data):
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps(data))
+    config = ServiceConfig()
+    config.update_from_file(str(path))
+    return config
+
+
+def test_values_are_applied(tmp_path):
+    config = load(tmp_path, {'inverter': {'poll_interval': 10, 'tcp_host': '10.0.0.2'},
+                             'adaptive': {'slow_states': ['Standby']}})
+    assert config.inverter.poll_interval == 10
+    assert config.inverter.tcp_host == '10.0.0.2'
+    assert config.adaptive.slow_states == ['Standby']
+
+
+def test_ints_are_accepted_for_float_options(tmp_path):
+    config = load(tmp_path, {'alarms': {'status_interval': 2}})
+    assert config.alarms.status_interval == 2.0
+    assert isinstance(config.alarms.status_interval, float)
+
+
+@pytest.mark.parametrize('data', [
+    {'inverter': {'poll_interval': '10'}},
+    {'inverter': {'baudrate': True}},
+    {'backend': {'max_in_flight': 2.5}},
+    {'logging': {'level': 10}},
+    {'adaptive': {'slow_states': 'Standby'}},
+    {'sinks': {'targets': ['historian']}},
+])
+def test_wrong_types_are_rejected(tmp_path, data):
+    with pytest.raises(ValueError, match='wrong type'):
+        load(tmp_path, data)
+
+
+@pytest.mark.parametrize('data, message', [
+    ({'inverter': {'poll_intervall': 10}}, 'unknown config option'),
+    ({'invertor': {}}, 'unknown config section'),
+    ([], 'expected an object'),
+])
+def test_unknown_names_are_rejected(tmp_path, data, message):
+    with pytest.raises(ValueError, match=message):
+        load(tmp_path, data)
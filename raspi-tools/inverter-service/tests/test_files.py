@@ -0,0 +1,22 @@
+"""Atomic JSON writes"""
+import json
+
+import pytest
+
+from utils.files import write_json_atomic
+
+
+def test_writes_json_and_creates_parents(tmp_path):
+    path = tmp_path / 'cache' / 'plan.json'
+    write_json_atomic(path, {'a': 1}, indent=2)
+    assert json.loads(path.read_text()) == {'a': 1}
+    assert list(path.parent.iterdir()) == [path]
+
+
+def test_failed_write_keeps_old_file(tmp_path):
+    path = tmp_path / 'state.json'
+    write_json_atomic(path, {'a': 1})
+    with pytest.raises(TypeError):
+        write_json_atomic(path, {'a': object()})
+    assert json.loads(path.read_text()) == {'a': 1}
+    assert list(tmp_path.iterdir()) == [path]
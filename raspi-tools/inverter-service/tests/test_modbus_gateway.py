@@ -0,0 +1,122 @@
+"""Modbus gateway building blocks that need no serial port: CRC, register cache, response timer"""
+from types import SimpleNamespace
+
+import pytest
+
+from modules import modbus_gateway
+from modules.modbus_gateway import (
+    READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS, RegisterCache, ResponseTimer, crc16,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # The gateway module's clock only
+    monkeypatch.setattr(modbus_gateway, 'time', SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def test_crc16_matches_a_known_frame():
+    # Read holding register 0 of slave 1: 01 03 00 00 00 01 84 0A
+    assert crc16(bytes.fromhex('010300000001')).to_bytes(2, 'little') == bytes.fromhex('840a')
+
+
+def test_cache_answers_reads_within_what_was_read(clock):
+    cache = RegisterCache(ttl=1.0)
+    cache.put(1, READ_HOLDING_REGISTERS, 100, [10, 11, 12, 13])
+    assert cache.get(1, READ_HOLDING_REGISTERS, 101, 2) == [11, 12]
+    # Partly outside the cached range, another slave or another function
+    assert cache.get(1, READ_HOLDING_REGISTERS, 102, 4) is None
+    assert cache.get(2, READ_HOLDING_REGISTERS, 100, 1) is None
+    assert cache.get(1, READ_INPUT_REGISTERS, 100, 1) is None
+
+
+def test_cache_entries_expire(clock):
+    cache = RegisterCache(ttl=1.0)
+    cache.put(1, READ_HOLDING_REGISTERS, 100, [10, 11])
+    clock.now += 0.5
+    cache.put(1, READ_HOLDING_REGISTERS, 101, [21])
+    clock.now += 0.6
+    # Register 100 is 1.1s old, 101 was refreshed 0.6s ago
+    assert cache.get(1, READ_HOLDING_REGISTERS, 100, 2) is None
+    assert cache.get(1, READ_HOLDING_REGISTERS, 101, 1) == [21]
+
+
+def test_writes_invalidate_holding_registers(clock):
+    cache = RegisterCache(ttl=10.0)
+    for unit in (1, 2):
+        cache.put(unit, READ_HOLDING_REGISTERS, 100, [1, 2, 3])
+    cache.put(1, READ_INPUT_REGISTERS, 100, [7, 8, 9])
+
+    cache.invalidate(1, 101, 1)
+    assert cache.get(1, READ_HOLDING_REGISTERS, 100, 1) == [1]
+    assert cache.get(1, READ_HOLDING_REGISTERS, 101, 1) is None
+    assert cache.get(2, READ_HOLDING_REGISTERS, 101, 1) == [2]
+    assert cache.get(1, READ_INPUT_REGISTERS, 101, 1) == [8]
+
+    # Broadcast write: every slave
+    cache.invalidate(0, 102, 1)
+    assert cache.get(2, READ_HOLDING_REGISTERS, 102, 1) is None
+
+
+def test_zero_ttl_disables_the_cache(clock):
+    cache = RegisterCache(ttl=0)
+    cache.put(1, READ_HOLDING_REGISTERS, 100, [1])
+    assert cache.get(1, READ_HOLDING_REGISTERS, 100, 1) is None
+
+
+def test_timer_starts_at_the_configured_timeout():
+    assert ResponseTimer(0.1, 2.0).timeout == 2.0
+
+
+def test_timer_follows_measured_latency():
+    timer = ResponseTimer(0.05, 2.0)
+    timer.sample(0.2)
+    # First measurement: srtt + 4 * srtt / 2
+    assert timer.timeout == pytest.approx(0.6)
+    for _ in range(50):
+        timer.sample(0.2)
+    # Steady latency: the deviation term fades
+    assert 0.2 < timer.timeout < 0.21
+
+
+def test_timer_stays_within_its_bounds():
+    timer = ResponseTimer(0.1, 1.0)
+    timer.sample(0.001)
+    assert timer.timeout == 0.1
+    timer.sample(5.0)
+    assert timer.timeout == 1.0
+
+
+def test_expiries_back_off_and_isolate_the_slave():
+    timer = ResponseTimer(0.05, 1.0, unreachable_after=3, probe_interval=30.0)
+    timer.sample(0.1)
+    before = timer.timeout
+    timer.expired(now=0.0)
+    assert timer.timeout == pytest.approx(min(before * 2, 1.0))
+    timer.expired(now=1.0)
+    assert timer.available(now=1.0)
+    timer.expired(now=2.0)
+    assert timer.unreachable
+    assert timer.timeout == 1.0
+    assert not timer.available(now=31.9)
+    # Probe after probe_interval; an answer brings the slave back
+    assert timer.available(now=32.0)
+    timer.sample(0.1)
+    assert not timer.unreachable and timer.available(now=32.0)
+
+
+def test_zero_unreachable_after_never_isolates():
+    timer = ResponseTimer(0.05, 1.0, unreachable_after=0)
+    for now in range(10):
+        timer.expired(now=float(now))
+    assert timer.available(now=10.0)
@@ -0,0 +1,94 @@
+"""MqttClient: topics, QoS/retain per message kind and reconnect after a publish error"""
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip('asyncio_mqtt')
+
+from asyncio_mqtt import MqttError  # noqa: E402
+
+from config import config  # noqa: E402
+from modules import mqtt_client  # noqa: E402
+
+
+class FakeClient:
+    """Records what would be published; fails the next publish when told to"""
+    instances = []
+
+    def __init__(self, host, port, **options):
+        self.options = options
+        self.published = []
+        self.fail_next = False
+        self.disconnected = False
+        FakeClient.instances.append(self)
+
+    async def connect(self, timeout=None):
+        pass
+
+    async def publish(self, topic, payload, qos=0, retain=False, timeout=None):
+        if self.fail_next:
+            self.fail_next = False
+            raise MqttError("connection lost")
+        self.published.append((topic, payload, qos, retain))
+
+    async def disconnect(self, timeout=None):
+        self.disconnected = True
+
+
+@pytest.fixture
+def client(monkeypatch):
+    FakeClient.instances = []
+    monkeypatch.setattr(mqtt_client, 'Client', FakeClient)
+    monkeypatch.setattr(config.mqtt, 'topic_prefix', 'plant')
+    monkeypatch.setattr(config.mqtt, 'client_id', 'edge-1')
+    monkeypatch.setattr(config.mqtt, 'qos', 1)
+    return mqtt_client.MqttClient()
+
+
+def test_session_is_persistent_with_a_last_will(client):
+    asyncio.run(client.connect())
+    fake = FakeClient.instances[0]
+    assert fake.options['client_id'] == 'edge-1'
+    assert fake.options['clean_session'] is False
+    assert fake.options['will'].topic == 'plant/service/edge-1/availability'
+    assert fake.published == [('plant/service/edge-1/availability', 'online', 1, True)]
+
+
+def test_telemetry_is_retained_on_the_device_topic(client):
+    asyncio.run(client.send_telemetry({'device_id': 'inv1', 'timestamp': 't', 'power': {}}))
+    topic, payload, qos, retain = FakeClient.instances[0].published[-1]
+    assert (topic, qos, retain) == ('plant/inv1/telemetry', 1, True)
+    assert json.loads(payload) == {'device_id': 'inv1', 'timestamp': 't', 'power': {}}
+
+
+def test_events_are_grouped_per_device_and_not_retained(client):
+    events = [
+        {'device_id': 'inv1', 'event': 'alarm_raised'},
+        {'device_id': 'inv2', 'event': 'status_changed'},
+        {'device_id': 'inv1', 'event': 'alarm_cleared'},
+    ]
+    asyncio.run(client.send_events(events))
+    published = FakeClient.instances[0].published[1:]
+    assert [(topic, retain) for topic, _, _, retain in published] == \
+        [('plant/inv1/events', False), ('plant/inv2/events', False)]
+    assert [e['event'] for e in json.loads(published[0][1])['events']] == ['alarm_raised', 'alarm_cleared']
+
+
+def test_missing_device_id_goes_to_unknown(client):
+    assert client.topic(None, 'telemetry') == 'plant/unknown/telemetry'
+
+
+def test_publish_error_drops_the_connection_and_the_next_send_reconnects(client):
+    async def scenario():
+        await client.connect()
+        FakeClient.instances[0].fail_next = True
+        with pytest.raises(MqttError):
+            await client.send_telemetry({'device_id': 'inv1'})
+        assert not client.connected
+        await client.send_telemetry({'device_id': 'inv1'})
+
+    asyncio.run(scenario())
+    first, second = FakeClient.instances
+    assert first.disconnected
+    assert second.published[-1][0] == 'plant/inv1/telemetry'
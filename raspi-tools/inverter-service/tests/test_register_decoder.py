@@ -0,0 +1,71 @@
+"""BlockDecoder: one struct pass gives the values huawei_solar's decode() gives"""
+import struct
+
+import pytest
+from huawei_solar import register_names as rn
+from huawei_solar.registers import REGISTERS
+
+from modules.register_decoder import STRUCT_CODES, BlockDecoder
+
+# Registers of one inverter block, with gaps between them, and raw values
+RAW = {
+    rn.PV_01_VOLTAGE: 6012,              # I16, gain 10
+    rn.PV_01_CURRENT: -3,                # I16, gain 100
+    rn.INPUT_POWER: 61234,               # I32
+    rn.ACTIVE_POWER: -1500,              # I32, negative
+    rn.GRID_FREQUENCY: 5001,             # U16, gain 100
+    rn.INTERNAL_TEMPERATURE: 452,        # I16, gain 10
+    rn.DEVICE_STATUS: 0x0200,            # enum: decoded by huawei_solar
+    rn.ACCUMULATED_YIELD_ENERGY: 123456789,  # U32, gain 100
+}
+
+
+def words(definition, raw):
+    """Big-endian register words of a raw value"""
+    code = STRUCT_CODES.get(type(definition).__name__, 'H')
+    return list(struct.unpack(f'>{definition.length}H', struct.pack(f'>{code}', raw)))
+
+
+def block(decoder, raw_values):
+    registers = [0] * decoder.count
+    for name, raw in raw_values.items():
+        definition = REGISTERS[name]
+        offset = definition.register - decoder.start
+        registers[offset:offset + definition.length] = words(definition, raw)
+    return registers
+
+
+def expected(raw_values):
+    return [REGISTERS[name].decode(words(REGISTERS[name], raw)) for name, raw in raw_values.items()]
+
+
+def test_block_matches_huawei_solar_decode():
+    decoder = BlockDecoder(list(RAW))
+    assert decoder.start == REGISTERS[rn.PV_01_VOLTAGE].register
+    assert decoder.fast_fields == len(RAW) - 1
+    assert decoder.decode_registers(block(decoder, RAW)) == expected(RAW)
+
+
+def test_units_follow_huawei_solar_results():
+    decoder = BlockDecoder([rn.ACTIVE_POWER, rn.DEVICE_STATUS])
+    assert decoder.units == [REGISTERS[rn.ACTIVE_POWER].unit, None]
+
+
+def test_invalid_values_decode_to_none():
+    raw = {rn.ACTIVE_POWER: 2 ** 31 - 1, rn.GRID_FREQUENCY: 2 ** 16 - 1, rn.INTERNAL_TEMPERATURE: 2 ** 15 - 1}
+    decoder = BlockDecoder(list(raw))
+    assert decoder.decode_registers(block(decoder, raw)) == [None, None, None]
+
+
+@pytest.mark.parametrize('order', [list(RAW), list(reversed(RAW))])
+def test_values_follow_the_name_order(order):
+    decoder = BlockDecoder(order)
+    raw = {name: RAW[name] for name in order}
+    assert decoder.decode_registers(block(decoder, raw)) == expected(raw)
+
+
+def test_bytes_and_register_lists_decode_alike():
+    decoder = BlockDecoder(list(RAW))
+    registers = block(decoder, RAW)
+    raw_bytes = struct.pack(f'>{len(registers)}H', *registers)
+    assert decoder.decode(raw_bytes) == decoder.decode_registers(registers)
@@ -0,0 +1,96 @@
+"""Register profiles compiled into read plans, and the plan cache"""
+import json
+
+import pytest
+from huawei_solar import register_names as rn
+
+from modules.inverter_client import InverterClient
+from modules.register_profile import (
+    DEFAULT_PROFILE, ProfileError, ReadPlan, compile_profile, load_read_plan, split_blocks,
+)
+
+
+def profile(*groups):
+    return {'name': 'test', 'groups': list(groups)}
+
+
+def test_default_profile_compiles():
+    plan = load_read_plan(str(DEFAULT_PROFILE))
+    assert plan.fields[:2] == ['power', 'voltage_current']
+    assert plan.status_registers == [rn.DEVICE_STATUS, rn.ALARM_1, rn.ALARM_2, rn.ALARM_3]
+    assert plan.decoder[rn.ACTIVE_POWER] == ('power', None)
+    assert plan.requests_per_cycle >= 1
+
+
+@pytest.mark.parametrize('groups, message', [
+    ([{'name': 'a', 'registers': ['no_such_register']}], 'unknown register'),
+    ([{'name': 'a', 'registers': [rn.ACTIVE_POWER]}, {'name': 'b', 'registers': [rn.ACTIVE_POWER]}],
+     'is in groups'),
+    ([{'name': 'a', 'registers': [rn.ACTIVE_POWER], 'period': 0}], 'period'),
+    ([{'name': 'a', 'registers': [rn.ACTIVE_POWER], 'deadband': {rn.INPUT_POWER: 1}}], 'not in the group'),
+    ([{'name': 'a', 'registers': [rn.ACTIVE_POWER], 'colour': 'red'}], 'unknown option'),
+    ([], 'no groups'),
+])
+def test_invalid_profiles_are_rejected(groups, message):
+    with pytest.raises(ProfileError, match=message):
+        compile_profile(profile(*groups))
+
+
+def test_deadband_default_and_override():
+    plan = compile_profile(profile({
+        'name': 'power', 'registers': [rn.ACTIVE_POWER, rn.INPUT_POWER],
+        'deadband': {'*': 50, rn.INPUT_POWER: 10},
+    }))
+    assert plan.decoder[rn.ACTIVE_POWER] == ('power', 50)
+    assert plan.decoder[rn.INPUT_POWER] == ('power', 10)
+
+
+def test_due_groups_follow_their_period():
+    plan = compile_profile(profile(
+        {'name': 'power', 'registers': [rn.ACTIVE_POWER]},
+        {'name': 'energy', 'registers': [rn.DAILY_YIELD_ENERGY], 'period': 60},
+    ))
+    assert [g.name for g in plan.due_groups(100.0, {})] == ['power', 'energy']
+    last_read = {'power': 100.0, 'energy': 100.0}
+    assert [g.name for g in plan.due_groups(130.0, last_read)] == ['power']
+    assert [g.name for g in plan.due_groups(160.0, last_read)] == ['power', 'energy']
+
+
+def test_pv_string_registers_come_from_the_device():
+    plan = compile_profile(profile(
+        {'name': 'power', 'registers': [rn.ACTIVE_POWER]},
+        {'name': 'pv_strings', 'pv_strings': True},
+    ))
+    plan.set_pv_registers(InverterClient.build_pv_registers(2))
+    assert plan.group('pv_strings').registers == [rn.PV_01_VOLTAGE, rn.PV_01_CURRENT,
+                                                  rn.PV_02_VOLTAGE, rn.PV_02_CURRENT]
+    assert plan.decoder[rn.PV_02_CURRENT] == ('pv_strings', None)
+
+
+def test_split_blocks_breaks_at_large_gaps():
+    # PV strings and the power block sit far apart in the address space
+    blocks = split_blocks([rn.ACTIVE_POWER, rn.PV_01_VOLTAGE, rn.PV_01_CURRENT, rn.INPUT_POWER])
+    assert blocks == [[rn.PV_01_VOLTAGE, rn.PV_01_CURRENT], [rn.INPUT_POWER, rn.ACTIVE_POWER]]
+
+
+def test_plan_round_trips_through_its_cache(tmp_path):
+    source = tmp_path / 'profile.json'
+    source.write_text(json.dumps(profile({'name': 'power', 'registers': [rn.ACTIVE_POWER], 'period': 5})))
+    cache = tmp_path / 'plans'
+    plan = load_read_plan(str(source), str(cache))
+    cached_files = list(cache.glob('read_plan-*.json'))
+    assert len(cached_files) == 1
+
+    cached = ReadPlan.from_dict(json.loads(cached_files[0].read_text()))
+    assert cached.to_dict() == plan.to_dict()
+    assert load_read_plan(str(source), str(cache)).to_dict() == plan.to_dict()
+
+
+def test_changed_profile_gets_a_new_plan(tmp_path):
+    source = tmp_path / 'profile.json'
+    source.write_text(json.dumps(profile({'name': 'power', 'registers': [rn.ACTIVE_POWER]})))
+    first = load_read_plan(str(source), str(tmp_path))
+    source.write_text(json.dumps(profile({'name': 'power', 'registers': [rn.INPUT_POWER]})))
+    second = load_read_plan(str(source), str(tmp_path))
+    assert first.profile_hash != second.profile_hash
+    assert second.group('power').registers == [rn.INPUT_POWER]
@@ -0,0 +1,104 @@
+"""SampleQueue overflow policies: drop_oldest, coalesce and spill to disk"""
+import asyncio
+
+import pytest
+
+from modules.sample_queue import SampleQueue
+from utils.metrics import metrics
+
+
+def sample(n):
+    return {'device_id': 'inv1', 'n': n}
+
+
+def drain(queue):
+    items = []
+    while True:
+        item = queue.get_nowait()
+        if item is None:
+            return items
+        items.append(item['n'])
+
+
+def test_invalid_settings_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        SampleQueue(0)
+    with pytest.raises(ValueError):
+        SampleQueue(10, 'newest')
+    with pytest.raises(ValueError):
+        SampleQueue(10, 'spill')
+
+
+def test_drop_oldest_keeps_the_newest_samples():
+    queue = SampleQueue(3, 'drop_oldest', name='t-drop')
+    for n in range(5):
+        queue.put(sample(n))
+    assert len(queue) == 3
+    assert drain(queue) == [2, 3, 4]
+    assert metrics.get('queue_dropped_total', queue='t-drop') == 2
+
+
+def test_coalesce_replaces_the_newest_queued_sample():
+    queue = SampleQueue(3, 'coalesce', name='t-coalesce')
+    for n in range(5):
+        queue.put(sample(n))
+    # The oldest samples are kept; the tail always holds the latest reading
+    assert drain(queue) == [0, 1, 4]
+    assert metrics.get('queue_coalesced_total', queue='t-coalesce') == 2
+
+
+def test_spill_keeps_every_sample_in_order(tmp_path):
+    queue = SampleQueue(2, 'spill', spill_dir=str(tmp_path), name='t-spill')
+    for n in range(6):
+        queue.put(sample(n))
+    assert (queue.depth, queue.spilled) == (2, 4)
+    # New samples go behind the spooled ones even once memory has room
+    assert queue.get_nowait()['n'] == 0
+    queue.put(sample(6))
+    assert drain(queue) == [1, 2, 3, 4, 5, 6]
+    assert queue.spilled == 0
+    assert not (tmp_path / SampleQueue.SPILL_FILE).exists()
+
+
+def test_spill_survives_a_restart(tmp_path):
+    queue = SampleQueue(2, 'spill', spill_dir=str(tmp_path))
+    for n in range(5):
+        queue.put(sample(n))
+    assert queue.get_nowait()['n'] == 0
+    queue.persist()
+    assert queue.depth == 0
+
+    restarted = SampleQueue(2, 'spill', spill_dir=str(tmp_path))
+    assert len(restarted) == 4
+    assert drain(restarted) == [1, 2, 3, 4]
+
+
+def test_put_back_returns_a_sample_to_the_head():
+    queue = SampleQueue(3)
+    queue.put(sample(1))
+    queue.put(sample(2))
+    first = queue.get_nowait()
+    queue.put_back(first)
+    assert drain(queue) == [1, 2]
+
+
+def test_get_waits_for_a_sample():
+    async def scenario():
+        queue = SampleQueue(3)
+        waiter = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        queue.put(sample(7))
+        return await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(scenario())['n'] == 7
+
+
+def test_take_spilled_moves_the_backlog(tmp_path):
+    queue = SampleQueue(1, 'spill', spill_dir=str(tmp_path / 'spool'))
+    for n in range(4):
+        queue.put(sample(n))
+    target = tmp_path / 'export.jsonl'
+    assert queue.take_spilled(target) == 3
+    assert len(target.read_text().splitlines()) == 3
+    assert drain(queue) == [0]
@@ -0,0 +1,31 @@
+"""SampleSequencer: (device_id, boot_id, sequence) identifies every sample"""
+from modules.sample_queue import SampleSequencer
+from modules.sample_record import Sample
+
+
+def test_sequence_counts_per_device():
+    sequencer = SampleSequencer('boot-a')
+    stamped = [sequencer.stamp({'device_id': device}) for device in ('inv1', 'inv2', 'inv1', 'inv1', 'inv2')]
+    assert [(s['device_id'], s['metadata']['sequence']) for s in stamped] == \
+        [('inv1', 1), ('inv2', 1), ('inv1', 2), ('inv1', 3), ('inv2', 2)]
+    assert {s['metadata']['boot_id'] for s in stamped} == {'boot-a'}
+
+
+def test_existing_metadata_is_kept():
+    sample = SampleSequencer('boot-a').stamp({'device_id': 'inv1', 'metadata': {'data_quality': 'good'}})
+    assert sample['metadata'] == {'data_quality': 'good', 'boot_id': 'boot-a', 'sequence': 1}
+
+
+def test_each_start_gets_a_new_boot_id():
+    first, second = SampleSequencer(), SampleSequencer()
+    assert first.boot_id != second.boot_id
+    # Both restart at 1: the boot ID keeps their samples apart
+    assert first.stamp({'device_id': 'inv1'})['metadata']['sequence'] == \
+        second.stamp({'device_id': 'inv1'})['metadata']['sequence'] == 1
+
+
+def test_sample_records_are_stamped_in_place():
+    sample = Sample.build(['power'], (('power', 'active_power'),), ('W',), [1500], 'inv1', 0.0, {})
+    assert SampleSequencer('boot-a').stamp(sample) is sample
+    assert sample.to_dict()['metadata']['sequence'] == 1
+    assert sample.to_dict()['metadata']['boot_id'] == 'boot-a'
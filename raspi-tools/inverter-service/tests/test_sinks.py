@@ -0,0 +1,48 @@
+"""Historian sink: one JSON line per sample, one file per day, batches all or nothing"""
+import json
+
+import pytest
+
+from modules.sinks import HistorianSink
+
+
+def sample(timestamp, value):
+    return {'device_id': 'inv1', 'timestamp': timestamp, 'power': {'active_power': {'value': value}}}
+
+
+def lines(path):
+    return [json.loads(line)['power']['active_power']['value'] for line in path.read_text().splitlines()]
+
+
+def test_samples_go_to_the_file_of_their_day(tmp_path):
+    sink = HistorianSink('historian', {'path': str(tmp_path), 'retention_days': 0})
+    sink.send([sample('2026-10-18T23:59:59', 1), sample('2026-10-19T00:00:01', 2)])
+    sink.send([sample('2026-10-19T00:00:06', 3)])
+    assert lines(tmp_path / 'telemetry-2026-10-18.jsonl') == [1]
+    assert lines(tmp_path / 'telemetry-2026-10-19.jsonl') == [2, 3]
+
+
+def test_failed_batch_leaves_no_lines_behind(tmp_path):
+    sink = HistorianSink('historian', {'path': str(tmp_path), 'retention_days': 0})
+    sink.send([sample('2026-10-18T12:00:00', 0)])
+    # The second day's file cannot be opened
+    (tmp_path / 'telemetry-2026-10-19.jsonl').mkdir()
+    batch = [sample('2026-10-18T23:59:59', 1), sample('2026-10-19T00:00:01', 2)]
+    with pytest.raises(OSError):
+        sink.send(batch)
+    assert lines(tmp_path / 'telemetry-2026-10-18.jsonl') == [0]
+
+    # The retry stores the batch once
+    (tmp_path / 'telemetry-2026-10-19.jsonl').rmdir()
+    sink.send(batch)
+    assert lines(tmp_path / 'telemetry-2026-10-18.jsonl') == [0, 1]
+    assert lines(tmp_path / 'telemetry-2026-10-19.jsonl') == [2]
+
+
+def test_old_files_are_pruned(tmp_path):
+    old = tmp_path / 'telemetry-2000-01-01.jsonl'
+    old.parent.mkdir(parents=True, exist_ok=True)
+    old.write_text('{}\n')
+    sink = HistorianSink('historian', {'path': str(tmp_path), 'retention_days': 30})
+    sink.send([sample('2026-10-19T00:00:00', 1)])
+    assert not old.exists()
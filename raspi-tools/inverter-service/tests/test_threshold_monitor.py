@@ -0,0 +1,112 @@
+"""ThresholdMonitor: HH/H/L/LL levels with hysteresis, debounce and cooldown"""
+from modules.sample_record import MISSING
+from modules.threshold_monitor import ThresholdMonitor, ThresholdRule
+
+
+def row(**overrides):
+    values = {
+        'sensor_name': 'temperature', 'sensor_address': 'internal_temperature',
+        'threshold_hh': '70.0', 'threshold_h': '60.0', 'threshold_l': '5.0', 'threshold_ll': '-10.0',
+        'enable_hh': True, 'enable_h': True, 'enable_l': True, 'enable_ll': True,
+        'hysteresis': '2.0', 'debounce_seconds': 0, 'cooldown_seconds': 0,
+    }
+    values.update(overrides)
+    return values
+
+
+def monitor(**overrides):
+    monitor = ThresholdMonitor()
+    monitor.set_rules([row(**overrides)])
+    return monitor
+
+
+def feed(monitor, readings, device_id='inv1'):
+    """[(time, value)] -> [(event, level, previous)] in order"""
+    events = []
+    for now, value in readings:
+        for event in monitor.update(device_id, {'internal_temperature': value}, now=now):
+            events.append((event['event'], event['level'], event['previous']))
+    return events
+
+
+def test_rule_from_backend_row():
+    rule = ThresholdRule.from_preferences(row(enable_ll=False, threshold_l=None))
+    assert rule.thresholds == {'HH': 70.0, 'H': 60.0}
+    assert (rule.hysteresis, rule.debounce, rule.cooldown) == (2.0, 0.0, 0.0)
+
+
+def test_level_is_held_within_hysteresis():
+    events = feed(monitor(), [(0, 59.9), (1, 60.0), (2, 59.0), (3, 58.5), (4, 58.0)])
+    # Raised at the threshold, kept at 59 and 58.5, cleared at threshold - hysteresis
+    assert events == [('threshold_raised', 'H', None), ('threshold_cleared', None, 'H')]
+
+
+def test_escalation_and_de_escalation():
+    events = feed(monitor(), [(0, 61), (1, 72), (2, 69), (3, 67.9), (4, 50)])
+    assert events == [
+        ('threshold_raised', 'H', None),
+        ('threshold_raised', 'HH', 'H'),
+        ('threshold_raised', 'H', 'HH'),
+        ('threshold_cleared', None, 'H'),
+    ]
+
+
+def test_low_side_mirrors_the_high_side():
+    events = feed(monitor(), [(0, 5), (1, -10), (2, -8.5), (3, -8), (4, 6.9), (5, 7)])
+    assert events == [
+        ('threshold_raised', 'L', None),
+        ('threshold_raised', 'LL', 'L'),
+        ('threshold_raised', 'L', 'LL'),
+        ('threshold_cleared', None, 'L'),
+    ]
+
+
+def test_debounce_needs_the_level_to_hold():
+    m = monitor(debounce_seconds=10)
+    assert feed(m, [(0, 61), (5, 61)]) == []
+    assert feed(m, [(10, 61)]) == [('threshold_raised', 'H', None)]
+
+
+def test_debounce_restarts_when_the_value_flickers():
+    m = monitor(debounce_seconds=10)
+    assert feed(m, [(0, 61), (5, 55), (8, 61), (15, 61)]) == []
+    assert feed(m, [(18, 61)]) == [('threshold_raised', 'H', None)]
+
+
+def test_cooldown_holds_back_a_repeated_alert_and_its_clear():
+    m = monitor(cooldown_seconds=300)
+    assert feed(m, [(0, 61), (10, 50)]) == [('threshold_raised', 'H', None), ('threshold_cleared', None, 'H')]
+    # Same alert again within the cooldown: neither the raise nor its clear
+    assert feed(m, [(20, 61), (30, 50)]) == []
+    assert feed(m, [(400, 61)]) == [('threshold_raised', 'H', None)]
+
+
+def test_devices_have_their_own_state():
+    m = monitor()
+    assert feed(m, [(0, 61)], device_id='inv1') == [('threshold_raised', 'H', None)]
+    assert feed(m, [(0, 20)], device_id='inv2') == []
+    assert m.active() == {'inv1/temperature': 'H'}
+
+
+def test_non_numeric_values_are_ignored():
+    m = monitor()
+    for value in (None, MISSING, True, 'Overheating'):
+        assert m.update('inv1', {'internal_temperature': value}, now=0) == []
+    assert m.active() == {}
+
+
+def test_removed_rule_clears_its_active_level():
+    m = monitor()
+    feed(m, [(0, 75)])
+    events = m.set_rules([])
+    assert [(e['event'], e['previous'], e['severity']) for e in events] == [('threshold_cleared', 'HH', 'critical')]
+    assert m.active() == {}
+
+
+def test_rules_survive_a_restart_through_the_cache(tmp_path):
+    cache = tmp_path / 'thresholds.json'
+    ThresholdMonitor(str(cache)).sync([row()])
+    restarted = ThresholdMonitor(str(cache))
+    assert restarted.load_cache()
+    assert restarted.addresses == ['internal_temperature']
+    assert not ThresholdMonitor(str(tmp_path / 'missing.json')).load_cache()
@@ -0,0 +1,93 @@
+"""Metered uplink: rollup of samples into records and the budget-driven rollup factor"""
+import gzip
+import json
+from datetime import date
+
+import pytest
+
+from config import UplinkConfig
+from modules.uplink import UplinkController, rollup_samples
+
+
+def sample(device_id, second, active_power, energy, status='On-grid', sequence=None):
+    return {
+        'device_id': device_id,
+        'timestamp': f'2026-10-19T12:00:{second:02d}',
+        'power': {'active_power': {'value': active_power, 'unit': 'W'}},
+        'energy': {'daily_yield_energy': {'value': energy, 'unit': 'kWh'}},
+        'status': {'device_status': {'value': status, 'unit': None}},
+        'metadata': {'boot_id': 'b', 'sequence': sequence or second},
+    }
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    monkeypatch.setattr(UplinkController, 'sample_rate', property(lambda self: 0.0))
+    monkeypatch.setattr(UplinkController, '_seconds_to_midnight', staticmethod(lambda: 3600.0))
+    return UplinkController(UplinkConfig(daily_budget_mb=1.0, max_rollup=10, usage_file=''))
+
+
+def test_rollup_averages_measurements_and_keeps_the_last_counters():
+    record = rollup_samples([
+        sample('inv1', 0, 1000, 10.0, 'Standby'),
+        sample('inv1', 5, 2000, 10.5),
+        sample('inv1', 10, 3300, 11.0),
+    ])
+    assert record['timestamp'] == '2026-10-19T12:00:10'
+    assert record['power']['active_power'] == {'value': 2100.0, 'unit': 'W'}
+    assert record['energy']['daily_yield_energy']['value'] == 11.0
+    assert record['status']['device_status']['value'] == 'On-grid'
+    assert record['metadata'] == {'boot_id': 'b', 'sequence': 10, 'rollup': 3,
+                                  'rollup_from': '2026-10-19T12:00:00'}
+
+
+def test_rollup_skips_missing_and_non_numeric_values():
+    partial = sample('inv1', 0, None, 10.0)
+    del partial['power']['active_power']
+    record = rollup_samples([partial, sample('inv1', 5, 'n/a', 10.0), sample('inv1', 10, 900, 10.0)])
+    assert record['power']['active_power']['value'] == 900.0
+
+
+def test_single_sample_is_sent_as_is():
+    raw = sample('inv1', 0, 1000, 10.0)
+    assert rollup_samples([raw]) is raw
+
+
+def test_records_roll_up_each_device_separately():
+    samples = [sample(device, second, 1000 * (second + 1), 1.0)
+               for second in range(3) for device in ('inv1', 'inv2')]
+    records = UplinkController.records(samples, 2)
+    assert [(r['device_id'], r['metadata'].get('rollup', 1)) for r in records] == \
+        [('inv1', 2), ('inv1', 1), ('inv2', 2), ('inv2', 1)]
+    assert records[0]['power']['active_power']['value'] == 1500.0
+    assert UplinkController.records(samples, 1) == samples
+
+
+def test_encode_is_gzip_json():
+    records = [sample('inv1', 0, 1000, 1.0)]
+    assert json.loads(gzip.decompress(UplinkController.encode(records, 6))) == {'samples': records}
+
+
+def test_no_budget_means_no_rollup(controller):
+    controller.settings.daily_budget_mb = 0
+    assert controller._rollup(backlog=100000, per_record=1000) == 1
+
+
+def test_rollup_grows_as_the_budget_runs_short(controller):
+    # 1 MB left: 1000 raw records of 1 kB fit, 4000 need 4 per record
+    assert controller._rollup(backlog=1000, per_record=1000) == 1
+    assert controller._rollup(backlog=4000, per_record=1000) == 4
+    assert controller._rollup(backlog=10 ** 6, per_record=1000) == 10
+
+
+def test_spent_budget_sends_at_the_lowest_rate(controller):
+    controller.usage = {date.today().isoformat(): {'inv1': 2 * 10 ** 6}}
+    assert controller._rollup(backlog=1, per_record=1000) == 10
+
+
+def test_usage_is_counted_per_device(controller):
+    records = [sample('inv1', 0, 1, 1.0), sample('inv1', 1, 1, 1.0), sample('inv2', 0, 1, 1.0)]
+    controller.record(records, body_size=2400, duration=0.5, ok=True)
+    usage = controller.usage_today()
+    assert set(usage) == {'inv1', 'inv2'}
+    assert usage['inv1'] == 2 * usage['inv2']
@@ -1,4 +1,7 @@
 """Utils package"""
-from .logger import setup_logger
+from .files import write_json_atomic
+from .logger import setup_logger, set_log_level
+from .metrics import metrics, MetricsRegistry
+from .profiler import SamplingProfiler
 
-__all__ = ['setup_logger']
+__all__ = ['setup_logger', 'set_log_level', 'metrics', 'MetricsRegistry', 'SamplingProfiler', 'write_json_atomic']
@@ -0,0 +1,30 @@
+"""
+File utility module
+Atomic writes for the JSON state and cache files of the service
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+
+def write_json_atomic(path: Path, data: Any, **dump_kwargs):
+    """
+    Write data as JSON to path, replacing it in one step
+    The data goes to a per-process temp file first (fleet workers share
+    the same files), so readers never see a partial file. Parent
+    directories are created; OSError is left to the caller
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, **dump_kwargs)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
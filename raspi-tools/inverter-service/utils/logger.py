@@ -1,35 +1,211 @@
 """
 Logging utility module
 Centralized logging configuration
+Records are handed to a background thread through a queue, so a slow
+terminal, SD card or journald never blocks the event loop
 """
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
 import colorlog
 from config import config
 
+# Top-level logger names of this service (their level follows config.logging.level);
+# third-party libraries stay at WARNING
+SERVICE_LOGGERS = ('__main__', 'modules', 'utils', 'config')
+
+# Loggers configured by setup_logger (their level follows config.logging.level)
+_configured_loggers = set(SERVICE_LOGGERS)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+# Attributes every LogRecord has; anything else came from extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+# Message arguments a record can carry to the writer thread unmerged; other
+# objects (lists, dicts, instances) may change before they are formatted
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line (journald, Loki, jq)
+    Fields passed with extra={...} are added to the object
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Drop repeats of the same warning/error within a time window
+    Repeats are matched by logger, level and message template, so a
+    backend that fails every poll logs once per window; the next message
+    that gets through reports how many were suppressed
+    """
+
+    # Templates tracked before expired ones are pruned
+    MAX_KEYS = 1000
+
+    def __init__(self, window: float = 60.0, min_level: int = logging.WARNING):
+        super().__init__()
+        self.window = window
+        self.min_level = min_level
+        self._lock = threading.Lock()
+        # key -> (last emitted at, suppressed since)
+        self._seen: Dict[Tuple[str, int, str], Tuple[float, int]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.window <= 0 or record.levelno < self.min_level:
+            return True
+
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            emitted_at, suppressed = self._seen.get(key, (None, 0))
+            if emitted_at is not None and now - emitted_at < self.window:
+                self._seen[key] = (emitted_at, suppressed + 1)
+                return False
+
+            if len(self._seen) >= self.MAX_KEYS:
+                self._prune(now)
+            self._seen[key] = (now, 0)
+
+        if suppressed:
+            record.msg = f"{record.getMessage()} ({suppressed} similar messages suppressed)"
+            record.args = None
+            record.suppressed = suppressed
+        return True
+
+    def _prune(self, now: float):
+        expired = [key for key, (emitted_at, _) in self._seen.items() if now - emitted_at >= self.window]
+        for key in expired:
+            del self._seen[key]
+        if len(self._seen) >= self.MAX_KEYS:
+            self._seen.clear()
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the writer thread
+    The stock prepare() merges the message and renders the traceback in the
+    caller, then drops exc_info; here the record is queued as it is (a
+    copy), with exc_info, so the listener's formatter does that work and
+    the JSON output keeps the traceback in its own field. Only messages
+    with mutable arguments are merged in the caller
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        args = record.args
+        if args:
+            values = args.values() if isinstance(args, dict) else args
+            if not all(isinstance(value, _IMMUTABLE_ARGS) for value in values):
+                record.msg = record.getMessage()
+                record.args = None
+        return record
+
+
+def _build_formatter() -> logging.Formatter:
+    if config.logging.output == 'json':
+        return JsonFormatter()
+    return colorlog.ColoredFormatter(
+        config.logging.format,
+        datefmt=config.logging.date_format,
+        log_colors={
+            'DEBUG': 'cyan',
+            'INFO': 'green',
+            'WARNING': 'yellow',
+            'ERROR': 'red',
+            'CRITICAL': 'red,bg_white',
+        }
+    )
+
+
+def create_pipeline(stream=None) -> Tuple[DeferredQueueHandler, logging.handlers.QueueListener]:
+    """
+    Non-blocking handler and the listener thread that writes its records
+    The caller only pays for the rate limit check and a queue put;
+    formatting and the write happen on the listener thread
+    """
+    output = colorlog.StreamHandler(stream)
+    output.setFormatter(_build_formatter())
+
+    log_queue = queue.SimpleQueue()
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter(config.logging.rate_limit_window))
+
+    return handler, logging.handlers.QueueListener(log_queue, output)
+
+
+def setup_logging():
+    """
+    Install the logging pipeline once per process:
+    loggers -> rate limit -> DeferredQueueHandler -> (thread) formatter -> stderr
+    """
+    global _listener
+
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        handler, _listener = create_pipeline()
+
+        root = logging.getLogger()
+        root.addHandler(handler)
+        root.setLevel(logging.WARNING)
+
+        _listener.start()
+        # Flush what is still queued at exit
+        atexit.register(shutdown_logging)
+
+        set_log_level(config.logging.level)
+
+
+def shutdown_logging():
+    """Stop the writer thread after it has written every queued record"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
 
 def setup_logger(name: str = None) -> logging.Logger:
     """
-    Setup colored logger with consistent formatting
+    Logger for a module, with the service pipeline installed
     """
+    setup_logging()
     logger = logging.getLogger(name)
-
-    if not logger.handlers:
-        handler = colorlog.StreamHandler()
-        handler.setFormatter(
-            colorlog.ColoredFormatter(
-                config.logging.format,
-                datefmt=config.logging.date_format,
-                log_colors={
-                    'DEBUG': 'cyan',
-                    'INFO': 'green',
-                    'WARNING': 'yellow',
-                    'ERROR': 'red',
-                    'CRITICAL': 'red,bg_white',
-                }
-            )
-        )
-
-        logger.addHandler(handler)
+    if name and name not in _configured_loggers and not name.startswith(tuple(f'{n}.' for n in SERVICE_LOGGERS)):
         logger.setLevel(getattr(logging, config.logging.level))
-
+        _configured_loggers.add(name)
     return logger
+
+
+def set_log_level(level: str):
+    """Change the level of all configured loggers at runtime"""
+    for name in _configured_loggers:
+        logging.getLogger(name).setLevel(getattr(logging, level))
@@ -0,0 +1,101 @@
+"""
+Metrics utility module
+In-process counters and gauges with Prometheus textfile export
+"""
+import logging
+import os
+import threading
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """
+    Minimal thread-safe metrics registry
+    Values can be logged, inspected via snapshot() or written in the
+    Prometheus textfile format (node_exporter textfile collector)
+    """
+
+    def __init__(self, prefix: str = 'inverter_service'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._help: Dict[str, str] = {}
+
+    @staticmethod
+    def _key(labels: Dict[str, str]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def describe(self, name: str, help_text: str):
+        """Register help text for a metric"""
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Increment a counter"""
+        key = self._key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        """Set a gauge"""
+        key = self._key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def get(self, name: str, **labels) -> float:
+        """Current value of a counter or gauge (0 if unknown)"""
+        key = self._key(labels)
+        with self._lock:
+            for store in (self._gauges, self._counters):
+                if name in store and key in store[name]:
+                    return store[name][key]
+        return 0
+
+    def snapshot(self) -> Dict[str, float]:
+        """Flat copy of all series, keyed as name{label=value}"""
+        flat = {}
+        with self._lock:
+            for store in (self._counters, self._gauges):
+                for name, series in store.items():
+                    for key, value in series.items():
+                        flat[self._series_name(name, key)] = value
+        return flat
+
+    def _series_name(self, name: str, key: LabelKey) -> str:
+        if not key:
+            return name
+        labels = ','.join(f'{k}="{v}"' for k, v in key)
+        return f'{name}{{{labels}}}'
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for kind, store in (('counter', self._counters), ('gauge', self._gauges)):
+                for name, series in sorted(store.items()):
+                    full_name = f'{self.prefix}_{name}'
+                    if name in self._help:
+                        lines.append(f'# HELP {full_name} {self._help[name]}')
+                    lines.append(f'# TYPE {full_name} {kind}')
+                    for key, value in sorted(series.items()):
+                        lines.append(f'{self._series_name(full_name, key)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path: str):
+        """Atomically write metrics to a textfile"""
+        tmp_path = f'{path}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(self.render())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics file {path}: {e}")
+
+
+# Global metrics instance
+metrics = MetricsRegistry()
@@ -0,0 +1,198 @@
+"""
+Profiling utility module
+Low-overhead sampling profiler aware of the asyncio event loop
+"""
+import asyncio
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Leaf functions that mean the event loop is waiting for I/O or timers
+IDLE_FUNCTIONS = {'select', 'poll', 'epoll', 'kqueue'}
+MAX_STACK_DEPTH = 64
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler driven by an interval timer (SIGALRM)
+    The signal handler runs on the event loop thread at the interrupted
+    frame, so samples are not biased by the GIL. Stacks on the loop thread
+    are tagged with the coroutine of the task that is running, so time splits
+    cleanly between the polling loop, uploader, etc. Worker threads
+    (asyncio.to_thread) are sampled at the same time and tagged by name.
+
+    Output:
+      - collapsed stacks ('root;frame;frame count'), loadable by
+        flamegraph.pl, speedscope or inferno
+      - per-coroutine summary: time running on the loop, estimated CPU and
+        time suspended (awaiting I/O)
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._active = False
+        self._previous_handler = None
+        self._reset()
+
+    def _reset(self):
+        self._stacks: Counter = Counter()
+        self._self_time: Counter = Counter()
+        self._running: Counter = Counter()
+        self._suspended: Counter = Counter()
+        self._samples = 0
+        self._started_wall = 0.0
+        self._stopped_wall = 0.0
+        self._cpu_start: Tuple[float, float] = (0.0, 0.0)
+        self._cpu_end: Tuple[float, float] = (0.0, 0.0)
+
+    @property
+    def running(self) -> bool:
+        return self._active
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Start sampling; must be called from the event loop (main) thread"""
+        if self._active:
+            return
+        self._reset()
+        self.loop = loop
+        self._loop_ident = threading.get_ident()
+        self._started_wall = time.perf_counter()
+        self._cpu_start = self._cpu_times()
+        self._previous_handler = signal.signal(signal.SIGALRM, self._on_signal)
+        signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+        self._active = True
+        logger.info(f"Profiler started ({1 / self.interval:.0f} Hz)")
+
+    def stop(self):
+        """Stop sampling and restore the previous SIGALRM handler"""
+        if not self._active:
+            return
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, self._previous_handler or signal.SIG_DFL)
+        self._active = False
+        self._stopped_wall = time.perf_counter()
+        self._cpu_end = self._cpu_times()
+        logger.info(f"Profiler stopped ({self._samples} samples)")
+
+    @staticmethod
+    def _cpu_times() -> Tuple[float, float]:
+        """(event loop thread CPU, process CPU) in seconds"""
+        return time.thread_time(), time.process_time()
+
+    # ==================== Sampling ====================
+
+    def _on_signal(self, signum, frame):
+        try:
+            self._sample(frame)
+        except Exception as e:  # Never let the profiler take the service down
+            logger.debug(f"Profiler sample failed: {e}")
+
+    def _sample(self, loop_frame):
+        current = asyncio.current_task(self.loop)
+        self._samples += 1
+
+        stack = self._stack(loop_frame)
+        if current is not None:
+            root = self._task_label(current)
+        elif stack and stack[-1].split(' ', 1)[0] in IDLE_FUNCTIONS:
+            root = '<idle>'
+        else:
+            root = '<loop>'
+        self._running[root] += 1
+        self._record(root, stack)
+
+        frames = sys._current_frames()
+        if len(frames) > 1:
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident != self._loop_ident:
+                    self._record(f"thread:{thread_names.get(ident, ident)}", self._stack(frame))
+
+        for task in asyncio.all_tasks(self.loop):
+            if task is not current:
+                self._suspended[self._task_label(task)] += 1
+
+    def _record(self, root: str, stack: List[str]):
+        self._stacks[';'.join([root] + stack)] += 1
+        if stack:
+            self._self_time[stack[-1]] += 1
+
+    @staticmethod
+    def _task_label(task: asyncio.Task) -> str:
+        coro = task.get_coro()
+        return getattr(coro, '__qualname__', None) or task.get_name()
+
+    @staticmethod
+    def _stack(frame) -> List[str]:
+        """Root-to-leaf list of 'function (file.py)' labels"""
+        stack = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            if code is not SamplingProfiler._on_signal.__code__:
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    # ==================== Output ====================
+
+    def collapsed(self) -> str:
+        """Collapsed stacks, one 'a;b;c count' line per unique stack"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def summary(self) -> str:
+        """Human-readable per-coroutine wall/CPU summary"""
+        wall = (self._stopped_wall or time.perf_counter()) - self._started_wall
+        end = self._cpu_end if self._stopped_wall else self._cpu_times()
+        loop_cpu = end[0] - self._cpu_start[0]
+        process_cpu = end[1] - self._cpu_start[1]
+        samples = max(self._samples, 1)
+        busy = sum(n for label, n in self._running.items() if label != '<idle>')
+
+        lines = [
+            f"Profile window:   {wall:.1f}s wall, {1 / self.interval:.0f} Hz, {self._samples} samples",
+            f"Event loop CPU:   {loop_cpu:.2f}s ({100 * loop_cpu / max(wall, 1e-9):.1f}% of one core)",
+            f"Process CPU:      {process_cpu:.2f}s (all threads)",
+            "",
+            f"{'Coroutine':<44} {'running':>9} {'est. CPU':>9} {'suspended':>10} {'share':>6}",
+        ]
+        labels = set(self._running) | set(self._suspended)
+        for label in sorted(labels, key=lambda l: -self._running.get(l, 0)):
+            running = self._running.get(label, 0)
+            running_s = running * wall / samples
+            cpu_s = loop_cpu * running / busy if busy and label != '<idle>' else 0.0
+            suspended_s = self._suspended.get(label, 0) * wall / samples
+            lines.append(
+                f"{label[:44]:<44} {running_s:>8.2f}s {cpu_s:>8.2f}s "
+                f"{suspended_s:>9.2f}s {100 * running / samples:>5.1f}%"
+            )
+
+        lines += ["", "Top frames (self time, all threads):"]
+        for frame, count in self._self_time.most_common(20):
+            lines.append(f"  {100 * count / samples:>5.1f}%  {frame}")
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, output_dir: str) -> Tuple[Path, Path]:
+        """Write collapsed stacks and summary; returns both paths"""
+        directory = Path(output_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        stem = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+
+        collapsed_path = directory / f"{stem}.collapsed"
+        summary_path = directory / f"{stem}.summary.txt"
+        collapsed_path.write_text(self.collapsed())
+        summary_path.write_text(self.summary())
+
+        logger.info(f"Profile written to {collapsed_path} and {summary_path}")
+        return collapsed_path, summary_path